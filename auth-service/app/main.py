@@ -1,81 +1,96 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, HTTPException, Request, Response
 from pydantic import BaseModel
 from prometheus_fastapi_instrumentator import Instrumentator
-from starlette.middleware.base import BaseHTTPMiddleware
-import logging, time, uuid, subprocess, os
-
-# Logging config
-logging.basicConfig(
-    #filename="/var/log/app.log",
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s"
-)
-# also log to file for /logs endpoint and shipping
-try:
-    os.makedirs("/var/log", exist_ok=True)
-    _root_logger = logging.getLogger()
-    if not any(isinstance(h, logging.FileHandler) and getattr(h, 'baseFilename', '') == "/var/log/app.log" for h in _root_logger.handlers):
-        _fh = logging.FileHandler("/var/log/app.log")
-        _fh.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-        _root_logger.addHandler(_fh)
-except Exception:
-    pass
-logger = logging.getLogger("auth-service")
-
-app = FastAPI(title="auth-service")
-Instrumentator().instrument(app).expose(app)
+from starlette.concurrency import run_in_threadpool
+from sre_common import (HealthCheck, HealthMiddleware, InvalidToken, TokenAuthMiddleware, TokenSigner, TokenVerifier,
+                        TracingMiddleware, log_extra, setup_logging)
+from sre_common.tokens import ADMIN_ROLE, AdminCredentials
+from sre_common.logs_api import loglevel_router
+
+from .users import UserRepository
 
-# Enterprise middleware
-class EnterpriseMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        trace_id = request.headers.get("x-trace-id", str(uuid.uuid4()))
-        request.state.trace_id = trace_id
+# Logging: handlers only enqueue, a background thread writes app.log + stdout
+logger = setup_logging("auth-service")
 
-        user_id = request.headers.get("x-user-id", "unknown")
-        request.state.user_id = user_id
+# Tokens: HMAC-signed here, verified locally by every service (sre_common.tokens)
+SIGNER = TokenSigner.from_env()
+VERIFIER = TokenVerifier.from_env()
+# accounts whose tokens carry the admin role (POST /loglevel on every service), with password hashes
+ADMINS = AdminCredentials.from_env()
 
-        start = time.time()
-        response: Response = await call_next(request)
-        duration_ms = round((time.time() - start) * 1000, 2)
+# /user/{username}: read-through cache over Mongo
+USERS = UserRepository()
 
-        logger.info(
-            f"[trace={trace_id}] [user={user_id}] [route={request.url.path}] [duration_ms={duration_ms}]"
-        )
 
-        response.headers["x-trace-id"] = trace_id
-        return response
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await USERS.close()
+
+
+app = FastAPI(title="auth-service", lifespan=lifespan)
+Instrumentator().instrument(app).expose(app)
 
-app.add_middleware(EnterpriseMiddleware)
+# Bearer token -> request.state.user_id (inner), then tracing (outer)
+app.add_middleware(TokenAuthMiddleware, verifier=VERIFIER)
+app.add_middleware(TracingMiddleware, logger=logger)
+
+# /health and /ready: answered ahead of tracing and logging, from a cached dependency check.
+# Mongo is not critical: /user falls back to default profiles while it is down.
+HEALTH = HealthCheck("auth")
+HEALTH.add("mongo", USERS.ping, critical=False)
+app.add_middleware(HealthMiddleware, health=HEALTH)
 
 # Models
 class LoginIn(BaseModel):
     username: str
     password: str
 
-@app.get("/health")
-async def health(request: Request):
-    logger.info(f"[trace={request.state.trace_id}] [user={request.state.user_id}] health check")
-    return {"status": "ok", "service": "auth"}
-
 @app.post("/login")
 async def login(request: Request, payload: LoginIn, response: Response):
     # set user id for this request (so middleware logs show it)
     request.state.user_id = payload.username
     # demo-only behavior
     if not payload.username:
-        logger.warning(f"[trace={request.state.trace_id}] [user=unknown] Login failed: missing username")
+        logger.warning(f"[trace={request.state.trace_id}] [user=unknown] Login failed: missing username",
+                       extra=log_extra(request, user_id="unknown"))
         raise HTTPException(status_code=400, detail="username required")
 
-    logger.info(f"[trace={request.state.trace_id}] [user={payload.username}] login success")
+    # an admin account only logs in with its password (PBKDF2: kept off the event loop)
+    claims = {}
+    if payload.username in ADMINS:
+        if not await run_in_threadpool(ADMINS.check, payload.username, payload.password):
+            logger.warning(f"[trace={request.state.trace_id}] [user={payload.username}] Login failed: bad admin password",
+                           extra=log_extra(request))
+            raise HTTPException(status_code=401, detail="invalid credentials")
+        claims = {"roles": [ADMIN_ROLE]}
+
+    logger.info(f"[trace={request.state.trace_id}] [user={payload.username}] login success", extra=log_extra(request))
     # include x-user-id in response so client can use it in subsequent calls
     response.headers["x-user-id"] = payload.username
     response.headers["x-trace-id"] = request.state.trace_id
-    return {"access_token": f"fake-token-for-{payload.username}", "token_type": "bearer"}
+    return {"access_token": SIGNER.issue(payload.username, **claims), "token_type": "bearer", "expires_in": SIGNER.ttl}
+
+@app.get("/verify")
+async def verify(request: Request):
+    # token introspection for callers that cannot verify locally
+    auth = request.headers.get("authorization", "")
+    try:
+        claims = VERIFIER.verify(auth[7:].strip() if auth[:7].lower() == "bearer " else auth)
+    except InvalidToken as e:
+        raise HTTPException(status_code=401, detail=f"invalid token: {e}")
+    return {"active": True, **claims}
 
 @app.get("/user/{username}")
 async def get_user(request: Request, username: str):
-    logger.info(f"[trace={request.state.trace_id}] [user={username}] fetched user")
-    return {"username": username, "roles": ["user"]}
+    profile = await USERS.get(username)
+    logger.info(f"[trace={request.state.trace_id}] [user={username}] fetched user", extra=log_extra(request, user_id=username))
+    return profile
+
+# GET/POST /loglevel: logger levels and per-route access-log rules at runtime
+app.include_router(loglevel_router())
 
 # @app.get("/logs")
 # async def get_logs(lines: int = 50):
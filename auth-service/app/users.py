@@ -0,0 +1,82 @@
+"""
+User profiles for /user/{username}: read-through cache in front of Mongo.
+
+Lookups hit an in-process TTLCache first; a miss reads `authdb.users` through
+pymongo's async client (one pooled client per process) and caches the result
+for USER_CACHE_TTL seconds. Unknown users get the default profile, which is
+written back so the next service instance finds it too. Without MONGO_URL (or
+pymongo), or while Mongo is unreachable, the default profile is served.
+"""
+
+import logging
+import os
+
+from sre_common import TTLCache
+
+logger = logging.getLogger(__name__)
+
+MONGO_URL = os.getenv("MONGO_URL")
+MONGO_DB = os.getenv("AUTH_MONGO_DB", "authdb")
+CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+POOL_SIZE = int(os.getenv("MONGO_POOL_SIZE", "20"))
+
+
+def default_profile(username: str) -> dict:
+    return {"username": username, "roles": ["user"]}
+
+
+class UserRepository:
+    """
+    users = UserRepository(MONGO_URL)
+    await users.get("alice")   # -> {"username": "alice", "roles": [...]}
+    """
+
+    def __init__(self, url: str = MONGO_URL, collection=None, cache_ttl: float = CACHE_TTL,
+                 cache_size: int = CACHE_SIZE):
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.stats = {"hits": 0, "misses": 0}
+        self.client = None
+        self.collection = collection
+        if collection is None and url:
+            try:
+                from pymongo import AsyncMongoClient
+            except ImportError:
+                logger.warning("users: pymongo not installed, serving default profiles")
+            else:
+                self.client = AsyncMongoClient(url, maxPoolSize=POOL_SIZE, serverSelectionTimeoutMS=2000)
+                self.collection = self.client[MONGO_DB]["users"]
+
+    async def _load(self, username: str) -> dict:
+        if self.collection is None:
+            return default_profile(username)
+        doc = await self.collection.find_one({"_id": username}, {"_id": 0, "username": 1, "roles": 1})
+        if doc is None:
+            doc = default_profile(username)
+            await self.collection.update_one({"_id": username}, {"$setOnInsert": doc}, upsert=True)
+        return doc
+
+    async def get(self, username: str) -> dict:
+        profile = self.cache.get(username)
+        if profile is not None:
+            self.stats["hits"] += 1
+            return profile
+        self.stats["misses"] += 1
+        try:
+            profile = await self._load(username)
+        except Exception as e:  # Mongo down: answer, but don't cache the fallback
+            logger.warning(f"users: mongo lookup failed for {username}: {e}")
+            return default_profile(username)
+        self.cache.put(username, profile)
+        return profile
+
+    async def ping(self):
+        if self.client is not None:
+            await self.client.admin.command("ping")
+
+    def invalidate(self, username: str):
+        self.cache.pop(username)
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
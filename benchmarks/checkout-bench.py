@@ -0,0 +1,145 @@
+"""
+Before/after comparison: client-driven purchase (order /create, payment
+/charge, notification /send, one round trip each, as in
+log-scripting/trace-log-testing.py) vs one POST /checkout on order-service.
+
+Starts order-, payment- and notification-service locally (uvicorn, SQLite
+orders, in-process idempotency) and times complete purchases one after the
+other, end to end as the client sees them.
+
+    python benchmarks/checkout-bench.py --purchases 300
+    python benchmarks/checkout-bench.py --purchases 300 --client-rtt-ms 40
+
+Login is left out of both sides: the token it returns is reused for many
+purchases. --client-rtt-ms adds that much delay to every client round trip,
+to model a client that is not in the same datacenter as the services; the
+service-to-service hops inside /checkout are not delayed.
+"""
+
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import requests
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+PORTS = {"order-service": 8112, "payment-service": 8113, "notification-service": 8114}
+
+
+def start_services(workdir):
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "LOG_FILE": os.path.join(workdir, "app.log"),
+        "ORDERS_DB_URL": f"sqlite:///{os.path.join(workdir, 'orders.db')}",
+        "IDEMPOTENCY_DSN": "",
+        "TRACE_EXPORT": "",
+        "PAYMENT_URL": f"http://127.0.0.1:{PORTS['payment-service']}",
+        "NOTIFY_URL": f"http://127.0.0.1:{PORTS['notification-service']}",
+    }
+    procs = []
+    for service, port in PORTS.items():
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning"],
+            cwd=os.path.join(ROOT, service), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+    for port in PORTS.values():
+        deadline = time.time() + 30
+        while True:
+            try:
+                if requests.get(f"http://127.0.0.1:{port}/ready", timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            if time.time() > deadline:
+                stop_services(procs)
+                raise RuntimeError(f"service on :{port} did not come up")
+            time.sleep(0.2)
+    return procs
+
+
+def stop_services(procs):
+    for proc in procs:
+        proc.send_signal(signal.SIGTERM)
+    for proc in procs:
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+###############################################
+# BEFORE — the client drives every hop and forwards the trace by hand
+###############################################
+
+def client_driven(http, user, rtt):
+    order_id = f"o-{uuid.uuid4().hex[:6]}"
+    time.sleep(rtt)
+    r = http.post(f"http://127.0.0.1:{PORTS['order-service']}/create",
+                  json={"id": order_id, "customer_id": user, "amount": 150.0}, headers={"x-user-id": user})
+    headers = {"x-trace-id": r.headers.get("x-trace-id"), "x-user-id": user}
+
+    time.sleep(rtt)
+    r = http.post(f"http://127.0.0.1:{PORTS['payment-service']}/charge",
+                  json={"id": f"p-{uuid.uuid4().hex[:6]}", "order_id": order_id, "amount": 150.0}, headers=headers)
+    if r.json().get("status") == "ok":
+        time.sleep(rtt)
+        http.post(f"http://127.0.0.1:{PORTS['notification-service']}/send",
+                  json={"to": user, "message": f"order {order_id} done"}, headers=headers)
+
+
+###############################################
+# AFTER — one call, order-service fans out
+###############################################
+
+def checkout(http, user, rtt):
+    time.sleep(rtt)
+    http.post(f"http://127.0.0.1:{PORTS['order-service']}/checkout",
+              json={"customer_id": user, "amount": 150.0}, headers={"x-user-id": user})
+
+
+def run(flow, http, purchases, rtt):
+    latencies = []
+    for i in range(purchases):
+        started = time.perf_counter()
+        flow(http, f"user{i % 7}", rtt)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def report(label, latencies):
+    q = statistics.quantiles(latencies, n=100)
+    print(f"{label:<34}{statistics.mean(latencies):>9.2f}{q[49]:>9.2f}{q[89]:>9.2f}{q[98]:>9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--purchases", type=int, default=300)
+    parser.add_argument("--client-rtt-ms", type=float, default=0.0, help="simulated client<->service round trip")
+    args = parser.parse_args()
+    rtt = args.client_rtt_ms / 1000
+
+    with tempfile.TemporaryDirectory(prefix="checkout-bench-") as workdir:
+        procs = start_services(workdir)
+        try:
+            # warm up imports, pools and caches on every path
+            with requests.Session() as http:
+                run(client_driven, http, 20, 0)
+                run(checkout, http, 20, 0)
+
+            print(f"{args.purchases} purchases, client RTT {args.client_rtt_ms:.0f} ms, latency in ms")
+            print(f"{'flow':<34}{'mean':>9}{'p50':>9}{'p90':>9}{'p99':>9}")
+            # new connection per call, like trace-log-testing.py's bare requests.post()
+            report("client-driven, no keep-alive", run(client_driven, requests, args.purchases, rtt))
+            with requests.Session() as http:
+                report("client-driven, keep-alive", run(client_driven, http, args.purchases, rtt))
+                report("POST /checkout", run(checkout, http, args.purchases, rtt))
+        finally:
+            stop_services(procs)
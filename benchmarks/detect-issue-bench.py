@@ -0,0 +1,105 @@
+"""
+detect_issue() microbenchmark: legacy dict/any() scan vs the compiled
+snow.matcher.IssueMatcher, over synthetic payment-service log lines.
+
+    python benchmarks/detect-issue-bench.py --lines 2000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from snow.matcher import IssueMatcher  # noqa: E402
+
+
+###############################################
+# BEFORE — the original detect_issue()
+###############################################
+
+def detect_issue_legacy(log_message: str):
+    log_message = str(log_message).lower()
+
+    patterns = {
+        "Invalid Amount": ["error_type=invalidamount"],
+        "Duplicate Transaction": ["error_type=duplicatetransaction"],
+        "Fraud Blocked": ["error_type=fraudblocked"],
+        "Random Failure": ["error_type=randomfail", "event=payment_failure"],
+        "Payment Failure": ["payment failed", "transaction failed", "failed payment"],
+    }
+
+    for issue_name, keywords in patterns.items():
+        if any(k in log_message for k in keywords):
+            return issue_name
+
+    return None
+
+
+###############################################
+# SYNTHETIC PAYMENT-SERVICE TRAFFIC
+###############################################
+
+# roughly what test-payment.py produces, weighted towards successes
+_EVENTS = [
+    (70, "INFO", "payment_success", "None"),
+    (10, "INFO", None, None),  # access log line
+    (5, "WARNING", "payment_validation", "InvalidAmount"),
+    (5, "WARNING", "payment_validation", "DuplicateTransaction"),
+    (3, "WARNING", "payment_validation", "FraudBlocked"),
+    (7, "ERROR", "payment_failure", "RandomFail"),
+]
+
+
+def synth_lines(n, seed=7):
+    rnd = random.Random(seed)
+    weights = [w for w, *_ in _EVENTS]
+    traces = [str(uuid.UUID(int=rnd.getrandbits(128))) for _ in range(1000)]
+    users = ["michel", "alex", "robert", "sneha", "james"]
+    out = []
+    for _, level, event, error_type in rnd.choices(_EVENTS, weights=weights, k=n):
+        prefix = f"2026-01-01 10:00:00,000 [{level}] [trace={rnd.choice(traces)}] [user={rnd.choice(users)}]"
+        if event is None:
+            out.append(f"{prefix} [route=/charge] [duration_ms={rnd.random() * 20:.2f}]")
+        else:
+            out.append(f"{prefix} event={event} error_type={error_type} "
+                       f"order_id=o-{rnd.getrandbits(24):06x} amount={rnd.choice([0, 150.0, 499, 60000.0])}")
+    return out
+
+
+def timed(fn, lines):
+    t0 = time.perf_counter()
+    results = [fn(line) for line in lines]
+    return time.perf_counter() - t0, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=2_000_000)
+    parser.add_argument("--rules", default=os.path.join(ROOT, "snow", "rules.json"))
+    args = parser.parse_args()
+
+    print(f"generating {args.lines:,} lines ...")
+    lines = synth_lines(args.lines)
+    matcher = IssueMatcher.from_file(args.rules)
+
+    legacy_s, legacy = timed(detect_issue_legacy, lines)
+    compiled_s, compiled = timed(matcher.match, lines)
+    t0 = time.perf_counter()
+    batched = []
+    for i in range(0, len(lines), 100_000):
+        batched.extend(matcher.match_many(lines[i:i + 100_000]))
+    batch_s = time.perf_counter() - t0
+
+    mismatches = sum(a != b for a, b in zip(legacy, compiled)) + sum(a != b for a, b in zip(legacy, batched))
+    print(f"{'legacy dict/any()':28} {args.lines / legacy_s:12,.0f} lines/s")
+    print(f"{'IssueMatcher.match':28} {args.lines / compiled_s:12,.0f} lines/s  x{legacy_s / compiled_s:.2f}")
+    print(f"{'IssueMatcher.match_many':28} {args.lines / batch_s:12,.0f} lines/s  x{legacy_s / batch_s:.2f}")
+    print(f"mismatches vs legacy: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Per-charge cost of payment-service's velocity fraud engine with ~1M active
+users, against the old single `amount > 50000` check.
+
+Loads 1M users (one charge each, every charge on a new order, so the order
+index is full and evicting), then times charges from random users of that
+population. Also reports the memory the engine holds, and the cost of the
+SQLite-backed SharedFraudEngine (FRAUD_SHARED, windows shared by the gunicorn
+workers) on the first --shared-charges of the same traffic.
+
+    python benchmarks/fraud-bench.py --users 1000000 --charges 500000
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "payment-service"))
+from app.fraud import RULES_PATH, FraudEngine, SharedFraudEngine  # noqa: E402
+
+
+###############################################
+# BEFORE — the old check in process_charge()
+###############################################
+
+def legacy_check(user_id, order_id, amount, now=None):
+    return "max_amount" if amount > 50000 else None
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def run(check, users, order_ids, amounts, times):
+    started = time.perf_counter()
+    blocked = 0
+    for user, order_id, amount, now in zip(users, order_ids, amounts, times):
+        if check(user, order_id, amount, now):
+            blocked += 1
+    return (time.perf_counter() - started) / len(users) * 1e9, blocked
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--charges", type=int, default=500_000)
+    parser.add_argument("--rules", default=RULES_PATH)
+    parser.add_argument("--shared-charges", type=int, default=50_000)
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    names = [f"user-{i:07d}" for i in range(args.users)]
+
+    gc.collect()
+    before = rss_mb()
+    engine = FraudEngine.from_file(args.rules, max_keys=args.users)
+    # population: every user charges once within the first minute
+    t0 = 1_000_000.0
+    load_started = time.perf_counter()
+    for i, name in enumerate(names):
+        engine.check(name, f"o-{i}", 100.0, t0 + i * 60.0 / args.users)
+    load_s = time.perf_counter() - load_started
+    gc.collect()
+    held = rss_mb() - before
+
+    # measured traffic: random users, fresh orders, over the next minute
+    n = args.charges
+    users = [names[rnd.randrange(args.users)] for _ in range(n)]
+    orders = [f"o-{args.users + i}" for i in range(n)]
+    amounts = [rnd.choice((25.0, 150.0, 900.0, 4000.0, 60000.0)) for _ in range(n)]
+    times = [t0 + 60.0 + i * 60.0 / n for i in range(n)]
+
+    legacy_ns, legacy_blocked = run(legacy_check, users, orders, amounts, times)
+    engine_ns, engine_blocked = run(engine.check, users, orders, amounts, times)
+    k = min(n, args.shared_charges)
+    with tempfile.TemporaryDirectory(prefix="fraud-bench-") as workdir:
+        shared = SharedFraudEngine.from_file(args.rules, db_path=os.path.join(workdir, "windows.db"))
+        shared_ns, shared_blocked = run(shared.check, users[:k], orders[:k], amounts[:k], times[:k])
+
+    print(f"{args.users:,} users loaded in {load_s:.1f}s, engine holds ~{held:.0f} MB "
+          f"({held * 1e6 / args.users:.0f} B/user incl. order keys)")
+    print(f"{'check':<26}{'ns/charge':>11}{'blocked':>10}")
+    print(f"{'amount > 50000 (before)':<26}{legacy_ns:>11.0f}{legacy_blocked:>10}")
+    print(f"{'velocity engine':<26}{engine_ns:>11.0f}{engine_blocked:>10}")
+    print(f"{'shared (SQLite), ' + format(k, ','):<26}{shared_ns:>11.0f}{shared_blocked:>10}")
+    print(f"order index evictions: {engine.index['order'].evictions:,}, "
+          f"user index: {len(engine.index['user']):,} keys")
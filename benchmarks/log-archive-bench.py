@@ -0,0 +1,159 @@
+"""
+Historical latency / error questions over a large app.log: re-parsing the
+raw text with Python regexes (what answering it without Kibana meant)
+against the Parquet archive of sre_common.log_archive.
+
+Writes --lines synthetic payment-service lines spread over a week, archives
+them once (timed), then asks the same three questions both ways:
+p50/p99 duration_ms of /charge on one day, error rate per user, top users
+by charged amount.
+
+    python benchmarks/log-archive-bench.py --lines 20000000
+"""
+
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from sre_common.log_archive import LogArchive  # noqa: E402
+
+T0 = 1_760_000_000  # 2025-10-09 08:53:20 UTC
+WEEK = 7 * 86400
+DAY = ("2025-10-11", 1_760_140_800, 1_760_227_200)  # that day's UTC bounds
+
+
+def write_log(path, n, seed=7):
+    rnd = random.Random(seed)
+    users = [f"user{i}" for i in range(5000)]
+    step = WEEK / (n / 2)
+    with open(path, "w") as f:
+        batch = []
+        for i in range(n // 2):
+            ts = T0 + i * step
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ts)) + f",{int(ts * 1000) % 1000:03d}"
+            head = f"{stamp} [{{}}] [trace={i:012x}] [user={rnd.choice(users)}]"
+            kind = rnd.random()
+            if kind < 0.07:
+                batch.append(head.format("ERROR") + f" event=payment_failure error_type=RandomFail order_id=o{i} amount=150.0")
+            elif kind < 0.1:
+                batch.append(head.format("WARNING") + f" event=payment_validation error_type=FraudBlocked order_id=o{i} amount=60000.0")
+            else:
+                batch.append(head.format("INFO") + f" event=payment_success error_type=None order_id=o{i} amount={rnd.choice((25.0, 150.0, 499.0))}")
+            batch.append(head.format("INFO") + f" [route=/charge] [duration_ms={rnd.lognormvariate(1.5, 0.6):.2f}]")
+            if len(batch) >= 100_000:
+                f.write("\n".join(batch) + "\n")
+                batch = []
+        if batch:
+            f.write("\n".join(batch) + "\n")
+
+
+###############################################
+# BEFORE — one regex pass over the raw text per question
+###############################################
+
+LINE = re.compile(r"^(\S+ \S+) \[(\w+)\] \[trace=([^\]]*)\] \[user=([^\]]*)\](?: \[route=([^\]]*)\] \[duration_ms=([\d.]+)\])?")
+FIELD = re.compile(r"\b(event|error_type|amount)=(\S+)")
+
+
+def _lines(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            m = LINE.match(line)
+            if m:
+                yield m, line
+
+
+def before_latency(path):
+    day_prefix = DAY[0]
+    durations = [float(m.group(6)) for m, _ in _lines(path)
+                 if m.group(5) == "/charge" and m.group(1).startswith(day_prefix)]
+    q = statistics.quantiles(durations, n=100)
+    return len(durations), q[49], q[98]
+
+
+def before_errors(path):
+    requests, failed_traces, per_user = defaultdict(int), set(), defaultdict(int)
+    for m, line in _lines(path):
+        if m.group(6):
+            requests[m.group(4)] += 1
+        elif m.group(2) in ("ERROR", "CRITICAL") or "error_type=None" not in line:
+            failed_traces.add(m.group(3))
+    for m, _ in _lines(path):
+        if m.group(6) and m.group(3) in failed_traces:
+            per_user[m.group(4)] += 1
+    return max((per_user[u] / n, u) for u, n in requests.items())
+
+
+def before_top_amount(path):
+    totals = defaultdict(float)
+    for m, line in _lines(path):
+        if "event=payment_success" in line:
+            fields = dict(FIELD.findall(line))
+            totals[m.group(4)] += float(fields["amount"])
+    return sorted(totals.items(), key=lambda kv: -kv[1])[:10]
+
+
+###############################################
+# AFTER — the archive
+###############################################
+
+def after_latency(archive):
+    where = archive.where(route="/charge", since=DAY[0], until=DAY[0])
+    row = archive.latency(None, where, (50, 99))[0]
+    return row["requests"], row["p50"], row["p99"]
+
+
+def after_errors(archive):
+    top = archive.errors("user")[0]
+    return top["error_rate"], top["user"]
+
+
+def after_top_amount(archive):
+    return [(r["user"], r["amount"]) for r in archive.top("user", "amount", 10, archive.where(event="payment_success"))]
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - t0, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=2_000_000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--skip-before", action="store_true", help="only time the archive")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="log-archive-bench-") as workdir:
+        log = os.path.join(workdir, "app.log")
+        t, _ = timed(write_log, log, args.lines)
+        print(f"{args.lines:,} lines, {os.path.getsize(log) / 1e6:.0f} MB of app.log written in {t:.0f}s, "
+              f"{os.cpu_count()} CPUs")
+
+        archive = LogArchive(os.path.join(workdir, "archive"))
+        t, rows = timed(archive.ingest_files, {"payment": log}, args.workers)
+        size = sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(archive.path) for f in fs)
+        print(f"archived {rows:,} rows in {t:.1f}s ({rows / t / 1e6:.2f} M lines/s), {size / 1e6:.0f} MB of Parquet")
+
+        print(f"{'question':<34}{'regex scan s':>14}{'archive s':>11}{'speedup':>9}")
+        for label, before, after in (
+            (f"p50/p99 /charge on {DAY[0]}", before_latency, after_latency),
+            ("worst error rate per user", before_errors, after_errors),
+            ("top 10 users by amount", before_top_amount, after_top_amount),
+        ):
+            t_after, r_after = timed(after, archive)
+            if args.skip_before:
+                print(f"{label:<34}{'-':>14}{t_after:>11.2f}")
+                continue
+            t_before, r_before = timed(before, log)
+            print(f"{label:<34}{t_before:>14.2f}{t_after:>11.2f}{t_before / t_after:>8.0f}x")
+            print(f"    before {r_before if not isinstance(r_before, list) else r_before[:2]}")
+            print(f"    after  {r_after if not isinstance(r_after, list) else r_after[:2]}")
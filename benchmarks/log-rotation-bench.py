@@ -0,0 +1,109 @@
+"""
+Cost of log rotation on the log writer thread, and of /logs paging into
+rotated, gzipped history.
+
+Writes the same batches (512 lines, like a full LOG_BATCH_SIZE) through the
+old never-rotating AppendFile and through RotatingAppendFile with a small
+LOG_ROTATE_BYTES, and reports per-batch write latency. gzip runs on the
+compressor thread, so the writer's p99 should only see the rename. Then it
+pages backwards with read_page() from the live file into the .gz segments.
+
+    python benchmarks/log-rotation-bench.py --batches 4000 --rotate-mb 8
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from sre_common.log_reader import read_page  # noqa: E402
+from sre_common.logfile import RotatingAppendFile, SegmentCompressor, list_segments  # noqa: E402
+
+
+###############################################
+# BEFORE — one O_APPEND file that grows forever
+###############################################
+
+class AppendFile:
+    def __init__(self, path):
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def write(self, text):
+        data = memoryview(text.encode("utf-8"))
+        start = 0
+        while start < len(data):
+            start += os.write(self.fd, data[start:])
+
+    def close(self):
+        os.close(self.fd)
+
+
+def batch_text(n, lines=512):
+    return "".join(
+        f"2026-10-18 07:45:12,{i % 1000:03d} [INFO] [trace=t{n:08x}{i:04x}] [user=user{i % 97}] "
+        f"[route=/charge] payment p-{n}-{i} ok amount=25.0 rule=None\n"
+        for i in range(lines)
+    )
+
+
+def write_all(stream, batches):
+    latencies = []
+    for n in range(batches):
+        text = batch_text(n)
+        started = time.perf_counter()
+        stream.write(text)
+        latencies.append((time.perf_counter() - started) * 1e6)
+    return latencies
+
+
+def report(label, latencies):
+    q = statistics.quantiles(latencies, n=1000)
+    print(f"{label:<28}{statistics.mean(latencies):>9.0f}{q[499]:>9.0f}{q[989]:>9.0f}{q[998]:>9.0f}{max(latencies):>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batches", type=int, default=4000)
+    parser.add_argument("--rotate-mb", type=float, default=8)
+    parser.add_argument("--page", type=int, default=500, help="lines per /logs page when paging back")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="log-rotation-bench-") as workdir:
+        plain_path = os.path.join(workdir, "plain.log")
+        path = os.path.join(workdir, "app.log")
+
+        print(f"{args.batches} batches of 512 lines, rotate every {args.rotate_mb:.0f} MB, write latency in µs")
+        print(f"{'writer':<28}{'mean':>9}{'p50':>9}{'p99':>9}{'p99.9':>9}{'max':>10}")
+        plain = AppendFile(plain_path)
+        report("no rotation (before)", write_all(plain, args.batches))
+        plain.close()
+
+        compressor = SegmentCompressor(path, keep_files=0, delay=0.5)
+        rotating = RotatingAppendFile(path, max_bytes=int(args.rotate_mb * 1024 * 1024), compressor=compressor)
+        report("rotate + background gzip", write_all(rotating, args.batches))
+        while any(not s.compressed for s in list_segments(path)):
+            time.sleep(0.2)
+        rotating.close()
+
+        segments = list_segments(path)
+        on_disk = sum(os.path.getsize(s.path) for s in segments) + os.path.getsize(path)
+        print(f"{rotating.rotations} rotations, {len(segments)} gz segments, "
+              f"{os.path.getsize(plain_path) / 1e6:.0f} MB of log in {on_disk / 1e6:.0f} MB on disk")
+
+        # page back from the newest line to the oldest one
+        cursor, pages, lines, timings = None, 0, 0, []
+        while True:
+            started = time.perf_counter()
+            page = read_page(path, args.page, cursor)
+            lines += sum(1 for _ in page.iter_lines())
+            timings.append((time.perf_counter() - started) * 1000)
+            pages += 1
+            if not page.older:
+                break
+            cursor = page.older
+        print(f"paged back through {lines:,} lines in {pages} pages of {args.page}: "
+              f"p50 {statistics.median(timings):.2f} ms, max {max(timings):.1f} ms "
+              f"(first page of each .gz segment inflates it)")
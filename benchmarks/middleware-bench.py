@@ -0,0 +1,159 @@
+"""
+Before/after comparison: legacy EnterpriseMiddleware(BaseHTTPMiddleware)
+vs the shared pure-ASGI TracingMiddleware.
+
+Requests are pushed straight into the ASGI app (no sockets), so the numbers
+isolate middleware overhead from network/uvicorn noise.
+
+    python benchmarks/middleware-bench.py --requests 20000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+import uuid
+
+from fastapi import FastAPI, Request, Response
+from starlette.middleware.base import BaseHTTPMiddleware
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from sre_common import TracingMiddleware  # noqa: E402
+
+logger = logging.getLogger("bench")
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+logger.setLevel(logging.INFO)
+
+
+###############################################
+# BEFORE — copy of the old per-service middleware
+###############################################
+
+class EnterpriseMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        trace_id = request.headers.get("x-trace-id", str(uuid.uuid4()))
+        request.state.trace_id = trace_id
+
+        user_id = request.headers.get("x-user-id", "unknown")
+        request.state.user_id = user_id
+
+        start = time.time()
+        response: Response = await call_next(request)
+        duration_ms = round((time.time() - start) * 1000, 2)
+
+        logger.info(
+            f"[trace={trace_id}] [user={user_id}] [route={request.url.path}] [duration_ms={duration_ms}]"
+        )
+
+        response.headers["x-trace-id"] = trace_id
+        return response
+
+
+def build_app(middleware):
+    app = FastAPI()
+    if middleware is TracingMiddleware:
+        app.add_middleware(TracingMiddleware, logger=logger)
+    else:
+        app.add_middleware(middleware)
+
+    @app.get("/health")
+    async def health(request: Request):
+        return {"status": "ok", "trace": request.state.trace_id}
+
+    return app
+
+
+###############################################
+# IN-PROCESS ASGI DRIVER
+###############################################
+
+async def one_request(app, path="/health"):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"x-trace-id", b"bench-trace"), (b"x-user-id", b"bench-user")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("127.0.0.1", 8000),
+    }
+    sent_request = False
+
+    async def receive():
+        nonlocal sent_request
+        if not sent_request:
+            sent_request = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(3600)  # client never disconnects mid-request
+        return {"type": "http.disconnect"}
+
+    status = None
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run(app, n, concurrency):
+    # warmup (builds routes, caches, etc.)
+    for _ in range(200):
+        await one_request(app)
+
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def timed():
+        async with sem:
+            t0 = time.perf_counter()
+            status = await one_request(app)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            assert status == 200, status
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(timed() for _ in range(n)))
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    return {
+        "rps": n / elapsed,
+        "p50": statistics.median(latencies),
+        "p99": latencies[int(len(latencies) * 0.99) - 1],
+        "mean": statistics.fmean(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    results = {}
+    for name, mw in (("before: BaseHTTPMiddleware", EnterpriseMiddleware),
+                     ("after:  TracingMiddleware", TracingMiddleware)):
+        results[name] = asyncio.run(run(build_app(mw), args.requests, args.concurrency))
+
+    print(f"{'variant':28} {'req/s':>10} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, r in results.items():
+        print(f"{name:28} {r['rps']:10.0f} {r['mean']:9.3f} {r['p50']:9.3f} {r['p99']:9.3f}")
+
+    before, after = results.values()
+    print(f"\nthroughput x{after['rps'] / before['rps']:.2f}, "
+          f"p99 {before['p99']:.3f} -> {after['p99']:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+notification-service /send: provider call inline in the request (what a
+naive "real" send() would do) vs the batched DeliveryQueue, against the
+fake provider with a fixed per-call latency.
+
+Reports how long the /send handler holds the request, how many provider
+calls were made and how long until every message was delivered.
+
+    python benchmarks/notification-bench.py --messages 5000 --clients 50 --latency-ms 50
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "notification-service"))
+from app.delivery import DeliveryQueue, FakeProvider, Pending  # noqa: E402
+
+
+def pct(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))] * 1000
+
+
+async def drive(handler, messages, clients):
+    """`clients` concurrent senders splitting `messages` sends; returns per-request latencies."""
+    latencies = []
+
+    async def client(n):
+        for i in range(n, messages, clients):
+            t0 = time.perf_counter()
+            await handler(f"user-{i % 1000}", f"order o-{i} done")
+            latencies.append(time.perf_counter() - t0)
+
+    await asyncio.gather(*(client(n) for n in range(clients)))
+    return latencies
+
+
+async def inline(args):
+    provider = FakeProvider(latency=args.latency_ms / 1000)
+
+    async def handler(to, message):
+        await provider.send_batch([Pending(to, message)])
+
+    t0 = time.perf_counter()
+    latencies = await drive(handler, args.messages, args.clients)
+    return latencies, time.perf_counter() - t0, provider
+
+
+async def queued(args):
+    provider = FakeProvider(latency=args.latency_ms / 1000)
+    queue = DeliveryQueue(provider, workers=args.workers, batch_size=args.batch, batch_wait=0.02,
+                          maxsize=args.messages)
+    await queue.start()
+
+    async def handler(to, message):
+        queue.offer(to, message)
+
+    t0 = time.perf_counter()
+    latencies = await drive(handler, args.messages, args.clients)
+    await queue.queue.join()
+    elapsed = time.perf_counter() - t0
+    await queue.stop()
+    return latencies, elapsed, provider
+
+
+def report(name, latencies, elapsed, provider, messages):
+    print(f"{name:14} /send p50 {pct(latencies, 0.5):8.3f} ms  p99 {pct(latencies, 0.99):8.3f} ms  "
+          f"provider calls {provider.calls:6}  all delivered in {elapsed:6.2f}s ({messages / elapsed:8,.0f} msg/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=50)
+    args = parser.parse_args()
+
+    report("inline", *asyncio.run(inline(args)), args.messages)
+    report("DeliveryQueue", *asyncio.run(queued(args)), args.messages)
+
+
+if __name__ == "__main__":
+    main()
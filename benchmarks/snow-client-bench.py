@@ -0,0 +1,75 @@
+"""
+Before/after comparison: one bare requests.post per incident, serially (old
+create_snow_ticket) vs the pooled ServiceNowClient, both against the local
+mock incident table (snow/fake_snow.py) with the same latency / error rate.
+
+    python benchmarks/snow-client-bench.py --tickets 300 --latency 0.15 --error-rate 0.05
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import requests
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+from snow.fake_snow import FakeServiceNow  # noqa: E402
+from snow.servicenow import Outbox, ServiceNowClient  # noqa: E402
+
+
+###############################################
+# BEFORE — copy of the old create_snow_ticket
+###############################################
+
+def create_snow_ticket_legacy(url, short_desc, description):
+    payload = {
+        "short_description": short_desc,
+        "description": description,
+        "urgency": "2",
+        "impact": "2",
+        "category": "Software"
+    }
+    response = requests.post(url, auth=("admin", "x"), json=payload)
+    if response.status_code in [200, 201]:
+        return response.json()["result"]["number"]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.15, help="mock ServiceNow seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="fraction of 503 answers")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=100, help="client token bucket, requests/s")
+    args = parser.parse_args()
+
+    snow = FakeServiceNow(latency=args.latency, error_rate=args.error_rate, seed=1).start()
+    items = [(f"Bench Issue {i}", f"benchmark incident {i}") for i in range(args.tickets)]
+
+    t0 = time.perf_counter()
+    legacy = [create_snow_ticket_legacy(snow.url, s, d) for s, d in items]
+    legacy_s = time.perf_counter() - t0
+    legacy_ok = sum(t is not None for t in legacy)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        client = ServiceNowClient(snow.url, ("admin", "x"), workers=args.workers, rate=args.rate,
+                                  burst=args.workers, backoff=0.1, outbox=Outbox(os.path.join(tmp, "outbox.db")))
+        t0 = time.perf_counter()
+        pooled = client.create_many(items)
+        pooled_s = time.perf_counter() - t0
+        client.close()
+    pooled_ok = sum(bool(t) and not t.startswith("outbox:") for t in pooled)
+
+    print(f"{'legacy requests.post':24} {legacy_ok:5}/{args.tickets} created  {legacy_ok / legacy_s:8.1f} tickets/s")
+    print(f"{'ServiceNowClient':24} {pooled_ok:5}/{args.tickets} created  {pooled_ok / pooled_s:8.1f} tickets/s"
+          f"  x{(pooled_ok / pooled_s) / (legacy_ok / legacy_s):.1f}")
+    print(f"client: {client.report()}")
+    snow.stop()
+
+
+if __name__ == "__main__":
+    main()
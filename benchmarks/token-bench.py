@@ -0,0 +1,120 @@
+"""
+Token verification cost: local HMAC check (cold and LRU-cached) vs an HTTP
+round trip to auth-service /verify, which is what every service would need
+without sre_common.tokens. The order flow in log-scripting/test-payment.py
+touches orders, payment and notification once each, so one flow saves three
+auth round trips.
+
+auth-service is started in-process under uvicorn on --port. With
+--mongo-url, /user/{username} is also timed cold (Mongo) vs cached.
+
+    python benchmarks/token-bench.py --tokens 20000 --requests 2000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import requests
+import uvicorn
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "auth-service"))
+os.environ.setdefault("LOG_FILE", os.path.join(ROOT, "benchmarks", "token-bench.log"))
+from sre_common import TokenSigner, TokenVerifier  # noqa: E402
+from sre_common.tokens import load_keys  # noqa: E402
+
+SERVICES_PER_FLOW = 3  # orders/create, payment/charge, notify/send
+
+
+def pct(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))] * 1e6
+
+
+def line(name, samples):
+    print(f"{name:30} p50 {pct(samples, 0.5):9.1f} µs   p99 {pct(samples, 0.99):9.1f} µs")
+
+
+def timed(fn, items):
+    out = []
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def serve_auth(port):
+    from app.main import app  # auth-service
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def user_lookups(mongo_url, users):
+    from app.users import UserRepository
+
+    repo = UserRepository(mongo_url)
+    cold, warm = [], []
+    for name in users:
+        t0 = time.perf_counter()
+        await repo.get(name)
+        cold.append(time.perf_counter() - t0)
+    for name in users:
+        t0 = time.perf_counter()
+        await repo.get(name)
+        warm.append(time.perf_counter() - t0)
+    await repo.close()
+    return cold, warm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=2_000, help="HTTP /verify calls")
+    parser.add_argument("--port", type=int, default=8791)
+    parser.add_argument("--mongo-url", help="also time /user lookups against this Mongo")
+    args = parser.parse_args()
+
+    kid, keys = load_keys()
+    signer = TokenSigner(kid, keys[kid])
+    tokens = [signer.issue(f"user-{i}") for i in range(args.tokens)]
+
+    verifier = TokenVerifier(keys, cache_size=args.tokens)
+    cold = timed(verifier.verify, tokens)
+    warm = timed(verifier.verify, tokens)
+
+    server = serve_auth(args.port)
+    session = requests.Session()
+    url = f"http://127.0.0.1:{args.port}/verify"
+
+    def remote(token):
+        r = session.get(url, headers={"authorization": f"Bearer {token}"})
+        r.raise_for_status()
+
+    remote_samples = timed(remote, tokens[: args.requests])
+    server.should_exit = True
+
+    line("local verify, cold", cold)
+    line("local verify, LRU hit", warm)
+    line("HTTP round trip to /verify", remote_samples)
+    saved = pct(remote_samples, 0.5) - pct(warm, 0.5)
+    print(f"per order flow: {SERVICES_PER_FLOW} auth round trips avoided, "
+          f"~{SERVICES_PER_FLOW * saved / 1000:.2f} ms saved at p50 (loopback, no network latency)")
+
+    if args.mongo_url:
+        cold_u, warm_u = asyncio.run(user_lookups(args.mongo_url, [f"user-{i}" for i in range(500)]))
+        line("/user Mongo read", cold_u)
+        line("/user cache hit", warm_u)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Log volume and CPU per request: the old TracingMiddleware (every request
+logged at INFO, no spans) vs W3C tracing with head sampling at several
+TRACE_SAMPLE_RATEs, spans exported in batches to a file.
+
+The handler logs like payment /charge does: two INFO lines per request, and
+a WARNING validation line for --error-rate of them (always kept). Requests
+go straight into the ASGI app; logging goes through the real queue/writer
+thread into a scratch file, so CPU includes formatting and writing.
+
+    python benchmarks/tracing-bench.py --requests 20000 --rates 1,0.1,0.01
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+SCRATCH = tempfile.mkdtemp(prefix="tracing-bench-")
+os.environ["LOG_FILE"] = os.path.join(SCRATCH, "app.log")
+from sre_common import TracingMiddleware, log_extra, setup_logging, shutdown_logging  # noqa: E402
+from sre_common import logging_setup  # noqa: E402
+from sre_common.tracing import Sampler, SpanExporter  # noqa: E402
+
+
+###############################################
+# BEFORE — copy of the previous TracingMiddleware
+###############################################
+
+def _header(headers, name: bytes):
+    for key, value in headers:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class LegacyTracingMiddleware:
+    def __init__(self, app, logger: logging.Logger = None):
+        self.app = app
+        self.logger = logger
+
+    async def __call__(self, scope, receive, send):
+        headers = scope.get("headers") or []
+        trace_id = _header(headers, b"x-trace-id") or str(uuid.uuid4())
+        user_id = _header(headers, b"x-user-id") or "unknown"
+        state = scope.setdefault("state", {})
+        state["trace_id"] = trace_id
+        state["user_id"] = user_id
+        raw_trace = trace_id.encode("latin-1")
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                out = [(k, v) for k, v in message.get("headers", []) if k != b"x-trace-id"]
+                out.append((b"x-trace-id", raw_trace))
+                message["headers"] = out
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            duration_ms = round((time.perf_counter() - start) * 1000, 2)
+            user_id = state.get("user_id", user_id)
+            route = scope.get("path", "")
+            self.logger.info(
+                f"[trace={trace_id}] [user={user_id}] [route={route}] [duration_ms={duration_ms}]",
+                extra={"trace_id": trace_id, "user_id": user_id, "route": route, "duration_ms": duration_ms},
+            )
+
+
+###############################################
+# APP + DRIVER
+###############################################
+
+def build_app(logger, middleware, **kwargs):
+    app = FastAPI()
+    app.add_middleware(middleware, logger=logger, **kwargs)
+
+    @app.post("/charge")
+    async def charge(request: Request):
+        bad = request.headers.get("x-bad") == "1"
+        logger.info(f"[trace={request.state.trace_id}] [user={request.state.user_id}] claim payment_id=p-1",
+                    extra=log_extra(request))
+        if bad:
+            logger.warning(
+                f"[trace={request.state.trace_id}] [user={request.state.user_id}] "
+                f"event=payment_validation error_type=InvalidAmount order_id=o-1 amount=0.0",
+                extra=log_extra(request, event="payment_validation", error_type="InvalidAmount"))
+            return {"status": "error", "error_type": "InvalidAmount"}
+        logger.info(
+            f"[trace={request.state.trace_id}] [user={request.state.user_id}] "
+            f"event=payment_success error_type=None order_id=o-1 amount=10.0",
+            extra=log_extra(request, event="payment_success", order_id="o-1", amount=10.0))
+        return {"status": "ok"}
+
+    return app
+
+
+async def one_request(app, bad):
+    headers = [(b"x-trace-id", str(uuid.uuid4()).encode()), (b"x-user-id", b"bench-user")]
+    if bad:
+        headers.append((b"x-bad", b"1"))
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": "/charge", "raw_path": b"/charge", "query_string": b"", "root_path": "",
+             "headers": headers, "client": ("127.0.0.1", 1234), "server": ("127.0.0.1", 8000)}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+def drain():
+    while not logging_setup._listener.queue.empty():
+        time.sleep(0.01)
+    time.sleep(0.1)
+
+
+async def drive(app, n, error_rate):
+    rnd = random.Random(7)
+    for _ in range(n):
+        await one_request(app, rnd.random() < error_rate)
+
+
+def run(label, app, n, error_rate, exporter=None):
+    log_file = os.environ["LOG_FILE"]
+    asyncio.run(drive(app, 200, error_rate))  # warmup
+    drain()
+    log_before = os.path.getsize(log_file)
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    asyncio.run(drive(app, n, error_rate))
+    drain()
+    span_bytes = 0
+    if exporter is not None:
+        exporter.shutdown()
+        span_bytes = os.path.getsize(exporter.target[len("file:"):])
+    cpu, wall = time.process_time() - cpu0, time.perf_counter() - t0
+    log_bytes = os.path.getsize(log_file) - log_before
+    print(f"{label:22} {n / wall:8.0f} {cpu / n * 1e6:9.1f} {log_bytes / n:9.1f} {span_bytes / n:10.1f}")
+    return cpu / n, log_bytes / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--rates", default="1,0.1,0.01")
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    logger = setup_logging("bench-service")
+    # the benchmark reads the log file, not the console
+    logging_setup._listener.streams = logging_setup._listener.streams[1:]
+
+    print(f"{'variant':22} {'req/s':>8} {'cpu µs/req':>9} {'log B/req':>9} {'span B/req':>10}")
+    base_cpu, base_log = run("before: INFO always", build_app(logger, LegacyTracingMiddleware),
+                             args.requests, args.error_rate)
+    for i, rate in enumerate(float(r) for r in args.rates.split(",")):
+        exporter = SpanExporter("bench-service", f"file:{os.path.join(SCRATCH, f'spans-{i}.jsonl')}", interval=0.2)
+        app = build_app(logger, TracingMiddleware, sampler=Sampler(rate), exporter=exporter)
+        cpu, log = run(f"after: sample {rate:g}", app, args.requests, args.error_rate, exporter)
+        print(f"{'':22} log volume {log / base_log:6.1%} of before, cpu {cpu / base_cpu:6.1%} "
+              f"(spans included; errors kept at any rate)")
+    shutdown_logging()
+    shutil.rmtree(SCRATCH, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
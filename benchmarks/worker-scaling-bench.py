@@ -0,0 +1,184 @@
+"""
+Throughput scaling of a service from 1 to N gunicorn workers
+(sre_common/gunicorn_conf.py), against the old single uvicorn process.
+
+Starts payment-service on a local port for every setting, drives POST /charge
+from several client processes (closed loop, keep-alive) and reports req/s,
+p50/p99 and the speedup over the uvicorn baseline. After each run /metrics
+must count every request once, whichever worker served it.
+
+    python benchmarks/worker-scaling-bench.py --workers 1,2,4,8 --duration 10
+    python benchmarks/worker-scaling-bench.py --service order-service --path /list --method GET
+
+The client processes share the machine with the workers: on a host with C
+cores scaling stops around C workers minus the load the clients take.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import re
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+PORT = 8095
+
+
+###############################################
+# SERVER
+###############################################
+
+def start_server(service, workers, port, workdir, preload=False):
+    """workers=0 runs the old `uvicorn app.main:app` command instead of gunicorn."""
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "LOG_FILE": os.path.join(workdir, "app.log"),
+        "IDEMPOTENCY_DSN": "",
+        "ORDERS_DB_URL": f"sqlite:///{os.path.join(workdir, 'orders.db')}",
+        "TRACE_EXPORT": "",
+        "WEB_WORKERS": str(max(1, workers)),
+        "WEB_PRELOAD": "true" if preload else "false",
+        "WEB_BIND": f"127.0.0.1:{port}",
+    }
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    if workers > 1:
+        env["PROMETHEUS_MULTIPROC_DIR"] = os.path.join(workdir, "prometheus")
+    if workers == 0:
+        cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+               "--log-level", "warning"]
+    else:
+        cmd = [sys.executable, "-m", "gunicorn", "-c", os.path.join(ROOT, "sre_common", "gunicorn_conf.py"),
+               "app.main:app", "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=os.path.join(ROOT, service), env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                # one request per worker so imports/warm-up are not in the numbers
+                for _ in range(max(1, workers) * 4):
+                    httpx.get(f"http://127.0.0.1:{port}/health", timeout=1)
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{service} did not come up with {workers} workers")
+
+
+def stop_server(proc):
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+###############################################
+# LOAD
+###############################################
+
+def _body(path):
+    if path == "/charge":
+        return {"id": uuid.uuid4().hex, "order_id": uuid.uuid4().hex, "amount": 25}
+    if path == "/create":
+        return {"id": uuid.uuid4().hex, "item": "book", "price": 12.5}
+    return None
+
+
+async def _client(url, method, path, concurrency, duration):
+    latencies = []
+    errors = 0
+    stop_at = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=10) as client:
+        async def user():
+            nonlocal errors
+            while time.perf_counter() < stop_at:
+                started = time.perf_counter()
+                try:
+                    r = await client.request(method, path, json=_body(path))
+                    if r.status_code >= 500:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def _client_proc(args):
+    return asyncio.run(_client(*args))
+
+
+def drive(url, method, path, clients, concurrency, duration):
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.map(_client_proc, [(url, method, path, concurrency, duration)] * clients)
+    latencies = [x for lat, _ in results for x in lat]
+    errors = sum(e for _, e in results)
+    return latencies, errors
+
+
+def counted_requests(url, path):
+    """Requests /metrics saw for `path` (all workers merged)."""
+    text = httpx.get(f"{url}/metrics", timeout=10).text
+    pattern = rf'^http_requests_total\{{handler="{re.escape(path)}"[^}}]*\}} ([0-9.e+]+)'
+    return int(sum(float(v) for v in re.findall(pattern, text, re.M)))
+
+
+###############################################
+# MAIN
+###############################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--service", default="payment-service")
+    parser.add_argument("--path", default="/charge")
+    parser.add_argument("--method", default="POST")
+    parser.add_argument("--workers", default=",".join(str(n) for n in (1, 2, 4, 8) if n <= 2 * (os.cpu_count() or 1)),
+                        help="worker counts to try, e.g. 1,2,4,8")
+    parser.add_argument("--clients", type=int, default=max(2, (os.cpu_count() or 2) // 2), help="client processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="connections per client process")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per setting")
+    parser.add_argument("--preload", action="store_true", help="WEB_PRELOAD=true")
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{args.port}"
+    settings = [0] + [int(n) for n in args.workers.split(",")]
+    print(f"{args.method} {args.path} on {args.service}: {args.clients} client procs x {args.concurrency} "
+          f"connections, {args.duration:.0f}s per setting, {os.cpu_count()} CPUs")
+    print(f"{'setup':<22}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'speedup':>9}  /metrics")
+
+    baseline = None
+    for workers in settings:
+        workdir = tempfile.mkdtemp(prefix="worker-bench-")
+        proc = start_server(args.service, workers, args.port, workdir, preload=args.preload)
+        try:
+            before = counted_requests(url, args.path)
+            latencies, errors = drive(url, args.method, args.path, args.clients, args.concurrency, args.duration)
+            counted = counted_requests(url, args.path) - before
+        finally:
+            stop_server(proc)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        rps = len(latencies) / args.duration
+        baseline = baseline or rps
+        q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+        label = "uvicorn (before)" if workers == 0 else f"gunicorn x{workers}"
+        # counted can include requests that were still in flight when the clients stopped
+        seen = "ok" if counted >= len(latencies) else f"MISSING {len(latencies) - counted}"
+        print(f"{label:<22}{rps:>10.0f}{q[49] * 1000:>10.1f}{q[98] * 1000:>10.1f}{errors:>8}"
+              f"{rps / baseline:>8.2f}x  {seen}")
@@ -0,0 +1,40 @@
+import argparse
+import requests
+
+# Microservices
+SERVICES = {
+    "orders": "http://localhost:8002",
+    "payment": "http://localhost:8003",
+    "notify": "http://localhost:8004",
+}
+
+# -----------------------------------------------------------------------------
+# Watch one service's log over a single long-lived /logs/stream connection
+# instead of polling /logs?lines=50 in a loop.
+#
+#   python follow-logs.py payment --level error
+#   python follow-logs.py orders --trace <trace-id> --lines 20
+# -----------------------------------------------------------------------------
+def follow(base_url, params):
+    with requests.get(f"{base_url}/logs/stream", params=params, stream=True, timeout=(5, None)) as r:
+        r.raise_for_status()
+        for raw in r.iter_lines(decode_unicode=True):
+            if raw and raw.startswith("data: "):
+                print(raw[len("data: "):], flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("service", choices=SERVICES)
+    parser.add_argument("--trace")
+    parser.add_argument("--user")
+    parser.add_argument("--level")
+    parser.add_argument("--route")
+    parser.add_argument("--lines", type=int, default=0, help="replay this many lines first")
+    args = parser.parse_args()
+
+    params = {k: v for k, v in vars(args).items() if k != "service" and v}
+    try:
+        follow(SERVICES[args.service], params)
+    except KeyboardInterrupt:
+        pass
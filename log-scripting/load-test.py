@@ -0,0 +1,335 @@
+import argparse
+import asyncio
+import csv
+import json
+import random
+import time
+import uuid
+
+import httpx
+
+# Microservices
+AUTH = "http://localhost:8001"
+ORDERS = "http://localhost:8002"
+PAYMENT = "http://localhost:8003"
+NOTIFY = "http://localhost:8004"
+
+USERS = ["parkavi", "alex", "rahul", "sneha", "james", "michel", "robert"]
+
+# -----------------------------------------------------------------------------
+# Async load generator for the same scenarios as test-payment.py /
+# trace-log-testing.py, without the one-call-at-a-time + sleep pacing.
+#
+#   python load-test.py --concurrency 50 --duration 60 --warmup 10
+#   python load-test.py --rps 200 --duration 60 --mix normal=80,invalid=5,dup=5,fraud=5,retry=5
+#   python load-test.py --rps 100 --duration 30 --out runs/baseline   # -> baseline.json / baseline.csv
+#
+# --rps starts that many scenario iterations per second (open model, capped by
+# --max-inflight); --concurrency runs that many virtual users back to back
+# (closed model). Latencies are recorded per endpoint in a log-linear
+# histogram (HDR-style, <1% error) and reported as p50/p90/p99/max.
+# -----------------------------------------------------------------------------
+
+SUB_BUCKET_BITS = 7  # 128 linear sub-buckets per power of two -> <1% relative error
+
+
+class LatencyHistogram:
+    """Log-linear histogram of microsecond values; mergeable, fixed error, tiny footprint."""
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @staticmethod
+    def _bucket(value):
+        shift = max(0, value.bit_length() - SUB_BUCKET_BITS - 1)
+        return shift, value >> shift
+
+    def record(self, micros):
+        value = max(0, int(micros))
+        key = self._bucket(value)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        for key, n in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + n
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p):
+        if not self.count:
+            return 0
+        rank = max(1, int(round(p / 100 * self.count)))
+        seen = 0
+        for shift, sub in sorted(self.counts, key=lambda k: k[1] << k[0]):
+            seen += self.counts[(shift, sub)]
+            if seen >= rank:
+                # midpoint of the bucket, clamped to what was actually seen
+                return min(self.max, (sub << shift) + ((1 << shift) >> 1))
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count / 1000, 3) if self.count else 0,
+            "min_ms": round((self.min or 0) / 1000, 3),
+            "p50_ms": round(self.percentile(50) / 1000, 3),
+            "p90_ms": round(self.percentile(90) / 1000, 3),
+            "p99_ms": round(self.percentile(99) / 1000, 3),
+            "max_ms": round(self.max / 1000, 3),
+        }
+
+
+class Recorder:
+    def __init__(self):
+        self.recording = False
+        self.hist = {}      # endpoint -> LatencyHistogram
+        self.status = {}    # endpoint -> {status: n}
+        self.errors = {}    # endpoint -> n (connection errors / timeouts)
+        self.scenarios = {}
+        self.dropped = 0    # rps ticks skipped because --max-inflight was reached
+
+    def add(self, endpoint, micros, status):
+        if not self.recording:
+            return
+        self.hist.setdefault(endpoint, LatencyHistogram()).record(micros)
+        codes = self.status.setdefault(endpoint, {})
+        codes[status] = codes.get(status, 0) + 1
+
+    def error(self, endpoint):
+        if self.recording:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+class Session:
+    """One virtual user: shared pooled client, per-flow trace/user/token headers."""
+
+    def __init__(self, client, rec):
+        self.client = client
+        self.rec = rec
+        self.headers = {}
+
+    async def call(self, method, url, endpoint, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            r = await self.client.request(method, url, headers=self.headers, **kwargs)
+        except httpx.HTTPError:
+            self.rec.error(endpoint)
+            return None
+        self.rec.add(endpoint, (time.perf_counter() - t0) * 1e6, r.status_code)
+        return r
+
+    async def login(self, user):
+        r = await self.call("POST", f"{AUTH}/login", "POST auth/login", json={"username": user, "password": "x"})
+        self.headers = {"x-user-id": user}
+        if r is not None and r.status_code == 200:
+            self.headers["x-trace-id"] = r.headers.get("x-trace-id") or str(uuid.uuid4())
+            token = r.json().get("access_token")
+            if token:
+                self.headers["Authorization"] = f"Bearer {token}"
+        return user
+
+    async def order(self, order_id, user, amount):
+        await self.call("POST", f"{ORDERS}/create", "POST orders/create",
+                        json={"id": order_id, "customer_id": user, "amount": amount})
+
+    async def charge(self, payment_id, order_id, amount):
+        return await self.call("POST", f"{PAYMENT}/charge", "POST payment/charge",
+                               json={"id": payment_id, "order_id": order_id, "amount": amount})
+
+    async def notify(self, user, message):
+        await self.call("POST", f"{NOTIFY}/send", "POST notify/send", json={"to": user, "message": message})
+
+
+def _id(prefix):
+    return f"{prefix}-{uuid.uuid4().hex[:10]}"
+
+
+# -------------------------------------------------------
+# Scenarios (same flows as test-payment.py)
+# -------------------------------------------------------
+async def normal(s, user):
+    order_id = _id("o")
+    await s.order(order_id, user, 150.0)
+    await s.charge(_id("p"), order_id, 150.0)
+    await s.notify(user, f"order {order_id} done")
+
+
+async def invalid_amount(s, user):
+    order_id = _id("o")
+    await s.order(order_id, user, 0)
+    await s.charge(_id("p"), order_id, 0)
+
+
+async def duplicate(s, user):
+    order_id = _id("o") + "DUP"
+    await s.order(order_id, user, 150.0)
+    await s.charge(_id("p"), order_id, 150.0)
+
+
+async def fraud(s, user):
+    order_id = _id("o")
+    await s.order(order_id, user, 60000.0)
+    await s.charge(_id("p"), order_id, 60000.0)
+
+
+async def random_fail(s, user):
+    # plain charges; ~10% hit the simulated RandomFail
+    order_id = _id("o")
+    await s.charge(_id("p"), order_id, 200)
+
+
+async def retry(s, user):
+    # same payment id several times, like test-payment.py's retry loop
+    payment_id, order_id = _id("p"), _id("o")
+    for _ in range(5):
+        await s.charge(payment_id, order_id, 300)
+
+
+SCENARIOS = {
+    "normal": normal,
+    "invalid": invalid_amount,
+    "dup": duplicate,
+    "fraud": fraud,
+    "randomfail": random_fail,
+    "retry": retry,
+}
+DEFAULT_MIX = "normal=60,invalid=8,dup=8,fraud=8,randomfail=8,retry=8"
+
+
+def parse_mix(spec):
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name!r}, choose from {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return list(weights), list(weights.values())
+
+
+async def iteration(client, rec, names, weights, rnd):
+    name = rnd.choices(names, weights)[0]
+    s = Session(client, rec)
+    user = await s.login(rnd.choice(USERS))
+    t0 = time.perf_counter()
+    await SCENARIOS[name](s, user)
+    if rec.recording:
+        rec.scenarios.setdefault(name, LatencyHistogram()).record((time.perf_counter() - t0) * 1e6)
+
+
+async def run_closed(client, rec, args, names, weights, stop_at):
+    async def vu(n):
+        rnd = random.Random(n)
+        while time.monotonic() < stop_at:
+            await iteration(client, rec, names, weights, rnd)
+
+    await asyncio.gather(*(vu(n) for n in range(args.concurrency)))
+
+
+async def run_open(client, rec, args, names, weights, stop_at):
+    rnd = random.Random(0)
+    inflight = set()
+    interval = 1.0 / args.rps
+    next_tick = time.monotonic()
+    while next_tick < stop_at:
+        if len(inflight) >= args.max_inflight:
+            rec.dropped += rec.recording
+        else:
+            task = asyncio.create_task(iteration(client, rec, names, weights, rnd))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+        next_tick += interval
+        await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+    if inflight:
+        await asyncio.gather(*inflight)
+
+
+async def main(args):
+    names, weights = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    rec = Recorder()
+    async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as client:
+        start = time.monotonic()
+        stop_at = start + args.warmup + args.duration
+
+        async def start_recording():
+            await asyncio.sleep(args.warmup)
+            rec.recording = True
+            print(f"warmup done, measuring for {args.duration}s ...")
+
+        marker = asyncio.create_task(start_recording())
+        if args.rps:
+            await run_open(client, rec, args, names, weights, stop_at)
+        else:
+            await run_closed(client, rec, args, names, weights, stop_at)
+        await marker
+    return rec
+
+
+def report(rec, args):
+    rows = []
+    for kind, table in (("endpoint", rec.hist), ("scenario", rec.scenarios)):
+        for name, hist in sorted(table.items()):
+            row = {"kind": kind, "name": name, **hist.summary(),
+                   "rps": round(hist.count / args.duration, 1)}
+            if kind == "endpoint":
+                codes = rec.status.get(name, {})
+                row["non_2xx"] = sum(n for code, n in codes.items() if code >= 300)
+                row["errors"] = rec.errors.get(name, 0)
+            rows.append(row)
+
+    print(f"\n{'':9} {'name':22} {'count':>8} {'rps':>8} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}  (ms)")
+    for r in rows:
+        print(f"{r['kind']:9} {r['name']:22} {r['count']:8} {r['rps']:8} {r['p50_ms']:9} {r['p90_ms']:9} "
+              f"{r['p99_ms']:9} {r['max_ms']:9}" + (f"  non-2xx={r['non_2xx']} errors={r['errors']}" if "errors" in r else ""))
+    if rec.dropped:
+        print(f"\n⚠ {rec.dropped} iterations not started: --max-inflight {args.max_inflight} reached (target rate not met)")
+
+    if args.out:
+        meta = {k: v for k, v in vars(args).items() if k != "out"}
+        with open(f"{args.out}.json", "w") as f:
+            json.dump({"config": meta, "dropped": rec.dropped, "results": rows,
+                       "status": {k: {str(c): n for c, n in v.items()} for k, v in rec.status.items()}}, f, indent=2)
+        fields = ["kind", "name", "count", "rps", "mean_ms", "min_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms",
+                  "non_2xx", "errors"]
+        with open(f"{args.out}.csv", "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\nresults written to {args.out}.json / {args.out}.csv")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the sre-ops services with the payment scenarios")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--rps", type=float, help="scenario iterations started per second (open model)")
+    mode.add_argument("--concurrency", type=int, default=20, help="virtual users looping (closed model)")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of load before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"scenario weights, default {DEFAULT_MIX}")
+    parser.add_argument("--connections", type=int, default=100, help="HTTP connection pool size")
+    parser.add_argument("--max-inflight", type=int, default=1000, help="cap on concurrent iterations in --rps mode")
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--out", help="write <out>.json and <out>.csv")
+    parser.add_argument("--auth", default=AUTH)
+    parser.add_argument("--orders", default=ORDERS)
+    parser.add_argument("--payment", default=PAYMENT)
+    parser.add_argument("--notify", default=NOTIFY)
+    parser.add_argument("--users", type=int, default=1000,
+                        help="distinct user ids; payment's velocity fraud rules block a few users charging at load-test rates")
+    args = parser.parse_args()
+
+    AUTH, ORDERS, PAYMENT, NOTIFY = args.auth, args.orders, args.payment, args.notify
+    if args.users > len(USERS):
+        USERS = [f"{USERS[i % len(USERS)]}{i}" for i in range(args.users)]
+    report(asyncio.run(main(args)), args)
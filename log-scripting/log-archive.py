@@ -0,0 +1,130 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from sre_common.log_archive import GROUP_COLUMNS, LogArchive  # noqa: E402
+
+# -----------------------------------------------------------------------------
+# Columnar (Parquet) archive of app.log files / Kibana CSV exports, and fast
+# historical queries over it.
+#
+#   python log-archive.py ingest --log payment=logs/payment/app.log --log order=logs/order/app.log
+#   python log-archive.py ingest --csv payment="Untitled discover search.csv"
+#   python log-archive.py latency --service payment --route /charge --since 2026-10-13 --until 2026-10-13
+#   python log-archive.py latency --by route --since 7d
+#   python log-archive.py errors --by route --service payment
+#   python log-archive.py top --by user --metric amount --event payment_success -n 20
+#
+# `ingest` parses in parallel into --archive (default logs-archive/, one
+# directory per service and day) and only adds what is new since the last run,
+# rotated app.log.<stamp>.gz segments included. The queries only read the
+# archive. --since / --until take a date, a date-time (UTC) or "36h" / "7d" ago;
+# a bare --until date includes that whole day.
+# -----------------------------------------------------------------------------
+def parse_sources(items):
+    """["svc=path", "path"] -> {svc: path}; without svc= the parent directory name is used."""
+    out = {}
+    for item in items or []:
+        service, sep, path = item.partition("=")
+        if not sep:
+            path = item
+            service = os.path.basename(os.path.dirname(os.path.abspath(path))) or "unknown"
+        out[service] = path
+    return out
+
+
+def fmt(value, width, digits=2):
+    if value is None:
+        return f"{'-':>{width}}"
+    if isinstance(value, float):
+        return f"{value:>{width}.{digits}f}"
+    if isinstance(value, int):
+        return f"{value:>{width},}"
+    return f"{str(value):<{width}}"
+
+
+def print_rows(rows, columns, key=None):
+    if key:
+        columns = [key] + columns
+    widths = {c: max(12, len(c) + 1) for c in columns}
+    if key:
+        widths[key] = max([len(key) + 1, 12] + [len(str(r.get(key))) + 1 for r in rows])
+    print("  " + "".join(f"{c:<{widths[c]}}" if c == key else f"{c:>{widths[c]}}" for c in columns))
+    for row in rows:
+        print("  " + "".join(fmt(row.get(c), widths[c]) for c in columns))
+
+
+def where_from(archive, args):
+    return archive.where(service=args.service, route=args.route, user=args.user, level=args.level,
+                         event=args.event, since=args.since, until=args.until)
+
+
+def cmd_ingest(archive, args):
+    t0 = time.perf_counter()
+    rows = 0
+    files = parse_sources(args.log)
+    if files:
+        rows += archive.ingest_files(files, workers=args.workers, progress=lambda msg: print(f"  {msg}", flush=True))
+    exports = parse_sources(args.csv)
+    if exports:
+        rows += archive.ingest_csv(exports, progress=lambda msg: print(f"  {msg}", flush=True))
+    print(f"archived {rows:,} lines in {time.perf_counter() - t0:.1f}s -> {args.archive}")
+
+
+def cmd_latency(archive, args):
+    t0 = time.perf_counter()
+    percentiles = [float(p) for p in args.percentiles.split(",")]
+    rows = archive.latency(args.by, where_from(archive, args), percentiles)[: args.n]
+    print(f"duration_ms of access lines (t-digest percentiles), {time.perf_counter() - t0:.2f}s")
+    print_rows(rows, ["requests", "mean"] + [f"p{p:g}" for p in percentiles] + ["max"], args.by)
+
+
+def cmd_errors(archive, args):
+    t0 = time.perf_counter()
+    rows = archive.errors(args.by, where_from(archive, args))[: args.n]
+    print(f"requests whose trace logged an ERROR line or an error_type, {time.perf_counter() - t0:.2f}s")
+    for row in rows:
+        row["error_rate"] = round(row["error_rate"] * 100, 2)
+    print_rows(rows, ["requests", "failed", "error_rate"], args.by)
+
+
+def cmd_top(archive, args):
+    t0 = time.perf_counter()
+    rows = archive.top(args.by, args.metric, args.n, where_from(archive, args))
+    print(f"top {args.n} {args.by} by {args.metric}, {time.perf_counter() - t0:.2f}s")
+    print_rows(rows, [args.metric], args.by)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--archive", default="logs-archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("ingest")
+    p.add_argument("--log", action="append", help="[service=]path to an app.log (repeatable)")
+    p.add_argument("--csv", action="append", help="[service=]path to a Kibana CSV export (repeatable)")
+    p.add_argument("--workers", type=int, default=None, help="parser processes (default: all cores)")
+
+    for name in ("latency", "errors", "top"):
+        p = sub.add_parser(name)
+        p.add_argument("--by", choices=sorted(GROUP_COLUMNS), required=name == "top")
+        p.add_argument("--service")
+        p.add_argument("--route")
+        p.add_argument("--user")
+        p.add_argument("--level")
+        p.add_argument("--event")
+        p.add_argument("--since")
+        p.add_argument("--until")
+        p.add_argument("-n", type=int, default=20, help="rows to show")
+        if name == "latency":
+            p.add_argument("--percentiles", default="50,90,99")
+        if name == "top":
+            p.add_argument("--metric", choices=LogArchive.METRICS, default="requests")
+
+    args = parser.parse_args()
+    archive = LogArchive(args.archive)
+    if args.command != "ingest" and not os.path.isdir(args.archive):
+        sys.exit(f"no archive at {args.archive}: run `ingest` first")
+    {"ingest": cmd_ingest, "latency": cmd_latency, "errors": cmd_errors, "top": cmd_top}[args.command](archive, args)
@@ -0,0 +1,77 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# -----------------------------------------------------------------------------
+# Local stand-in for an OTLP/HTTP collector: accepts the JSON batches the
+# services POST with TRACE_EXPORT=http://localhost:4318/v1/traces, appends
+# them to --out (one batch per line, same as TRACE_EXPORT=file:...) and
+# prints spans/s every few seconds.
+#
+#   python span-collector.py --port 4318 --out spans.jsonl
+# -----------------------------------------------------------------------------
+stats = {"batches": 0, "spans": 0, "traces": set()}
+lock = threading.Lock()
+
+
+class Collector(BaseHTTPRequestHandler):
+    out = None
+
+    def do_POST(self):
+        if self.path != "/v1/traces":
+            self.send_error(404)
+            return
+        body = self.rfile.read(int(self.headers.get("content-length", 0)))
+        try:
+            doc = json.loads(body)
+        except ValueError:
+            self.send_error(400, "invalid JSON")
+            return
+        spans = [s for rs in doc.get("resourceSpans", []) for ss in rs.get("scopeSpans", []) for s in ss.get("spans", [])]
+        with lock:
+            stats["batches"] += 1
+            stats["spans"] += len(spans)
+            stats["traces"].update(s["traceId"] for s in spans)
+            if self.out:
+                self.out.write(body.decode() + "\n")
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+def report(every):
+    last = 0
+    while True:
+        time.sleep(every)
+        with lock:
+            spans, batches, traces = stats["spans"], stats["batches"], len(stats["traces"])
+        print(f"{spans:,} spans in {batches:,} batches, {traces:,} traces  (+{(spans - last) / every:,.0f} spans/s)",
+              flush=True)
+        last = spans
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--out", help="append received batches here (JSON lines)")
+    parser.add_argument("--every", type=float, default=5.0, help="report interval, seconds")
+    args = parser.parse_args()
+
+    if args.out:
+        Collector.out = open(args.out, "a", buffering=1 << 16)
+    threading.Thread(target=report, args=(args.every,), daemon=True).start()
+    server = ThreadingHTTPServer(("0.0.0.0", args.port), Collector)
+    print(f"collecting OTLP/JSON on http://localhost:{args.port}/v1/traces")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if Collector.out:
+            Collector.out.close()
@@ -62,7 +62,9 @@ for user in users:
 
     headers = {
         "x-trace-id": trace_id,
-        "x-user-id": user_id
+        "x-user-id": user_id,
+        # signed token: orders/payment/notify verify it locally, no call back to auth
+        "Authorization": f"Bearer {resp.json()['access_token']}"
     }
 
     # -------------------------------------------------------
@@ -0,0 +1,143 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from sre_common.trace_index import TraceIndex  # noqa: E402
+
+# Microservices
+SERVICES = {
+    "auth": "http://localhost:8001",
+    "orders": "http://localhost:8002",
+    "payment": "http://localhost:8003",
+    "notify": "http://localhost:8004",
+}
+
+# -----------------------------------------------------------------------------
+# Stitch one request flow back together across services from their app.log
+# files (or /logs endpoints), offline, without grepping each file per trace.
+#
+#   python trace-assembler.py index --log auth=logs/auth/app.log --log payment=logs/payment/app.log ...
+#   python trace-assembler.py index --log logs/payment/app.log --log 'logs/payment/app.log.*.gz'
+#   python trace-assembler.py index --url payment                    # page a live /logs
+#   python trace-assembler.py report --slowest 10 --failed 10
+#   python trace-assembler.py show <trace-id>
+#
+# `index` makes one parallel pass over all files into a SQLite index
+# (--db, default traces.db); re-running it skips files that did not change.
+# `report` / `show` only read the index.
+# -----------------------------------------------------------------------------
+def parse_sources(items):
+    """["svc=path", "path"] -> [(svc, path)]; without svc= the parent directory name is used."""
+    out = []
+    for item in items or []:
+        service, sep, path = item.partition("=")
+        if not sep:
+            path = item
+            service = os.path.basename(os.path.dirname(os.path.abspath(path))) or "unknown"
+        out.append((service, path))
+    return out
+
+
+def fetch_logs(base_url, page_lines=5000):
+    """All lines a service's /logs exposes, newest page first (order does not matter for the index)."""
+    session = requests.Session()
+    cursor = None
+    while True:
+        params = {"lines": page_lines}
+        if cursor:
+            params["cursor"] = cursor
+        r = session.get(f"{base_url}/logs", params=params, timeout=30)
+        r.raise_for_status()
+        page = r.json()
+        yield from page["logs"]
+        cursor = page.get("older")
+        if not cursor or not page["logs"]:
+            return
+
+
+def fmt_ts(ts):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ts)) + f".{int(ts % 1 * 1000):03d}"
+
+
+def print_traces(title, rows):
+    print(f"\n{title}")
+    print(f"  {'trace':38} {'start':23} {'span_ms':>9} {'hop_ms':>9} {'hops':>4} {'err':>3}  services")
+    for t in rows:
+        print(f"  {t['trace_id']:38} {fmt_ts(t['start']):23} {t['span_ms']:9.1f} {t['hop_ms']:9.1f} "
+              f"{t['hops']:4} {t['errors']:3}  {t['services']}")
+
+
+def cmd_index(idx, args):
+    t0 = time.perf_counter()
+    files = [(service, path) for service, pattern in parse_sources(args.log)
+             for path in sorted(glob.glob(pattern)) or [pattern]]
+    if files:
+        idx.ingest_files(files, workers=args.workers, progress=lambda msg: print(f"  {msg}", flush=True))
+    for item in args.url or []:
+        service, sep, url = item.partition("=")
+        if not sep:
+            service, url = item, SERVICES.get(item, item)
+        print(f"  fetching {url}/logs ...", flush=True)
+        idx.ingest_lines(service, url, fetch_logs(url))
+    stats = idx.stats()
+    print(f"indexed in {time.perf_counter() - t0:.1f}s: {stats['events']:,} traced lines, "
+          f"{stats['traces']:,} traces, {len(stats['sources'])} sources")
+
+
+def cmd_report(idx, args):
+    stats = idx.stats()
+    print(f"{stats['events']:,} traced lines, {stats['traces']:,} traces")
+    print_traces(f"slowest {args.slowest} (by {args.by})", idx.slowest(args.slowest, by=args.by))
+    print_traces(f"latest {args.failed} failed", idx.failed(args.failed))
+    print("\nper hop")
+    for h in idx.hop_stats()[: args.hops]:
+        print(f"  {h['service']:14} {h['route'] or '-':24} n={h['count']:<8} avg {h['avg_ms']:8.2f} ms   "
+              f"max {h['max_ms']:8.2f} ms")
+
+
+def cmd_show(idx, args):
+    summary = idx.summary(args.trace)
+    if summary is None:
+        sys.exit(f"trace {args.trace} not in {args.db}")
+    print(f"trace {args.trace}: {summary['lines']} lines across {summary['services']}, "
+          f"span {summary['span_ms']} ms, {summary['hops']} hops / {summary['hop_ms']} ms, "
+          f"{summary['errors']} errors\n")
+    start = summary["start"]
+    for e in idx.timeline(args.trace):
+        print(f"+{(e['ts'] - start) * 1000:8.1f}ms  {e['service']:12} {e['line']}")
+    print("\nhops")
+    for h in idx.hops(args.trace):
+        print(f"  +{(h['ts'] - start) * 1000:8.1f}ms  {h['service']:12} {h['route']:24} {h['duration_ms']:8.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default="traces.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("index")
+    p.add_argument("--log", action="append",
+                   help="[service=]path to an app.log or a rotated segment, globs allowed (repeatable)")
+    p.add_argument("--url", action="append", help=f"service=base-url or one of {', '.join(SERVICES)} (repeatable)")
+    p.add_argument("--workers", type=int, default=None, help="parser processes (default: all cores)")
+
+    p = sub.add_parser("report")
+    p.add_argument("--slowest", type=int, default=10)
+    p.add_argument("--failed", type=int, default=10)
+    p.add_argument("--hops", type=int, default=20)
+    p.add_argument("--by", choices=["hop_ms", "span"], default="hop_ms")
+
+    p = sub.add_parser("show")
+    p.add_argument("trace")
+
+    args = parser.parse_args()
+    idx = TraceIndex(args.db)
+    try:
+        {"index": cmd_index, "report": cmd_report, "show": cmd_show}[args.command](idx, args)
+    finally:
+        idx.close()
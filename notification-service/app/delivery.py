@@ -0,0 +1,353 @@
+"""
+In-process delivery queue for notification-service.
+
+POST /send only enqueues (or coalesces, or refuses with 429 when full);
+a pool of asyncio workers drains the queue and hands messages to the
+provider in batches of up to NOTIFY_BATCH_SIZE, waiting at most
+NOTIFY_BATCH_WAIT_MS to fill a batch. The same message to the same
+recipient within NOTIFY_COALESCE_SECONDS is delivered once, with a count,
+as long as the first one is still waiting in the queue (once a worker has
+taken it, a duplicate is queued on its own).
+
+A batch the provider still refuses after MAX_ATTEMPTS quick retries goes back
+on the queue after NOTIFY_RETRY_BACKOFF seconds, doubling each round, up to
+NOTIFY_RETRY_ROUNDS rounds; only then is it counted as failed.
+
+With NOTIFY_SPOOL set, every accepted message is appended to a JSONL spool
+and marked done after delivery, so whatever was pending at shutdown/crash
+(including batches waiting for a retry) is re-queued on the next start, with
+its coalesced count. The spool is rewritten to just the pending entries on
+start and whenever it grows past NOTIFY_SPOOL_COMPACT lines and four times
+the pending count.
+
+Metrics (default registry, served on /metrics by the Instrumentator):
+notification_queue_depth, notification_delivery_latency_seconds,
+notification_batch_size, notifications_total{outcome}.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.getenv("NOTIFY_WORKERS", "4"))
+BATCH_SIZE = int(os.getenv("NOTIFY_BATCH_SIZE", "50"))
+BATCH_WAIT = float(os.getenv("NOTIFY_BATCH_WAIT_MS", "50")) / 1000
+COALESCE_SECONDS = float(os.getenv("NOTIFY_COALESCE_SECONDS", "2"))
+QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "10000"))
+SPOOL_PATH = os.getenv("NOTIFY_SPOOL")
+PROVIDER_URL = os.getenv("NOTIFY_PROVIDER_URL")
+MAX_ATTEMPTS = 3
+RETRY_ROUNDS = int(os.getenv("NOTIFY_RETRY_ROUNDS", "5"))
+RETRY_BACKOFF = float(os.getenv("NOTIFY_RETRY_BACKOFF", "1"))
+SPOOL_COMPACT = int(os.getenv("NOTIFY_SPOOL_COMPACT", "10000"))
+
+QUEUE_DEPTH = Gauge("notification_queue_depth", "Notifications waiting for a worker", multiprocess_mode="livesum")
+DELIVERY_LATENCY = Histogram(
+    "notification_delivery_latency_seconds", "Time from /send to provider acceptance",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+BATCH_SIZES = Histogram("notification_batch_size", "Messages per provider call", buckets=(1, 2, 5, 10, 25, 50, 100, 250))
+OUTCOMES = Counter("notifications_total", "Notifications by outcome", ["outcome"])
+
+
+class Pending:
+    __slots__ = ("id", "to", "message", "trace_id", "enqueued_at", "count", "rounds")
+
+    def __init__(self, to, message, trace_id=None, id=None, enqueued_at=None, count=1):
+        self.id = id or uuid.uuid4().hex
+        self.to = to
+        self.message = message
+        self.trace_id = trace_id
+        self.enqueued_at = enqueued_at or time.time()
+        self.count = count
+        self.rounds = 0  # failed delivery rounds so far
+
+    def as_dict(self):
+        return {"id": self.id, "to": self.to, "message": self.message,
+                "trace_id": self.trace_id, "enqueued_at": self.enqueued_at, "count": self.count}
+
+
+class FakeProvider:
+    """Stand-in provider: `latency` per call whatever the batch size, `failure_rate` of calls fail."""
+
+    def __init__(self, latency: float = 0.05, failure_rate: float = 0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.delivered = []
+
+    async def send_batch(self, items):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise RuntimeError("provider unavailable")
+        self.delivered.extend(items)
+
+    async def close(self):
+        pass
+
+
+class HttpProvider:
+    """POSTs {"messages": [...]} to NOTIFY_PROVIDER_URL over one pooled httpx client."""
+
+    def __init__(self, url: str, timeout: float = 10):
+        import httpx
+
+        self.url = url
+        self.client = httpx.AsyncClient(timeout=timeout, limits=httpx.Limits(max_keepalive_connections=WORKERS))
+
+    async def send_batch(self, items):
+        r = await self.client.post(self.url, json={"messages": [
+            {"to": p.to, "message": p.message, "count": p.count, "trace_id": p.trace_id} for p in items
+        ]})
+        r.raise_for_status()
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class Spool:
+    """Append-only JSONL of accepted / delivered ids, compacted once it is mostly delivered entries."""
+
+    def __init__(self, path: str, compact_lines: int = SPOOL_COMPACT):
+        self.path = path
+        self.compact_lines = compact_lines
+        self.file = None
+        self.pending = {}  # id -> "add" entry, as it would be rewritten
+        self.lines = 0
+
+    def load(self):
+        """Pending entries left by the previous run; the file is compacted to just those."""
+        pending = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line after a crash
+                    if entry.get("op") == "add":
+                        pending[entry["id"]] = entry
+                    elif entry.get("op") == "count":
+                        if entry["id"] in pending:
+                            pending[entry["id"]]["count"] = entry["count"]
+                    elif entry.get("op") == "done":
+                        for i in entry["ids"]:
+                            pending.pop(i, None)
+        self.pending = pending
+        self.compact()
+        return [Pending(e["to"], e["message"], e.get("trace_id"), e["id"], e.get("enqueued_at"), e.get("count", 1))
+                for e in pending.values()]
+
+    def compact(self):
+        """Rewrite the file to the pending entries only."""
+        if self.file:
+            self.file.close()
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entry in self.pending.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp, self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.lines = len(self.pending)
+
+    def _write(self, entry):
+        self.file.write(json.dumps(entry) + "\n")
+        self.file.flush()
+        self.lines += 1
+
+    def add(self, item: Pending):
+        entry = {"op": "add", **item.as_dict()}
+        self.pending[item.id] = entry
+        self._write(entry)
+
+    def count(self, item: Pending):
+        if item.id in self.pending:
+            self.pending[item.id]["count"] = item.count
+        self._write({"op": "count", "id": item.id, "count": item.count})
+
+    def done(self, ids):
+        for i in ids:
+            self.pending.pop(i, None)
+        self._write({"op": "done", "ids": ids})
+        if self.lines > self.compact_lines and self.lines > 4 * len(self.pending):
+            self.compact()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+class DeliveryQueue:
+    """
+    queue = DeliveryQueue(FakeProvider())
+    await queue.start()
+    status, item = queue.offer(to, message, trace_id)   # "queued" | "coalesced" | "rejected"
+    await queue.stop()
+    """
+
+    def __init__(self, provider, workers: int = WORKERS, batch_size: int = BATCH_SIZE,
+                 batch_wait: float = BATCH_WAIT, coalesce_seconds: float = COALESCE_SECONDS,
+                 maxsize: int = QUEUE_SIZE, spool_path: str = SPOOL_PATH,
+                 retry_rounds: int = RETRY_ROUNDS, retry_backoff: float = RETRY_BACKOFF):
+        self.provider = provider
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.coalesce_seconds = coalesce_seconds
+        self.maxsize = maxsize
+        self.retry_rounds = retry_rounds
+        self.retry_backoff = retry_backoff
+        self.spool = Spool(spool_path) if spool_path else None
+        self.queue = None
+        self.recent = {}  # (to, message) -> Pending still in the queue, for coalescing
+        self.tasks = []
+        self.retrying = set()  # timer handles of failed batches waiting to be re-queued
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        if self.spool:
+            restored = self.spool.load()
+            for item in restored:
+                self.queue.put_nowait(item)
+            if restored:
+                logger.info(f"notification spool: re-queued {len(restored)} pending notifications")
+        QUEUE_DEPTH.set(self.queue.qsize())
+        self.tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    def offer(self, to, message, trace_id=None):
+        """Enqueue without waiting. Runs entirely between awaits, so no locking is needed."""
+        now = time.time()
+        key = (to, message)
+        previous = self.recent.get(key)
+        if previous is not None and now - previous.enqueued_at <= self.coalesce_seconds:
+            previous.count += 1
+            if self.spool:
+                self.spool.count(previous)
+            OUTCOMES.labels("coalesced").inc()
+            return "coalesced", previous
+
+        if self.queue.qsize() >= self.maxsize:
+            OUTCOMES.labels("rejected").inc()
+            return "rejected", None
+
+        item = Pending(to, message, trace_id, enqueued_at=now)
+        if len(self.recent) > self.maxsize:
+            self.recent = {k: p for k, p in self.recent.items() if now - p.enqueued_at <= self.coalesce_seconds}
+        self.recent[key] = item
+        if self.spool:
+            self.spool.add(item)
+        self.queue.put_nowait(item)
+        QUEUE_DEPTH.set(self.queue.qsize())
+        return "queued", item
+
+    async def _next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.batch_wait
+        while len(batch) < self.batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        for item in batch:
+            # taken: from now on a duplicate is a new notification
+            if self.recent.get((item.to, item.message)) is item:
+                del self.recent[item.to, item.message]
+        QUEUE_DEPTH.set(self.queue.qsize())
+        return batch
+
+    async def _deliver(self, batch):
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                await self.provider.send_batch(batch)
+                return True
+            except Exception as e:
+                if attempt == MAX_ATTEMPTS:
+                    logger.error(f"notification batch of {len(batch)} failed after {attempt} attempts: {e}")
+                    return False
+                await asyncio.sleep(0.2 * 2 ** attempt)
+
+    async def _worker(self, n):
+        while True:
+            batch = await self._next_batch()
+            try:
+                delivered = await self._deliver(batch)
+                now = time.time()
+                BATCH_SIZES.observe(len(batch))
+                if delivered:
+                    for item in batch:
+                        DELIVERY_LATENCY.observe(now - item.enqueued_at)
+                    OUTCOMES.labels("delivered").inc(len(batch))
+                    if self.spool:
+                        self.spool.done([item.id for item in batch])
+                else:
+                    self._retry_later(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _retry_later(self, batch):
+        """Re-queue a failed batch after a growing delay; past retry_rounds it is given up on."""
+        retry = [item for item in batch if item.rounds < self.retry_rounds]
+        if len(retry) < len(batch):
+            # left in the spool (if any) for the next start
+            OUTCOMES.labels("failed").inc(len(batch) - len(retry))
+        if not retry:
+            return
+        for item in retry:
+            item.rounds += 1
+        OUTCOMES.labels("retried").inc(len(retry))
+        delay = self.retry_backoff * 2 ** (retry[0].rounds - 1)
+
+        def requeue():
+            self.retrying.discard(handle)
+            for item in retry:
+                self.queue.put_nowait(item)
+            QUEUE_DEPTH.set(self.queue.qsize())
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self.retrying.add(handle)
+
+    def ping(self):
+        """Health check: raises if a worker died or the queue is full."""
+        dead = [t for t in self.tasks if t.done()]
+        if self.queue is None or not self.tasks or dead:
+            raise RuntimeError(f"{len(dead)}/{len(self.tasks)} delivery workers stopped")
+        if self.queue.qsize() >= self.maxsize:
+            raise RuntimeError(f"queue full ({self.queue.qsize()})")
+
+    async def stop(self, timeout: float = 5.0):
+        """Give the workers `timeout` seconds to drain, then cancel; undelivered items stay spooled."""
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"notification queue: {self.queue.qsize()} still pending at shutdown")
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        for handle in self.retrying:
+            handle.cancel()
+        self.retrying.clear()
+        await self.provider.close()
+        if self.spool:
+            self.spool.close()
+
+
+def make_provider():
+    if PROVIDER_URL:
+        return HttpProvider(PROVIDER_URL)
+    return FakeProvider(latency=float(os.getenv("NOTIFY_FAKE_LATENCY_MS", "50")) / 1000)
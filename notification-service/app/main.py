@@ -1,69 +1,60 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request, Response
 from pydantic import BaseModel
 from prometheus_fastapi_instrumentator import Instrumentator
-from starlette.middleware.base import BaseHTTPMiddleware
-import logging, time, uuid, subprocess, os
+from sre_common import HealthCheck, HealthMiddleware, TokenAuthMiddleware, TracingMiddleware, log_extra, setup_logging
+from sre_common.logs_api import loglevel_router, logs_router
 
-logging.basicConfig(
-    #filename="/var/log/app.log",
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s"
-)
-try:
-    os.makedirs("/var/log", exist_ok=True)
-    _root_logger = logging.getLogger()
-    if not any(isinstance(h, logging.FileHandler) and getattr(h, 'baseFilename', '') == "/var/log/app.log" for h in _root_logger.handlers):
-        _fh = logging.FileHandler("/var/log/app.log")
-        _fh.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-        _root_logger.addHandler(_fh)
-except Exception:
-    pass
-logger = logging.getLogger("notification-service")
+from .delivery import DeliveryQueue, make_provider
 
-app = FastAPI(title="notification-service")
-Instrumentator().instrument(app).expose(app)
+# Logging: handlers only enqueue, a background thread writes app.log + stdout
+logger = setup_logging("notification-service")
+
+# Delivery: /send enqueues, background workers batch messages to the provider
+DELIVERY = DeliveryQueue(make_provider())
 
-class EnterpriseMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        trace_id = request.headers.get("x-trace-id", str(uuid.uuid4()))
-        request.state.trace_id = trace_id
 
-        user_id = request.headers.get("x-user-id", "unknown")
-        request.state.user_id = user_id
+@asynccontextmanager
+async def lifespan(app):
+    await DELIVERY.start()
+    yield
+    await DELIVERY.stop()
 
-        start = time.time()
-        response = await call_next(request)
-        duration_ms = round((time.time() - start) * 1000, 2)
 
-        logger.info(
-            f"[trace={trace_id}] [user={user_id}] [route={request.url.path}] [duration_ms={duration_ms}]"
-        )
+app = FastAPI(title="notification-service", lifespan=lifespan)
+Instrumentator().instrument(app).expose(app)
 
-        response.headers["x-trace-id"] = trace_id
-        return response
+# Bearer tokens from auth-service are verified locally (no auth round trip),
+# then tracing wraps everything
+app.add_middleware(TokenAuthMiddleware)
+app.add_middleware(TracingMiddleware, logger=logger)
 
-app.add_middleware(EnterpriseMiddleware)
+# /health and /ready: answered ahead of tracing and logging, from a cached dependency check
+HEALTH = HealthCheck("notification")
+HEALTH.add("delivery_workers", DELIVERY.ping)
+app.add_middleware(HealthMiddleware, health=HEALTH)
 
 class Notification(BaseModel):
     to: str
     message: str
 
-@app.get("/health")
-async def health(request: Request):
-    logger.info(f"[trace={request.state.trace_id}] [user={request.state.user_id}] notification health check")
-    return {"status": "ok", "service": "notification"}
-
 @app.post("/send")
 async def send(request: Request, n: Notification, response: Response):
-    logger.info(f"[trace={request.state.trace_id}] [user={request.state.user_id}] Queued notification to {n.to}")
+    status, item = DELIVERY.offer(n.to, n.message, request.state.trace_id)
     response.headers["x-trace-id"] = request.state.trace_id
-    return {"status": "queued", "to": n.to}
-
-@app.get("/logs")
-async def get_logs(lines: int = 50):
-    try:
-        result = subprocess.run(["tail", "-n", str(lines), "/var/log/app.log"],
-                                capture_output=True, text=True, check=True)
-        return {"logs": result.stdout.splitlines()}
-    except subprocess.CalledProcessError as e:
-        return {"error": str(e)}
+    if status == "rejected":
+        logger.warning(f"[trace={request.state.trace_id}] [user={request.state.user_id}] Notification queue full, rejected notification to {n.to}", extra=log_extra(request, event="notification_rejected"))
+        response.status_code = 429
+        response.headers["Retry-After"] = "1"
+        return {"status": "rejected", "to": n.to, "message": "notification queue is full, retry later"}
+    if status == "coalesced":
+        logger.info(f"[trace={request.state.trace_id}] [user={request.state.user_id}] Coalesced notification to {n.to} (x{item.count})", extra=log_extra(request, event="notification_coalesced"))
+    else:
+        logger.info(f"[trace={request.state.trace_id}] [user={request.state.user_id}] Queued notification to {n.to}", extra=log_extra(request, event="notification_queued"))
+    return {"status": status, "to": n.to, "id": item.id}
+
+# GET /logs: in-process, seek-based reader with filters and cursors
+app.include_router(logs_router())
+# GET/POST /loglevel: logger levels and per-route access-log rules at runtime
+app.include_router(loglevel_router())
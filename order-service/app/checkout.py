@@ -0,0 +1,123 @@
+"""
+Downstream calls for POST /checkout (order -> charge -> notify in one request).
+
+A purchase used to be four sequential client round trips (login, /create,
+/charge, /send, see log-scripting/trace-log-testing.py), each carrying the
+trace headers by hand. /checkout inserts the order locally, then:
+
+  - charges through payment-service on a pooled keep-alive client
+    (one connection pool per worker, reused across requests), with its own
+    timeout. A stale pooled connection or refused connect is retried once:
+    /charge is idempotent on the payment id, so a retry never charges twice.
+  - after a successful charge, hands the notification to a background
+    task with a shorter timeout; the caller does not wait for it.
+
+Every call carries traceparent / x-trace-id from sre_common.outgoing_headers(),
+so payment and notification continue the checkout trace.
+
+Environment knobs:
+    PAYMENT_URL                 payment-service base URL   (default http://payment-service:8000)
+    NOTIFY_URL                  notification-service URL   (default http://notification-service:8000)
+    PAYMENT_TIMEOUT             seconds per /charge call   (default 5)
+    NOTIFY_TIMEOUT              seconds per /send call     (default 2)
+    DOWNSTREAM_CONNECT_TIMEOUT  seconds to connect         (default 1)
+    DOWNSTREAM_MAX_CONNECTIONS  pool size per worker       (default 100)
+"""
+
+import asyncio
+import logging
+import os
+
+import httpx
+from sre_common import outgoing_headers, start_span
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_URL = os.getenv("PAYMENT_URL", "http://payment-service:8000").rstrip("/")
+NOTIFY_URL = os.getenv("NOTIFY_URL", "http://notification-service:8000").rstrip("/")
+PAYMENT_TIMEOUT = float(os.getenv("PAYMENT_TIMEOUT", "5"))
+NOTIFY_TIMEOUT = float(os.getenv("NOTIFY_TIMEOUT", "2"))
+CONNECT_TIMEOUT = float(os.getenv("DOWNSTREAM_CONNECT_TIMEOUT", "1"))
+MAX_CONNECTIONS = int(os.getenv("DOWNSTREAM_MAX_CONNECTIONS", "100"))
+
+# caller headers passed on to payment/notification
+FORWARD_HEADERS = ("authorization", "x-user-id")
+
+# errors where the request cannot have reached the handler
+_RETRYABLE = (httpx.ConnectError, httpx.RemoteProtocolError)
+
+
+def forward_headers(request_headers) -> dict:
+    return {k: request_headers[k] for k in FORWARD_HEADERS if k in request_headers}
+
+
+class Downstream:
+    """Shared client for payment-service and notification-service."""
+
+    def __init__(self, payment_url: str = PAYMENT_URL, notify_url: str = NOTIFY_URL,
+                 payment_timeout: float = PAYMENT_TIMEOUT, notify_timeout: float = NOTIFY_TIMEOUT,
+                 max_connections: int = MAX_CONNECTIONS, transport=None):
+        self.payment_url = payment_url
+        self.notify_url = notify_url
+        self.payment_timeout = httpx.Timeout(payment_timeout, connect=min(CONNECT_TIMEOUT, payment_timeout))
+        self.notify_timeout = httpx.Timeout(notify_timeout, connect=min(CONNECT_TIMEOUT, notify_timeout))
+        self.max_connections = max_connections
+        self.transport = transport
+        self.client = None
+        self.pending = set()  # notification tasks still running
+        self.stats = {"charges": 0, "charge_retries": 0, "notified": 0, "notify_failed": 0}
+
+    async def start(self):
+        limits = httpx.Limits(max_connections=self.max_connections,
+                              max_keepalive_connections=self.max_connections, keepalive_expiry=30)
+        self.client = httpx.AsyncClient(limits=limits, timeout=self.payment_timeout, transport=self.transport)
+
+    async def stop(self, timeout: float = 5):
+        """Give queued notifications `timeout` seconds, then close the pool."""
+        if self.pending:
+            await asyncio.wait(self.pending, timeout=timeout)
+        for task in list(self.pending):
+            task.cancel()
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def charge(self, payment: dict, headers: dict) -> dict:
+        """POST /charge; raises httpx.HTTPError when payment-service can't answer."""
+        with start_span("payment.charge", payment_id=payment["id"], **{"peer.service": "payment-service"}):
+            headers = {**headers, **outgoing_headers()}
+            for attempt in range(2):
+                try:
+                    r = await self.client.post(f"{self.payment_url}/charge", json=payment, headers=headers,
+                                               timeout=self.payment_timeout)
+                    break
+                except _RETRYABLE:
+                    if attempt:
+                        raise
+                    self.stats["charge_retries"] += 1
+            r.raise_for_status()
+            self.stats["charges"] += 1
+            return r.json()
+
+    def notify(self, to: str, message: str, headers: dict):
+        """Send the notification in the background; failures are logged, not raised."""
+        # captured now: the task outlives the request's span, but keeps its trace
+        headers = {**headers, **outgoing_headers()}
+        task = asyncio.create_task(self._notify(to, message, headers))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def _notify(self, to, message, headers):
+        try:
+            r = await self.client.post(f"{self.notify_url}/send", json={"to": to, "message": message},
+                                       headers=headers, timeout=self.notify_timeout)
+            r.raise_for_status()
+            self.stats["notified"] += 1
+        except httpx.HTTPError as e:
+            self.stats["notify_failed"] += 1
+            logger.warning(f"[trace={headers.get('x-trace-id')}] notification to {to} failed: "
+                           f"{type(e).__name__}: {e}")
+
+    def ping(self):
+        if self.client is None or self.client.is_closed:
+            raise RuntimeError("downstream client not started")
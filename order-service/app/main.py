@@ -1,78 +1,137 @@
-from fastapi import FastAPI, Request, Response
+import uuid
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+import httpx
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from pydantic import BaseModel
 from prometheus_fastapi_instrumentator import Instrumentator
-from starlette.middleware.base import BaseHTTPMiddleware
-import logging, time, uuid, subprocess, os
-
-logging.basicConfig(
-    #filename="/var/log/app.log",
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s"
-)
-# also log to file for /logs endpoint and shipping
-try:
-    os.makedirs("/var/log", exist_ok=True)
-    _root_logger = logging.getLogger()
-    if not any(isinstance(h, logging.FileHandler) and getattr(h, 'baseFilename', '') == "/var/log/app.log" for h in _root_logger.handlers):
-        _fh = logging.FileHandler("/var/log/app.log")
-        _fh.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-        _root_logger.addHandler(_fh)
-except Exception:
-    pass
-logger = logging.getLogger("order-service")
-
-app = FastAPI(title="order-service")
-Instrumentator().instrument(app).expose(app)
+from sre_common import (HealthCheck, HealthMiddleware, TokenAuthMiddleware, TracingMiddleware, log_extra,
+                        setup_logging, start_span)
+from sre_common.logs_api import loglevel_router, logs_router
+
+from .checkout import Downstream, forward_headers
+from .store import make_store
 
-class EnterpriseMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        trace_id = request.headers.get("x-trace-id", str(uuid.uuid4()))
-        request.state.trace_id = trace_id
+# Logging: handlers only enqueue, a background thread writes app.log + stdout
+logger = setup_logging("order-service")
 
-        user_id = request.headers.get("x-user-id", "unknown")
-        request.state.user_id = user_id
+# Orders: Postgres pool or SQLite stand-in, see ORDERS_DB_URL
+ORDERS = make_store()
 
-        start = time.time()
-        response = await call_next(request)
-        duration_ms = round((time.time() - start) * 1000, 2)
+# /checkout: pooled keep-alive client to payment-service and notification-service
+DOWNSTREAM = Downstream()
 
-        logger.info(
-            f"[trace={trace_id}] [user={user_id}] [route={request.url.path}] [duration_ms={duration_ms}]"
-        )
 
-        response.headers["x-trace-id"] = trace_id
-        return response
+@asynccontextmanager
+async def lifespan(app):
+    await DOWNSTREAM.start()
+    yield
+    await DOWNSTREAM.stop()
 
-app.add_middleware(EnterpriseMiddleware)
+
+app = FastAPI(title="order-service", lifespan=lifespan)
+Instrumentator().instrument(app).expose(app)
+
+# Bearer tokens from auth-service are verified locally (no auth round trip),
+# then tracing wraps everything
+app.add_middleware(TokenAuthMiddleware)
+app.add_middleware(TracingMiddleware, logger=logger)
+
+# /health and /ready: answered ahead of tracing and logging, from a cached dependency check
+HEALTH = HealthCheck("order")
+HEALTH.add("orders_db", ORDERS.ping)
+HEALTH.add("downstream_client", DOWNSTREAM.ping)
+app.add_middleware(HealthMiddleware, health=HEALTH)
 
 class Order(BaseModel):
     id: str
     customer_id: str
     amount: float
 
-@app.get("/health")
-async def health(request: Request):
-    logger.info(f"[trace={request.state.trace_id}] [user={request.state.user_id}] order health check")
-    return {"status": "ok", "service": "order"}
-
 @app.post("/create")
 async def create_order(request: Request, o: Order, response: Response):
     # if frontend passes x-trace-id/x-user-id, they are preserved; otherwise middleware created them
-    logger.info(f"[trace={request.state.trace_id}] [user={request.state.user_id}] Created order: {o.id} for customer {o.customer_id}")
+    with start_span("orders.insert", order_id=o.id):
+        created = await ORDERS.insert(o.id, o.customer_id, o.amount)
+    if created:
+        logger.info(f"[trace={request.state.trace_id}] [user={request.state.user_id}] Created order: {o.id} for customer {o.customer_id}", extra=log_extra(request, order_id=o.id, amount=o.amount))
+    else:
+        logger.info(f"[trace={request.state.trace_id}] [user={request.state.user_id}] Order already exists: {o.id}", extra=log_extra(request, order_id=o.id))
     # respond with trace id so caller can forward it
     response.headers["x-trace-id"] = request.state.trace_id
-    return {"status": "created", "order": o}
+    return {"status": "created" if created else "exists", "order": o}
+
+@app.post("/bulk")
+async def create_orders(request: Request, orders: List[Order], response: Response):
+    # one transaction (COPY on Postgres) for the whole batch; existing ids are skipped
+    with start_span("orders.insert_many", count=len(orders)):
+        created = await ORDERS.insert_many([(o.id, o.customer_id, o.amount) for o in orders])
+    logger.info(f"[trace={request.state.trace_id}] [user={request.state.user_id}] Bulk created {created}/{len(orders)} orders", extra=log_extra(request))
+    response.headers["x-trace-id"] = request.state.trace_id
+    return {"status": "created", "received": len(orders), "created": created}
 
 @app.get("/list")
-async def list_orders(request: Request):
-    logger.info(f"[trace={request.state.trace_id}] [user={request.state.user_id}] Listed orders")
-    return [{"id": "order-1", "amount": 100.0}]
+async def list_orders(
+    request: Request,
+    customer_id: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+):
+    # newest first; pass back "next" as ?cursor= for the following page
+    try:
+        with start_span("orders.list", limit=limit):
+            page = await ORDERS.list(customer_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"[trace={request.state.trace_id}] [user={request.state.user_id}] Listed orders: {len(page['orders'])} customer={customer_id}", extra=log_extra(request))
+    return page
+
+class Checkout(BaseModel):
+    customer_id: str
+    amount: float
+    order_id: Optional[str] = None
+    payment_id: Optional[str] = None
+    notify: bool = True
 
-@app.get("/logs")
-async def get_logs(lines: int = 50):
+@app.post("/checkout")
+async def checkout(request: Request, c: Checkout, response: Response):
+    # create -> charge -> notify in one call; the caller waits for the order and the charge only
+    order_id = c.order_id or f"o-{uuid.uuid4().hex[:12]}"
+    # derived from the order, so a retried checkout replays the same payment instead of charging again
+    payment_id = c.payment_id or f"p-{order_id}"
+    with start_span("orders.insert", order_id=order_id):
+        created = await ORDERS.insert(order_id, c.customer_id, c.amount)
+    if not created:
+        # a retry may only replay the order it names, never charge it for someone else or another amount
+        existing = await ORDERS.get(order_id)
+        if existing is None or existing["customer_id"] != c.customer_id or existing["amount"] != c.amount:
+            logger.warning(f"[trace={request.state.trace_id}] [user={request.state.user_id}] event=checkout_failure error_type=OrderMismatch order_id={order_id} amount={c.amount}", extra=log_extra(request, event="checkout_failure", error_type="OrderMismatch", order_id=order_id, amount=c.amount))
+            raise HTTPException(status_code=409, detail=f"order {order_id} exists with another customer or amount")
+
+    forward = forward_headers(request.headers)
     try:
-        result = subprocess.run(["tail", "-n", str(lines), "/var/log/app.log"],
-                                capture_output=True, text=True, check=True)
-        return {"logs": result.stdout.splitlines()}
-    except subprocess.CalledProcessError as e:
-        return {"error": str(e)}
+        payment = await DOWNSTREAM.charge({"id": payment_id, "order_id": order_id, "amount": c.amount}, forward)
+    except httpx.HTTPError as e:
+        error_type = "PaymentTimeout" if isinstance(e, httpx.TimeoutException) else "PaymentUnavailable"
+        logger.error(f"[trace={request.state.trace_id}] [user={request.state.user_id}] event=checkout_failure error_type={error_type} order_id={order_id} amount={c.amount}", extra=log_extra(request, event="checkout_failure", error_type=error_type, order_id=order_id, amount=c.amount))
+        raise HTTPException(status_code=504 if error_type == "PaymentTimeout" else 502,
+                            detail=f"payment-service: {type(e).__name__}")
+
+    charged = payment.get("status") == "ok"
+    if charged and c.notify:
+        DOWNSTREAM.notify(c.customer_id, f"order {order_id} paid: {payment.get('charged')}", forward)
+    logger.info(f"[trace={request.state.trace_id}] [user={request.state.user_id}] Checkout order={order_id} created={created} payment={payment.get('status')}", extra=log_extra(request, event="checkout", order_id=order_id, amount=c.amount))
+    response.headers["x-trace-id"] = request.state.trace_id
+    return {
+        "status": "completed" if charged else "payment_" + str(payment.get("status")),
+        "order_id": order_id,
+        "order": "created" if created else "exists",
+        "payment": payment,
+        "notification": "queued" if charged and c.notify else "skipped",
+    }
+
+# GET /logs: in-process, seek-based reader with filters and cursors
+app.include_router(logs_router())
+# GET/POST /loglevel: logger levels and per-route access-log rules at runtime
+app.include_router(loglevel_router())
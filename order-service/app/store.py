@@ -0,0 +1,221 @@
+"""
+Order persistence for order-service.
+
+ORDERS_DB_URL picks the backend:
+- postgresql://...   async psycopg pool against the compose postgres container
+- sqlite:///path     in-process SQLite stand-in (default, also used by tests/benchmarks)
+
+Every order gets a monotonically increasing `seq`; /list walks it newest
+first with a keyset cursor (WHERE seq < :cursor ORDER BY seq DESC LIMIT n)
+over a (customer_id, seq) index, so page N costs the same as page 1 no
+matter how many rows the table holds (OFFSET would scan and drop N*limit rows).
+"""
+
+import asyncio
+import base64
+import json
+import os
+import sqlite3
+import time
+
+DB_URL = os.getenv("ORDERS_DB_URL", "sqlite:///orders.db")
+POOL_SIZE = int(os.getenv("ORDERS_DB_POOL", "10"))
+
+COLUMNS = ("seq", "id", "customer_id", "amount", "created_at")
+
+
+def encode_cursor(seq: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"s": seq}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Raises ValueError on anything that is not one of our cursors."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded))["s"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"invalid cursor: {cursor!r}") from e
+
+
+def _page(rows, limit):
+    orders = [dict(zip(COLUMNS, row)) for row in rows[:limit]]
+    more = len(rows) > limit
+    return {"orders": orders, "next": encode_cursor(orders[-1]["seq"]) if more else None}
+
+
+class SQLiteOrderStore:
+    """Single connection, calls run off the event loop and one at a time."""
+
+    def __init__(self, path: str):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS orders (
+                seq          INTEGER PRIMARY KEY AUTOINCREMENT,
+                id           TEXT NOT NULL UNIQUE,
+                customer_id  TEXT NOT NULL,
+                amount       REAL NOT NULL,
+                created_at   REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS orders_customer_seq ON orders (customer_id, seq);
+        """)
+        self.db.commit()
+        self.lock = asyncio.Lock()
+
+    async def _run(self, fn, *args):
+        async with self.lock:
+            return await asyncio.to_thread(fn, *args)
+
+    def _insert_many(self, rows):
+        before = self.db.total_changes
+        self.db.executemany(
+            "INSERT OR IGNORE INTO orders (id, customer_id, amount, created_at) VALUES (?, ?, ?, ?)", rows
+        )
+        self.db.commit()
+        return self.db.total_changes - before
+
+    def _list(self, customer_id, limit, after):
+        where, args = [], []
+        if customer_id is not None:
+            where.append("customer_id = ?")
+            args.append(customer_id)
+        if after is not None:
+            where.append("seq < ?")
+            args.append(after)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM orders"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY seq DESC LIMIT ?"
+        return self.db.execute(sql, (*args, limit + 1)).fetchall()
+
+    def _get(self, order_id):
+        return self.db.execute(f"SELECT {', '.join(COLUMNS)} FROM orders WHERE id = ?", (order_id,)).fetchone()
+
+    async def insert(self, order_id, customer_id, amount) -> bool:
+        """False if an order with this id already exists."""
+        return await self.insert_many([(order_id, customer_id, amount)]) == 1
+
+    async def get(self, order_id):
+        """The order as a dict of COLUMNS, or None."""
+        row = await self._run(self._get, order_id)
+        return dict(zip(COLUMNS, row)) if row else None
+
+    async def insert_many(self, orders) -> int:
+        """Insert (id, customer_id, amount) tuples in one transaction; returns rows added."""
+        now = time.time()
+        return await self._run(self._insert_many, [(*o, now) for o in orders])
+
+    async def list(self, customer_id=None, limit=50, cursor=None):
+        after = decode_cursor(cursor) if cursor else None
+        return _page(await self._run(self._list, customer_id, limit, after), limit)
+
+    async def ping(self):
+        await self._run(self.db.execute, "SELECT 1")
+
+    async def close(self):
+        self.db.close()
+
+
+class PostgresOrderStore:
+    """psycopg 3 async pool; the schema is created on first use."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS orders (
+            seq          BIGSERIAL PRIMARY KEY,
+            id           TEXT NOT NULL UNIQUE,
+            customer_id  TEXT NOT NULL,
+            amount       DOUBLE PRECISION NOT NULL,
+            created_at   DOUBLE PRECISION NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS orders_customer_seq ON orders (customer_id, seq DESC);
+    """
+
+    def __init__(self, dsn: str, pool_size: int = POOL_SIZE):
+        from psycopg_pool import AsyncConnectionPool
+
+        self.pool = AsyncConnectionPool(dsn, min_size=1, max_size=pool_size, open=False)
+        self._ready = False
+        self._opening = asyncio.Lock()
+
+    async def _open(self):
+        if self._ready:
+            return
+        async with self._opening:
+            if not self._ready:
+                await self.pool.open()
+                async with self.pool.connection() as conn:
+                    await conn.execute(self.SCHEMA)
+                self._ready = True
+
+    async def insert(self, order_id, customer_id, amount) -> bool:
+        await self._open()
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(
+                "INSERT INTO orders (id, customer_id, amount, created_at) VALUES (%s, %s, %s, %s) "
+                "ON CONFLICT (id) DO NOTHING",
+                (order_id, customer_id, amount, time.time()),
+            )
+            return cur.rowcount == 1
+
+    async def get(self, order_id):
+        await self._open()
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(f"SELECT {', '.join(COLUMNS)} FROM orders WHERE id = %s", (order_id,))
+            row = await cur.fetchone()
+        return dict(zip(COLUMNS, row)) if row else None
+
+    async def insert_many(self, orders) -> int:
+        """COPY into a temp table, then one INSERT ... SELECT that skips existing ids."""
+        await self._open()
+        now = time.time()
+        async with self.pool.connection() as conn, conn.transaction():
+            await conn.execute(
+                "CREATE TEMP TABLE orders_in (id TEXT, customer_id TEXT, amount DOUBLE PRECISION, "
+                "created_at DOUBLE PRECISION) ON COMMIT DROP"
+            )
+            async with conn.cursor() as cur:
+                async with cur.copy("COPY orders_in (id, customer_id, amount, created_at) FROM STDIN") as copy:
+                    for order_id, customer_id, amount in orders:
+                        await copy.write_row((order_id, customer_id, amount, now))
+                await cur.execute(
+                    "INSERT INTO orders (id, customer_id, amount, created_at) "
+                    "SELECT DISTINCT ON (id) id, customer_id, amount, created_at FROM orders_in "
+                    "ON CONFLICT (id) DO NOTHING"
+                )
+                return cur.rowcount
+
+    async def list(self, customer_id=None, limit=50, cursor=None):
+        after = decode_cursor(cursor) if cursor else None
+        where, args = [], []
+        if customer_id is not None:
+            where.append("customer_id = %s")
+            args.append(customer_id)
+        if after is not None:
+            where.append("seq < %s")
+            args.append(after)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM orders"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY seq DESC LIMIT %s"
+
+        await self._open()
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(sql, (*args, limit + 1))
+            return _page(await cur.fetchall(), limit)
+
+    async def ping(self):
+        await self._open()
+        async with self.pool.connection() as conn:
+            await conn.execute("SELECT 1")
+
+    async def close(self):
+        await self.pool.close()
+
+
+def make_store(url: str = DB_URL):
+    if url.startswith(("postgres://", "postgresql://")):
+        return PostgresOrderStore(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteOrderStore(url[len("sqlite:///"):])
+    raise ValueError(f"unsupported ORDERS_DB_URL: {url}")
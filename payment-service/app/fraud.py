@@ -0,0 +1,363 @@
+"""
+Velocity fraud checks for POST /charge.
+
+Besides the single-charge amount cap, charges are counted per user id and
+per order id in sliding windows (count and amount sum), and a rule trips
+when a window goes over its limit, e.g. more than 20 charges by one user in
+a minute, or more than 5 attempts on one order. Rules live in
+fraud_rules.json (FRAUD_RULES to use another file).
+
+    FRAUD = make_engine()                           # FraudEngine, or SharedFraudEngine with FRAUD_SHARED
+    rule = FRAUD.check(user_id, order_id, amount)   # None, or the name of the rule that tripped
+
+Layout, so a million active users stay cheap:
+  - KeySlots maps a key (user or order id) to a small integer slot, one
+    index per dimension shared by all of its windows. When it is full, the
+    least recently seen of the next few slots under a sweeping hand is
+    reused (CLOCK-style approximate LRU), so idle keys go first and
+    eviction is O(1).
+  - SlidingWindow keeps `buckets` counts (and sums, if a rule needs them)
+    per slot in flat arrays (array("I") / array("d"), no per-key objects)
+    plus running totals.
+    A charge advances the slot's ring by at most `buckets` steps and adds
+    itself: O(1), independent of the traffic in the window.
+
+Every attempt that reaches the check is recorded, blocked ones included.
+
+FraudEngine's state is per process: with several gunicorn workers each one
+would only see its share of the traffic, which multiplies every limit by
+the number of workers. With FRAUD_SHARED set, make_engine() returns a
+SharedFraudEngine instead: the same buckets, kept in a SQLite file that
+all workers on the host update in one short transaction per charge. If
+that file can't be used, it falls back to the worker's own windows
+rather than failing the charge. Its check() waits on the file lock, so
+callers on an event loop run it in a thread (`blocking` tells them), and
+the table is held to about FRAUD_MAX_KEYS keys' worth of buckets: past
+that, the buckets that started longest ago are dropped first.
+
+Environment knobs:
+    FRAUD_RULES       rules file                          (default app/fraud_rules.json)
+    FRAUD_MAX_KEYS    tracked keys per dimension          (default 1000000)
+    FRAUD_SHARED      SQLite file shared by the workers   (default unset = per process)
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+logger = logging.getLogger(__name__)
+
+RULES_PATH = os.getenv("FRAUD_RULES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "fraud_rules.json"))
+MAX_KEYS = int(os.getenv("FRAUD_MAX_KEYS", "1000000"))
+SHARED_PATH = os.getenv("FRAUD_SHARED")
+EVICTION_SAMPLE = 8
+# shared store: expired buckets are deleted every this many checks
+PRUNE_EVERY = 1000
+
+
+class KeySlots:
+    """key -> slot, at most max_keys of them; evicts (approximately) the least recently seen."""
+
+    def __init__(self, max_keys: int = MAX_KEYS, sample: int = EVICTION_SAMPLE):
+        self.max_keys = max_keys
+        self.sample = sample
+        self.slots = {}            # key -> slot
+        self.keys = []             # slot -> key
+        self.seen = array("d")     # slot -> last time seen
+        self.hand = 0              # next slot to consider for eviction
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, key, now: float):
+        """(slot, new): new means the slot's windows must be started from zero."""
+        slot = self.slots.get(key)
+        if slot is not None:
+            self.seen[slot] = now
+            return slot, False
+        if len(self.keys) < self.max_keys:
+            slot = len(self.keys)
+            self.keys.append(key)
+            self.seen.append(now)
+        else:
+            # oldest of the next `sample` slots under a sweeping hand (CLOCK-style):
+            # no RNG and sequential memory access, keys seen recently survive the sweep
+            seen, n, hand = self.seen, len(self.keys), self.hand
+            slot = hand
+            for step in range(1, min(self.sample, n)):
+                candidate = (hand + step) % n  # the sample wraps past the last slot
+                if seen[candidate] < seen[slot]:
+                    slot = candidate
+            self.hand = (hand + self.sample) % n
+            del self.slots[self.keys[slot]]
+            self.keys[slot] = key
+            seen[slot] = now
+            self.evictions += 1
+        self.slots[key] = slot
+        return slot, True
+
+
+class SlidingWindow:
+    """Per-slot count (and amount sum) over the last `window` seconds, in `buckets` steps."""
+
+    def __init__(self, window: float, buckets: int = 6, sums: bool = True):
+        self.window = window
+        self.buckets = buckets
+        self.width = window / buckets
+        self.track_sums = sums
+        self.counts = array("I")   # slot * buckets + epoch % buckets
+        self.sums = array("d")     # same layout, empty unless track_sums
+        self.total_count = array("I")
+        self.total_sum = array("d")
+        self.epoch = array("q")    # slot -> last bucket epoch written
+        self._zero_i = array("I", [0]) * buckets
+        self._zero_d = array("d", [0.0]) * buckets
+
+    def _grow(self, slot: int):
+        while len(self.epoch) <= slot:
+            self.counts.extend(self._zero_i)
+            self.total_count.append(0)
+            self.epoch.append(0)
+            if self.track_sums:
+                self.sums.extend(self._zero_d)
+                self.total_sum.append(0.0)
+
+    def add(self, slot: int, amount: float, now: float, new: bool = False):
+        """Record one charge; returns (count, sum) in the window, this charge included (sum 0 if untracked)."""
+        if slot >= len(self.epoch):
+            self._grow(slot)
+        b = self.buckets
+        base = slot * b
+        e = int(now / self.width)
+        last = self.epoch[slot]
+        counts, sums, track = self.counts, self.sums, self.track_sums
+
+        if e == last and not new:
+            # same bucket as this key's previous charge: nothing to expire
+            i = base + e % b
+            counts[i] += 1
+            count = self.total_count[slot] + 1
+            self.total_count[slot] = count
+            if not track:
+                return count, 0.0
+            sums[i] += amount
+            total = self.total_sum[slot] + amount
+            self.total_sum[slot] = total
+            return count, total
+
+        if new or e - last >= b:
+            counts[base:base + b] = self._zero_i
+            count, total = 0, 0.0
+            if track:
+                sums[base:base + b] = self._zero_d
+        else:
+            count = self.total_count[slot]
+            total = self.total_sum[slot] if track else 0.0
+            # expire the buckets between the last write and now (at most `buckets` of them)
+            for ep in range(last + 1, e + 1):
+                i = base + ep % b
+                if counts[i]:
+                    count -= counts[i]
+                    counts[i] = 0
+                    if track:
+                        total -= sums[i]
+                        sums[i] = 0.0
+            if not count:
+                total = 0.0  # no float residue once the window is empty
+        self.epoch[slot] = e
+
+        i = base + e % b
+        counts[i] += 1
+        count += 1
+        self.total_count[slot] = count
+        if track:
+            sums[i] += amount
+            total += amount
+            self.total_sum[slot] = total
+        return count, total
+
+
+class FraudEngine:
+    DIMENSIONS = ("user", "order")
+    clock = time.monotonic
+    blocking = False  # check() is in-memory O(1): fine to call on the event loop
+
+    def __init__(self, config: dict, max_keys: int = MAX_KEYS):
+        self.max_amount = config.get("max_amount")
+        rules = config.get("rules", [])
+        for rule in rules:
+            if rule["key"] not in self.DIMENSIONS:
+                raise ValueError(f"fraud rule {rule['name']!r}: key must be one of {self.DIMENSIONS}")
+
+        # one SlidingWindow per (dimension, window), summing amounts only if a rule needs it
+        self.windows = {}
+        for rule in rules:
+            wkey = (rule["key"], float(rule["window"]))
+            needs_sum = any(r.get("max_sum") is not None for r in rules
+                            if (r["key"], float(r["window"])) == wkey)
+            if wkey not in self.windows:
+                self.windows[wkey] = SlidingWindow(wkey[1], int(rule.get("buckets", 6)), sums=needs_sum)
+        order = list(self.windows)
+        self.index = {d: KeySlots(max_keys) for d in self.DIMENSIONS if any(w[0] == d for w in order)}
+        # per dimension: [(position in totals, window)]; rules point at a position
+        self.plan = [(d, self.index[d], [(order.index(w), self.windows[w]) for w in order if w[0] == d])
+                     for d in self.index]
+        self.rules = [(r["name"], order.index((r["key"], float(r["window"]))), r.get("max_count"), r.get("max_sum"))
+                      for r in rules]
+        self.stats = {"checked": 0, "blocked": 0}
+
+    @classmethod
+    def from_file(cls, path: str = RULES_PATH, **kwargs):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), **kwargs)
+
+    def _totals(self, user, order_id, amount: float, now: float) -> list:
+        """Record the charge in every window; (count, sum) per window position, None if it has no key."""
+        totals = [None] * len(self.windows)
+        for dimension, index, windows in self.plan:
+            key = user if dimension == "user" else order_id
+            if key is None:
+                continue
+            slot, new = index.get(key, now)
+            for position, window in windows:
+                totals[position] = window.add(slot, amount, now, new)
+        return totals
+
+    def check(self, user_id: str, order_id: str, amount: float, now: float = None):
+        """Record this charge; returns the name of the first rule it breaks, or None."""
+        now = self.clock() if now is None else now
+        self.stats["checked"] += 1
+        # anonymous callers share "unknown": don't lump them into one user
+        user = user_id if user_id and user_id != "unknown" else None
+        totals = self._totals(user, order_id, amount, now)
+
+        rule = None
+        if self.max_amount is not None and amount > self.max_amount:
+            rule = "max_amount"
+        else:
+            for name, position, max_count, max_sum in self.rules:
+                total = totals[position]
+                if total is None:
+                    continue
+                if (max_count is not None and total[0] > max_count) or (max_sum is not None and total[1] > max_sum):
+                    rule = name
+                    break
+        if rule:
+            self.stats["blocked"] += 1
+        return rule
+
+
+class SharedFraudEngine(FraudEngine):
+    """
+    FraudEngine whose window buckets live in a SQLite file, so every worker
+    process on the host counts the same charges. One row per (window, key,
+    bucket); a check upserts the current bucket and sums the live ones.
+    """
+
+    clock = time.time  # shared by processes: wall clock, not each one's monotonic
+    blocking = True    # waits on the SQLite file lock: run check() off the event loop
+
+    def __init__(self, config: dict, db_path: str = SHARED_PATH, max_keys: int = MAX_KEYS, timeout: float = 1.0):
+        super().__init__(config, max_keys)
+        self.db_path = db_path
+        self.timeout = timeout
+        self.order = list(self.windows)  # window position -> (dimension, window seconds)
+        # max_keys keys with every bucket of every window written
+        self.max_rows = max_keys * sum(window.buckets for window in self.windows.values())
+        self.stats["fallbacks"] = 0
+        self.stats["evicted"] = 0
+        self._db = None
+        self._pid = None
+        self._checks = 0
+        # one connection per process, used from threadpool threads: one check at a time
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # opened lazily in each worker: a connection must not cross a fork
+        if self._pid != os.getpid():
+            db = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=OFF")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS fraud_buckets (
+                    dim     TEXT NOT NULL,
+                    window  REAL NOT NULL,
+                    key     TEXT NOT NULL,
+                    epoch   INTEGER NOT NULL,
+                    count   INTEGER NOT NULL,
+                    sum     REAL NOT NULL,
+                    expires REAL NOT NULL,
+                    PRIMARY KEY (dim, window, key, epoch)
+                ) WITHOUT ROWID
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS fraud_buckets_expires ON fraud_buckets (expires)")
+            # expires - window = when the bucket started: least recently written first, whatever the window
+            db.execute("CREATE INDEX IF NOT EXISTS fraud_buckets_started ON fraud_buckets (expires - window)")
+            self._db, self._pid = db, os.getpid()
+        return self._db
+
+    def _shared_totals(self, user, order_id, amount: float, now: float) -> list:
+        db = self._connect()
+        totals = [None] * len(self.order)
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for position, (dimension, seconds) in enumerate(self.order):
+                key = user if dimension == "user" else order_id
+                if key is None:
+                    continue
+                window = self.windows[dimension, seconds]
+                e = int(now / window.width)
+                db.execute(
+                    "INSERT INTO fraud_buckets VALUES (?, ?, ?, ?, 1, ?, ?) "
+                    "ON CONFLICT (dim, window, key, epoch) DO UPDATE SET count = count + 1, sum = sum + excluded.sum",
+                    (dimension, seconds, key, e, amount, (e + window.buckets) * window.width),
+                )
+                # the same `buckets` steps SlidingWindow keeps: epochs e - buckets + 1 .. e
+                count, total = db.execute(
+                    "SELECT sum(count), sum(sum) FROM fraud_buckets WHERE dim = ? AND window = ? AND key = ? AND epoch > ?",
+                    (dimension, seconds, key, e - window.buckets),
+                ).fetchone()
+                totals[position] = (count, total)
+            self._checks += 1
+            if self._checks % PRUNE_EVERY == 0:
+                self._prune(db, now)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return totals
+
+    def _prune(self, db, now: float):
+        db.execute("DELETE FROM fraud_buckets WHERE expires < ?", (now,))
+        # over the cap: drop the buckets that started longest ago
+        cutoff = db.execute("SELECT expires - window FROM fraud_buckets ORDER BY expires - window DESC LIMIT 1 OFFSET ?",
+                            (self.max_rows,)).fetchone()
+        if cutoff:
+            self.stats["evicted"] += db.execute("DELETE FROM fraud_buckets WHERE expires - window <= ?", cutoff).rowcount
+
+    def check(self, user_id: str, order_id: str, amount: float, now: float = None):
+        with self._lock:
+            return super().check(user_id, order_id, amount, now)
+
+    def _totals(self, user, order_id, amount: float, now: float) -> list:
+        try:
+            return self._shared_totals(user, order_id, amount, now)
+        except sqlite3.Error as e:
+            # fail open to this worker's own windows: a charge is never refused over the store
+            self.stats["fallbacks"] += 1
+            if self.stats["fallbacks"] % 1000 == 1:
+                logger.warning(f"fraud: shared windows at {self.db_path} unavailable, using per-worker ones: {e}")
+            return super()._totals(user, order_id, amount, now)
+
+
+def make_engine(path: str = RULES_PATH):
+    """SharedFraudEngine when FRAUD_SHARED is set, else the in-process FraudEngine."""
+    if SHARED_PATH:
+        logger.info(f"fraud: velocity windows shared by all workers in {SHARED_PATH}")
+        return SharedFraudEngine.from_file(path)
+    return FraudEngine.from_file(path)
@@ -1,62 +1,118 @@
 from fastapi import FastAPI, Request, Response
 from pydantic import BaseModel
 from prometheus_fastapi_instrumentator import Instrumentator
-from starlette.middleware.base import BaseHTTPMiddleware
-import logging, time, uuid, subprocess, random, os
-
-logging.basicConfig(
-    #filename="/var/log/app.log",
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s"
-)
-# also log to file for /logs endpoint and shipping
-try:
-    os.makedirs("/var/log", exist_ok=True)
-    _root_logger = logging.getLogger()
-    if not any(isinstance(h, logging.FileHandler) and getattr(h, 'baseFilename', '') == "/var/log/app.log" for h in _root_logger.handlers):
-        _fh = logging.FileHandler("/var/log/app.log")
-        _fh.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-        _root_logger.addHandler(_fh)
-except Exception:
-    pass
-logger = logging.getLogger("payment-service")
+from sre_common import (HealthCheck, HealthMiddleware, TokenAuthMiddleware, TracingMiddleware, log_extra,
+                        setup_logging, start_span)
+from sre_common.logs_api import loglevel_router, logs_router
+from starlette.concurrency import run_in_threadpool
+import random
+import time
 
-app = FastAPI(title="payment-service")
-Instrumentator().instrument(app).expose(app)
+from .fraud import make_engine
+from .idempotency import CONFLICT, DUPLICATE_ORDER, IN_PROGRESS, REPLAY, fingerprint, make_store
+from .metrics import record_charge
 
-class EnterpriseMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        trace_id = request.headers.get("x-trace-id", str(uuid.uuid4()))
-        request.state.trace_id = trace_id
+# Logging: handlers only enqueue, a background thread writes app.log + stdout
+logger = setup_logging("payment-service")
 
-        user_id = request.headers.get("x-user-id", "unknown")
-        request.state.user_id = user_id
+app = FastAPI(title="payment-service")
+Instrumentator().instrument(app).expose(app)
 
-        start = time.time()
-        response = await call_next(request)
-        duration_ms = round((time.time() - start) * 1000, 2)
+# Bearer tokens from auth-service are verified locally (no auth round trip),
+# then tracing wraps everything
+app.add_middleware(TokenAuthMiddleware)
+app.add_middleware(TracingMiddleware, logger=logger)
 
-        logger.info(
-            f"[trace={trace_id}] [user={user_id}] [route={request.url.path}] [duration_ms={duration_ms}]"
-        )
+# Idempotency: one charge per payment id, one successful payment per order
+IDEMPOTENCY = make_store()
 
-        response.headers["x-trace-id"] = trace_id
-        return response
+# Fraud: sliding-window counters per user and order (shared by the workers with FRAUD_SHARED)
+FRAUD = make_engine()
 
-app.add_middleware(EnterpriseMiddleware)
+# /health and /ready: answered ahead of tracing and logging, from a cached dependency check
+HEALTH = HealthCheck("payment")
+HEALTH.add("idempotency_store", IDEMPOTENCY.ping)
+app.add_middleware(HealthMiddleware, health=HEALTH)
 
 class Payment(BaseModel):
     id: str
     order_id: str
     amount: float
 
-@app.get("/health")
-async def health(request: Request):
-    logger.info(f"[trace={request.state.trace_id}] [user={request.state.user_id}] payment health check")
-    return {"status": "ok", "service": "payment"}
-
 @app.post("/charge")
 async def charge(request: Request, p: Payment, response: Response):
+    started = time.perf_counter()
+    result = await handle_charge(request, p, response)
+    # business metrics (payments_total{outcome,error_type}, amounts, latency) for alerting
+    record_charge(result, started, replay=response.headers.get("idempotent-replayed") == "true")
+    return result
+
+
+async def handle_charge(request: Request, p: Payment, response: Response):
+    with start_span("idempotency.claim", payment_id=p.id, order_id=p.order_id):
+        outcome, record = await IDEMPOTENCY.claim(p.id, p.order_id, fingerprint(p.order_id, p.amount))
+
+    # Retry of a payment we already answered: same response, no second charge
+    if outcome == REPLAY:
+        logger.info(
+            f"[trace={request.state.trace_id}] [user={request.state.user_id}] "
+            f"event=payment_replay payment_id={p.id} order_id={p.order_id} amount={p.amount}",
+            extra=log_extra(request, event="payment_replay", order_id=p.order_id, amount=p.amount),
+        )
+        response.headers["x-trace-id"] = request.state.trace_id
+        response.headers["idempotent-replayed"] = "true"
+        return record.body
+
+    # Payment id reused for a different order/amount, or retried while the first try is running
+    if outcome in (CONFLICT, IN_PROGRESS):
+        error_type = "IdempotencyConflict" if outcome == CONFLICT else "PaymentInProgress"
+        logger.warning(
+            f"[trace={request.state.trace_id}] [user={request.state.user_id}] "
+            f"event=payment_validation error_type={error_type} payment_id={p.id} order_id={p.order_id} amount={p.amount}",
+            extra=log_extra(request, event="payment_validation", error_type=error_type,
+                            order_id=p.order_id, amount=p.amount),
+        )
+        return {
+            "status": "error",
+            "error_type": error_type,
+            "message": "Payment id already used for another request" if outcome == CONFLICT
+            else "Payment with this id is still being processed"
+        }
+
+    # Another payment already charged (or is charging) this order
+    if outcome == DUPLICATE_ORDER:
+        logger.warning(
+            f"[trace={request.state.trace_id}] [user={request.state.user_id}] "
+            f"event=payment_validation error_type=DuplicateTransaction order_id={p.order_id} amount={p.amount}",
+            extra=log_extra(request, event="payment_validation", error_type="DuplicateTransaction",
+                            order_id=p.order_id, amount=p.amount),
+        )
+        return {
+            "status": "error",
+            "error_type": "DuplicateTransaction",
+            "message": f"Order already paid by payment {record.payment_id if record else 'unknown'}"
+        }
+
+    try:
+        with start_span("charge", payment_id=p.id, amount=p.amount):
+            if FRAUD.blocking:
+                # shared fraud windows wait on a file lock: keep the event loop free meanwhile
+                result = await run_in_threadpool(process_charge, request, p, response)
+            else:
+                result = process_charge(request, p, response)
+    except Exception:
+        await IDEMPOTENCY.release(record)
+        raise
+    with start_span("idempotency.complete", status=result.get("status")):
+        if result.get("status") == "failed":
+            # transient failure: let a retry with the same id try again
+            await IDEMPOTENCY.release(record)
+        else:
+            await IDEMPOTENCY.complete(record, result, charged=result.get("status") == "ok")
+    return result
+
+
+def process_charge(request: Request, p: Payment, response: Response):
     # simulate a payment failure sometimes for testing alerts
         # --------------------------------------------------
     # 🔴 NON-INFRA (Application / Business) ERRORS
@@ -66,7 +122,9 @@ async def charge(request: Request, p: Payment, response: Response):
     if p.amount <= 0:
         logger.warning(
             f"[trace={request.state.trace_id}] [user={request.state.user_id}] "
-            f"event=payment_validation error_type=InvalidAmount order_id={p.order_id} amount={p.amount}"
+            f"event=payment_validation error_type=InvalidAmount order_id={p.order_id} amount={p.amount}",
+            extra=log_extra(request, event="payment_validation", error_type="InvalidAmount",
+                            order_id=p.order_id, amount=p.amount),
         )
         return {
             "status": "error",
@@ -78,7 +136,9 @@ async def charge(request: Request, p: Payment, response: Response):
     if p.order_id.endswith("DUP"):
         logger.warning(
             f"[trace={request.state.trace_id}] [user={request.state.user_id}] "
-            f"event=payment_validation error_type=DuplicateTransaction order_id={p.order_id} amount={p.amount}"
+            f"event=payment_validation error_type=DuplicateTransaction order_id={p.order_id} amount={p.amount}",
+            extra=log_extra(request, event="payment_validation", error_type="DuplicateTransaction",
+                            order_id=p.order_id, amount=p.amount),
         )
         return {
             "status": "error",
@@ -86,11 +146,14 @@ async def charge(request: Request, p: Payment, response: Response):
             "message": "This transaction appears to be duplicated"
         }
 
-    # Fraud detection block simulation (high amount)
-    if p.amount > 50000:
+    # Fraud detection: amount cap + per-user / per-order velocity windows (fraud_rules.json)
+    rule = FRAUD.check(request.state.user_id, p.order_id, p.amount)
+    if rule:
         logger.warning(
             f"[trace={request.state.trace_id}] [user={request.state.user_id}] "
-            f"event=payment_validation error_type=FraudBlocked order_id={p.order_id} amount={p.amount}"
+            f"event=payment_validation error_type=FraudBlocked order_id={p.order_id} amount={p.amount} rule={rule}",
+            extra=log_extra(request, event="payment_validation", error_type="FraudBlocked",
+                            order_id=p.order_id, amount=p.amount, rule=rule),
         )
         return {
             "status": "error",
@@ -106,7 +169,9 @@ async def charge(request: Request, p: Payment, response: Response):
     if fail:
         logger.error(
             f"[trace={request.state.trace_id}] [user={request.state.user_id}] "
-            f"event=payment_failure error_type=RandomFail order_id={p.order_id} amount={p.amount}"
+            f"event=payment_failure error_type=RandomFail order_id={p.order_id} amount={p.amount}",
+            extra=log_extra(request, event="payment_failure", error_type="RandomFail",
+                            order_id=p.order_id, amount=p.amount),
         )
         # still return 200 for demo, but include error in body
         response.headers["x-trace-id"] = request.state.trace_id
@@ -114,16 +179,14 @@ async def charge(request: Request, p: Payment, response: Response):
     else:
         logger.info(
             f"[trace={request.state.trace_id}] [user={request.state.user_id}] "
-            f"event=payment_success error_type=None order_id={p.order_id} amount={p.amount}"
+            f"event=payment_success error_type=None order_id={p.order_id} amount={p.amount}",
+            extra=log_extra(request, event="payment_success", error_type=None,
+                            order_id=p.order_id, amount=p.amount),
         )
         response.headers["x-trace-id"] = request.state.trace_id
         return {"status": "ok", "payment_id": p.id, "charged": p.amount}
 
-@app.get("/logs")
-async def get_logs(lines: int = 50):
-    try:
-        result = subprocess.run(["tail", "-n", str(lines), "/var/log/app.log"],
-                                capture_output=True, text=True, check=True)
-        return {"logs": result.stdout.splitlines()}
-    except subprocess.CalledProcessError as e:
-        return {"error": str(e)}
+# GET /logs: in-process, seek-based reader with filters and cursors
+app.include_router(logs_router())
+# GET/POST /loglevel: logger levels and per-route access-log rules at runtime
+app.include_router(loglevel_router())
@@ -0,0 +1,56 @@
+"""
+Business metrics for payment-service, next to the Instrumentator's HTTP ones.
+
+    payments_total{outcome, error_type}       every /charge answer
+    payment_charged_amount                    amounts actually charged
+    payment_charge_duration_seconds{outcome}  /charge handling time
+
+Labels only take values from fixed sets (anything unknown is "other") and
+every series is created at startup, so the scrape size never grows with
+traffic and rate() works from the first scrape. Alerts are queries on these
+(see prometheus-alerts.yml) instead of log scans.
+"""
+
+import time
+
+from prometheus_client import Counter, Histogram
+
+# outcome of a /charge call
+OUTCOMES = ("ok", "failed", "rejected", "replay")
+ERROR_TYPES = ("none", "InvalidAmount", "DuplicateTransaction", "FraudBlocked", "RandomFail",
+               "IdempotencyConflict", "PaymentInProgress", "other")
+
+PAYMENTS = Counter("payments_total", "Payment attempts by outcome and error type", ["outcome", "error_type"])
+CHARGED_AMOUNT = Histogram(
+    "payment_charged_amount", "Amount of successful charges",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000),
+)
+CHARGE_LATENCY = Histogram(
+    "payment_charge_duration_seconds", "Time to answer /charge, by outcome", ["outcome"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+# pre-bound children: no label lookup per request, and zero-valued series from the start
+_COUNTERS = {(o, e): PAYMENTS.labels(o, e) for o in OUTCOMES for e in ERROR_TYPES}
+_LATENCY = {o: CHARGE_LATENCY.labels(o) for o in OUTCOMES}
+
+
+def _outcome(result: dict, replay: bool) -> str:
+    if replay:
+        return "replay"
+    status = result.get("status")
+    if status == "ok":
+        return "ok"
+    return "failed" if status == "failed" else "rejected"
+
+
+def record_charge(result: dict, started: float, replay: bool = False):
+    """Count one /charge answer; `started` is a time.perf_counter() value."""
+    outcome = _outcome(result, replay)
+    error_type = result.get("error_type") or ("RandomFail" if outcome == "failed" else "none")
+    if error_type not in ERROR_TYPES:
+        error_type = "other"
+    _COUNTERS[outcome, error_type].inc()
+    _LATENCY[outcome].observe(time.perf_counter() - started)
+    if outcome == "ok":
+        CHARGED_AMOUNT.observe(result.get("charged") or 0)
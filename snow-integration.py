@@ -1,7 +1,17 @@
+import argparse
+import asyncio
+import os
 import pandas as pd
 import requests
 from datetime import datetime
 
+from snow.aggregate import IncidentAggregator, IncidentStore
+from snow.alerts import AlertReceiver, AlertStore
+from snow.csv_ingest import scan_csv_files
+from snow.elastic import Checkpoint, ElasticPoller, fields_of, message_of, run_forever
+from snow.matcher import IssueMatcher
+from snow.servicenow import Outbox, ServiceNowClient
+
 ###############################################
 # CONFIGURATION
 ###############################################
@@ -12,76 +22,95 @@ EXCEL_PATH = r"C:\Users\VParkavi\Downloads\Untitled discover search (1).csv"   #
 ELASTIC_URL = "http://localhost:9200/logs-*/_search"
 ELASTIC_USERNAME = "elastic"
 ELASTIC_PASSWORD = "changeme"
+# ---- MODE 2b: incremental polling daemon (point-in-time + search_after) ----
+ELASTIC_BASE = os.getenv("ELASTIC_BASE", "http://localhost:9200")
+ELASTIC_INDEX = "logs-*"
+POLL_INTERVAL = 30              # seconds between polls
+POLL_PAGE_SIZE = 1000
 
 # ---- ServiceNow Credentials ----
 #"https://<instance>.service-now.com/api/now/table/incident"
-SNOW_URL = "https://dev280340.service-now.com/api/now/table/incident"
+SNOW_URL = os.getenv("SNOW_URL", "https://dev280340.service-now.com/api/now/table/incident")
 SNOW_USER = "admin"
 SNOW_PASS = "xvY74%IVbQk$"
+SNOW_WORKERS = 8                # concurrent incident creations
+SNOW_RATE = 10                  # requests/second to the instance (token bucket)
+SNOW_BURST = 20
+TICKET_DEFAULTS = {
+    "urgency": "2",       # Medium
+    "impact": "2",        # Medium
+    "category": "Software"
+}
+SNOW_CLIENT = None              # set up in __main__
+
+# ---- Issue detection rules (first match wins) ----
+RULES_PATH = os.getenv("SNOW_RULES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "snow", "rules.json"))
+MATCHER = IssueMatcher.from_file(RULES_PATH)
+
+# ---- Incident aggregation (one ticket per issue group per window) ----
+AGGREGATE_WINDOW = 300          # seconds, 0 = one ticket per matching line (old behaviour)
+AGGREGATE_BY = []               # extra group keys, e.g. ["service"] or ["service", "order_id"]
+AGGREGATE_MAX_AGE = 24 * 3600   # seconds one incident keeps absorbing recurrences before a new ticket
+STATE_DB = os.getenv("SNOW_STATE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "snow_state.db"))
+AGGREGATOR = None               # set up in __main__
+
+# ---- MODE 3: Alertmanager webhook receiver ----
+ALERT_LISTEN = os.getenv("ALERT_LISTEN", "0.0.0.0:9095")
+ALERT_QUEUE = 1000              # alerts buffered before webhooks get 503 + Retry-After
 
 
 ###############################################
 # UTILITY FUNCTIONS
 ###############################################
 
-def detect_issue(log_message: str):
+def detect_issue(log_message: str, fields: dict = None):
     """
     SRE Issue Detection — Pattern Based
-    Matches payment-service log patterns
+    Matches payment-service log patterns (rules in snow/rules.json,
+    compiled once into MATCHER). `fields` can carry typed values
+    (error_type, amount, ...) for field-aware rules.
     """
-    log_message = str(log_message).lower()
-
-    patterns = {
-        # ---- PAYMENT VALIDATION ERRORS ----
-        "Invalid Amount": ["error_type=invalidamount"],
-        "Duplicate Transaction": ["error_type=duplicatetransaction"],
-        "Fraud Blocked": ["error_type=fraudblocked"],
-
-        # ---- PAYMENT CRITICAL FAILURES ----
-        "Random Failure": ["error_type=randomfail", "event=payment_failure"],
-
-        # ---- GENERIC PAYMENT FAILURES ----
-        "Payment Failure": ["payment failed", "transaction failed", "failed payment"],
+    return MATCHER.match(log_message, fields)
 
-        # ---- TIMEOUTS / NETWORK ----
-        #"Timeout Error": ["timeout", "connection timed out"],
 
-        # ---- INFRA (OPTIONAL) ----
-        #"Service Down": ["service unavailable", "503", "service down"],
-        #"Database Error": ["db error", "sql error", "connection refused"],
-    }
+def create_snow_ticket(short_desc, description):
+    """
+    Create ServiceNow Incident
+    Goes through SNOW_CLIENT (pooled, rate limited, retried); returns the
+    ticket number, "outbox:<id>" if it is queued for a later retry, or None.
+    """
+    ticket = SNOW_CLIENT.create(short_desc, description)
+    if ticket and not ticket.startswith("outbox:"):
+        print("✔ ServiceNow Ticket CREATED:", ticket)
+    return ticket
 
-    for issue_name, keywords in patterns.items():
-        if any(k in log_message for k in keywords):
-            return issue_name
 
-    return None
+def create_snow_tickets(items):
+    """create_snow_ticket() for a batch of (short_desc, description), concurrently."""
+    tickets = SNOW_CLIENT.create_many(items)
+    print(f"✔ {sum(1 for t in tickets if t and not t.startswith('outbox:'))}/{len(items)} ServiceNow Tickets CREATED")
+    return tickets
 
 
-def create_snow_ticket(short_desc, description):
+def report_issue(issue, message, timestamp, fields=None):
     """
-    Create ServiceNow Incident
+    Hand one detection over: straight to ServiceNow, or into the
+    aggregation window when AGGREGATOR is active.
     """
-    payload = {
-        "short_description": short_desc,
-        "description": description,
-        "urgency": "2",       # Medium
-        "impact": "2",        # Medium
-        "category": "Software"
-    }
+    print(f"\n🚨 Issue Detected: {issue}")
+    print("Log Message:", message)
 
-    response = requests.post(
-        SNOW_URL,
-        auth=(SNOW_USER, SNOW_PASS),
-        json=payload
-    )
-
-    if response.status_code in [200, 201]:
-        print("✔ ServiceNow Ticket CREATED")
-        print("RAW RESPONSE:", response.text)  # Debug
-    else:
-        print("❌ Failed to create ticket:", response.status_code, response.text)
+    if AGGREGATOR is not None:
+        AGGREGATOR.add(issue, message, timestamp, fields)
+        return
 
+    description = f"""
+Timestamp: {timestamp}
+Detected Issue: {issue}
+Log Message:
+{message}
+"""
+    SNOW_CLIENT.submit(issue, description)
 
 
 ###############################################
@@ -99,16 +128,22 @@ def read_logs_from_excel():
         issue = detect_issue(message)
 
         if issue:
-            print(f"\n🚨 Issue Detected: {issue}")
-            print("Log Message:", message)
+            report_issue(issue, message, timestamp)
 
-            description = f"""
-Timestamp: {timestamp}
-Detected Issue: {issue}
-Log Message:
-{message}
-"""
-            create_snow_ticket(issue, description)
+
+###############################################
+# MODE 1b — STREAM LARGE CSV EXPORTS (CHUNKED)
+###############################################
+
+def read_logs_from_csv_stream(paths, workers=None):
+    """
+    Same as MODE 1 for day-long exports: bounded chunks, only the needed
+    columns, vectorized candidate selection, one process per file.
+    """
+    print("📁 Streaming CSV exports:", ", ".join(paths))
+
+    for d in scan_csv_files(paths, RULES_PATH, workers=workers):
+        report_issue(d.issue, d.message, d.timestamp, d.fields)
 
 
 ###############################################
@@ -144,20 +179,114 @@ def read_logs_from_elastic():
         issue = detect_issue(message)
 
         if issue:
-            print(f"\n🚨 Issue Detected: {issue}")
-            print("Log Message:", message)
+            report_issue(issue, message, timestamp)
 
-            description = f"""
-Timestamp: {timestamp}
-Detected Issue: {issue}
-Log Message:
-{message}
-"""
-            create_snow_ticket(issue, description)
 
 
+###############################################
+# MODE 2b — POLL ELASTICSEARCH INCREMENTALLY
+###############################################
+
+def poll_elastic(base_url, interval, state_db, once=False):
+    """
+    Daemon version of MODE 2: every `interval` seconds, fetch only the
+    documents newer than the stored checkpoint that can match a rule,
+    page by page, and flush aggregated incidents after each cycle.
+    """
+    print(f"🔄 Polling {base_url}/{ELASTIC_INDEX} every {interval}s...")
+    poller = ElasticPoller(base_url, ELASTIC_INDEX, Checkpoint(state_db, f"elastic:{ELASTIC_INDEX}"),
+                           matcher=MATCHER, auth=(ELASTIC_USERNAME, ELASTIC_PASSWORD),
+                           page_size=POLL_PAGE_SIZE)
+
+    def handle(doc_id, source):
+        message = message_of(source)
+        fields = fields_of(source)
+        issue = detect_issue(message, fields)
+        if issue:
+            report_issue(issue, message, source.get("@timestamp"), fields)
+
+    def end_of_cycle():
+        if AGGREGATOR is not None:
+            AGGREGATOR.flush()
+        print(f"⏱ cycle done: {poller.stats['docs']} new docs in {poller.stats['pages']} pages")
+        poller.stats.update(docs=0, pages=0)
+
+    run_forever(poller, handle, interval=interval, once=once, on_cycle=end_of_cycle)
+
+
+###############################################
+# MODE 3 — RECEIVE ALERTMANAGER WEBHOOKS
+###############################################
+
+def receive_alerts(listen, alert_store, queue_size):
+    """
+    Long-running mode: Alertmanager posts to http://<listen>/alerts and every
+    new firing alert (by fingerprint) becomes one incident right away.
+    """
+    host, _, port = listen.rpartition(":")
+    receiver = AlertReceiver(SNOW_CLIENT, alert_store, MATCHER, queue_size=queue_size)
+    try:
+        asyncio.run(receiver.serve(host or "0.0.0.0", int(port)))
+    except KeyboardInterrupt:
+        pass
+    print(f"\n📊 alerts: {receiver.stats}")
 
 
 if __name__ == "__main__":
-    read_logs_from_excel()
-    # read_logs_from_elastic()
+    parser = argparse.ArgumentParser(description="Detect issues in service logs and raise ServiceNow incidents")
+    parser.add_argument("--mode", choices=["excel", "csv-stream", "elastic", "elastic-poll", "alert-receiver"], default="excel")
+    parser.add_argument("--csv", nargs="+", default=[EXCEL_PATH], help="CSV export(s) for --mode csv-stream")
+    parser.add_argument("--workers", type=int, help="processes for multi-file csv-stream")
+    parser.add_argument("--window", type=float, default=AGGREGATE_WINDOW,
+                        help="aggregation window in seconds (0 = one ticket per line)")
+    parser.add_argument("--group-by", default=",".join(AGGREGATE_BY),
+                        help="extra grouping keys, e.g. service,order_id")
+    parser.add_argument("--max-age", type=float, default=AGGREGATE_MAX_AGE,
+                        help="seconds one incident may span before a recurrence gets a new ticket")
+    parser.add_argument("--state-db", default=STATE_DB, help="SQLite file with open incidents and poll checkpoint")
+    parser.add_argument("--es", default=ELASTIC_BASE, help="Elasticsearch base URL for --mode elastic-poll")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="seconds between elastic-poll cycles")
+    parser.add_argument("--once", action="store_true", help="run a single elastic-poll cycle and exit")
+    parser.add_argument("--listen", default=ALERT_LISTEN, help="host:port for --mode alert-receiver")
+    parser.add_argument("--queue", type=int, default=ALERT_QUEUE, help="alert-receiver queue size")
+    args = parser.parse_args()
+
+    store = IncidentStore(args.state_db) if args.window > 0 else None
+    alert_store = AlertStore(args.state_db) if args.mode == "alert-receiver" else None
+
+    def on_created(ref, ticket):
+        # an incident parked in the outbox got created on a later drain
+        if store is not None:
+            store.set_ticket(ref, ticket)
+        if alert_store is not None:
+            alert_store.replace_ticket(ref, ticket)
+
+    SNOW_CLIENT = ServiceNowClient(SNOW_URL, (SNOW_USER, SNOW_PASS), workers=SNOW_WORKERS,
+                                   rate=SNOW_RATE, burst=SNOW_BURST, outbox=Outbox(args.state_db),
+                                   on_created=on_created,
+                                   defaults=TICKET_DEFAULTS)
+    SNOW_CLIENT.drain_outbox()
+
+    if store is not None:
+        group_by = [k for k in args.group_by.split(",") if k]
+        AGGREGATOR = IncidentAggregator(store, create_snow_ticket, window=args.window, group_by=group_by,
+                                        create_tickets=create_snow_tickets, max_age=args.max_age)
+
+    if args.mode == "csv-stream":
+        read_logs_from_csv_stream(args.csv, args.workers)
+    elif args.mode == "elastic":
+        read_logs_from_elastic()
+    elif args.mode == "elastic-poll":
+        poll_elastic(args.es, args.interval, args.state_db, once=args.once)
+    elif args.mode == "alert-receiver":
+        receive_alerts(args.listen, alert_store, args.queue)
+    else:
+        read_logs_from_excel()
+
+    if AGGREGATOR is not None:
+        AGGREGATOR.flush()
+        print(f"\n📊 {AGGREGATOR.stats['detections']} detections -> "
+              f"{AGGREGATOR.stats['tickets']} new tickets, {AGGREGATOR.stats['merged']} already open, "
+              f"{AGGREGATOR.stats['closed']} aged out")
+    SNOW_CLIENT.close()
+    print("🎫 ServiceNow:", SNOW_CLIENT.report())
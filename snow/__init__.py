@@ -0,0 +1,6 @@
+"""
+Building blocks for snow-integration.py (log -> ServiceNow incident bridge).
+
+snow-integration.py stays the entry point; the heavier pieces live here so
+they can be benchmarked and reused without running the script.
+"""
@@ -0,0 +1,238 @@
+"""
+Incident aggregation before ServiceNow ticket creation.
+
+Detections are grouped by issue (optionally also by service / order_id)
+inside a time window; each group becomes ONE ticket carrying the count,
+first/last timestamps and a few sample trace ids. A small SQLite store keeps
+the open incidents, so a rerun over the same export (or a burst that spans
+two runs) updates the existing incident instead of filing a new one.
+
+An incident absorbs new bursts for at most MAX_AGE (measured on the
+detection timestamps, so reruns of old exports behave the same): an issue
+that keeps recurring gets a fresh ticket every MAX_AGE instead of growing
+one stale ticket forever, and incidents that can no longer absorb anything
+are closed.
+"""
+
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+from .matcher import parse_fields
+
+SAMPLE_TRACES = 5
+# longest span one incident may cover before a recurrence gets its own ticket
+MAX_AGE = 24 * 3600
+
+_TS_FORMATS = ("%b %d, %Y @ %H:%M:%S.%f",)  # Kibana "Discover" CSV export
+
+
+def parse_ts(value) -> float:
+    """Epoch seconds from an epoch number or an ISO / Kibana timestamp, or now if unparseable."""
+    if value is None or value != value:  # None / NaN
+        return time.time()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    text = str(value).strip()
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        pass
+    for fmt in _TS_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+class IncidentGroup:
+    def __init__(self, key, issue, ts, message):
+        self.key = key
+        self.issue = issue
+        self.count = 0
+        self.first_ts = ts
+        self.last_ts = ts
+        self.sample_message = message
+        self.trace_ids = []
+
+    def add(self, ts, trace_id):
+        self.count += 1
+        self.first_ts = min(self.first_ts, ts)
+        self.last_ts = max(self.last_ts, ts)
+        if trace_id and trace_id not in self.trace_ids and len(self.trace_ids) < SAMPLE_TRACES:
+            self.trace_ids.append(trace_id)
+
+    @property
+    def short_description(self) -> str:
+        scope = " / ".join(part for part in self.key.split("|")[1:] if part)
+        suffix = f" [{scope}]" if scope else ""
+        return f"{self.issue}{suffix} x{self.count}"
+
+    def description(self) -> str:
+        return f"""
+Detected Issue: {self.issue}
+Group: {self.key}
+Occurrences: {self.count}
+First Seen: {_iso(self.first_ts)}
+Last Seen: {_iso(self.last_ts)}
+Sample Trace IDs: {", ".join(self.trace_ids) or "-"}
+Sample Log Message:
+{self.sample_message}
+"""
+
+
+class IncidentStore:
+    """Open incidents per group key, in SQLite."""
+
+    def __init__(self, path: str):
+        self.db = sqlite3.connect(path)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS incidents (
+                id         INTEGER PRIMARY KEY,
+                group_key  TEXT NOT NULL,
+                ticket     TEXT,
+                count      INTEGER NOT NULL,
+                first_ts   REAL NOT NULL,
+                last_ts    REAL NOT NULL,
+                state      TEXT NOT NULL DEFAULT 'open'
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS incidents_open ON incidents (group_key, state, last_ts)")
+        self.db.commit()
+
+    def find(self, key, first_ts, last_ts, window, max_age=MAX_AGE):
+        """
+        The incident for `key` that [first_ts, last_ts] belongs to: one that
+        already covers it (a replay, even if closed since), else an open one
+        whose range touches [first_ts - window, last_ts + window] and would
+        still span at most `max_age` with this range folded in.
+        """
+        return self.db.execute(
+            "SELECT id, ticket, count, first_ts, last_ts FROM incidents "
+            "WHERE group_key = ? AND ("
+            "  (first_ts <= ? AND last_ts >= ?) OR "
+            "  (state = 'open' AND last_ts >= ? AND first_ts <= ? AND max(last_ts, ?) - min(first_ts, ?) <= ?)) "
+            "ORDER BY first_ts <= ? AND last_ts >= ? DESC, last_ts DESC LIMIT 1",
+            (key, first_ts, last_ts, first_ts - window, last_ts + window, last_ts, first_ts, max_age,
+             first_ts, last_ts),
+        ).fetchone()
+
+    def insert(self, group, ticket):
+        self.db.execute(
+            "INSERT INTO incidents (group_key, ticket, count, first_ts, last_ts) VALUES (?, ?, ?, ?, ?)",
+            (group.key, ticket, group.count, group.first_ts, group.last_ts),
+        )
+        self.db.commit()
+
+    def extend(self, row_id, group, replayed: bool):
+        # a rerun over the same data must not double the count
+        self.db.execute(
+            "UPDATE incidents SET count = CASE WHEN ? THEN max(count, ?) ELSE count + ? END, "
+            "first_ts = min(first_ts, ?), last_ts = max(last_ts, ?) WHERE id = ?",
+            (replayed, group.count, group.count, group.first_ts, group.last_ts, row_id),
+        )
+        self.db.commit()
+
+    def set_ticket(self, old, new):
+        """Swap a placeholder ("outbox:<id>") for the real ticket once it exists."""
+        self.db.execute("UPDATE incidents SET ticket = ? WHERE ticket = ?", (new, old))
+        self.db.commit()
+
+    def close(self, ticket):
+        self.db.execute("UPDATE incidents SET state = 'closed' WHERE ticket = ?", (ticket,))
+        self.db.commit()
+
+    def close_before(self, ts) -> int:
+        """Close open incidents whose last detection is older than `ts`; returns how many."""
+        cur = self.db.execute("UPDATE incidents SET state = 'closed' WHERE state = 'open' AND last_ts < ?", (ts,))
+        self.db.commit()
+        return cur.rowcount
+
+
+class IncidentAggregator:
+    """
+    agg = IncidentAggregator(store, create_ticket, window=300, group_by=("service",))
+    for d in detections: agg.add(d.issue, d.message, d.timestamp, fields)
+    agg.flush()
+
+    `create_ticket(short_desc, description)` must return the ticket id/number
+    (or None on failure, in which case nothing is recorded and a rerun retries).
+    `create_tickets([(short_desc, description), ...])`, if given, is used by
+    flush() to file all new incidents in one concurrent batch.
+    flush() also closes incidents last seen more than `max_age` + `window`
+    before the newest detection it handled (nothing could merge into them).
+    """
+
+    def __init__(self, store: IncidentStore, create_ticket, window: float = 300, group_by=(),
+                 create_tickets=None, max_age: float = MAX_AGE):
+        self.store = store
+        self.create_ticket = create_ticket
+        self.create_tickets = create_tickets
+        self.window = window
+        self.max_age = max_age
+        self.group_by = tuple(group_by)
+        self.groups = {}
+        self.newest = None  # latest detection timestamp seen
+        self.stats = {"detections": 0, "tickets": 0, "merged": 0, "closed": 0}
+
+    def _key(self, issue, fields):
+        return "|".join([issue] + [str(fields.get(name) or "") for name in self.group_by])
+
+    def add(self, issue, message, timestamp=None, fields=None):
+        self.stats["detections"] += 1
+        parsed = parse_fields(str(message))
+        if fields:
+            parsed.update({k: v for k, v in fields.items() if v is not None})
+        ts = parse_ts(timestamp)
+        self.newest = ts if self.newest is None else max(self.newest, ts)
+        key = self._key(issue, parsed)
+
+        group = self.groups.get(key)
+        if group is not None and max(group.last_ts, ts) - min(group.first_ts, ts) > self.window:
+            # outside the window: close this group out and start a new one
+            self._emit(group)
+            group = None
+        if group is None:
+            group = self.groups[key] = IncidentGroup(key, issue, ts, message)
+        group.add(ts, parsed.get("trace_id"))
+
+    def flush(self):
+        groups = list(self.groups.values())
+        self.groups.clear()
+        if self.create_tickets is None:
+            for group in groups:
+                self._emit(group)
+        else:
+            new = [group for group in groups if not self._merge(group)]
+            if new:
+                tickets = self.create_tickets([(g.short_description, g.description()) for g in new])
+                for group, ticket in zip(new, tickets):
+                    self._record(group, ticket)
+        if self.newest is not None:
+            self.stats["closed"] += self.store.close_before(self.newest - self.max_age - self.window)
+
+    def _merge(self, group) -> bool:
+        """Fold `group` into an already open incident, if there is one."""
+        existing = self.store.find(group.key, group.first_ts, group.last_ts, self.window, self.max_age)
+        if not existing:
+            return False
+        row_id, ticket, _, first_ts, last_ts = existing
+        replayed = first_ts <= group.first_ts and group.last_ts <= last_ts
+        self.store.extend(row_id, group, replayed)
+        self.stats["merged"] += 1
+        print(f"↺ {group.short_description} already open as {ticket}, not refiling")
+        return True
+
+    def _record(self, group, ticket):
+        if ticket is not None:
+            self.store.insert(group, ticket)
+            self.stats["tickets"] += 1
+
+    def _emit(self, group):
+        self.groups.pop(group.key, None)
+        if not self._merge(group):
+            self._record(group, self.create_ticket(group.short_description, group.description()))
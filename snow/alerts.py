@@ -0,0 +1,293 @@
+"""
+Alertmanager webhook receiver: alerts in, ServiceNow incidents out, as they arrive.
+
+    store = AlertStore("snow_state.db")
+    receiver = AlertReceiver(client, store, matcher)
+    asyncio.run(receiver.serve("0.0.0.0", 9095))
+
+POST /alerts takes the Alertmanager webhook payload ({"alerts": [...]}).
+Alerts are mapped onto the issue categories of snow/rules.json (labels and
+annotations are matched like a log line, e.g. error_type=FraudBlocked ->
+"Fraud Blocked"); alerts no rule knows keep their alertname.
+
+Alertmanager re-sends firing alerts every group/repeat interval, so alerts
+are deduped by their fingerprint: one incident per fingerprint while it is
+firing, and a new one only if it fires again after being resolved.
+
+The HTTP side only validates and enqueues into a bounded queue; a few
+workers create the incidents through the ServiceNowClient. When a burst
+would overflow the queue the whole payload is refused with 503 +
+Retry-After and Alertmanager retries it later (duplicates are harmless,
+see above). GET /stats shows the counters, GET /health answers ok.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+
+QUEUE_SIZE = 1000
+MAX_BODY = 4 * 1024 * 1024
+
+
+def fingerprint_of(alert: dict) -> str:
+    """Alertmanager's fingerprint, or a stable hash of the labels if a sender leaves it out."""
+    fp = alert.get("fingerprint")
+    if fp:
+        return fp
+    labels = json.dumps(alert.get("labels") or {}, sort_keys=True)
+    return hashlib.sha1(labels.encode()).hexdigest()[:16]
+
+
+def alert_issue(alert: dict, matcher):
+    """(issue, message, fields) for one alert, categorised with the log rules."""
+    labels = alert.get("labels") or {}
+    annotations = alert.get("annotations") or {}
+    fields = {k: str(v) for k, v in labels.items()}
+    text = " ".join(f"{k}={v}" for k, v in labels.items())
+    notes = " ".join(str(v) for v in annotations.values())
+    message = f"{text} {notes}".strip()
+    issue = matcher.match(message, fields) if matcher is not None else None
+    return issue or labels.get("issue") or f"Alert: {labels.get('alertname', 'unknown')}", message, fields
+
+
+def describe(alert: dict, issue: str) -> str:
+    labels = alert.get("labels") or {}
+    annotations = alert.get("annotations") or {}
+    lines = [
+        f"Detected Issue: {issue}",
+        f"Alert: {labels.get('alertname', 'unknown')} ({labels.get('severity', 'n/a')})",
+        f"Started: {alert.get('startsAt', 'n/a')}",
+        f"Fingerprint: {fingerprint_of(alert)}",
+    ]
+    if annotations.get("summary"):
+        lines.append(f"Summary: {annotations['summary']}")
+    if annotations.get("description"):
+        lines.append(f"Details: {annotations['description']}")
+    lines.append("Labels: " + ", ".join(f"{k}={v}" for k, v in sorted(labels.items())))
+    if alert.get("generatorURL"):
+        lines.append(f"Source: {alert['generatorURL']}")
+    return "\n".join(lines)
+
+
+class AlertStore:
+    """Firing alerts by fingerprint and their ticket; survives receiver restarts."""
+
+    def __init__(self, path: str):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS alerts (
+                fingerprint  TEXT PRIMARY KEY,
+                issue        TEXT NOT NULL,
+                status       TEXT NOT NULL,
+                ticket       TEXT,
+                starts_at    TEXT,
+                first_seen   REAL NOT NULL,
+                last_seen    REAL NOT NULL,
+                repeats      INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        self.db.commit()
+        # the hot path (duplicate re-sends) is a dict lookup, not a query
+        self.firing = {fp for (fp,) in self.db.execute("SELECT fingerprint FROM alerts WHERE status = 'firing'")}
+
+    def claim(self, fp: str, issue: str, starts_at: str) -> bool:
+        """True if this firing alert needs an incident, False if one is already open for it."""
+        now = time.time()
+        if fp in self.firing:
+            self.db.execute("UPDATE alerts SET last_seen = ?, repeats = repeats + 1 WHERE fingerprint = ?", (now, fp))
+            self.db.commit()
+            return False
+        self.db.execute(
+            "INSERT INTO alerts (fingerprint, issue, status, starts_at, first_seen, last_seen) "
+            "VALUES (?, ?, 'firing', ?, ?, ?) ON CONFLICT (fingerprint) DO UPDATE SET "
+            "issue = excluded.issue, status = 'firing', ticket = NULL, starts_at = excluded.starts_at, "
+            "first_seen = excluded.first_seen, last_seen = excluded.last_seen, repeats = 0",
+            (fp, issue, starts_at, now, now),
+        )
+        self.db.commit()
+        self.firing.add(fp)
+        return True
+
+    def set_ticket(self, fp: str, ticket):
+        self.db.execute("UPDATE alerts SET ticket = ? WHERE fingerprint = ?", (ticket, fp))
+        self.db.commit()
+
+    def replace_ticket(self, old: str, new: str):
+        """ServiceNowClient on_created hook: an outbox placeholder became a real ticket."""
+        self.db.execute("UPDATE alerts SET ticket = ? WHERE ticket = ?", (new, old))
+        self.db.commit()
+
+    def forget(self, fp: str):
+        """Incident could not be created: let the next re-send try again."""
+        self.firing.discard(fp)
+        self.db.execute("DELETE FROM alerts WHERE fingerprint = ?", (fp,))
+        self.db.commit()
+
+    def resolve(self, fp: str):
+        """Returns the ticket of the incident this alert had, if any."""
+        if fp not in self.firing:
+            return None
+        self.firing.discard(fp)
+        row = self.db.execute("SELECT ticket FROM alerts WHERE fingerprint = ?", (fp,)).fetchone()
+        self.db.execute("UPDATE alerts SET status = 'resolved', last_seen = ? WHERE fingerprint = ?",
+                        (time.time(), fp))
+        self.db.commit()
+        return row[0] if row else None
+
+
+class AlertReceiver:
+    def __init__(self, client, store: AlertStore, matcher=None, queue_size: int = QUEUE_SIZE, workers: int = None):
+        self.client = client
+        self.store = store
+        self.matcher = matcher
+        self.queue_size = queue_size
+        self.workers = workers or getattr(client, "workers", 4)
+        self.queue = None
+        self.tasks = []
+        self.server = None
+        self.stats = {"received": 0, "created": 0, "deduped": 0, "resolved": 0, "failed": 0, "refused": 0}
+
+    # ------------------------------------------------------------------ processing
+
+    async def _handle(self, alert: dict):
+        fp = fingerprint_of(alert)
+        if alert.get("status") == "resolved":
+            ticket = self.store.resolve(fp)
+            if ticket:
+                self.stats["resolved"] += 1
+                print(f"✅ Alert resolved: {fp} (ticket {ticket})")
+            return
+
+        issue, message, fields = alert_issue(alert, self.matcher)
+        if not self.store.claim(fp, issue, alert.get("startsAt")):
+            self.stats["deduped"] += 1
+            return
+
+        print(f"\n🚨 Alert: {issue} [{fields.get('alertname', '?')}] fingerprint={fp}")
+        future = self.client.submit(issue, describe(alert, issue))
+        ticket = await asyncio.wrap_future(future)
+        if ticket:
+            self.store.set_ticket(fp, ticket)
+            self.stats["created"] += 1
+        else:
+            self.store.forget(fp)
+            self.stats["failed"] += 1
+
+    async def _worker(self):
+        while True:
+            alert = await self.queue.get()
+            try:
+                await self._handle(alert)
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"❌ alert handling failed: {e}")
+            finally:
+                self.queue.task_done()
+
+    def offer(self, payload: dict):
+        """Enqueue every alert of a webhook payload, or none of them. Returns False when full."""
+        if not isinstance(payload, dict):
+            raise ValueError("payload must be a JSON object")
+        alerts = payload.get("alerts")
+        if not isinstance(alerts, list) or not all(isinstance(alert, dict) for alert in alerts):
+            raise ValueError("payload has no alerts list")
+        if self.queue.maxsize - self.queue.qsize() < len(alerts):
+            self.stats["refused"] += len(alerts)
+            return False
+        for alert in alerts:
+            self.queue.put_nowait(alert)
+        self.stats["received"] += len(alerts)
+        return True
+
+    # ------------------------------------------------------------------ HTTP
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        method, path, _ = line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            raw = await reader.readline()
+            if raw in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = raw.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY:
+            raise ValueError("payload too large")
+        body = await reader.readexactly(length) if length else b""
+        return method, path.split("?", 1)[0], headers, body
+
+    @staticmethod
+    def _response(status: int, payload: dict, extra_headers=()) -> bytes:
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 503: "Service Unavailable"}
+        body = json.dumps(payload).encode()
+        head = [f"HTTP/1.1 {status} {reasons.get(status, 'OK')}", "Content-Type: application/json",
+                f"Content-Length: {len(body)}", *extra_headers]
+        return ("\r\n".join(head) + "\r\n\r\n").encode() + body
+
+    def _route(self, method, path, body) -> bytes:
+        if method == "POST" and path in ("/alerts", "/"):
+            try:
+                accepted = self.offer(json.loads(body or b"{}"))
+            except ValueError as e:
+                return self._response(400, {"error": str(e)})
+            if not accepted:
+                return self._response(503, {"error": "alert queue full"}, ["Retry-After: 5"])
+            return self._response(200, {"status": "accepted", "queued": self.queue.qsize()})
+        if method == "GET" and path == "/stats":
+            return self._response(200, {**self.stats, "queued": self.queue.qsize(), "firing": len(self.store.firing)})
+        if method == "GET" and path == "/health":
+            return self._response(200, {"status": "ok"})
+        return self._response(404, {"error": f"no route {method} {path}"})
+
+    async def _connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError) as e:
+                    writer.write(self._response(400, {"error": str(e)}, ["Connection: close"]))
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                writer.write(self._route(method, path, body))
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # ------------------------------------------------------------------ lifecycle
+
+    async def start(self, host: str = "0.0.0.0", port: int = 9095):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self.server = await asyncio.start_server(self._connection, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self, timeout: float = 30):
+        """Stop accepting, give queued alerts `timeout` seconds to become incidents."""
+        self.server.close()
+        await self.server.wait_closed()
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠ {self.queue.qsize()} alerts still queued at shutdown (Alertmanager will re-send them)")
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def serve(self, host: str = "0.0.0.0", port: int = 9095):
+        port = await self.start(host, port)
+        print(f"📡 Alert receiver on http://{host}:{port}/alerts")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
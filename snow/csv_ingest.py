@@ -0,0 +1,157 @@
+"""
+Streaming ingestion of Kibana CSV exports.
+
+Instead of loading the whole export and walking it with iterrows(), the file
+is read in bounded chunks with only the columns we use, the message columns
+are coalesced column-wise, and candidate rows are picked with one vectorized
+regex over the chunk before the exact rule match. Peak memory is one chunk,
+whatever the size of the export. Several files are spread over a process pool,
+whose workers send their detections back in small batches as they go.
+"""
+
+import multiprocessing
+import os
+import queue
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from .matcher import IssueMatcher
+
+MESSAGE_COLUMNS = ["message", "event.original", "msg"]
+TIMESTAMP_COLUMN = "@timestamp"
+# typed fields from LOG_FORMAT=json exports, passed to field-aware rules
+FIELD_COLUMNS = ["error_type", "event", "amount", "duration_ms", "route", "order_id", "trace_id", "user_id", "service"]
+
+CHUNK_ROWS = 50_000
+# detections per message from a worker, and messages in flight per worker
+RESULT_BATCH = 1000
+RESULT_QUEUE = 4
+
+
+class Detection:
+    __slots__ = ("issue", "message", "timestamp", "source", "fields")
+
+    def __init__(self, issue, message, timestamp, source, fields=None):
+        self.issue = issue
+        self.message = message
+        self.timestamp = timestamp
+        self.source = source
+        self.fields = fields
+
+
+def _wanted(column: str) -> bool:
+    return column in MESSAGE_COLUMNS or column == TIMESTAMP_COLUMN or column in FIELD_COLUMNS
+
+
+def scan_csv(path, matcher: IssueMatcher, chunksize: int = CHUNK_ROWS):
+    """Yield a Detection for every matching row of one CSV export."""
+    prefilter = matcher.prefilter
+    for chunk in pd.read_csv(path, usecols=_wanted, dtype=str, chunksize=chunksize):
+        present = [c for c in MESSAGE_COLUMNS if c in chunk.columns]
+        if not present:
+            continue
+
+        # first non-empty of message / event.original / msg, column-wise
+        messages = chunk[present[0]]
+        for col in present[1:]:
+            messages = messages.where(messages.notna() & (messages != ""), chunk[col])
+        messages = messages.fillna("")
+
+        if prefilter is not None:
+            # vectorized candidate selection, exact rule resolution only on hits
+            mask = messages.str.lower().str.contains(prefilter, regex=True)
+            candidates = messages[mask]
+            if candidates.empty:
+                continue
+            issues = matcher.match_many(candidates.tolist())
+        else:
+            # field rules can match any row: hand every row over with its typed columns
+            candidates = messages
+            field_cols = [c for c in FIELD_COLUMNS if c in chunk.columns]
+            fields = None
+            if field_cols:
+                typed = chunk[field_cols].astype(object)
+                fields = typed.where(typed.notna(), None).to_dict("records")
+            issues = matcher.match_many(candidates.tolist(), fields)
+
+        timestamps = chunk[TIMESTAMP_COLUMN] if TIMESTAMP_COLUMN in chunk.columns else None
+        typed_cols = [c for c in FIELD_COLUMNS if c in chunk.columns]
+        for idx, message, issue in zip(candidates.index, candidates.tolist(), issues):
+            if issue:
+                ts = timestamps.at[idx] if timestamps is not None else None
+                # typed columns of the hit (service, order_id...) for grouping downstream
+                row = {c: chunk.at[idx, c] for c in typed_cols if pd.notna(chunk.at[idx, c])}
+                yield Detection(issue, message, ts, path, row or None)
+
+
+# worker side of scan_csv_files(), set up by the pool initializer
+_results = None
+_stop = None
+
+
+def _init_worker(results, stop):
+    global _results, _stop
+    _results, _stop = results, stop
+
+
+def _scan_file(path, rules_path, chunksize):
+    # batches go through a bounded queue as they are found: a worker blocks
+    # when the consumer falls behind instead of collecting the whole file
+    matcher = IssueMatcher.from_file(rules_path)
+    batch = []
+    for d in scan_csv(path, matcher, chunksize):
+        batch.append((d.issue, d.message, d.timestamp, d.source, d.fields))
+        if len(batch) >= RESULT_BATCH:
+            if _stop.is_set():
+                return
+            _results.put(batch)
+            batch = []
+    if batch:
+        _results.put(batch)
+    _results.put(None)  # this file is done
+
+
+def scan_csv_files(paths, rules_path, workers: int = None, chunksize: int = CHUNK_ROWS):
+    """
+    Detections from several exports. One file per worker process; each
+    worker streams its file chunk by chunk and sends back the matching rows
+    in batches of RESULT_BATCH while it goes, so memory stays flat however
+    many rows match.
+    """
+    paths = list(paths)
+    if len(paths) == 1:
+        matcher = IssueMatcher.from_file(rules_path)
+        yield from scan_csv(paths[0], matcher, chunksize)
+        return
+
+    workers = workers or min(len(paths), os.cpu_count() or 1)
+    results = multiprocessing.Queue(maxsize=workers * RESULT_QUEUE)
+    stop = multiprocessing.Event()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(results, stop)) as pool:
+        futures = [pool.submit(_scan_file, p, rules_path, chunksize) for p in paths]
+        try:
+            running = len(futures)
+            while running:
+                try:
+                    batch = results.get(timeout=0.5)
+                except queue.Empty:
+                    for future in futures:
+                        if future.done() and future.exception() is not None:
+                            raise future.exception()
+                    continue
+                if batch is None:
+                    running -= 1
+                    continue
+                for row in batch:
+                    yield Detection(*row)
+        finally:
+            # stopped early or failed: let blocked workers finish their put and return
+            stop.set()
+            for future in futures:
+                future.cancel()
+            while not all(future.done() for future in futures):
+                try:
+                    results.get(timeout=0.1)
+                except queue.Empty:
+                    pass
@@ -0,0 +1,199 @@
+"""
+Incremental Elasticsearch poller for snow-integration.
+
+Each cycle opens a point-in-time, pages through everything newer than the
+stored checkpoint with search_after (oldest first, no 200-hit ceiling),
+and only asks ES for documents that can match a rule at all. The checkpoint
+(last @timestamp + ids already seen at that exact timestamp) lives in the
+same SQLite file as the open incidents, so restarts pick up where they left off.
+"""
+
+import json
+import sqlite3
+import time
+
+import requests
+
+SOURCE_FIELDS = [
+    "@timestamp", "message", "event.original", "msg",
+    "error_type", "event", "service", "order_id", "trace_id", "user_id", "amount", "duration_ms",
+]
+FIELD_NAMES = ["error_type", "event", "service", "order_id", "trace_id", "user_id", "amount", "duration_ms"]
+
+
+class Checkpoint:
+    """Last processed @timestamp (+ ids at that timestamp), in SQLite."""
+
+    def __init__(self, path: str, name: str):
+        self.name = name
+        self.db = sqlite3.connect(path)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                name  TEXT PRIMARY KEY,
+                ts    TEXT,
+                ids   TEXT NOT NULL DEFAULT '[]'
+            )""")
+        self.db.commit()
+
+    def load(self):
+        row = self.db.execute("SELECT ts, ids FROM checkpoints WHERE name = ?", (self.name,)).fetchone()
+        if not row:
+            return None, set()
+        return row[0], set(json.loads(row[1]))
+
+    def save(self, ts, ids):
+        self.db.execute(
+            "INSERT INTO checkpoints (name, ts, ids) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET ts = excluded.ts, ids = excluded.ids",
+            (self.name, ts, json.dumps(sorted(ids))),
+        )
+        self.db.commit()
+
+
+def narrowing_clauses(matcher):
+    """
+    ES `should` clauses that every matching doc satisfies, derived from the
+    keyword rules: "key=value" keywords become term lookups on the parsed
+    field (filled by both logstash pipelines) plus a phrase on the raw line,
+    everything else a phrase on the message. None if field rules exist (those can match anything).
+    """
+    if matcher.prefilter is None:
+        return None
+    terms, phrases = {}, []
+    for keyword in matcher.keywords:
+        field, sep, value = keyword.partition("=")
+        if sep and field.isidentifier() and value:
+            terms.setdefault(field, []).append(value)
+        else:
+            phrases.append(keyword)
+    clauses = [
+        {"term": {field: {"value": value, "case_insensitive": True}}}
+        for field, values in terms.items() for value in values
+    ]
+    for phrase in phrases:
+        clauses.append({"match_phrase": {"message": phrase}})
+        # logs that never went through the grok/json pipelines only have the raw line
+        clauses.append({"match_phrase": {"event.original": phrase}})
+    for field, values in terms.items():
+        for value in values:
+            clauses.append({"match_phrase": {"message": f"{field}={value}"}})
+    return clauses
+
+
+class ElasticPoller:
+    """
+    poller = ElasticPoller("http://localhost:9200", "logs-*", checkpoint, matcher)
+    for doc_id, source in poller.poll():   # one cycle, oldest first
+        ...
+    poller.commit()                # after the detections were handed off
+    """
+
+    def __init__(self, base_url, index, checkpoint: Checkpoint, matcher=None, auth=None,
+                 page_size: int = 1000, keep_alive: str = "1m", timeout: float = 30):
+        self.base_url = base_url.rstrip("/")
+        self.index = index
+        self.checkpoint = checkpoint
+        self.page_size = page_size
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.auth = auth
+        self.should = narrowing_clauses(matcher) if matcher is not None else None
+        self._pending = None
+        self.stats = {"pages": 0, "docs": 0}
+
+    def _query(self, since):
+        filters = []
+        if since:
+            filters.append({"range": {"@timestamp": {"gte": since}}})
+        if self.should:
+            filters.append({"bool": {"should": self.should, "minimum_should_match": 1}})
+        return {"bool": {"filter": filters}} if filters else {"match_all": {}}
+
+    def _post(self, path, body):
+        r = self.session.post(f"{self.base_url}{path}", json=body, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def poll(self):
+        """Yield (doc_id, _source) for every new matching-candidate document."""
+        since, seen_at_since = self.checkpoint.load()
+        last_ts, last_ids = since, set(seen_at_since)
+
+        pit = self._post(f"/{self.index}/_pit?keep_alive={self.keep_alive}", None)["id"]
+        try:
+            search_after = None
+            while True:
+                body = {
+                    "size": self.page_size,
+                    "pit": {"id": pit, "keep_alive": self.keep_alive},
+                    "query": self._query(since),
+                    "sort": [{"@timestamp": "asc"}, {"_shard_doc": "asc"}],
+                    "_source": SOURCE_FIELDS,
+                    "track_total_hits": False,
+                }
+                if search_after is not None:
+                    body["search_after"] = search_after
+                page = self._post("/_search", body)
+                pit = page.get("pit_id", pit)
+                hits = page["hits"]["hits"]
+                self.stats["pages"] += 1
+                if not hits:
+                    break
+
+                for hit in hits:
+                    source = hit.get("_source", {})
+                    ts = source.get("@timestamp")
+                    if ts == since and hit["_id"] in seen_at_since:
+                        continue  # processed in an earlier cycle
+                    if ts != last_ts:
+                        last_ts, last_ids = ts, set()
+                    last_ids.add(hit["_id"])
+                    self.stats["docs"] += 1
+                    yield hit["_id"], source
+
+                search_after = hits[-1]["sort"]
+                if len(hits) < self.page_size:
+                    break
+        finally:
+            try:
+                self.session.delete(f"{self.base_url}/_pit", json={"id": pit}, timeout=self.timeout)
+            except requests.RequestException:
+                pass  # PIT expires on its own after keep_alive
+
+        self._pending = (last_ts, last_ids)
+
+    def commit(self):
+        """Persist the checkpoint reached by the last completed poll()."""
+        if self._pending and self._pending[0]:
+            self.checkpoint.save(*self._pending)
+        self._pending = None
+
+
+def message_of(source) -> str:
+    return source.get("message") or source.get("event.original") or source.get("msg")
+
+
+def fields_of(source) -> dict:
+    return {k: source[k] for k in FIELD_NAMES if source.get(k) is not None}
+
+
+def run_forever(poller: ElasticPoller, handle, interval: float = 30, once: bool = False, on_cycle=None):
+    """
+    Poll, hand each doc to `handle(doc_id, source)`, call `on_cycle()` (e.g.
+    aggregator flush), then commit the checkpoint. Errors back off and retry
+    the same window next cycle.
+    """
+    while True:
+        started = time.monotonic()
+        try:
+            for doc_id, source in poller.poll():
+                handle(doc_id, source)
+            if on_cycle:
+                on_cycle()
+            poller.commit()
+        except requests.RequestException as e:
+            print("❌ Elasticsearch poll failed:", e)
+        if once:
+            return
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
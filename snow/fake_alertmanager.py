@@ -0,0 +1,104 @@
+"""
+Fake Alertmanager: sends webhook payloads the way Alertmanager does, for
+exercising the receiver mode (snow/alerts.py) without the Prometheus stack.
+
+    python -m snow.fake_snow --port 8089 &
+    SNOW_URL=http://127.0.0.1:8089/api/now/table/incident \
+        python snow-integration.py --mode alert-receiver --listen 127.0.0.1:9095 &
+    python -m snow.fake_alertmanager --url http://127.0.0.1:9095/alerts --alerts 200 --repeats 3
+
+Each round posts every alert of a group again (Alertmanager's group/repeat
+re-sends), so only `--alerts` incidents should be created however many
+rounds run; the last round resolves them. 503 answers are retried after
+their Retry-After, like Alertmanager does.
+"""
+
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+# the alerts of prometheus-alerts.yml, plus one the rules don't know
+ALERTS = [
+    ("PaymentFailureRateHigh", "critical", "RandomFail"),
+    ("PaymentFraudBlocksSpike", "warning", "FraudBlocked"),
+    ("PaymentDuplicateTransactions", "warning", "DuplicateTransaction"),
+    ("PaymentInvalidAmounts", "warning", "InvalidAmount"),
+    ("PaymentChargeLatencyHigh", "warning", None),
+]
+
+
+def make_alerts(n: int, seed: int = 0):
+    rnd = random.Random(seed)
+    started = datetime.now(timezone.utc).isoformat()
+    alerts = []
+    for i in range(n):
+        name, severity, error_type = rnd.choice(ALERTS)
+        labels = {"alertname": name, "severity": severity, "service": "payment-service", "instance": f"payment-{i}"}
+        if error_type:
+            labels["error_type"] = error_type
+        alerts.append({
+            "status": "firing",
+            "labels": labels,
+            "annotations": {"summary": f"{name} on payment-{i}"},
+            "startsAt": started,
+            "endsAt": "0001-01-01T00:00:00Z",
+            "generatorURL": "http://prometheus:9090/graph",
+            "fingerprint": f"{i:016x}",
+        })
+    return alerts
+
+
+def payload(alerts, status="firing"):
+    return {
+        "version": "4",
+        "status": status,
+        "receiver": "servicenow",
+        "groupKey": "{}:{alertname=\"payments\"}",
+        "commonLabels": {"service": "payment-service"},
+        "alerts": [{**a, "status": status} for a in alerts],
+    }
+
+
+def post(session, url, body, stats, max_tries=20):
+    for _ in range(max_tries):
+        r = session.post(url, json=body, timeout=10)
+        if r.status_code != 503:
+            stats[r.status_code] = stats.get(r.status_code, 0) + 1
+            return
+        stats[503] = stats.get(503, 0) + 1
+        time.sleep(float(r.headers.get("Retry-After", 1)))
+    stats["gave_up"] = stats.get("gave_up", 0) + 1
+
+
+def run(url, n_alerts=200, group_size=20, repeats=3, senders=8, resolve=True, seed=0):
+    alerts = make_alerts(n_alerts, seed)
+    groups = [alerts[i:i + group_size] for i in range(0, len(alerts), group_size)]
+    stats = {}
+    session = requests.Session()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=senders) as pool:
+        for _ in range(repeats):
+            list(pool.map(lambda g: post(session, url, payload(g), stats), groups))
+        if resolve:
+            list(pool.map(lambda g: post(session, url, payload(g, "resolved"), stats), groups))
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send Alertmanager-style webhook bursts")
+    parser.add_argument("--url", default="http://127.0.0.1:9095/alerts")
+    parser.add_argument("--alerts", type=int, default=200, help="distinct alerts (fingerprints)")
+    parser.add_argument("--group-size", type=int, default=20, help="alerts per webhook call")
+    parser.add_argument("--repeats", type=int, default=3, help="times every firing alert is re-sent")
+    parser.add_argument("--senders", type=int, default=8, help="concurrent webhook calls")
+    parser.add_argument("--no-resolve", action="store_true", help="leave the alerts firing")
+    args = parser.parse_args()
+
+    stats = run(args.url, args.alerts, args.group_size, args.repeats, args.senders, not args.no_resolve)
+    print(f"📨 webhook answers: {stats}")
+    print(f"📊 receiver: {requests.get(args.url.rsplit('/', 1)[0] + '/stats', timeout=5).json()}")
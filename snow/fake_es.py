@@ -0,0 +1,242 @@
+"""
+Minimal in-process stand-in for the bits of the Elasticsearch API the poller
+uses (_pit, _search with pit/search_after/sort/_source, _doc), so the
+elastic-poll mode can be exercised without a cluster.
+
+    python -m snow.fake_es --port 9200 --docs 50000
+    python snow-integration.py --mode elastic-poll --once
+
+Only the query shapes snow/elastic.py sends are understood: bool filter /
+should, range, term, terms, match_phrase and match_all.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+_WORDS = re.compile(r"\w+")
+
+
+def _tokens(value) -> str:
+    return " " + " ".join(_WORDS.findall(str(value).lower())) + " "
+
+
+def _get(source, field):
+    if field in source:
+        return source[field]
+    node = source
+    for part in field.split("."):
+        if not isinstance(node, dict) or part not in node:
+            return None
+        node = node[part]
+    return node
+
+
+def _matches(query, source) -> bool:
+    if not query or "match_all" in query:
+        return True
+    if "bool" in query:
+        b = query["bool"]
+        for clause in b.get("filter", []) + b.get("must", []):
+            if not _matches(clause, source):
+                return False
+        should = b.get("should", [])
+        if should:
+            hits = sum(_matches(clause, source) for clause in should)
+            return hits >= int(b.get("minimum_should_match", 1))
+        return True
+    if "range" in query:
+        (field, ops), = query["range"].items()
+        value = _get(source, field)
+        if value is None:
+            return False
+        checks = {"gt": value.__gt__, "gte": value.__ge__, "lt": value.__lt__, "lte": value.__le__}
+        return all(checks[op](bound) for op, bound in ops.items())
+    if "term" in query:
+        (field, spec), = query["term"].items()
+        if not isinstance(spec, dict):
+            spec = {"value": spec}
+        value = _get(source, field)
+        if value is None:
+            return False
+        if spec.get("case_insensitive"):
+            return str(value).lower() == str(spec["value"]).lower()
+        return str(value) == str(spec["value"])
+    if "terms" in query:
+        (field, values), = query["terms"].items()
+        return str(_get(source, field)) in {str(v) for v in values}
+    if "match_phrase" in query:
+        (field, phrase), = query["match_phrase"].items()
+        value = _get(source, field)
+        return value is not None and _tokens(phrase) in _tokens(value)
+    raise ValueError(f"fake_es: unsupported query {query}")
+
+
+def _trim(source, includes):
+    if not includes:
+        return source
+    return {k: v for k, v in source.items() if k in includes}
+
+
+class FakeElasticsearch:
+    """
+    es = FakeElasticsearch(docs).start()   # docs: list of _source dicts
+    es.url -> "http://127.0.0.1:<port>"
+    es.add({...}); es.stats; es.stop()
+    """
+
+    def __init__(self, docs=(), host="127.0.0.1", port=0):
+        self.lock = threading.Lock()
+        self.docs = []  # (seq, _id, _source)
+        self.pits = {}
+        self.stats = {"searches": 0, "hits_returned": 0, "bytes_sent": 0, "pits_open": 0}
+        for doc in docs:
+            self.add(doc)
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+
+    def add(self, source, doc_id=None):
+        with self.lock:
+            seq = len(self.docs)
+            self.docs.append((seq, doc_id or uuid.uuid4().hex[:20], source))
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def search(self, body):
+        pit = (body.get("pit") or {}).get("id")
+        if pit is not None:
+            if pit not in self.pits:
+                return 404, {"error": {"type": "search_context_missing_exception"}}
+            docs = self.pits[pit]
+        else:
+            with self.lock:
+                docs = list(self.docs)
+
+        query = body.get("query")
+        hits = [d for d in docs if _matches(query, d[2])]
+        # @timestamp asc, then doc order as the _shard_doc tiebreaker
+        hits.sort(key=lambda d: (str(d[2].get("@timestamp", "")), d[0]))
+        after = body.get("search_after")
+        if after is not None:
+            after = (str(after[0]), after[1])
+            hits = [d for d in hits if (str(d[2].get("@timestamp", "")), d[0]) > after]
+        hits = hits[: int(body.get("size", 10))]
+
+        includes = body.get("_source")
+        if isinstance(includes, dict):
+            includes = includes.get("includes")
+        self.stats["searches"] += 1
+        self.stats["hits_returned"] += len(hits)
+        result = {
+            "hits": {"hits": [
+                {"_id": doc_id, "_source": _trim(source, includes), "sort": [source.get("@timestamp"), seq]}
+                for seq, doc_id, source in hits
+            ]},
+        }
+        if pit is not None:
+            result["pit_id"] = pit
+        return 200, result
+
+    def _handler(self):
+        es = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                return json.loads(raw) if raw.strip() else {}
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                es.stats["bytes_sent"] += len(data)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                body = self._body()
+                if path.endswith("/_pit"):
+                    pit = uuid.uuid4().hex
+                    with es.lock:
+                        es.pits[pit] = list(es.docs)
+                    es.stats["pits_open"] = len(es.pits)
+                    return self._reply(200, {"id": pit})
+                if path.endswith("/_search"):
+                    return self._reply(*es.search(body))
+                if path.endswith("/_doc"):
+                    doc_id = uuid.uuid4().hex[:20]
+                    es.add(body, doc_id)
+                    return self._reply(201, {"_id": doc_id, "result": "created"})
+                self._reply(404, {"error": f"unsupported path {path}"})
+
+            do_GET = do_POST  # the legacy mode sends GET _search with a body
+
+            def do_DELETE(self):
+                if urlparse(self.path).path == "/_pit":
+                    es.pits.pop(self._body().get("id"), None)
+                    es.stats["pits_open"] = len(es.pits)
+                    return self._reply(200, {"succeeded": True, "num_freed": 1})
+                self._reply(404, {"error": "unsupported"})
+
+        return Handler
+
+
+def synthetic_docs(n: int, seed: int = 7, failure_rate: float = 0.02):
+    """payment-service style documents, mostly successes, oldest first."""
+    rnd = random.Random(seed)
+    start = datetime.now(timezone.utc) - timedelta(seconds=n // 10)
+    kinds = ["InvalidAmount", "DuplicateTransaction", "FraudBlocked", "RandomFail"]
+    for i in range(n):
+        ts = (start + timedelta(milliseconds=100 * i)).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+        trace = str(uuid.UUID(int=rnd.getrandbits(128)))
+        order = f"ord-{rnd.randint(1, 9999)}"
+        if rnd.random() < failure_rate:
+            kind = rnd.choice(kinds)
+            msg = f"event=payment_failure error_type={kind} order_id={order} amount={rnd.randint(1, 500)}"
+            fields = {"event": "payment_failure", "error_type": kind}
+        else:
+            msg = f"event=payment_success order_id={order} amount={rnd.randint(1, 500)}"
+            fields = {"event": "payment_success"}
+        yield {
+            "@timestamp": ts,
+            "message": f"{ts} [INFO] [trace={trace}] [user=u{rnd.randint(1, 50)}] {msg}",
+            "service": "payment-service",
+            "trace_id": trace,
+            "order_id": order,
+            "host": {"name": "payment-service"},
+            "agent": {"type": "filebeat", "version": "8.13.0"},
+            **fields,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Elasticsearch for elastic-poll testing")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--docs", type=int, default=10000, help="synthetic payment docs to seed")
+    args = parser.parse_args()
+
+    es = FakeElasticsearch(synthetic_docs(args.docs), port=args.port)
+    print(f"🧪 fake Elasticsearch on {es.url} with {len(es.docs)} docs (POST /logs-x/_doc to add more)")
+    try:
+        es.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
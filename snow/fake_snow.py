@@ -0,0 +1,150 @@
+"""
+Mock ServiceNow incident table for exercising snow/servicenow.py locally.
+
+    python -m snow.fake_snow --port 8089 --latency 0.15 --error-rate 0.05 --rate-limit 50
+    SNOW_URL=http://127.0.0.1:8089/api/now/table/incident python snow-integration.py ...
+
+POST /api/now/table/incident answers 201 with a ticket number after
+`latency` seconds, a 503 for `error_rate` of the calls, and a 429 with
+Retry-After when more than `rate_limit` requests arrive within a second.
+For `lost_reply_rate` of the calls the incident is created but the answer
+is a 504, like a gateway timing out after ServiceNow committed it.
+GET /api/now/table/incident?sysparm_query=correlation_id=<id> finds
+incidents by correlation_id.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeServiceNow:
+    """
+    snow = FakeServiceNow(latency=0.1).start()
+    snow.url -> "http://127.0.0.1:<port>/api/now/table/incident"
+    snow.incidents, snow.stats; snow.stop()
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.1, error_rate=0.0, rate_limit=0, seed=None,
+                 lost_reply_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.lost_reply_rate = lost_reply_rate
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.incidents = []
+        self.window = []  # arrival times in the last second
+        self.stats = {"requests": 0, "created": 0, "errors": 0, "throttled": 0, "lost_replies": 0, "lookups": 0}
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}/api/now/table/incident"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _decide(self):
+        with self.lock:
+            self.stats["requests"] += 1
+            now = time.monotonic()
+            self.window = [t for t in self.window if now - t < 1.0]
+            self.window.append(now)
+            if self.rate_limit and len(self.window) > self.rate_limit:
+                self.stats["throttled"] += 1
+                return 429
+            if self.random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return 503
+            if self.random.random() < self.lost_reply_rate:
+                self.stats["lost_replies"] += 1
+                return 504
+            return 201
+
+    def _create(self, body):
+        with self.lock:
+            self.stats["created"] += 1
+            number = f"INC{10000 + len(self.incidents):07d}"
+            record = {**body, "number": number, "sys_id": uuid.uuid4().hex}
+            self.incidents.append(record)
+            return record
+
+    def _find(self, query: str):
+        field, _, value = query.partition("=")
+        with self.lock:
+            self.stats["lookups"] += 1
+            return [i for i in self.incidents if field and str(i.get(field)) == value]
+
+    def _handler(self):
+        snow = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real instance
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload, headers=None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.startswith("/api/now/table/incident"):
+                    return self._reply(404, {"error": {"message": "No such table"}})
+                time.sleep(snow.latency)
+                status = snow._decide()
+                if status == 429:
+                    return self._reply(429, {"error": {"message": "Rate limit exceeded"}}, {"Retry-After": "1"})
+                if status == 503:
+                    return self._reply(503, {"error": {"message": "Service Unavailable"}})
+                record = snow._create(body)
+                if status == 504:
+                    return self._reply(504, {"error": {"message": "Gateway Timeout"}})
+                self._reply(201, {"result": record})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if not url.path.startswith("/api/now/table/incident"):
+                    return self._reply(404, {"error": {"message": "No such table"}})
+                params = parse_qs(url.query)
+                found = snow._find(params.get("sysparm_query", [""])[0])
+                limit = int(params.get("sysparm_limit", [len(found) or 1])[0])
+                self._reply(200, {"result": found[:limit]})
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock ServiceNow incident table")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.15, help="seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 503 answers")
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests/second before 429 (0 = off)")
+    parser.add_argument("--lost-reply-rate", type=float, default=0.0,
+                        help="fraction of creates answered 504 after the incident was created")
+    args = parser.parse_args()
+
+    snow = FakeServiceNow(port=args.port, latency=args.latency, error_rate=args.error_rate,
+                          rate_limit=args.rate_limit, lost_reply_rate=args.lost_reply_rate)
+    print(f"🧪 mock ServiceNow on {snow.url}")
+    try:
+        snow.server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{len(snow.incidents)} incidents created, stats: {snow.stats}")
@@ -0,0 +1,237 @@
+"""
+Compiled issue matcher for detect_issue().
+
+All keyword rules are folded into one regex, compiled once and run over the
+lowercased line (same case rules as the old `.lower()` + `in` scan). Most log
+lines (payment_success, health checks...) match nothing and cost a single
+pass. The matched text maps straight back to its rule, and the lowest rule
+index wins, so the original first-match priority is kept.
+
+The regex is a prefix trie of the keywords (error_type=(?:invalidamount|...))
+rather than a flat alternation, which is what makes it a cheap single pass in
+CPython's engine. It deliberately has no capture groups: they turn off the
+first-character prefilter and make the scan ~10x slower.
+
+Field rules ("where") are evaluated against key=value pairs parsed from the
+line, or against typed fields passed in by the caller (ES _source, CSV
+columns, JSON log lines).
+"""
+
+import json
+import operator
+import re
+from bisect import bisect_right
+from itertools import accumulate
+
+_OPS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+# [trace=..] [user=..] style prefixes and bare key=value pairs
+_KV = re.compile(r"\[?(\w+)=([^\s\]]*)")
+_ALIASES = {"trace": "trace_id", "user": "user_id"}
+
+
+def parse_fields(message: str) -> dict:
+    """Pull key=value pairs (or a JSON object) out of a log line."""
+    if message.startswith("{"):
+        try:
+            doc = json.loads(message)
+            if isinstance(doc, dict):
+                return doc
+        except ValueError:
+            pass
+    return {_ALIASES.get(k, k): v for k, v in _KV.findall(message)}
+
+
+def _as_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Condition:
+    def __init__(self, field, spec):
+        self.field = field
+        if isinstance(spec, dict):
+            self.checks = []
+            for op, expected in spec.items():
+                if op == "in":
+                    wanted = {str(v).lower() for v in expected}
+                    self.checks.append(lambda v, w=wanted: str(v).lower() in w)
+                elif op in _OPS:
+                    fn, num = _OPS[op], float(expected)
+                    self.checks.append(lambda v, fn=fn, num=num: (n := _as_number(v)) is not None and fn(n, num))
+                else:
+                    raise ValueError(f"unknown operator {op!r} for field {field!r}")
+        else:
+            wanted = str(spec).lower()
+            self.checks = [lambda v, w=wanted: str(v).lower() == w]
+
+    def __call__(self, fields) -> bool:
+        value = fields.get(self.field)
+        return value is not None and all(check(value) for check in self.checks)
+
+
+def _trie_pattern(words) -> str:
+    """Regex for `words` with common prefixes factored out."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}  # end of word
+
+    def build(node):
+        alts = [re.escape(ch) + build(child) for ch, child in node.items() if ch]
+        if not alts:
+            return ""
+        if len(alts) == 1 and "" not in node:
+            return alts[0]
+        group = "(?:" + "|".join(alts) + ")"
+        return group + "?" if "" in node else group
+
+    return build(trie)
+
+
+def _overlaps(a: str, b: str) -> bool:
+    """Can a and b both occur in a line while sharing characters?"""
+    if a in b or b in a:
+        return True
+    return any(a.endswith(b[:n]) or b.endswith(a[:n]) for n in range(1, min(len(a), len(b))))
+
+
+class IssueMatcher:
+    """detect_issue() engine: IssueMatcher.from_file("snow/rules.json").match(line)."""
+
+    def __init__(self, rules):
+        self.issues = []
+        self._keywords = {}     # rule index -> lowercased keywords
+        self._keyword_rule = {}  # lowercased keyword -> highest-priority rule using it
+        self._where = {}        # rule index -> ([_Condition], keywords or None)
+        ordered = []
+
+        for i, rule in enumerate(rules):
+            self.issues.append(rule["issue"])
+            keywords = [k.lower() for k in rule.get("any") or []]
+            if rule.get("where"):
+                # any + where: both must hold, so it is checked with the field rules
+                conds = [_Condition(f, spec) for f, spec in rule["where"].items()]
+                self._where[i] = (conds, keywords or None)
+            elif keywords:
+                self._keywords[i] = keywords
+                for k in keywords:
+                    if k not in self._keyword_rule:
+                        self._keyword_rule[k] = i
+                        ordered.append(k)
+
+        self._combined = re.compile(_trie_pattern(ordered)) if ordered else None
+        self._where_order = sorted(self._where)
+
+        # finditer() reports non-overlapping matches only (and, through the trie,
+        # the longest keyword at a position). A higher-priority keyword that can
+        # overlap a reported one may hide behind it, so those few are re-checked
+        # explicitly: rule -> [(higher rule, keyword), ...]
+        self._hidden = {}
+        for b, rb in self._keyword_rule.items():
+            for a, ra in self._keyword_rule.items():
+                if ra < rb and _overlaps(a, b):
+                    self._hidden.setdefault(rb, []).append((ra, a))
+
+    @property
+    def keywords(self):
+        """Lowercased keywords of the plain keyword rules, in priority order."""
+        return list(self._keyword_rule)
+
+    @property
+    def prefilter(self):
+        """
+        Lowercase regex that every matching line must contain, for callers
+        that can pre-select candidates in bulk (pandas .str.contains etc.).
+        None when field rules exist, since those can match any line.
+        """
+        if self._where or self._combined is None:
+            return None
+        return self._combined.pattern
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["rules"])
+
+    def _resolve(self, best, found, low):
+        for r in found:
+            for i, keyword in self._hidden.get(r, ()):
+                if i < best and keyword in low:
+                    best = i
+        return best
+
+    def _apply_where(self, best, message, low, fields):
+        parsed = None
+        for i in self._where_order:
+            if best is not None and i >= best:
+                break
+            if parsed is None:
+                parsed = parse_fields(message)
+                if fields:
+                    parsed.update({k: v for k, v in fields.items() if v is not None})
+            conds, keywords = self._where[i]
+            if (keywords is None or any(k in low for k in keywords)) and all(cond(parsed) for cond in conds):
+                return i
+        return best
+
+    def match(self, message, fields: dict = None):
+        """Issue name of the first rule that matches, or None."""
+        message = str(message)
+        low = message.lower()
+        best = None
+
+        if self._combined is not None:
+            rule_of = self._keyword_rule
+            found = [rule_of[m.group()] for m in self._combined.finditer(low)]
+            if found:
+                best = min(found)
+                if self._hidden:
+                    best = self._resolve(best, found, low)
+
+        if self._where:
+            best = self._apply_where(best, message, low, fields)
+
+        return None if best is None else self.issues[best]
+
+    def match_many(self, messages, fields=None):
+        """
+        match() for a whole batch. The lines are joined and scanned in one
+        regex pass, so lines without any keyword cost no Python work at all.
+        `fields` is an optional list of per-line dicts.
+        """
+        messages = [str(m) for m in messages]
+        # per line: lower() can change the length ("İ" -> "i̇"), so the
+        # offsets must come from the lowered strings
+        lowered = [m.lower() for m in messages]
+        best = [None] * len(messages)
+
+        if self._combined is not None and messages:
+            # NUL never shows up in keywords, so matches cannot span two lines
+            text = "\x00".join(lowered)
+            starts = [0, *accumulate(len(low) + 1 for low in lowered)]
+            rule_of = self._keyword_rule
+            found = {}
+            for m in self._combined.finditer(text):
+                found.setdefault(bisect_right(starts, m.start()) - 1, []).append(rule_of[m.group()])
+            for i, rules in found.items():
+                best[i] = min(rules)
+                if self._hidden:
+                    best[i] = self._resolve(best[i], rules, lowered[i])
+
+        if self._where:
+            for i, message in enumerate(messages):
+                best[i] = self._apply_where(best[i], message, lowered[i], fields[i] if fields else None)
+
+        return [None if b is None else self.issues[b] for b in best]
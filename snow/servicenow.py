@@ -0,0 +1,281 @@
+"""
+Pooled ServiceNow incident client.
+
+One requests.Session (keep-alive pool sized to the worker count) shared by a
+small thread pool, a token bucket in front of every POST so a storm stays
+under the instance quota, exponential backoff with jitter on 429/5xx and
+connection errors (Retry-After wins when ServiceNow sends it), and an
+on-disk outbox: every incident is written to SQLite before it is sent and
+marked done after, so whatever could not be created is retried on the next
+run instead of being lost.
+
+Every incident carries a correlation_id. A timeout or 5xx can come after
+ServiceNow committed the incident, so before any retry (and before an
+outbox entry is sent again) the client looks the correlation_id up and
+takes the existing incident instead of creating a duplicate.
+"""
+
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """`rate` requests per second on average, bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Outbox:
+    """Incidents waiting to be (re)created, in SQLite."""
+
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id             INTEGER PRIMARY KEY,
+                correlation_id TEXT NOT NULL,
+                short_desc     TEXT NOT NULL,
+                description    TEXT NOT NULL,
+                state          TEXT NOT NULL DEFAULT 'pending',
+                attempts       INTEGER NOT NULL DEFAULT 0,
+                ticket         TEXT,
+                last_error     TEXT,
+                created_at     REAL NOT NULL
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (state, id)")
+        self.db.commit()
+
+    def put(self, short_desc, description):
+        """Store a new incident; returns (id, correlation_id)."""
+        correlation_id = uuid.uuid4().hex
+        with self.lock:
+            cur = self.db.execute(
+                "INSERT INTO outbox (correlation_id, short_desc, description, created_at) VALUES (?, ?, ?, ?)",
+                (correlation_id, short_desc, description, time.time()),
+            )
+            self.db.commit()
+            return cur.lastrowid, correlation_id
+
+    def pending(self):
+        with self.lock:
+            return self.db.execute(
+                "SELECT id, correlation_id, short_desc, description FROM outbox WHERE state = 'pending' ORDER BY id"
+            ).fetchall()
+
+    def done(self, entry_id, ticket):
+        with self.lock:
+            self.db.execute("UPDATE outbox SET state = 'done', ticket = ? WHERE id = ?", (ticket, entry_id))
+            self.db.commit()
+
+    def failed_attempt(self, entry_id, attempts, error, give_up=False):
+        with self.lock:
+            self.db.execute(
+                "UPDATE outbox SET attempts = attempts + ?, last_error = ?, state = ? WHERE id = ?",
+                (attempts, str(error)[:500], "failed" if give_up else "pending", entry_id),
+            )
+            self.db.commit()
+
+
+class ServiceNowClient:
+    """
+    client = ServiceNowClient(SNOW_URL, (user, pw), outbox=Outbox("snow_state.db"))
+    client.create(short_desc, description)          # -> "INC0010001" / "outbox:12" / None
+    client.submit(short_desc, description)          # same, as a Future on the worker pool
+    client.create_many([(short_desc, description), ...])
+    client.drain_outbox()                           # retry what earlier runs left behind
+
+    When an incident cannot be created after all retries it stays in the
+    outbox and create() returns "outbox:<id>", so callers can record it as
+    in-flight; `on_created(ref, ticket)` fires when a later drain succeeds.
+    """
+
+    def __init__(self, url, auth, workers: int = 8, rate: float = 10, burst: int = 20,
+                 max_retries: int = 5, backoff: float = 0.5, max_backoff: float = 30,
+                 timeout: float = 10, outbox: Outbox = None, on_created=None, defaults=None):
+        self.url = url
+        self.workers = workers
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.outbox = outbox
+        self.on_created = on_created
+        self.defaults = defaults or {}
+
+        self.session = requests.Session()
+        self.session.auth = auth
+        self.session.headers.update({"Accept": "application/json"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="snow")
+
+        self.stats_lock = threading.Lock()
+        self.stats = {"created": 0, "retries": 0, "deferred": 0, "found": 0}
+        self.started = self.finished = None  # wall-clock span of the sends, for tickets/s
+
+    def _count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def _delay(self, attempt, response=None):
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return min(self.max_backoff, float(retry_after))
+                except ValueError:
+                    pass
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def _lookup(self, correlation_id):
+        """Number of an incident already created with this correlation_id, or None."""
+        self.bucket.acquire()
+        response = self.session.get(self.url, timeout=self.timeout, params={
+            "sysparm_query": f"correlation_id={correlation_id}",
+            "sysparm_fields": "number,sys_id",
+            "sysparm_limit": "1",
+        })
+        response.raise_for_status()
+        found = response.json().get("result") or []
+        if not found:
+            return None
+        return found[0].get("number") or found[0].get("sys_id") or "created"
+
+    def _post(self, short_desc, description, correlation_id=None, resend=False):
+        """
+        POST with retries. Returns (ticket or None, attempts, last error, worth retrying later).
+        `resend`: an earlier run may already have created it, look it up first.
+        """
+        payload = {**self.defaults, "short_description": short_desc, "description": description}
+        if correlation_id:
+            payload["correlation_id"] = correlation_id
+
+        error = None
+        maybe_created = resend
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count("retries")
+            response = None
+            try:
+                if maybe_created and correlation_id:
+                    # the previous POST may have landed even though we saw no answer
+                    existing = self._lookup(correlation_id)
+                    if existing is not None:
+                        self._count("found")
+                        return existing, attempt + 1, None, False
+                    maybe_created = False
+                self.bucket.acquire()
+                response = self.session.post(self.url, json=payload, timeout=self.timeout)
+                if response.status_code in (200, 201):
+                    result = response.json().get("result", {})
+                    return result.get("number") or result.get("sys_id") or "created", attempt + 1, None, False
+                error = f"{response.status_code} {response.text[:200]}"
+                if response.status_code not in RETRY_STATUS:
+                    return None, attempt + 1, error, False  # 4xx other than 429: retrying won't help
+                maybe_created = response.status_code != 429  # throttled requests are never processed
+            except requests.RequestException as e:
+                error = e
+                maybe_created = True
+            if attempt < self.max_retries:
+                time.sleep(self._delay(attempt, response))
+        return None, self.max_retries + 1, error, True
+
+    def _send(self, entry_id, correlation_id, short_desc, description, resend=False):
+        with self.stats_lock:
+            self.started = self.started or time.perf_counter()
+        try:
+            return self._deliver(entry_id, correlation_id, short_desc, description, resend)
+        finally:
+            with self.stats_lock:
+                self.finished = time.perf_counter()
+
+    def _deliver(self, entry_id, correlation_id, short_desc, description, resend=False):
+        ticket, attempts, error, retryable = self._post(short_desc, description, correlation_id, resend)
+        if ticket is not None:
+            self._count("created")
+            if self.outbox is not None:
+                self.outbox.done(entry_id, ticket)
+            return ticket
+        print(f"❌ Failed to create ticket after {attempts} attempts: {error}")
+        if self.outbox is None:
+            return None
+        self.outbox.failed_attempt(entry_id, attempts, error, give_up=not retryable)
+        if not retryable:
+            return None
+        self._count("deferred")
+        return f"outbox:{entry_id}"
+
+    def _entry(self, short_desc, description):
+        if self.outbox is None:
+            return None, None
+        return self.outbox.put(short_desc, description)
+
+    def create(self, short_desc, description):
+        return self._send(*self._entry(short_desc, description), short_desc, description)
+
+    def submit(self, short_desc, description):
+        """create() on the worker pool; returns a Future."""
+        entry = (*self._entry(short_desc, description), short_desc, description)
+        return self.pool.submit(self._send, *entry)
+
+    def create_many(self, items):
+        """Create several incidents concurrently; tickets come back in input order."""
+        entries = [(*self._entry(s, d), s, d) for s, d in items]
+        return list(self.pool.map(lambda e: self._send(*e), entries))
+
+    def drain_outbox(self):
+        """Retry everything still pending from earlier runs."""
+        if self.outbox is None:
+            return 0
+        pending = self.outbox.pending()
+        if not pending:
+            return 0
+        print(f"📤 Retrying {len(pending)} incidents from the outbox...")
+        tickets = list(self.pool.map(lambda e: self._send(*e, resend=True), pending))
+        created = 0
+        for (entry_id, *_), ticket in zip(pending, tickets):
+            if ticket and not ticket.startswith("outbox:"):
+                created += 1
+                if self.on_created:
+                    self.on_created(f"outbox:{entry_id}", ticket)
+        return created
+
+    def report(self) -> str:
+        s = self.stats
+        seconds = (self.finished - self.started) if self.started else 0.0
+        rate = s["created"] / seconds if seconds else 0.0
+        return (f"{s['created']} tickets in {seconds:.2f}s ({rate:.1f} tickets/s), "
+                f"{s['retries']} retries, {s['deferred']} left in outbox")
+
+    def close(self):
+        self.pool.shutdown()
+        self.session.close()
@@ -0,0 +1,38 @@
+"""
+Shared building blocks for the sre-ops microservices.
+
+Every service imports from here instead of carrying its own copy, so a fix
+to tracing or logging lands in auth, order, payment and notification at once.
+
+The FastAPI routers (sre_common.logs_api) are imported explicitly by the
+services, so the offline tools can use the rest without FastAPI installed.
+"""
+
+from .cache import TTLCache
+from .health import HealthCheck, HealthMiddleware
+from .jsonlog import JsonFormatter, log_extra
+from .log_reader import LogFilter, read_page
+from .logging_setup import setup_logging, shutdown_logging
+from .middleware import TracingMiddleware
+from .tokens import InvalidToken, TokenAuthMiddleware, TokenSigner, TokenVerifier
+from .tracing import current_span, outgoing_headers, start_span
+
+__all__ = [
+    "HealthCheck",
+    "HealthMiddleware",
+    "InvalidToken",
+    "JsonFormatter",
+    "LogFilter",
+    "TTLCache",
+    "TokenAuthMiddleware",
+    "TokenSigner",
+    "TokenVerifier",
+    "TracingMiddleware",
+    "current_span",
+    "log_extra",
+    "outgoing_headers",
+    "read_page",
+    "setup_logging",
+    "shutdown_logging",
+    "start_span",
+]
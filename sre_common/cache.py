@@ -0,0 +1,42 @@
+"""
+Small in-process TTL + LRU cache shared by the services (verified tokens,
+user profiles, idempotency keys). OrderedDict underneath: O(1) get/put,
+bounded size, least recently used goes first. Not thread-safe; meant for
+code running on one event loop.
+"""
+
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()  # key -> (expires_at, value)
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, now=None):
+        item = self.data.get(key)
+        if item is None:
+            return None
+        if item[0] <= (now or time.monotonic()):
+            del self.data[key]
+            return None
+        self.data.move_to_end(key)
+        return item[1]
+
+    def put(self, key, value, now=None, ttl=None):
+        self.data[key] = ((now or time.monotonic()) + (self.ttl if ttl is None else ttl), value)
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def pop(self, key):
+        item = self.data.pop(key, None)
+        return item and item[1]
+
+    def clear(self):
+        self.data.clear()
@@ -0,0 +1,72 @@
+"""
+gunicorn settings shared by the services: N uvicorn workers per container.
+
+    gunicorn -c sre_common/gunicorn_conf.py app.main:app
+
+Loaded as a file (not imported as sre_common.gunicorn_conf) so the
+environment below is in place before anything imports prometheus_client.
+
+Environment knobs:
+    WEB_WORKERS       worker processes, or "auto" = one per CPU   (default 1)
+    WEB_PRELOAD       "true": import the app once in the master and fork it
+                      (faster start, shared memory; lifespan still runs per worker)
+    WEB_BIND          listen address                              (default 0.0.0.0:8000)
+    WEB_TIMEOUT       seconds before a stuck worker is replaced   (default 30)
+    WEB_MAX_REQUESTS  recycle a worker after this many requests   (default 0 = never)
+    PROMETHEUS_MULTIPROC_DIR   metric files of the workers (default /tmp/prometheus-multiproc)
+
+With more than one worker prometheus_client runs in multiprocess mode:
+each worker writes its samples to files in PROMETHEUS_MULTIPROC_DIR and
+the Instrumentator's /metrics merges them, so every scrape sees the whole
+service whichever worker answers it. Counters of a worker that exits are
+kept, its live gauges are dropped.
+
+Anything kept in process memory stays per worker: TTL caches and payment
+idempotency keys without IDEMPOTENCY_DSN. /loglevel changes are journalled
+to loglevel.jsonl in the same directory and picked up by every worker
+(sre_common.middleware.LogLevelJournal).
+"""
+
+import glob
+import os
+
+
+def _workers() -> int:
+    value = os.getenv("WEB_WORKERS", "1").strip().lower()
+    if value == "auto":
+        return os.cpu_count() or 1
+    return max(1, int(value))
+
+
+bind = os.getenv("WEB_BIND", "0.0.0.0:8000")
+workers = _workers()
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = os.getenv("WEB_PRELOAD", "false").lower() == "true"
+timeout = int(os.getenv("WEB_TIMEOUT", "30"))
+graceful_timeout = timeout
+keepalive = 5
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+accesslog = None  # TracingMiddleware writes the access lines
+errorlog = "-"
+
+if workers > 1:
+    MULTIPROC_DIR = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-multiproc")
+    # has to exist before the app is imported: the Instrumentator checks it
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+
+def on_starting(server):
+    # files of a previous run would be summed into this run's counters, and its
+    # /loglevel changes replayed (here and not at module level: the config is re-read on SIGHUP)
+    multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        for path in glob.glob(os.path.join(multiproc_dir, "*.db")) + [os.path.join(multiproc_dir, "loglevel.jsonl")]:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
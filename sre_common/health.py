@@ -0,0 +1,104 @@
+"""
+Health / readiness fast path.
+
+HealthMiddleware answers GET /health and /ready before anything else runs
+(no tracing, no access log, no Prometheus instrumentation), from a cached
+result of the service's dependency checks. Probes and scrapers can hit it
+as often as they like: the checks run at most once per HEALTH_CACHE_SECONDS,
+in the background, and callers get the last result immediately.
+
+    HEALTH = HealthCheck("payment")
+    HEALTH.add("idempotency_store", IDEMPOTENCY.ping)
+    app.add_middleware(HealthMiddleware, health=HEALTH)   # added last = outermost
+
+/health is liveness: always 200, status "ok" or "degraded".
+/ready is readiness: 503 while a critical check fails.
+
+Environment knobs:
+    HEALTH_CACHE_SECONDS    how long a check result is reused   (default 5)
+    HEALTH_CHECK_TIMEOUT    per-check timeout, seconds          (default 2)
+"""
+
+import asyncio
+import inspect
+import json
+import os
+import time
+
+CACHE_SECONDS = float(os.getenv("HEALTH_CACHE_SECONDS", "5"))
+CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
+
+
+class HealthCheck:
+    def __init__(self, service: str, ttl: float = CACHE_SECONDS, timeout: float = CHECK_TIMEOUT):
+        self.service = service
+        self.ttl = ttl
+        self.timeout = timeout
+        self.checks = {}  # name -> (fn, critical)
+        self._result = None  # (ready, body bytes)
+        self._expires = 0.0
+        self._refresh = None
+
+    def add(self, name: str, fn, critical: bool = True):
+        """fn: sync or async callable; raising (or timing out) means the dependency is down."""
+        self.checks[name] = (fn, critical)
+        self._expires = 0.0
+
+    async def _run_one(self, fn):
+        try:
+            value = fn()
+            if inspect.isawaitable(value):
+                await asyncio.wait_for(value, self.timeout)
+            return "ok"
+        except asyncio.TimeoutError:
+            return f"error: timeout after {self.timeout}s"
+        except Exception as e:
+            return f"error: {type(e).__name__}: {e}"
+
+    async def _compute(self):
+        names = list(self.checks)
+        results = await asyncio.gather(*(self._run_one(self.checks[n][0]) for n in names))
+        checks = dict(zip(names, results))
+        failed = [n for n in names if checks[n] != "ok"]
+        ready = not any(self.checks[n][1] for n in failed)
+        doc = {"status": "ok" if not failed else "degraded", "service": self.service}
+        if checks:
+            doc["checks"] = checks
+            doc["checked_at"] = round(time.time(), 3)
+        self._result = (ready, json.dumps(doc, separators=(",", ":")).encode())
+        self._expires = time.monotonic() + self.ttl
+        return self._result
+
+    async def result(self):
+        """(ready, JSON body). Serves the cached result; stale ones are refreshed in the background."""
+        if self._result is not None and time.monotonic() < self._expires:
+            return self._result
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.ensure_future(self._compute())
+        if self._result is None:
+            return await asyncio.shield(self._refresh)
+        return self._result
+
+
+class HealthMiddleware:
+    def __init__(self, app, health: HealthCheck, live_path: str = "/health", ready_path: str = "/ready"):
+        self.app = app
+        self.health = health
+        self.live_path = live_path
+        self.ready_path = ready_path
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path")
+        if scope["type"] != "http" or (path != self.live_path and path != self.ready_path):
+            await self.app(scope, receive, send)
+            return
+
+        ready, body = await self.health.result()
+        status = 503 if path == self.ready_path and not ready else 200
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                        (b"cache-control", b"no-store")],
+        })
+        await send({"type": "http.response.body", "body": b"" if scope.get("method") == "HEAD" else body})
@@ -0,0 +1,62 @@
+"""
+Structured (JSON lines) log output, opt-in with LOG_FORMAT=json.
+
+Call sites keep their human-readable message and pass typed fields through
+`extra=`; the text formatter ignores them, the JSON formatter emits them as
+top-level keys so Logstash/ES/snow-integration never have to grok them back.
+
+    logger.warning("...", extra=log_extra(request, event="payment_validation",
+                                          error_type="InvalidAmount", amount=p.amount))
+"""
+
+import logging
+import time
+
+try:
+    import orjson
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj, default=str).decode()
+except ImportError:  # orjson is optional, stdlib json is just slower
+    import json
+
+    def _dumps(obj) -> str:
+        return json.dumps(obj, separators=(",", ":"), default=str)
+
+# typed fields carried through `extra=` (anything else is ignored)
+FIELDS = ("trace_id", "user_id", "route", "duration_ms", "event", "error_type", "order_id", "amount")
+
+
+def log_extra(request=None, **fields) -> dict:
+    """Build the `extra=` dict: trace/user from request.state plus any event fields."""
+    if request is not None:
+        state = request.state
+        fields.setdefault("trace_id", getattr(state, "trace_id", None))
+        fields.setdefault("user_id", getattr(state, "user_id", None))
+    return fields
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per record."""
+
+    def __init__(self, service: str = None):
+        super().__init__()
+        self.service = service
+
+    def format(self, record) -> str:
+        ct = record.created
+        doc = {
+            "@timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(ct)) + ".%03dZ" % (ct % 1 * 1000),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if self.service:
+            doc["service"] = self.service
+        for key in FIELDS:
+            value = record.__dict__.get(key)
+            if value is not None:
+                doc[key] = value
+        if record.exc_info:
+            doc["exc"] = self.formatException(record.exc_info)
+        return _dumps(doc)
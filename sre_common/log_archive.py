@@ -0,0 +1,627 @@
+"""
+Columnar archive of the services' logs, for historical latency / error questions.
+
+app.log files (text or LOG_FORMAT=json, with their rotated .gz segments) and
+Kibana CSV exports become a Parquet dataset of typed columns:
+
+    timestamp  level  trace_id  user_id  route  duration_ms  event  error_type  amount
+
+partitioned by service and day (archive/service=payment/date=2026-10-13/*.parquet),
+zstd-compressed. Parsing is vectorized: a chunk of the file is split into an
+Arrow string array and the text-format fields come out of a handful of
+regex kernels (pyarrow.compute.extract_regex, RE2), JSON lines go through
+Arrow's JSON reader. Large files are cut into newline-aligned byte ranges and
+parsed by a process pool, like sre_common.trace_index.
+
+Queries read only the columns they need, skip partitions outside the
+service / date filter, and aggregate with Arrow's hash group-by
+(percentiles via t-digest), so tens of millions of lines take seconds.
+
+    archive = LogArchive("logs-archive")
+    archive.ingest_files({"payment": "logs/payment/app.log"})      # + app.log.<stamp>[.gz]
+    archive.ingest_csv({"payment": "kibana-export.csv"})
+    where = archive.where(service="payment", route="/charge", since="2026-10-13", until="2026-10-14")
+    archive.latency("route", where)      # [{"route": "/charge", "requests": ..., "p99": ...}]
+    archive.errors("user", where); archive.top("user", "amount", 10, where)
+
+Re-ingesting is incremental: the archive remembers, per file (identified by
+its first line, so renames and gzip don't matter), how far it got, and only
+the lines appended since are added. A run is all or nothing: its parts are
+staged, then a commit record moves them into place together with the new
+offsets, so a crash mid-run never archives a line twice.
+
+Needs pyarrow; the rest of sre_common does not.
+"""
+
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+import pyarrow.json as pa_json
+
+from .logfile import list_segments
+
+CHUNK_BYTES = 32 * 1024 * 1024
+CSV_BLOCK_BYTES = 16 * 1024 * 1024
+
+SCHEMA = pa.schema([
+    ("timestamp", pa.timestamp("ms", tz="UTC")),
+    ("level", pa.string()),
+    ("trace_id", pa.string()),
+    ("user_id", pa.string()),
+    ("route", pa.string()),
+    ("duration_ms", pa.float64()),
+    ("event", pa.string()),
+    ("error_type", pa.string()),
+    ("amount", pa.float64()),
+    ("service", pa.string()),
+    ("date", pa.date32()),
+])
+PARTITIONING = ds.partitioning(pa.schema([("service", pa.string()), ("date", pa.date32())]), flavor="hive")
+
+# CLI names -> columns
+GROUP_COLUMNS = {"route": "route", "service": "service", "user": "user_id", "level": "level",
+                 "event": "event", "error_type": "error_type"}
+ERROR_LEVELS = ("ERROR", "CRITICAL")
+
+# text format: "2026-10-13 09:12:44,120 [INFO] [trace=..] [user=..] [route=..] [duration_ms=..] ..."
+_TEXT = (r"^(?P<timestamp>\d{4}-\d\d-\d\d[ T]\d\d:\d\d:\d\d[,.]\d{3}) \[(?P<level>\w+)\]"
+         r"(?: \[trace=(?P<trace_id>[^\]\s]*)\])?(?: \[user=(?P<user_id>[^\]]*)\])?"
+         r"(?: \[route=(?P<route>[^\]]*)\])?(?: \[duration_ms=(?P<duration_ms>[\d.]+)\])?")
+# a leading space instead of \b: RE2 runs these ~30% faster
+_EVENT = r" event=(?P<v>\w+)"
+_ERROR_TYPE = r" error_type=(?P<v>\w+)"
+_AMOUNT = r" amount=(?P<v>-?\d+(?:\.\d+)?)"
+_NUMBER = r"^(?P<v>-?\d+(?:\.\d+)?)$"
+_ISO = r"(?P<d>\d{4}-\d\d-\d\d)[T ](?P<t>\d\d:\d\d:\d\d)(?:[.,](?P<f>\d+))?"
+_KIBANA = r"(?P<d>[A-Z][a-z]{2} \d{1,2}, \d{4}) @ (?P<t>\d\d:\d\d:\d\d)(?:\.(?P<f>\d+))?"
+
+JSON_FIELDS = pa.schema([
+    ("@timestamp", pa.string()), ("level", pa.string()), ("service", pa.string()),
+    ("trace_id", pa.string()), ("user_id", pa.string()), ("route", pa.string()),
+    ("duration_ms", pa.float64()), ("event", pa.string()), ("error_type", pa.string()),
+    ("amount", pa.float64()),
+])
+CSV_COLUMNS = {
+    "timestamp": ("@timestamp",),
+    "message": ("message", "event.original", "msg"),
+    "service": ("service", "service.name"),
+    "level": ("level", "log.level"),
+    "trace_id": ("trace_id",), "user_id": ("user_id",), "route": ("route",),
+    "duration_ms": ("duration_ms",), "event": ("event",), "error_type": ("error_type",), "amount": ("amount",),
+}
+
+
+###############################################
+# PARSING (vectorized)
+###############################################
+
+def _nulls(values):
+    """"" (an optional regex group that did not match) and Kibana's "-" -> null."""
+    empty = pc.or_(pc.equal(values, ""), pc.equal(values, "-"))
+    return pc.if_else(empty, pa.scalar(None, values.type), values)
+
+
+def _group(values, pattern, name="v"):
+    return _nulls(pc.struct_field(pc.extract_regex(values, pattern), name))
+
+
+def _numbers(values):
+    cleaned = pc.replace_substring(pc.cast(values, pa.string()), ",", "")  # Kibana's 1,234.5
+    return pc.cast(_group(cleaned, _NUMBER), pa.float64())
+
+
+def _timestamps(values):
+    """ISO-8601, app.log ("2026-10-13 09:12:44,120") or Kibana ("Oct 13, 2026 @ 09:12:44.120"), as UTC."""
+    out, millis = None, None
+    for pattern, fmt, sep in ((_ISO, "%Y-%m-%d %H:%M:%S", " "), (_KIBANA, "%b %d, %Y @ %H:%M:%S", " @ ")):
+        parts = pc.extract_regex(values, pattern)
+        text = pc.binary_join_element_wise(pc.struct_field(parts, "d"), pc.struct_field(parts, "t"), sep)
+        seconds = pc.strptime(text, format=fmt, unit="ms", error_is_null=True)
+        fraction = pc.if_else(pc.is_valid(seconds), pc.struct_field(parts, "f"), pa.scalar(None, pa.string()))
+        out = seconds if out is None else pc.coalesce(out, seconds)
+        millis = fraction if millis is None else pc.coalesce(millis, fraction)
+    millis = pc.cast(pc.utf8_slice_codeunits(pc.utf8_rpad(millis.fill_null(""), 3, "0"), 0, 3), pa.int64())
+    return pc.cast(pc.add(out, pc.cast(millis, pa.duration("ms"))), pa.timestamp("ms", tz="UTC"))
+
+
+def _app_timestamps(values):
+    """Timestamps _TEXT already matched ("2026-10-13 09:12:44,120"): fixed offsets, no regex pass."""
+    seconds = pc.replace_substring(pc.utf8_slice_codeunits(values, 0, 19), "T", " ")
+    seconds = pc.strptime(seconds, format="%Y-%m-%d %H:%M:%S", unit="ms", error_is_null=True)
+    millis = pc.cast(pc.cast(pc.utf8_slice_codeunits(values, 20, 23), pa.int64()), pa.duration("ms"))
+    return pc.cast(pc.add(seconds, millis), pa.timestamp("ms", tz="UTC"))
+
+
+def _text_fields(lines) -> dict:
+    """Typed columns of text-format lines; fields a line does not have are null."""
+    head = pc.extract_regex(lines, _TEXT)
+    fields = {name: _nulls(pc.struct_field(head, name))
+              for name in ("timestamp", "level", "trace_id", "user_id", "route", "duration_ms")}
+    fields["timestamp"] = _app_timestamps(fields["timestamp"])
+    fields["duration_ms"] = pc.cast(fields["duration_ms"], pa.float64())
+    fields["event"] = _group(lines, _EVENT)
+    error_type = _group(lines, _ERROR_TYPE)
+    fields["error_type"] = pc.if_else(pc.equal(error_type, "None"), pa.scalar(None, pa.string()), error_type)
+    fields["amount"] = pc.cast(_group(lines, _AMOUNT), pa.float64())
+    return fields
+
+
+def _json_fields(data: bytes) -> dict:
+    try:
+        table = pa_json.read_json(io.BytesIO(data), parse_options=pa_json.ParseOptions(
+            explicit_schema=JSON_FIELDS, unexpected_field_behavior="ignore", newlines_in_values=False))
+    except pa.ArrowInvalid:
+        # a line Arrow can't type (bad JSON, amount as a string...): slow path, line by line
+        docs = []
+        for line in data.split(b"\n"):
+            try:
+                doc = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(doc, dict):
+                continue
+            row = {}
+            for field in JSON_FIELDS:
+                value = doc.get(field.name)
+                if value is not None and field.type == pa.float64():
+                    try:
+                        value = float(value)
+                    except (TypeError, ValueError):
+                        value = None
+                elif value is not None:
+                    value = str(value)
+                row[field.name] = value
+            docs.append(row)
+        table = pa.Table.from_pylist(docs, schema=JSON_FIELDS)
+    fields = {name: table.column(name).combine_chunks() for name in JSON_FIELDS.names if name != "@timestamp"}
+    fields["timestamp"] = _timestamps(table.column("@timestamp").combine_chunks())
+    return fields
+
+
+def _table(fields: dict, service: str) -> pa.Table:
+    """Archive rows; lines without a parsable timestamp (tracebacks, blank lines) are dropped."""
+    n = len(fields["timestamp"])
+    default = pa.repeat(pa.scalar(service, pa.string()), n) if service else pa.nulls(n, pa.string())
+    own = fields.get("service")
+    fields["service"] = pc.coalesce(own, default) if own is not None else default
+    fields["date"] = pc.cast(fields["timestamp"], pa.date32())
+    columns = [fields[f.name] if fields.get(f.name) is not None else pa.nulls(n, f.type) for f in SCHEMA]
+    table = pa.Table.from_arrays([pc.cast(c, f.type) for c, f in zip(columns, SCHEMA)], schema=SCHEMA)
+    return table.filter(pc.is_valid(table.column("timestamp")))
+
+
+def parse_chunk(data: bytes, service: str) -> pa.Table:
+    """Complete lines of app.log (text and/or JSON lines) -> archive rows."""
+    if not data:
+        return SCHEMA.empty_table()
+    lines = pc.list_flatten(pc.split_pattern(pa.array([data.decode("utf-8", "replace")]), "\n"))
+    is_json = pc.starts_with(lines, "{")
+    if data.startswith(b"{") and pc.all(pc.or_(is_json, pc.equal(lines, ""))).as_py():
+        return _table(_json_fields(data), service)  # LOG_FORMAT=json: the chunk goes to Arrow's reader as is
+    tables = []
+    text = lines.filter(pc.invert(is_json))
+    if len(text):
+        tables.append(_table(_text_fields(text), service))
+    if pc.any(is_json).as_py():
+        tables.append(_table(_json_fields("\n".join(lines.filter(is_json).to_pylist()).encode()), service))
+    return pa.concat_tables(tables) if tables else SCHEMA.empty_table()
+
+
+def parse_range(path, start, end, service):
+    """Worker: one newline-aligned byte range of a plain file -> (rows, end)."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return parse_chunk(data, service), end
+
+
+def parse_gzip(path, start, service, chunk_bytes=CHUNK_BYTES):
+    """Worker: a rotated .gz segment from uncompressed offset `start` -> (rows, end of last complete line)."""
+    tables, pos, rest = [], start, b""
+    with gzip.open(path, "rb") as f:
+        f.seek(start)
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            block = rest + block
+            cut = block.rfind(b"\n") + 1
+            block, rest = block[:cut], block[cut:]
+            if block:
+                tables.append(parse_chunk(block, service))
+                pos += len(block)
+    return (pa.concat_tables(tables) if tables else SCHEMA.empty_table()), pos
+
+
+def _csv_fields(batch: pa.RecordBatch, names: dict) -> dict:
+    def column(key):
+        name = names.get(key)
+        return _nulls(batch.column(name)) if name else None
+
+    message = None
+    for name in CSV_COLUMNS["message"]:
+        if name in batch.schema.names:
+            col = _nulls(batch.column(name))
+            message = col if message is None else pc.coalesce(message, col)
+    parsed = _text_fields(message.fill_null("")) if message is not None else {}
+
+    fields = {}
+    for key in ("level", "trace_id", "user_id", "route", "event", "error_type", "service"):
+        typed = column(key)
+        if key == "error_type" and typed is not None:
+            typed = pc.if_else(pc.equal(typed, "None"), pa.scalar(None, pa.string()), typed)
+        fields[key] = typed if key not in parsed else (parsed[key] if typed is None else pc.coalesce(typed, parsed[key]))
+    for key in ("duration_ms", "amount"):
+        typed = column(key)
+        typed = _numbers(typed) if typed is not None else None
+        fields[key] = typed if key not in parsed else (parsed[key] if typed is None else pc.coalesce(typed, parsed[key]))
+    stamp = column("timestamp")
+    stamp = _timestamps(stamp) if stamp is not None else None
+    if stamp is None:
+        stamp = parsed.get("timestamp", pa.nulls(batch.num_rows, pa.timestamp("ms", tz="UTC")))
+    elif "timestamp" in parsed:
+        stamp = pc.coalesce(stamp, parsed["timestamp"])
+    fields["timestamp"] = stamp
+    return fields
+
+
+###############################################
+# ARCHIVE
+###############################################
+
+def _first_line_key(path) -> str:
+    """Identity of a log file across rotation and compression: hash of its first line."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        line = f.readline(4096)
+    return hashlib.sha1(line).hexdigest() if line.endswith(b"\n") else None
+
+
+def _complete_end(path) -> int:
+    """Offset just past the last newline of a plain file (a half-written line waits)."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        pos = size
+        while pos > 0:
+            start = max(0, pos - 65536)
+            f.seek(start)
+            cut = f.read(pos - start).rfind(b"\n")
+            if cut >= 0:
+                return start + cut + 1
+            pos = start
+    return 0
+
+
+def _ranges(path, start, end, size=CHUNK_BYTES):
+    """Newline-aligned (start, end) byte ranges covering [start, end)."""
+    ranges = []
+    with open(path, "rb") as f:
+        while start < end:
+            stop = min(end, start + size)
+            if stop < end:
+                f.seek(stop)
+                stop = min(end, stop + len(f.readline()))
+            ranges.append((start, stop))
+            start = stop
+    return ranges
+
+
+def _parse_when(value, end=False):
+    """"2026-10-13", "2026-10-13T09:00", "36h" / "7d" ago -> aware datetime (a bare date as `until` means its end)."""
+    if value is None or isinstance(value, datetime):
+        return value
+    value = str(value).strip()
+    if value[-1:] in ("m", "h", "d") and value[:-1].replace(".", "", 1).isdigit():
+        unit = {"m": "minutes", "h": "hours", "d": "days"}[value[-1]]
+        return datetime.now(timezone.utc) - timedelta(**{unit: float(value[:-1])})
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+class LogArchive:
+    def __init__(self, path: str):
+        self.path = path
+        self.manifest_path = os.path.join(path, "_manifest.json")
+        self.commit_path = os.path.join(path, "_commit.json")
+        self.staging_path = os.path.join(path, "_staging")
+
+    # ------------------------------------------------------------------ ingest
+
+    def _load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_json(self, path: str, doc: dict):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(doc, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _save_manifest(self, manifest: dict):
+        self._save_json(self.manifest_path, manifest)
+
+    def _write(self, batches, updates: dict) -> int:
+        """
+        Stream record batches into new files of the dataset and record
+        `updates` in the manifest, all or nothing; returns rows written.
+        """
+        counted = [0]
+
+        def counting():
+            for batch in batches:
+                counted[0] += batch.num_rows
+                yield batch
+
+        # parts go to _staging/<run>/ first (ignored by dataset discovery, like
+        # every "_" name) and only move into the dataset once they are complete
+        run = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        staging = os.path.join(self.staging_path, run)
+        ds.write_dataset(
+            pa.RecordBatchReader.from_batches(SCHEMA, counting()), staging, format="parquet",
+            partitioning=PARTITIONING, basename_template=f"part-{run}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore", min_rows_per_group=64 * 1024,
+            file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+        )
+        parts = []
+        for root, _, names in os.walk(staging):
+            parts += [os.path.relpath(os.path.join(root, name), staging) for name in names]
+        # the commit point: from here on the run is rolled forward, never lost or doubled
+        self._save_json(self.commit_path, {"run": run, "parts": parts, "manifest": updates})
+        self._recover()
+        return counted[0]
+
+    def _recover(self):
+        """Finish a run that reached its commit record; drop staged parts of runs that did not."""
+        try:
+            with open(self.commit_path) as f:
+                commit = json.load(f)
+        except FileNotFoundError:
+            commit = None
+        if commit is not None:
+            staging = os.path.join(self.staging_path, commit["run"])
+            for part in commit["parts"]:
+                src, dst = os.path.join(staging, part), os.path.join(self.path, part)
+                if os.path.exists(src):  # else already moved before a crash
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    os.replace(src, dst)
+            manifest = self._load_manifest()
+            manifest.update(commit["manifest"])
+            self._save_manifest(manifest)
+            os.unlink(self.commit_path)
+        shutil.rmtree(self.staging_path, ignore_errors=True)
+
+    def ingest_files(self, files: dict, workers: int = None, chunk_bytes: int = CHUNK_BYTES, progress=None):
+        """Archive {service: app.log path} and each file's rotated segments; returns rows added."""
+        self._recover()
+        manifest = self._load_manifest()
+        jobs, done = [], {}
+        for service, path in files.items():
+            for source in [s.path for s in list_segments(path)] + [path]:
+                key = _first_line_key(source) if os.path.exists(source) else None
+                if key is None:
+                    continue
+                seen = manifest.get(key, {})
+                if seen.get("complete"):
+                    continue
+                offset = seen.get("offset", 0)
+                entry = {"service": service, "location": os.path.abspath(source), "offset": offset}
+                if source.endswith(".gz"):
+                    jobs.append((key, parse_gzip, (source, offset, service)))
+                    entry["complete"] = True  # rotated segments never change again
+                else:
+                    end = _complete_end(source)
+                    jobs += [(key, parse_range, (source, a, b, service)) for a, b in _ranges(source, offset, end, chunk_bytes)]
+                    entry["offset"] = max(offset, end)
+                done[key] = entry
+        if not jobs:
+            if progress:
+                progress("nothing new to archive")
+            return 0
+
+        def batches():
+            workers_ = workers or os.cpu_count() or 1
+            finished = 0
+            with ProcessPoolExecutor(max_workers=workers_) as pool:
+                pending, queue = {}, list(reversed(jobs))
+                while queue or pending:
+                    # at most 2 chunks per worker in flight: bounded memory
+                    while queue and len(pending) < workers_ * 2:
+                        key, fn, args = queue.pop()
+                        pending[pool.submit(fn, *args)] = key
+                    ready, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in ready:
+                        key = pending.pop(future)
+                        table, end = future.result()
+                        if done[key].get("complete"):
+                            done[key]["offset"] = end
+                        finished += 1
+                        yield from table.to_batches()
+                    if progress:
+                        progress(f"{finished}/{len(jobs)} chunks parsed")
+
+        return self._write(batches(), done)
+
+    def ingest_csv(self, files: dict, block_bytes: int = CSV_BLOCK_BYTES, progress=None):
+        """Archive Kibana CSV exports ({service: path}; the service column wins when the export has one)."""
+        self._recover()
+        manifest = self._load_manifest()
+        new = {}
+        for service, path in files.items():
+            st = os.stat(path)
+            key = hashlib.sha1(f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime}".encode()).hexdigest()
+            if key in manifest:
+                if progress:
+                    progress(f"{path}: already archived, skipped")
+                continue
+            new[key] = {"service": service, "location": os.path.abspath(path), "complete": True}
+
+        def batches():
+            for key, entry in new.items():
+                path = entry["location"]
+                with open(path, newline="", encoding="utf-8-sig") as f:
+                    header = next(csv.reader(f), [])
+                names = {key_: next((n for n in candidates if n in header), None)
+                         for key_, candidates in CSV_COLUMNS.items()}
+                wanted = [n for n in names.values() if n] + [n for n in CSV_COLUMNS["message"] if n in header]
+                reader = pa_csv.open_csv(
+                    path, read_options=pa_csv.ReadOptions(block_size=block_bytes),
+                    convert_options=pa_csv.ConvertOptions(
+                        include_columns=list(dict.fromkeys(wanted)),
+                        column_types={n: pa.string() for n in header}, strings_can_be_null=True),
+                )
+                rows = 0
+                for batch in reader:
+                    table = _table(_csv_fields(batch, names), entry["service"])
+                    rows += table.num_rows
+                    yield from table.to_batches()
+                    if progress:
+                        progress(f"{path}: {rows:,} rows")
+
+        return self._write(batches(), new) if new else 0
+
+    # ------------------------------------------------------------------ queries
+
+    def dataset(self):
+        return ds.dataset(self.path, format="parquet", partitioning=PARTITIONING)
+
+    def where(self, service=None, route=None, user=None, level=None, event=None, since=None, until=None):
+        """Filter expression; the service / date parts prune whole partitions."""
+        conditions = []
+        since, until = _parse_when(since), _parse_when(until, end=True)
+        if since is not None:
+            conditions += [ds.field("date") >= pa.scalar(since.date(), pa.date32()),
+                           ds.field("timestamp") >= pa.scalar(since, SCHEMA.field("timestamp").type)]
+        if until is not None:
+            conditions += [ds.field("date") <= pa.scalar(until.date(), pa.date32()),
+                           ds.field("timestamp") < pa.scalar(until, SCHEMA.field("timestamp").type)]
+        for column, value in (("service", service), ("route", route), ("user_id", user), ("event", event)):
+            if value is not None:
+                conditions.append(ds.field(column) == value)
+        if level is not None:
+            conditions.append(ds.field("level") == level.upper())
+        expr = None
+        for condition in conditions:
+            expr = condition if expr is None else expr & condition
+        return expr
+
+    def _scan(self, columns, where=None) -> pa.Table:
+        return self.dataset().to_table(columns=list(dict.fromkeys(columns)), filter=where)
+
+    @staticmethod
+    def _rows(table: pa.Table, rename=None) -> list:
+        rename = rename or {}
+        return [{rename.get(k, k): v for k, v in row.items()} for row in table.to_pylist()]
+
+    def count(self, where=None) -> int:
+        return self.dataset().count_rows(filter=where)
+
+    def latency(self, by=None, where=None, percentiles=(50, 90, 99)) -> list:
+        """Per group: requests (access lines), mean / max and t-digest percentiles of duration_ms."""
+        keys = [GROUP_COLUMNS[by]] if by else []
+        where = ds.field("duration_ms").is_valid() if where is None else where & ds.field("duration_ms").is_valid()
+        table = self._scan(keys + ["duration_ms"], where)
+        q = [p / 100 for p in percentiles]
+        if not keys:
+            # one group: the scalar kernels (a keyless group_by mangles list results like tdigest)
+            column = table.column("duration_ms")
+            stats = [{"duration_ms_count": len(column), "duration_ms_mean": pc.mean(column).as_py(),
+                      "duration_ms_max": pc.max(column).as_py(),
+                      "duration_ms_tdigest": pc.tdigest(column, q=q).to_pylist() if len(column) else []}]
+        else:
+            stats = self._rows(table.group_by(keys).aggregate([
+                ("duration_ms", "count"), ("duration_ms", "mean"), ("duration_ms", "max"),
+                ("duration_ms", "tdigest", pc.TDigestOptions(q=q)),
+            ]).sort_by([("duration_ms_count", "descending")]), {keys[0]: by})
+        rows = []
+        for row in stats:
+            item = {k: row[k] for k in ([by] if by else [])}
+            item.update(requests=row["duration_ms_count"], mean=row["duration_ms_mean"], max=row["duration_ms_max"])
+            item.update({f"p{p:g}": v for p, v in zip(percentiles, row["duration_ms_tdigest"] or [])})
+            rows.append(item)
+        return rows
+
+    def errors(self, by=None, where=None) -> list:
+        """
+        Per group: requests, how many of them failed and the rate. A request
+        failed when its trace logged an ERROR/CRITICAL line or an error_type in
+        the same service (event lines carry no route, the join brings it).
+        """
+        keys = [GROUP_COLUMNS[by]] if by else []
+        table = self._scan(keys + ["service", "trace_id", "duration_ms", "level", "error_type"], where)
+        requests = table.filter(pc.is_valid(table.column("duration_ms")))
+        failed_lines = table.filter(pc.or_(pc.is_in(table.column("level"), pa.array(ERROR_LEVELS)),
+                                           pc.is_valid(table.column("error_type"))))
+        failed = failed_lines.group_by(["service", "trace_id"]).aggregate([("error_type", "count")])
+        failed = failed.append_column("failed", pa.array([True] * failed.num_rows, pa.bool_()))
+        joined = requests.select(list(dict.fromkeys(keys + ["service", "trace_id"]))).join(
+            failed.select(["service", "trace_id", "failed"]), keys=["service", "trace_id"], join_type="left outer")
+        out = joined.group_by(keys).aggregate([("trace_id", "count", pc.CountOptions(mode="all")), ("failed", "count")])
+        rows = []
+        for row in self._rows(out, {GROUP_COLUMNS.get(by): by}):
+            total, bad = row["trace_id_count"], row["failed_count"]
+            item = {k: row[k] for k in ([by] if by else [])}
+            item.update(requests=total, failed=bad, error_rate=bad / total if total else 0.0)
+            rows.append(item)
+        rows.sort(key=lambda r: (r["error_rate"], r["failed"]), reverse=True)
+        return rows
+
+    METRICS = ("requests", "errors", "lines", "total_ms", "p99", "amount")
+
+    def top(self, by, metric="requests", n=10, where=None) -> list:
+        """Top `n` groups by requests, error lines, all lines, total / p99 duration_ms or summed amount."""
+        key = GROUP_COLUMNS[by]
+        if metric in ("requests", "total_ms", "p99"):
+            column = "duration_ms"
+            aggregate = {"requests": ("count", None), "total_ms": ("sum", None),
+                         "p99": ("tdigest", pc.TDigestOptions(q=[0.99]))}[metric]
+            where = ds.field(column).is_valid() if where is None else where & ds.field(column).is_valid()
+            table = self._scan([key, column], where)
+        elif metric == "amount":
+            column, aggregate = "amount", ("sum", None)
+            where = ds.field(column).is_valid() if where is None else where & ds.field(column).is_valid()
+            table = self._scan([key, column], where)
+        elif metric == "errors":
+            column, aggregate = "level", ("count_all", None)
+            table = self._scan([key, "level", "error_type"], where)
+            table = table.filter(pc.or_(pc.is_in(table.column("level"), pa.array(ERROR_LEVELS)),
+                                        pc.is_valid(table.column("error_type"))))
+        elif metric == "lines":
+            column, aggregate = "level", ("count_all", None)
+            table = self._scan([key, "level"], where)
+        else:
+            raise ValueError(f"metric must be one of {self.METRICS}")
+
+        function, options = aggregate
+        spec = (column, function, options) if options else (column, function)
+        if function == "count_all":
+            spec = ([], "count_all")
+        out = table.group_by([key]).aggregate([spec])
+        value = out.column_names[0] if out.column_names[0] != key else out.column_names[1]
+        if function == "tdigest":
+            out = out.set_column(out.column_names.index(value), value,
+                                 pc.list_element(out.column(value), 0))
+        out = out.sort_by([(value, "descending")]).slice(0, n)
+        return [{by: row[key], metric: row[value]} for row in out.to_pylist()]
@@ -0,0 +1,372 @@
+"""
+In-process reader for /var/log/app.log (replaces `tail` subprocesses).
+
+The file is mmap'ed and scanned backwards from the end (or forwards from a
+cursor) with rfind/find, so a page of the newest lines costs the same on a
+10 KB file and a 10 GB one. Filters are plain byte needles: the reader jumps
+straight to lines containing the most selective one instead of decoding
+every line, and works for both text and LOG_FORMAT=json lines.
+
+Cursors are opaque strings; "older" pages further back, "newer" picks up
+anything written after the last call.
+
+History does not stop at the live file: once it runs out, paging carries on
+into the rotated segments (app.log.<stamp>, app.log.<stamp>.gz, see
+sre_common.logfile), newest first. Compressed segments are inflated into
+memory once and kept for the next few pages (SEGMENT_CACHE); offsets and
+cursors always refer to the uncompressed bytes, so a cursor stays valid when
+its segment gets compressed. A cursor into the live file finds its file by
+inode while that is on disk uncompressed, and by when the cursor was taken
+once it was rotated and gzipped (which gives it a new inode): the first
+segment rotated after that moment is the file that was live then.
+"""
+
+import base64
+import functools
+import gzip
+import json
+import mmap
+import os
+import time
+from contextlib import contextmanager
+
+from .logfile import Segment, list_segments, segment_name
+
+# how far one request may scan before it hands back a cursor instead
+MAX_SCAN_BYTES = 64 * 1024 * 1024
+
+# decompressed .gz segments kept in memory, so paging through one doesn't inflate it per page
+SEGMENT_CACHE = 2
+
+# text-format and json-format spelling of each filter, most selective first
+_NEEDLES = {
+    "trace": ("[trace={}]", '"trace_id":"{}"'),
+    "user": ("[user={}]", '"user_id":"{}"'),
+    "route": ("[route={}]", '"route":"{}"'),
+    "level": (" [{}] ", '"level":"{}"'),
+}
+
+
+class LogFilter:
+    """Match lines on trace / user / route / level (all optional, AND-ed)."""
+
+    def __init__(self, trace=None, user=None, route=None, level=None):
+        values = {"trace": trace, "user": user, "route": route, "level": level.upper() if level else None}
+        self.needles = [
+            [pattern.format(value).encode() for pattern in _NEEDLES[name]]
+            for name, value in values.items() if value
+        ]
+
+    def __bool__(self):
+        return bool(self.needles)
+
+    def matches(self, line: bytes) -> bool:
+        return all(any(n in line for n in variants) for variants in self.needles)
+
+
+def encode_cursor(offset: int, inode: int, direction: str, segment: str = "", after: str = "") -> str:
+    data = {"o": offset, "i": inode, "d": direction}
+    if segment:
+        data["s"] = segment
+    elif after:
+        data["a"] = after
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """
+    Return (offset, inode, direction, segment, after) or raise ValueError.
+    segment "" = live file; `after` = segment name it would have had when the cursor was taken.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return int(data["o"]), int(data["i"] or 0), data["d"], str(data.get("s", "")), str(data.get("a", ""))
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+def _line_bounds(mm, pos, size):
+    """Start/end (excluding newline) of the line containing byte `pos`."""
+    start = mm.rfind(b"\n", 0, pos) + 1
+    end = mm.find(b"\n", pos, size)
+    return start, (size if end == -1 else end)
+
+
+def _scan_backward(mm, end, limit, flt, scan_limit):
+    """Newest-first spans of matching lines ending at or before `end`."""
+    spans = []
+    floor = max(0, end - scan_limit)
+    if floor > 0:
+        floor = mm.rfind(b"\n", 0, floor) + 1  # only ever stop on a line boundary
+    pos = end
+    while pos > 0 and len(spans) < limit:
+        if pos <= floor:
+            break
+        if flt:
+            # jump to the closest candidate for the first (most selective) filter
+            hit = max(mm.rfind(n, floor, pos) for n in flt.needles[0])
+            if hit == -1:
+                pos = floor
+                break
+            start, stop = _line_bounds(mm, hit, pos)
+            if flt.matches(mm[start:stop]):
+                spans.append((start, stop))
+            pos = start
+        else:
+            stop = pos - 1 if mm[pos - 1:pos] == b"\n" else pos
+            start = mm.rfind(b"\n", 0, stop) + 1
+            if start < stop:
+                spans.append((start, stop))
+            pos = start
+    return spans, pos
+
+
+def _scan_forward(mm, begin, size, limit, flt, scan_limit):
+    """Oldest-first spans of complete matching lines starting at or after `begin`."""
+    spans = []
+    ceiling = min(size, begin + scan_limit)
+    pos = begin
+    while pos < ceiling and len(spans) < limit:
+        if flt:
+            hits = [h for h in (mm.find(n, pos, ceiling) for n in flt.needles[0]) if h != -1]
+            if not hits:
+                # keep a possibly partial last line for the next call
+                pos = max(pos, mm.rfind(b"\n", pos, ceiling) + 1)
+                break
+            start, stop = _line_bounds(mm, min(hits), size)
+            start = max(start, pos)
+        else:
+            start = pos
+            nl = mm.find(b"\n", pos, size)
+            stop = size if nl == -1 else nl
+        if stop >= size:
+            break  # line still being written
+        if start < stop and (not flt or flt.matches(mm[start:stop])):
+            spans.append((start, stop))
+        pos = stop + 1
+    return spans, pos
+
+
+@functools.lru_cache(maxsize=SEGMENT_CACHE)
+def _inflate(path, mtime_ns):
+    with gzip.open(path, "rb") as f:
+        return f.read()
+
+
+def _sources(path):
+    """Every file of the log, oldest first: rotated segments, then the live file."""
+    return list_segments(path) + [Segment("", path, False)]
+
+
+def _locate(sources, name, inode, after=""):
+    """Index of the file a cursor points into, or None if it is gone."""
+    if name:
+        for i, source in enumerate(sources):
+            if source.name == name:
+                return i
+        return None
+    # the live file, or an uncompressed segment it was renamed to since
+    for i in range(len(sources) - 1, -1, -1):
+        if not sources[i].compressed:
+            try:
+                if os.stat(sources[i].path).st_ino == inode:
+                    return i
+            except FileNotFoundError:
+                pass
+    if after:
+        # rotated and compressed since: the first segment rotated after the cursor was taken
+        for i, source in enumerate(sources[:-1]):
+            if source.compressed and source.name >= after:
+                return i
+    return None
+
+
+def _cursor(source, inode, offset, direction, taken):
+    # segments are found by name, the live file by inode (None: look it up) or when it was read
+    if source.name:
+        inode = 0
+    elif inode is None:
+        try:
+            inode = os.stat(source.path).st_ino
+        except FileNotFoundError:
+            inode = 0
+    return encode_cursor(offset, inode, direction, source.name, taken)
+
+
+@contextmanager
+def _mapped(source):
+    """(buffer, inode) of one file, empty if it is gone; buffers support find/rfind/slicing."""
+    fd = None
+    if not source.compressed:
+        try:
+            fd = os.open(source.path, os.O_RDONLY)
+        except FileNotFoundError:
+            pass
+    if fd is None:
+        # a compressed segment, or a plain one the compressor replaced since it was listed
+        gz = source.path if source.compressed else source.path + ".gz"
+        buf, inode = b"", None
+        if source.name:
+            try:
+                st = os.stat(gz)
+                buf, inode = _inflate(gz, st.st_mtime_ns), st.st_ino
+            except (OSError, EOFError):
+                pass  # deleted by retention, or a damaged archive
+        yield buf, inode
+        return
+    try:
+        st = os.fstat(fd)
+        if st.st_size == 0:
+            yield b"", st.st_ino
+        else:
+            with mmap.mmap(fd, st.st_size, access=mmap.ACCESS_READ) as mm:
+                yield mm, st.st_ino
+    finally:
+        os.close(fd)
+
+
+class LogPage:
+    """Spans of matching lines per file (oldest first) plus paging cursors."""
+
+    def __init__(self, path, chunks, older, newer, inode=None, taken=""):
+        self.path = path
+        self.chunks = chunks  # [(segment name, inode, spans)], name "" = live file
+        self.spans = [span for _, _, spans in chunks for span in spans]
+        self.older = older
+        self.newer = newer
+        self.inode = inode
+        self.taken = taken  # segment name the live file would have got when the page was read
+
+    def cursor_at(self, offset: int, direction: str = "f") -> str:
+        """Cursor into the live file."""
+        return encode_cursor(offset, self.inode, direction, after=self.taken)
+
+    def first_cursor(self, direction: str = "f") -> str:
+        """Cursor at the first line of the page (`newer` when it is empty)."""
+        if not self.spans:
+            return self.newer
+        name, inode, spans = self.chunks[0]
+        return encode_cursor(spans[0][0], inode, direction, name, self.taken)
+
+    def iter_lines(self):
+        """Decode the lines lazily, one file at a time."""
+        if not self.chunks:
+            return
+        sources = _sources(self.path)
+        for name, inode, spans in self.chunks:
+            i = _locate(sources, name, inode, self.taken)
+            if i is None:
+                continue  # deleted by retention since the page was read
+            with _mapped(sources[i]) as (buf, _):
+                for a, b in spans:
+                    yield buf[a:b].decode("utf-8", "replace")
+
+    def as_dict(self):
+        return {"logs": list(self.iter_lines()), "older": self.older, "newer": self.newer}
+
+
+def _page_backward(sources, idx, offset, lines, flt, budget, taken):
+    chunks, newer = [], None
+    while True:
+        with _mapped(sources[idx]) as (buf, inode):
+            if offset is None or offset > len(buf):
+                # end of the last complete line; a half-written one waits for "newer"
+                offset = buf.rfind(b"\n") + 1
+            if newer is None:
+                newer = _cursor(sources[idx], inode, offset, "f", taken)
+            spans, stop = _scan_backward(buf, offset, lines, flt, budget)
+        budget -= offset - stop
+        if spans:
+            spans.reverse()
+            chunks.append((sources[idx].name, inode, spans))
+            lines -= len(spans)
+        if stop > 0:
+            older = _cursor(sources[idx], inode, stop, "b", taken)
+            break
+        if idx == 0:
+            older = None
+            break
+        # this file is exhausted: carry on at the end of the previous one
+        idx, offset = idx - 1, None
+        if lines <= 0 or budget <= 0:
+            older = _cursor(sources[idx], None, -1, "b", taken)
+            break
+    chunks.reverse()
+    return chunks, older, newer
+
+
+def _page_forward(sources, idx, offset, lines, flt, budget, taken):
+    chunks, older, first = [], None, True
+    while True:
+        with _mapped(sources[idx]) as (buf, inode):
+            size = len(buf)
+            if offset > size:
+                offset = 0  # truncated
+            if first:
+                if offset > 0:
+                    older = _cursor(sources[idx], inode, offset, "b", taken)
+                elif idx > 0:
+                    older = _cursor(sources[idx - 1], None, -1, "b", taken)
+                first = False
+            spans, stop = _scan_forward(buf, offset, size, lines, flt, budget)
+            # a rotated segment is complete: a last line without newline never will be
+            exhausted = idx < len(sources) - 1 and buf.find(b"\n", stop) == -1
+        budget -= stop - offset
+        if spans:
+            chunks.append((sources[idx].name, inode, spans))
+            lines -= len(spans)
+        if not exhausted:
+            newer = _cursor(sources[idx], inode, stop, "f", taken)
+            break
+        idx, offset = idx + 1, 0
+        if lines <= 0 or budget <= 0:
+            newer = _cursor(sources[idx], None, 0, "f", taken)
+            break
+    return chunks, older, newer
+
+
+def read_page(path, lines=50, cursor=None, flt=None, scan_limit=MAX_SCAN_BYTES) -> LogPage:
+    """
+    Locate one page of `lines` matching lines (offsets only, nothing decoded).
+
+    No cursor: the newest lines. "older" cursor: the page before it.
+    "newer" cursor: lines appended since (empty page if nothing new yet).
+    Pages run on into rotated segments when the live file alone can't fill
+    them, and a "newer" cursor taken before a rotation finishes the old file
+    before moving to the new one.
+    Raises ValueError on a malformed cursor.
+    """
+    flt = flt or LogFilter()
+    taken = segment_name(time.time())  # before anything is opened: see _locate
+    sources = _sources(path)
+    try:
+        live_inode = os.stat(path).st_ino
+    except FileNotFoundError:
+        live_inode = None
+    if live_inode is None and len(sources) == 1:
+        return LogPage(path, [], None, None)
+
+    idx, offset, direction = len(sources) - 1, None, "b"
+    if cursor:
+        offset, inode, direction, name, after = decode_cursor(cursor)
+        offset = None if offset < 0 else offset
+        found = _locate(sources, name, inode, after)
+        if found is not None:
+            idx = found
+        elif name:
+            # segment deleted by retention: nothing older left, newer goes on after it
+            idx = next((i for i, s in enumerate(sources) if s.name > name), len(sources) - 1)
+            if direction != "f":
+                return LogPage(path, [], None, _cursor(sources[idx], None, 0, "f", taken), live_inode, taken)
+            offset = 0
+        else:
+            # live file truncated, or its segment deleted already: start over from a sane place
+            offset = None if direction != "f" else 0
+
+    if direction == "f":
+        chunks, older, newer = _page_forward(sources, idx, offset or 0, lines, flt, scan_limit, taken)
+    else:
+        chunks, older, newer = _page_backward(sources, idx, offset, lines, flt, scan_limit, taken)
+    return LogPage(path, chunks, older, newer, live_inode, taken)
@@ -0,0 +1,312 @@
+"""
+The shared log file on disk: multi-process appends, rotation, rotated segments.
+
+The log writer thread (sre_common.logging_setup) writes through
+RotatingAppendFile, which rotates by size and/or time:
+
+    app.log                              live file
+    app.log.20261018-074512-031337       rotated (UTC stamp), not compressed yet
+    app.log.20261018-074512-031337.gz    rotated and compressed
+
+Rotating is a rename on the writer thread. gzip runs on a separate
+compressor thread a couple of seconds later, at nice 19 on Linux, so neither
+the event loop nor the log writer waits on it. Retention is applied after each compression,
+and the oldest segments are deleted first. /logs reads across all of these
+(sre_common.log_reader).
+
+Several worker processes share the file. The one that rotates holds an
+flock on app.log.lock, and under it checks again that nobody rotated first.
+The others see that the path now has a different inode and reopen it before
+their next write.
+
+Environment knobs:
+    LOG_ROTATE_BYTES        rotate before the live file passes this size  (default 67108864, 0 = never)
+    LOG_ROTATE_SECONDS      also rotate at every multiple of this (UTC)    (default 0 = never, 86400 = daily)
+    LOG_COMPRESS            "gzip" (default) or "none"
+    LOG_RETENTION_FILES     rotated segments to keep                      (default 10, 0 = no limit)
+    LOG_RETENTION_BYTES     max total size of rotated segments on disk    (default 0 = no limit)
+    LOG_RETENTION_SECONDS   delete segments last written longer ago       (default 0 = no limit)
+"""
+
+import fcntl
+import glob
+import gzip
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+ROTATE_BYTES = int(os.getenv("LOG_ROTATE_BYTES", str(64 * 1024 * 1024)))
+ROTATE_SECONDS = int(os.getenv("LOG_ROTATE_SECONDS", "0"))
+COMPRESS = os.getenv("LOG_COMPRESS", "gzip").lower() == "gzip"
+RETENTION_FILES = int(os.getenv("LOG_RETENTION_FILES", "10"))
+RETENTION_BYTES = int(os.getenv("LOG_RETENTION_BYTES", "0"))
+RETENTION_SECONDS = int(os.getenv("LOG_RETENTION_SECONDS", "0"))
+
+# largest single write(2); batches above this are split at line boundaries
+APPEND_CHUNK = 1 << 20
+
+# a worker that has not noticed a rotation yet may still append one batch to
+# the renamed file: segments are compressed only once they are this quiet
+COMPRESS_DELAY = 2.0
+COMPRESS_LEVEL = 6
+
+# "live" is the current file (name ""), anything else a rotated segment
+Segment = namedtuple("Segment", "name path compressed")
+
+_STAMP = "%Y%m%d-%H%M%S-%f"
+_STOP = object()
+
+logger = logging.getLogger("sre_common")
+
+
+def segment_name(now: float) -> str:
+    """Name a segment rotated at `now` gets; names sort by rotation time."""
+    return datetime.fromtimestamp(now, timezone.utc).strftime(_STAMP)
+
+
+def segment_path(path: str, now: float) -> str:
+    return f"{path}.{segment_name(now)}"
+
+
+def list_segments(path: str) -> list:
+    """Rotated segments of `path`, oldest first (an uncompressed copy wins while both exist)."""
+    pattern = re.compile(re.escape(os.path.basename(path)) + r"\.(\d{8}-\d{6}-\d{6})(\.gz)?$")
+    found = {}
+    try:
+        names = os.listdir(os.path.dirname(path) or ".")
+    except FileNotFoundError:
+        return []
+    for entry in names:
+        m = pattern.match(entry)
+        if m and (m.group(1) not in found or not m.group(2)):
+            found[m.group(1)] = Segment(m.group(1), os.path.join(os.path.dirname(path), entry), bool(m.group(2)))
+    return [found[name] for name in sorted(found)]
+
+
+class AppendFile:
+    """Append-only log file that several processes can write at once."""
+
+    def __init__(self, path: str, chunk: int = APPEND_CHUNK):
+        self.path = path
+        self.chunk = chunk
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def write(self, text: str):
+        self.write_bytes(text.encode("utf-8"))
+
+    def write_bytes(self, data: bytes):
+        data = memoryview(data)
+        start = 0
+        while start < len(data):
+            end = len(data)
+            if end - start > self.chunk:
+                cut = bytes(data[start:start + self.chunk]).rfind(b"\n")
+                end = start + (cut + 1 if cut >= 0 else self.chunk)
+            start += os.write(self.fd, data[start:end])
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class SegmentCompressor:
+    """Background thread: gzips rotated segments, then applies retention."""
+
+    def __init__(self, path: str, compress: bool = COMPRESS, keep_files: int = RETENTION_FILES,
+                 keep_bytes: int = RETENTION_BYTES, keep_seconds: int = RETENTION_SECONDS,
+                 delay: float = COMPRESS_DELAY):
+        self.path = path
+        self.compress = compress
+        self.keep_files = keep_files
+        self.keep_bytes = keep_bytes
+        self.keep_seconds = keep_seconds
+        self.delay = delay
+        self.queue = queue.Queue()
+        self._thread = None
+        self.stats = {"compressed": 0, "deleted": 0, "errors": 0}
+
+    def submit(self):
+        """Ask for a sweep (after a rotation, or at startup for leftovers)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="log-compressor", daemon=True)
+            self._thread.start()
+        self.queue.put(None)
+
+    def stop(self):
+        # not joined: exiting mid-gzip only leaves a temp file the next sweep removes
+        if self._thread is not None:
+            self.queue.put(_STOP)
+            self._thread = None
+
+    def after_fork(self):
+        # the thread is gone in the child and the queue's lock may be held
+        self.queue = queue.Queue()
+        self._thread = None
+
+    def _run(self):
+        try:
+            # Linux: nice applies per thread, gzip yields the CPU to request handling
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            if self.queue.get() is _STOP:
+                return
+            pending = True
+            while pending:
+                time.sleep(self.delay)
+                stopping = False
+                while True:  # one sweep covers every rotation queued meanwhile
+                    try:
+                        stopping = self.queue.get_nowait() is _STOP or stopping
+                    except queue.Empty:
+                        break
+                try:
+                    pending = self.sweep()
+                except Exception as e:
+                    pending = False
+                    self.stats["errors"] += 1
+                    logger.warning(f"log segment sweep failed for {self.path}: {type(e).__name__}: {e}")
+                if stopping:
+                    return
+
+    def sweep(self) -> bool:
+        """Compress quiet segments, apply retention; True if a segment was too fresh to compress yet."""
+        now = time.time()
+        pending = False
+        if self.compress:
+            for seg in list_segments(self.path):
+                if not seg.compressed and not os.path.exists(seg.path + ".gz"):
+                    try:
+                        if now - os.stat(seg.path).st_mtime >= self.delay:
+                            self._gzip(seg.path)
+                        else:
+                            pending = True
+                    except FileNotFoundError:
+                        pass  # another worker got there first
+        self._retain(now)
+        return pending
+
+    def _gzip(self, path: str):
+        # per-process temp name: two workers sweeping at once both produce the
+        # same .gz, the rename makes whichever finishes last the one that stays
+        tmp = f"{path}.gz.tmp{os.getpid()}"
+        with open(path, "rb") as src, gzip.open(tmp, "wb", compresslevel=COMPRESS_LEVEL) as dst:
+            shutil.copyfileobj(src, dst, APPEND_CHUNK)
+            st = os.fstat(src.fileno())
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))  # age-based retention keeps working
+        os.rename(tmp, path + ".gz")
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        self.stats["compressed"] += 1
+
+    def _retain(self, now: float):
+        total = 0
+        for i, seg in enumerate(reversed(list_segments(self.path))):  # newest first
+            try:
+                st = os.stat(seg.path)
+            except FileNotFoundError:
+                continue
+            total += st.st_size
+            if ((self.keep_files and i >= self.keep_files)
+                    or (self.keep_bytes and total > self.keep_bytes)
+                    or (self.keep_seconds and now - st.st_mtime > self.keep_seconds)):
+                self._unlink(seg.path)
+        # temp files of a compression that died with its process
+        for tmp in glob.glob(glob.escape(self.path) + ".*.gz.tmp*"):
+            try:
+                if now - os.stat(tmp).st_mtime > 60:
+                    self._unlink(tmp)
+            except FileNotFoundError:
+                pass
+
+    def _unlink(self, path: str):
+        try:
+            os.unlink(path)
+            self.stats["deleted"] += 1
+        except FileNotFoundError:
+            pass
+
+
+class RotatingAppendFile(AppendFile):
+    """AppendFile that rotates by size / time and hands segments to a SegmentCompressor."""
+
+    def __init__(self, path: str, max_bytes: int = ROTATE_BYTES, interval: int = ROTATE_SECONDS,
+                 compressor: SegmentCompressor = None, chunk: int = APPEND_CHUNK):
+        super().__init__(path, chunk)
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.compressor = compressor or SegmentCompressor(path)
+        self.rotations = 0
+        self.period = self._period_of(os.fstat(self.fd))
+        self.compressor.submit()  # leftovers from a previous run
+
+    def _period_of(self, st) -> int:
+        # a non-empty file belongs to the period it was last written in, so a
+        # restart after midnight still rotates yesterday's lines away
+        if not self.interval:
+            return 0
+        return int((st.st_mtime if st.st_size else time.time()) // self.interval)
+
+    def _due(self, size: int, incoming: int, now: float) -> bool:
+        if not size:
+            return False
+        return bool((self.max_bytes and size + incoming > self.max_bytes)
+                    or (self.interval and int(now // self.interval) != self.period))
+
+    def _reopen(self):
+        old, self.fd = self.fd, os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        os.close(old)
+        self.period = self._period_of(os.fstat(self.fd))
+
+    def write(self, text: str):
+        data = text.encode("utf-8")
+        st = os.fstat(self.fd)
+        try:
+            moved = os.stat(self.path).st_ino != st.st_ino
+        except FileNotFoundError:
+            moved = True
+        if moved:
+            # another worker rotated (or someone removed the file): follow the path
+            self._reopen()
+            st = os.fstat(self.fd)
+        now = time.time()
+        if self._due(st.st_size, len(data), now):
+            self._rotate(len(data), now)
+        self.write_bytes(data)
+
+    def _rotate(self, incoming: int, now: float):
+        rotated = False
+        with open(self.path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                st = None
+            # under the lock: only if the path is still our file and still due
+            if st is not None and st.st_ino == os.fstat(self.fd).st_ino and self._due(st.st_size, incoming, now):
+                os.rename(self.path, segment_path(self.path, now))
+                self.rotations += 1
+                rotated = True
+            self._reopen()
+        if rotated:
+            self.compressor.submit()
+
+    def after_fork(self):
+        self.compressor.after_fork()
+
+    def close(self):
+        self.compressor.stop()
+        super().close()
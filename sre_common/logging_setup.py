@@ -0,0 +1,219 @@
+"""
+Non-blocking logging for the services.
+
+Request handlers only put records on a bounded in-memory queue. A single
+background thread drains it in batches and does buffered writes to
+/var/log/app.log and stdout, so a slow disk never stalls the event loop.
+
+    logger = setup_logging("payment-service")
+
+Environment knobs:
+    LOG_FILE          path of the shared log file   (default /var/log/app.log)
+    LOG_LEVEL         root level                    (default INFO)
+    LOG_QUEUE_SIZE    max queued records            (default 10000)
+    LOG_BATCH_SIZE    max records per write         (default 512)
+    LOG_OVERFLOW      "drop"  -> drop + count INFO/DEBUG when the queue is full
+                      "block" -> wait for room, never drop anything
+                      WARNING and above always wait, they are never dropped.
+    LOG_FORMAT        "text" (default) or "json" for one JSON object per line
+
+INFO/DEBUG records logged while serving an unsampled request are dropped
+before they reach the queue (sre_common.tracing.SamplingFilter).
+
+Several worker processes (gunicorn, see sre_common.gunicorn_conf) can share
+the log file: it is opened O_APPEND and every write(2) carries whole lines
+only, so lines from different workers never interleave. A writer thread
+started before a fork (--preload) is restarted in the child.
+
+The file is rotated by size and/or time, and rotated segments are gzipped in
+the background (LOG_ROTATE_BYTES, LOG_RETENTION_FILES, ..., see
+sre_common.logfile).
+"""
+
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler
+
+from .jsonlog import JsonFormatter
+from .logfile import RotatingAppendFile
+from .tracing import SamplingFilter
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+LOG_FILE = os.getenv("LOG_FILE", "/var/log/app.log")
+
+_STOP = object()
+_listener = None
+_handler = None
+
+class BoundedQueueHandler(QueueHandler):
+    """QueueHandler with an overflow policy instead of unbounded growth."""
+
+    def __init__(self, q: queue.Queue, overflow: str = "drop"):
+        super().__init__(q)
+        self.overflow = overflow
+        self.dropped = 0
+        self._lock_dropped = threading.Lock()
+
+    def prepare(self, record):
+        # same process, same objects: skip the pickling-oriented copy/format
+        # the stdlib does here. Formatting happens on the writer thread.
+        return record
+
+    def enqueue(self, record):
+        if record.levelno >= logging.WARNING or self.overflow == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock_dropped:
+                self.dropped += 1
+
+    def take_dropped(self) -> int:
+        with self._lock_dropped:
+            n, self.dropped = self.dropped, 0
+        return n
+
+
+class BatchingListener:
+    """Background writer: drains the queue and writes each batch in one go."""
+
+    def __init__(self, q: queue.Queue, handler: BoundedQueueHandler, streams, batch_size: int = 512, formatter=None):
+        self.queue = q
+        self.handler = handler
+        self.streams = streams
+        self.batch_size = batch_size
+        self.formatter = formatter or logging.Formatter(LOG_FORMAT)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self.queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        for stream in self.streams:
+            try:
+                stream.flush()
+                if stream not in (sys.stdout, sys.stderr):
+                    stream.close()
+            except Exception:
+                pass
+
+    def _format(self, record) -> str:
+        try:
+            return self.formatter.format(record)
+        except Exception:
+            return f"[log format error] {record.msg!r}"
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            stopping = record is _STOP
+            batch = [] if stopping else [record]
+
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    continue
+                batch.append(record)
+
+            lines = [self._format(r) for r in batch]
+            dropped = self.handler.take_dropped()
+            if dropped:
+                lines.append(self._format(logging.makeLogRecord({
+                    "levelno": logging.WARNING, "levelname": "WARNING",
+                    "msg": f"log queue full: dropped {dropped} INFO/DEBUG records",
+                })))
+            if lines:
+                self._write("\n".join(lines) + "\n")
+
+            if stopping:
+                return
+
+    def _write(self, text: str):
+        for stream in self.streams:
+            try:
+                stream.write(text)
+                stream.flush()
+            except Exception:
+                pass
+
+
+def setup_logging(service_name: str, log_file: str = LOG_FILE) -> logging.Logger:
+    """Route the root logger through the queue and return the service logger."""
+    global _listener, _handler
+
+    if _listener is None:
+        q = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+        handler = BoundedQueueHandler(q, overflow=os.getenv("LOG_OVERFLOW", "drop"))
+        handler.addFilter(SamplingFilter())
+
+        streams = [sys.stdout]
+        # also log to file for /logs endpoint and shipping
+        try:
+            os.makedirs(os.path.dirname(log_file), exist_ok=True)
+            streams.append(RotatingAppendFile(log_file))
+        except Exception:
+            pass
+
+        root = logging.getLogger()
+        for h in list(root.handlers):
+            root.removeHandler(h)
+        root.addHandler(handler)
+        root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+        if os.getenv("LOG_FORMAT", "text").lower() == "json":
+            formatter = JsonFormatter(service=service_name)
+        else:
+            formatter = logging.Formatter(LOG_FORMAT)
+
+        _handler = handler
+        _listener = BatchingListener(q, handler, streams, batch_size=int(os.getenv("LOG_BATCH_SIZE", "512")),
+                                     formatter=formatter)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+    return logging.getLogger(service_name)
+
+
+def _after_fork_in_child():
+    # the writer thread does not survive fork(); records the parent had queued
+    # stay the parent's to write, the child starts with an empty queue
+    if _listener is None:
+        return
+    q = queue.Queue(maxsize=_listener.queue.maxsize)
+    _handler.queue = q
+    _handler._lock_dropped = threading.Lock()
+    _handler.dropped = 0
+    _listener.queue = q
+    for stream in _listener.streams:
+        if hasattr(stream, "after_fork"):
+            stream.after_fork()
+    _listener.start()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def shutdown_logging():
+    """Flush everything still queued and stop the writer thread."""
+    global _listener, _handler
+    if _listener is not None:
+        # detach first so late records don't pile up in a queue nobody drains
+        logging.getLogger().removeHandler(_handler)
+        _listener.stop()
+        _listener = None
+        _handler = None
@@ -0,0 +1,221 @@
+"""
+Shared /logs endpoint.
+
+    app.include_router(logs_router())
+
+GET /logs?lines=50&trace=..&user=..&level=..&route=..&cursor=..
+returns {"logs": [...oldest first...], "older": cursor, "newer": cursor}.
+File access runs in the threadpool, and big pages are streamed out instead
+of being built as one giant JSON document. "older" keeps going into the
+rotated (and gzipped) segments once the live file is exhausted.
+
+GET /logs/stream?trace=..&user=..&level=..&route=..&lines=0&format=sse|ndjson
+keeps the connection open and pushes new lines as they are written.
+SSE events carry the cursor as `id:`, so a reconnecting EventSource resumes
+where it left off via Last-Event-ID.
+
+    app.include_router(loglevel_router())
+
+GET /loglevel shows the logger levels and the per-route access-log rules;
+POST /loglevel changes them in place, no restart, in every worker (through
+the journal in sre_common.middleware.LogLevelJournal):
+    {"logger": "payment-service", "level": "DEBUG"}     (no logger = root)
+    {"route": "/list", "rate": 0.1, "level": "DEBUG"}   (access-log rule)
+    {"route": "/list", "reset": true}                   (drop the rule)
+POST needs a bearer token with the "admin" role (verified by
+TokenAuthMiddleware, issued by auth-service to AUTH_ADMINS logging in with
+their password), and the gateway does not route /loglevel at all: it is for
+operators inside the network.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from .jsonlog import _dumps
+from .log_reader import LogFilter, read_page
+from .logging_setup import LOG_FILE
+from .middleware import ACCESS_LOG, LOGLEVELS, LogLevelJournal
+from .tokens import ADMIN_ROLE
+
+# pages bigger than this are streamed
+STREAM_LINES = 1000
+
+# follow mode: how often to look for new lines, max lines per read, keep-alive period
+FOLLOW_POLL_SECONDS = 0.25
+FOLLOW_BATCH_LINES = 500
+FOLLOW_HEARTBEAT_SECONDS = 15
+
+
+def _stream_page(page, chunk: int = 500):
+    yield f'{{"older":{_dumps(page.older)},"newer":{_dumps(page.newer)},"logs":['.encode()
+    batch, first = [], True
+    for line in page.iter_lines():
+        batch.append(_dumps(line))
+        if len(batch) >= chunk:
+            yield (("" if first else ",") + ",".join(batch)).encode()
+            batch, first = [], False
+    if batch:
+        yield (("" if first else ",") + ",".join(batch)).encode()
+    yield b"]}"
+
+
+def _sse(lines, cursor) -> bytes:
+    out = [f"data: {line}\n\n" for line in lines[:-1]]
+    # only the last event of a batch carries the resume cursor
+    out.append(f"id: {cursor}\ndata: {lines[-1]}\n\n")
+    return "".join(out).encode()
+
+
+async def _follow(request: Request, log_file: str, flt, cursor: str, fmt: str):
+    """
+    Yield new lines forever. Nothing is buffered server-side: the next read
+    only happens once the previous chunk was handed to the client, so a slow
+    reader just falls behind in the file instead of growing memory.
+    """
+    last_sent = time.monotonic()
+    while True:
+        if cursor is None:
+            # no log file when we started: once it appears, all of it is new
+            probe = await run_in_threadpool(read_page, log_file, 0)
+            if probe.inode is not None:
+                cursor = probe.cursor_at(0)
+            page = probe
+        else:
+            page = await run_in_threadpool(read_page, log_file, FOLLOW_BATCH_LINES, cursor, flt)
+            # rotation is handled by read_page: the rotated file is finished first, then the new one
+            cursor = page.newer or cursor
+
+        if page.spans:
+            lines = await run_in_threadpool(lambda: list(page.iter_lines()))
+            if fmt == "ndjson":
+                yield "".join(_dumps(line) + "\n" for line in lines).encode()
+            else:
+                yield _sse(lines, cursor)
+            last_sent = time.monotonic()
+            if len(page.spans) == FOLLOW_BATCH_LINES:
+                continue  # more is waiting, don't sleep
+
+        if await request.is_disconnected():
+            return
+        if time.monotonic() - last_sent >= FOLLOW_HEARTBEAT_SECONDS:
+            yield b": keep-alive\n\n" if fmt == "sse" else b"\n"
+            last_sent = time.monotonic()
+        await asyncio.sleep(FOLLOW_POLL_SECONDS)
+
+
+def logs_router(log_file: str = LOG_FILE) -> APIRouter:
+    router = APIRouter()
+
+    @router.get("/logs")
+    async def get_logs(
+        lines: int = Query(50, ge=1, le=100000),
+        cursor: str = None,
+        trace: str = None,
+        user: str = None,
+        level: str = None,
+        route: str = None,
+    ):
+        flt = LogFilter(trace=trace, user=user, route=route, level=level)
+        try:
+            page = await run_in_threadpool(read_page, log_file, lines, cursor, flt)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        if len(page.spans) <= STREAM_LINES:
+            return await run_in_threadpool(page.as_dict)
+        # sync generator -> Starlette iterates it in the threadpool
+        return StreamingResponse(_stream_page(page), media_type="application/json")
+
+    @router.get("/logs/stream")
+    async def stream_logs(
+        request: Request,
+        lines: int = Query(0, ge=0, le=10000),
+        trace: str = None,
+        user: str = None,
+        level: str = None,
+        route: str = None,
+        format: str = Query("sse", pattern="^(sse|ndjson)$"),
+        cursor: str = None,
+        last_event_id: str = Header(None),
+    ):
+        flt = LogFilter(trace=trace, user=user, route=route, level=level)
+        cursor = cursor or last_event_id
+        try:
+            if cursor:
+                await run_in_threadpool(read_page, log_file, 0, cursor, flt)  # validate
+            else:
+                # start at the end of the file, optionally replaying the last `lines`
+                start = await run_in_threadpool(read_page, log_file, lines, None, flt)
+                cursor = start.first_cursor()
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        media_type = "application/x-ndjson" if format == "ndjson" else "text/event-stream"
+        return StreamingResponse(
+            _follow(request, log_file, flt, cursor, format),
+            media_type=media_type,
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    return router
+
+
+class LogLevelChange(BaseModel):
+    logger: Optional[str] = None
+    route: Optional[str] = None
+    level: Optional[str] = None
+    rate: Optional[float] = None
+    reset: bool = False
+
+
+def _levels(policy=ACCESS_LOG) -> dict:
+    loggers = {
+        name: logging.getLevelName(lg.level)
+        for name, lg in sorted(logging.Logger.manager.loggerDict.items())
+        if isinstance(lg, logging.Logger) and lg.level != logging.NOTSET
+    }
+    return {"root": logging.getLevelName(logging.getLogger().level), "loggers": loggers,
+            "access_log": policy.as_dict()}
+
+
+def require_role(role: str):
+    """Dependency: the request's verified token (request.state.claims) must carry `role`."""
+    def check(request: Request):
+        claims = getattr(request.state, "claims", None)
+        if claims is None:
+            raise HTTPException(status_code=401, detail="bearer token required",
+                                headers={"WWW-Authenticate": "Bearer"})
+        roles = claims.get("roles")
+        if not isinstance(roles, list) or role not in roles:
+            raise HTTPException(status_code=403, detail=f"{role} role required")
+        return claims
+    return check
+
+
+def loglevel_router(levels: LogLevelJournal = LOGLEVELS, role: str = ADMIN_ROLE) -> APIRouter:
+    router = APIRouter()
+
+    @router.get("/loglevel")
+    async def get_levels():
+        levels.poll(force=True)
+        return _levels(levels.policy)
+
+    @router.post("/loglevel")
+    async def set_level(change: LogLevelChange, claims: dict = Depends(require_role(role))):
+        try:
+            # journalled, so every worker of the service applies it, not just this one
+            levels.change(change.model_dump(exclude_none=True))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        logging.getLogger("sre_common").warning(
+            f"log levels changed by {claims['sub']}: {change.model_dump(exclude_none=True)}")
+        return _levels(levels.policy)
+
+    return router
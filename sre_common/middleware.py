@@ -0,0 +1,279 @@
+"""
+Pure-ASGI tracing middleware shared by all services.
+
+Replaces the per-service EnterpriseMiddleware(BaseHTTPMiddleware). It does the
+same job (x-trace-id / x-user-id propagation + one access log line per request)
+but wraps `send` directly instead of spawning a task and re-streaming the body,
+so it adds almost nothing per request and does not break streaming responses.
+
+It also speaks W3C trace context (see sre_common.tracing): an incoming
+`traceparent` / `tracestate` continues the caller's trace, every request gets
+a server span, and the response carries `traceparent` for the next hop.
+Unsampled requests write no access line unless they failed (status >= 500,
+or a WARNING/ERROR was logged while handling them).
+
+Access lines can be sampled and re-levelled per route (AccessLogPolicy):
+
+    ACCESS_LOG_ROUTES="/metrics=0,/list=0.1,/logs*=1:DEBUG"
+
+route[*]=rate[:LEVEL], comma separated; a trailing * matches a prefix, the
+longest match wins. Failed requests are always logged (at INFO at least).
+The rules can be changed at runtime through /loglevel (sre_common.logs_api).
+
+Such changes reach every gunicorn worker through LogLevelJournal: a change is
+appended to LOGLEVEL_JOURNAL (default loglevel.jsonl in
+PROMETHEUS_MULTIPROC_DIR, i.e. only when WEB_WORKERS > 1), and the middleware
+replays what other workers appended at the start of a request, looking at
+the file at most every LOGLEVEL_POLL_SECONDS.
+"""
+
+import json
+import logging
+import os
+import time
+import uuid
+
+from .tracing import Sampler, Span, activate, deactivate, get_exporter, parse_traceparent, trace_id_for
+
+TRACE_HEADER = b"x-trace-id"
+USER_HEADER = b"x-user-id"
+TRACEPARENT_HEADER = b"traceparent"
+TRACESTATE_HEADER = b"tracestate"
+
+# per-route access-log rules, see AccessLogPolicy
+ACCESS_LOG_ROUTES = os.getenv("ACCESS_LOG_ROUTES", "/metrics=0")
+# runtime level changes shared between workers, see LogLevelJournal
+LOGLEVEL_JOURNAL = os.getenv("LOGLEVEL_JOURNAL") or (
+    os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "loglevel.jsonl")
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR") else None)
+LOGLEVEL_POLL_SECONDS = float(os.getenv("LOGLEVEL_POLL_SECONDS", "1"))
+
+
+def _header(headers, name: bytes):
+    for key, value in headers:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class AccessLogPolicy:
+    """Per-route access-log sample rate and level."""
+
+    def __init__(self, spec: str = ""):
+        self.rules = {}  # route or "prefix*" -> (rate, levelno)
+        self._resolved = {}  # path -> rule, so each request is one dict lookup
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            route, _, value = item.partition("=")
+            rate, _, level = value.partition(":")
+            self.set(route.strip(), float(rate or 1), level or None)
+
+    @classmethod
+    def from_env(cls):
+        return cls(ACCESS_LOG_ROUTES)
+
+    def set(self, route: str, rate: float = None, level: str = None):
+        old_rate, old_level = self.rules.get(route, (1.0, logging.INFO))
+        if level is not None:
+            levelno = logging.getLevelName(level.upper())
+            if not isinstance(levelno, int):
+                raise ValueError(f"unknown level {level!r}")
+        else:
+            levelno = old_level
+        rate = old_rate if rate is None else max(0.0, min(1.0, float(rate)))
+        self.rules[route] = (rate, levelno)
+        self._resolved = {}
+
+    def remove(self, route: str):
+        self.rules.pop(route, None)
+        self._resolved = {}
+
+    def rule(self, path: str):
+        rule = self._resolved.get(path)
+        if rule is None:
+            rule = self.rules.get(path)
+            if rule is None:
+                best = ""
+                for route, candidate in self.rules.items():
+                    if route.endswith("*") and path.startswith(route[:-1]) and len(route) > len(best):
+                        best, rule = route, candidate
+            rule = rule or (1.0, logging.INFO)
+            if len(self._resolved) < 4096:  # paths with ids in them must not grow this forever
+                self._resolved[path] = rule
+        return rule
+
+    def level_for(self, path: str, trace_id: str, failed: bool = False):
+        """Level to log this request's access line at, or None to skip it."""
+        rate, levelno = self.rule(path)
+        if failed:
+            return max(levelno, logging.INFO)
+        if rate >= 1.0 or (rate > 0.0 and int(trace_id[-14:], 16) < rate * (1 << 56)):
+            return levelno
+        return None
+
+    def as_dict(self) -> dict:
+        return {route: {"rate": rate, "level": logging.getLevelName(levelno)}
+                for route, (rate, levelno) in self.rules.items()}
+
+
+# shared by the middleware and the /loglevel endpoint
+ACCESS_LOG = AccessLogPolicy.from_env()
+
+
+class LogLevelJournal:
+    """
+    levels = LogLevelJournal(path, ACCESS_LOG)
+    levels.change({"logger": "payment-service", "level": "DEBUG"})   # here, and journalled
+    levels.poll()                                                     # apply what other workers journalled
+
+    Changes are applied in journal order in every worker, so they all end up
+    with the same levels; a worker started later replays the whole journal.
+    Without a path it only applies changes locally.
+    """
+
+    def __init__(self, path: str = None, policy: AccessLogPolicy = None, interval: float = LOGLEVEL_POLL_SECONDS):
+        self.path = path
+        self.policy = policy if policy is not None else ACCESS_LOG
+        self.interval = interval
+        self.offset = 0
+        self.next_poll = 0.0
+
+    def apply(self, change: dict):
+        """{"logger", "level"} or {"route", "rate", "level", "reset"}; ValueError if it makes no sense."""
+        if change.get("route") is not None:
+            if change.get("reset"):
+                self.policy.remove(change["route"])
+            else:
+                self.policy.set(change["route"], change.get("rate"), change.get("level"))
+        elif change.get("level") is not None:
+            levelno = logging.getLevelName(change["level"].upper())
+            if not isinstance(levelno, int):
+                raise ValueError(f"unknown level {change['level']!r}")
+            logging.getLogger(change.get("logger")).setLevel(levelno)
+        else:
+            raise ValueError("nothing to change: give a level, or a route with rate/level/reset")
+
+    def change(self, change: dict):
+        self.poll(force=True)  # on top of what the other workers already did
+        self.apply(change)
+        if self.path:
+            # one short O_APPEND write: lines from several workers never interleave
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, (json.dumps(change) + "\n").encode())
+            finally:
+                os.close(fd)
+
+    def poll(self, force: bool = False):
+        if self.path is None:
+            return
+        now = time.monotonic()
+        if not force and now < self.next_poll:
+            return
+        self.next_poll = now + self.interval
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size < self.offset:
+            self.offset = 0  # a new journal (service restarted)
+        if size == self.offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        data = data[:data.rfind(b"\n") + 1]  # a line still being written waits for the next poll
+        self.offset += len(data)
+        for line in data.splitlines():
+            try:
+                self.apply(json.loads(line))
+            except ValueError as e:
+                logging.getLogger("sre_common").warning(f"loglevel journal: skipped {line[:200]!r}: {e}")
+
+
+# the one the middleware polls and POST /loglevel writes to
+LOGLEVELS = LogLevelJournal(LOGLEVEL_JOURNAL, ACCESS_LOG)
+
+
+class TracingMiddleware:
+    """
+    app.add_middleware(TracingMiddleware, logger=logger)
+
+    Handlers keep using request.state.trace_id / request.state.user_id:
+    both are stored in scope["state"], which is what Request.state reads.
+    request.state.span is the server span (see sre_common.tracing.start_span).
+    """
+
+    def __init__(self, app, logger: logging.Logger = None, sampler: Sampler = None, exporter=None,
+                 service: str = None, access_log: AccessLogPolicy = None, levels: LogLevelJournal = None):
+        self.app = app
+        self.access_log = access_log or ACCESS_LOG
+        self.levels = levels or LOGLEVELS
+        self.logger = logger or logging.getLogger("sre_common")
+        self.service = service or self.logger.name
+        self.sampler = sampler or Sampler()
+        self.exporter = exporter if exporter is not None else get_exporter(self.service)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        self.levels.poll()  # level changes made through another worker
+        headers = scope.get("headers") or []
+        given = _header(headers, TRACE_HEADER)
+        parent = parse_traceparent(_header(headers, TRACEPARENT_HEADER))
+        if parent:
+            w3c_trace, parent_id, sampled = parent
+        else:
+            given = given or str(uuid.uuid4())
+            w3c_trace, parent_id = trace_id_for(given), None
+            sampled = self.sampler.should_sample(w3c_trace)
+        # log lines keep the id callers already know (x-trace-id), else the W3C one
+        trace_id = given or w3c_trace
+        user_id = _header(headers, USER_HEADER) or "unknown"
+        route = scope.get("path", "")
+
+        span = Span(w3c_trace, f"{scope.get('method', 'GET')} {route}", parent_id=parent_id, sampled=sampled,
+                    kind="server", tracestate=_header(headers, TRACESTATE_HEADER), **{"log.trace_id": trace_id})
+
+        state = scope.setdefault("state", {})
+        state["trace_id"] = trace_id
+        state["user_id"] = user_id
+        state["span"] = span
+
+        raw_trace = trace_id.encode("latin-1")
+        status = 500
+
+        async def send_with_trace(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # replace (not append) so handlers that already set it don't duplicate
+                out = [(k, v) for k, v in message.get("headers", []) if k not in (TRACE_HEADER, TRACEPARENT_HEADER)]
+                out.append((TRACE_HEADER, raw_trace))
+                out.append((TRACEPARENT_HEADER, span.traceparent().encode()))
+                message["headers"] = out
+            await send(message)
+
+        token = activate(span)
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            deactivate(token)
+            span.end()
+            if status >= 500:
+                span.set_error(f"HTTP {status}")
+            if span.recorded:
+                level = self.access_log.level_for(route, w3c_trace, failed=span.root.keep)
+                if level is not None and self.logger.isEnabledFor(level):
+                    duration_ms = round(span.duration_ms, 2)
+                    # handlers may update the user (e.g. /login), so read it back from state
+                    user_id = state.get("user_id", user_id)
+                    self.logger.log(
+                        level,
+                        f"[trace={trace_id}] [user={user_id}] [route={route}] [duration_ms={duration_ms}]",
+                        extra={"trace_id": trace_id, "user_id": user_id, "route": route, "duration_ms": duration_ms},
+                    )
+                if self.exporter is not None:
+                    span.attributes["http.status_code"] = status
+                    self.exporter.export(span.spans)
@@ -0,0 +1,246 @@
+"""
+Signed access tokens: issued by auth-service, verified locally by every service.
+
+Tokens are compact HS256 JWTs (header.payload.signature, base64url) carrying
+`sub`, `iat`, `exp` and optionally `roles`; the header names the signing key
+(`kid`). Keys come
+from AUTH_SIGNING_KEYS="kid:secret,kid:secret": the first one signs, all of
+them verify, so a key is rotated by putting the new one first and dropping
+the old one once its tokens have expired.
+
+A verified token is kept in an LRU cache until its own expiry, so repeat
+requests with the same token skip the HMAC and JSON work entirely.
+
+The admin role is only issued against a password: AUTH_ADMINS="user:hash,..."
+with hashes from hash_password() (PBKDF2-SHA256, salted), checked by
+AdminCredentials.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from .cache import TTLCache
+
+DEFAULT_TTL = int(os.getenv("AUTH_TOKEN_TTL", "3600"))
+CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE", "10000"))
+# demo default so the stack works out of the box; set AUTH_SIGNING_KEYS in any real deployment
+DEV_KEYS = "dev:sre-ops-dev-signing-key"
+# role claim needed for operator endpoints (POST /loglevel)
+ADMIN_ROLE = "admin"
+PASSWORD_ITERATIONS = 200_000
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def load_keys(spec: str = None):
+    """"kid:secret,kid:secret" -> (active kid, {kid: secret bytes})."""
+    spec = spec or os.getenv("AUTH_SIGNING_KEYS") or DEV_KEYS
+    keys = {}
+    active = None
+    for part in spec.split(","):
+        kid, sep, secret = part.strip().partition(":")
+        if not sep or not kid or not secret:
+            raise ValueError("AUTH_SIGNING_KEYS must look like kid:secret[,kid:secret...]")
+        keys[kid] = secret.encode()
+        active = active or kid
+    return active, keys
+
+
+def _sign(secret: bytes, signing_input: str) -> str:
+    return _b64(hmac.new(secret, signing_input.encode("ascii"), hashlib.sha256).digest())
+
+
+def hash_password(password: str, salt: bytes = None, iterations: int = PASSWORD_ITERATIONS) -> str:
+    """"iterations:salt:digest" (hex), for AUTH_ADMINS."""
+    salt = salt or os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return f"{iterations}:{salt.hex()}:{digest.hex()}"
+
+
+class AdminCredentials:
+    """
+    admins = AdminCredentials.from_env()       # AUTH_ADMINS="alice:<hash_password()>,..."
+    admins.check("alice", password)            # True / False; None if alice is not an admin
+
+    check() runs PBKDF2 (~0.1s), so call it off the event loop.
+    """
+
+    def __init__(self, hashes: dict):
+        self.hashes = dict(hashes)
+
+    @classmethod
+    def from_env(cls, spec: str = None):
+        spec = os.getenv("AUTH_ADMINS", "") if spec is None else spec
+        hashes = {}
+        for part in spec.split(","):
+            if not part.strip():
+                continue
+            user, sep, stored = part.strip().partition(":")
+            if not sep or stored.count(":") != 2:
+                raise ValueError("AUTH_ADMINS must look like user:<hash_password()>[,user:<hash>...]")
+            hashes[user] = stored
+        return cls(hashes)
+
+    def __contains__(self, username) -> bool:
+        return username in self.hashes
+
+    def check(self, username: str, password: str):
+        stored = self.hashes.get(username)
+        if stored is None:
+            return None
+        iterations, salt, _ = stored.split(":")
+        candidate = hash_password(password, bytes.fromhex(salt), int(iterations))
+        return hmac.compare_digest(candidate.encode(), stored.encode())
+
+
+class TokenSigner:
+    """TokenSigner.from_env().issue("alice") -> "eyJ..."."""
+
+    def __init__(self, kid: str, secret: bytes, ttl: int = DEFAULT_TTL):
+        self.kid = kid
+        self.secret = secret
+        self.ttl = ttl
+        self.header = _b64(json.dumps({"alg": "HS256", "typ": "JWT", "kid": kid}, separators=(",", ":")).encode())
+
+    @classmethod
+    def from_env(cls, ttl: int = DEFAULT_TTL):
+        kid, keys = load_keys()
+        return cls(kid, keys[kid], ttl)
+
+    def issue(self, sub: str, **claims) -> str:
+        now = int(time.time())
+        payload = {"sub": sub, "iat": now, "exp": now + self.ttl, **claims}
+        signing_input = f"{self.header}.{_b64(json.dumps(payload, separators=(',', ':')).encode())}"
+        return f"{signing_input}.{_sign(self.secret, signing_input)}"
+
+
+class TokenVerifier:
+    """
+    verifier = TokenVerifier.from_env()
+    claims = verifier.verify(token)    # raises InvalidToken
+    """
+
+    def __init__(self, keys: dict, cache_size: int = CACHE_SIZE):
+        self.keys = dict(keys)
+        self.cache = TTLCache(cache_size, DEFAULT_TTL)
+        self.stats = {"hits": 0, "misses": 0}
+
+    @classmethod
+    def from_env(cls, cache_size: int = CACHE_SIZE):
+        return cls(load_keys()[1], cache_size)
+
+    def set_keys(self, keys: dict):
+        """Swap the key set (rotation); tokens cached under a dropped key are forgotten."""
+        self.keys = dict(keys)
+        self.cache.clear()
+
+    def verify(self, token: str) -> dict:
+        now = time.time()
+        claims = self.cache.get(token)
+        if claims is not None:
+            self.stats["hits"] += 1
+            if claims["exp"] <= now:
+                self.cache.pop(token)
+                raise InvalidToken("token expired")
+            return claims
+
+        self.stats["misses"] += 1
+        # anything a client can send must end up as InvalidToken (a 401), never a 500
+        if not isinstance(token, str) or not token.isascii():
+            raise InvalidToken("malformed token")
+        try:
+            header_b64, payload_b64, signature = token.split(".")
+            header = json.loads(_unb64(header_b64))
+        except ValueError as e:
+            raise InvalidToken("malformed token") from e
+        if not isinstance(header, dict):
+            raise InvalidToken("malformed token")
+        if header.get("alg") != "HS256":
+            raise InvalidToken("unsupported alg")
+        kid = header.get("kid")
+        secret = self.keys.get(kid) if isinstance(kid, str) else None
+        if secret is None:
+            raise InvalidToken("unknown signing key")
+        expected = _sign(secret, f"{header_b64}.{payload_b64}")
+        if not hmac.compare_digest(signature.encode("ascii"), expected.encode("ascii")):
+            raise InvalidToken("bad signature")
+        try:
+            claims = json.loads(_unb64(payload_b64))
+        except ValueError as e:
+            raise InvalidToken("malformed payload") from e
+        if not isinstance(claims, dict) or not isinstance(claims.get("sub"), str):
+            raise InvalidToken("malformed payload")
+        exp = claims.get("exp")
+        if not isinstance(exp, (int, float)) or exp <= now:
+            raise InvalidToken("token expired")
+
+        # cache only until the token itself expires
+        self.cache.put(token, claims, ttl=exp - now)
+        return claims
+
+
+class TokenAuthMiddleware:
+    """
+    app.add_middleware(TokenAuthMiddleware, verifier=TokenVerifier.from_env())
+    app.add_middleware(TracingMiddleware, logger=logger)   # added last = runs first
+
+    A valid `Authorization: Bearer <token>` sets request.state.user_id to the
+    token subject (and request.state.claims), without calling auth-service.
+    A bad token is a 401. Requests without a token pass through unchanged
+    unless required=True (AUTH_REQUIRED=true).
+    """
+
+    def __init__(self, app, verifier: TokenVerifier = None, required: bool = None):
+        self.app = app
+        self.verifier = verifier or TokenVerifier.from_env()
+        self.required = os.getenv("AUTH_REQUIRED", "false").lower() == "true" if required is None else required
+
+    async def _reject(self, send, reason: str):
+        body = json.dumps({"detail": f"invalid token: {reason}"}).encode()
+        await send({"type": "http.response.start", "status": 401, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"www-authenticate", b"Bearer"),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        auth = None
+        for key, value in scope.get("headers") or []:
+            if key == b"authorization":
+                auth = value.decode("latin-1")
+                break
+
+        if auth and auth[:7].lower() == "bearer ":
+            try:
+                claims = self.verifier.verify(auth[7:].strip())
+            except InvalidToken as e:
+                await self._reject(send, str(e))
+                return
+            state = scope.setdefault("state", {})
+            state["user_id"] = claims["sub"]
+            state["claims"] = claims
+        elif self.required and not scope.get("path", "").startswith(("/health", "/metrics")):
+            await self._reject(send, "missing bearer token")
+            return
+
+        await self.app(scope, receive, send)
+
@@ -0,0 +1,426 @@
+"""
+Offline trace index over the services' app.log files (or their /logs endpoints).
+
+Every line carrying a trace id (text "[trace=..]" or LOG_FORMAT=json
+"trace_id") becomes one compact event row in a SQLite index: trace, service,
+timestamp, level, route, duration_ms, event/error_type and where the raw line
+lives. Large files are cut into newline-aligned byte ranges and parsed by a
+process pool; rotated .gz segments are parsed whole, one per worker. Rows
+stream into SQLite as chunks finish, with a bounded number of chunks in
+flight, so memory stays flat whatever the input size. Lines without a trace
+id are skipped with one substring test. Running it again over a file that
+grew only parses the new lines; a file that was rotated or rewritten in
+between is indexed again from scratch. The per-trace rollup is only
+recomputed for the traces a run touched.
+
+From the index: per-trace summaries (span, hops, errors), per-hop durations
+from the access lines' duration_ms, the slowest / failed traces and full
+timelines with the original lines.
+
+    idx = TraceIndex("traces.db")
+    idx.ingest_files([("payment", "/var/log/payment/app.log"), ("payment", ".../app.log.<stamp>.gz"), ...],
+                     workers=8)
+    idx.slowest(10); idx.failed(10); idx.timeline(trace_id)
+"""
+
+import calendar
+import gzip
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    from orjson import loads as _loads
+except ImportError:  # orjson is optional, stdlib json is just slower
+    from json import loads as _loads
+
+CHUNK_BYTES = 32 * 1024 * 1024
+
+_TEXT = re.compile(
+    rb"^(\d{4}-\d\d-\d\d[ T]\d\d:\d\d:\d\d)[,.](\d{3}) \[(\w+)\] \[trace=([^\]\s]+)\]"
+    rb"(?: \[user=([^\]]*)\])?(?: \[route=([^\]]*)\])?(?: \[duration_ms=([\d.]+)\])?"
+)
+_EVENT = re.compile(rb"\bevent=(\w+)")
+_ERROR_TYPE = re.compile(rb"\berror_type=(\w+)")
+
+_SECONDS = {}  # "YYYY-mm-dd HH:MM:SS" -> epoch seconds (one strptime per distinct second)
+
+
+def _epoch(second: bytes) -> float:
+    value = _SECONDS.get(second)
+    if value is None:
+        if len(_SECONDS) > 100_000:
+            _SECONDS.clear()
+        text = second.decode().replace("T", " ")
+        value = _SECONDS[second] = calendar.timegm(time.strptime(text, "%Y-%m-%d %H:%M:%S"))
+    return value
+
+
+def _parse_text(line: bytes):
+    m = _TEXT.match(line)
+    if not m:
+        return None
+    second, millis, level, trace, user, route, duration = m.groups()
+    event = error_type = None
+    if b"event=" in line:
+        event = _EVENT.search(line, m.end())
+        error_type = _ERROR_TYPE.search(line, m.end())
+        error_type = error_type.group(1).decode() if error_type else None
+    return (
+        trace.decode(), _epoch(second) + int(millis) / 1000, level.decode(),
+        user.decode() if user else None, route.decode() if route else None,
+        float(duration) if duration else None,
+        event.group(1).decode() if event else None,
+        None if error_type == "None" else error_type,
+    )
+
+
+def _parse_json(line: bytes):
+    try:
+        doc = _loads(line)
+    except ValueError:
+        return None
+    trace = doc.get("trace_id")
+    if not trace:
+        return None
+    ts = doc.get("@timestamp", "")
+    try:
+        second, _, frac = ts.rstrip("Z").partition(".")
+        epoch = _epoch(second.encode()) + (int(frac[:3].ljust(3, "0")) / 1000 if frac else 0)
+    except ValueError:
+        epoch = 0.0
+    duration = doc.get("duration_ms")
+    return (trace, epoch, doc.get("level"), doc.get("user_id"), doc.get("route"),
+            float(duration) if duration is not None else None, doc.get("event"), doc.get("error_type"))
+
+
+def parse_line(line: bytes):
+    """(trace, ts, level, user, route, duration_ms, event, error_type) or None."""
+    if line.startswith(b"{"):
+        return _parse_json(line) if b'"trace_id"' in line else None
+    return _parse_text(line) if b"[trace=" in line else None
+
+
+def _chunks(path, size=CHUNK_BYTES, start=0):
+    """Newline-aligned (start, end) byte ranges covering the file from `start`."""
+    total = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        while start < total:
+            end = min(total, start + size)
+            if end < total:
+                f.seek(end)
+                tail = f.readline()
+                end += len(tail)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_range(path, start, end):
+    """Worker: parse one byte range, return [(fields..., offset, length)] for traced lines."""
+    rows = []
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    offset = start
+    for line in data.split(b"\n"):
+        parsed = parse_line(line) if line else None
+        if parsed:
+            rows.append((*parsed, offset, len(line)))
+        offset += len(line) + 1
+    return rows
+
+
+def parse_gzip(path, start=0, end=None):
+    """Worker: parse a whole .gz segment; offsets are into the uncompressed stream."""
+    rows = []
+    offset = 0
+    with gzip.open(path, "rb") as f:
+        for line in f:
+            length = len(line) - line.endswith(b"\n")
+            parsed = parse_line(line[:length]) if length else None
+            if parsed:
+                rows.append((*parsed, offset, length))
+            offset += len(line)
+    return rows
+
+
+def _open(location):
+    return gzip.open(location, "rb") if location.endswith(".gz") else open(location, "rb")
+
+
+class TraceIndex:
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS sources (
+                id       INTEGER PRIMARY KEY,
+                service  TEXT NOT NULL,
+                location TEXT NOT NULL,
+                size     INTEGER,
+                mtime    REAL,
+                UNIQUE (location, size, mtime)
+            );
+            CREATE TABLE IF NOT EXISTS events (
+                trace_id    TEXT NOT NULL,
+                ts          REAL NOT NULL,
+                service     TEXT NOT NULL,
+                level       TEXT,
+                user_id     TEXT,
+                route       TEXT,
+                duration_ms REAL,
+                event       TEXT,
+                error_type  TEXT,
+                source_id   INTEGER NOT NULL,
+                offset      INTEGER,
+                length      INTEGER,
+                raw         TEXT
+            );
+        """)
+        self.db.execute("CREATE TEMP TABLE touched (trace_id TEXT PRIMARY KEY)")
+        self.db.commit()
+        self._rollup = self.db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'traces'").fetchone() is not None
+
+    # ------------------------------------------------------------------ ingest
+
+    def _source(self, service, location, size=None, mtime=None):
+        """Source id, or None if this exact file (location/size/mtime) is already indexed."""
+        row = self.db.execute(
+            "SELECT id FROM sources WHERE location = ? AND size IS ? AND mtime IS ?", (location, size, mtime)
+        ).fetchone()
+        if row:
+            return None
+        cur = self.db.execute("INSERT INTO sources (service, location, size, mtime) VALUES (?, ?, ?, ?)",
+                              (service, location, size, mtime))
+        return cur.lastrowid
+
+    def _drop(self, source_id):
+        if self._rollup:
+            self.db.execute("INSERT OR IGNORE INTO touched SELECT trace_id FROM events WHERE source_id = ?",
+                            (source_id,))
+        self.db.execute("DELETE FROM events WHERE source_id = ?", (source_id,))
+        self.db.execute("DELETE FROM sources WHERE id = ?", (source_id,))
+
+    def _file_source(self, service, location, size, mtime):
+        """
+        (source id, byte to parse from) for a file on disk, or None if it is
+        indexed as it is. A file that only grew since (app.log being appended
+        to) keeps its events and is parsed from where the last run stopped;
+        any other change (rotated, truncated, rewritten) drops its events and
+        indexes it again from the start.
+        """
+        rows = self.db.execute("SELECT id, size, mtime FROM sources WHERE location = ? ORDER BY id",
+                               (location,)).fetchall()
+        if any(known == size and seen == mtime for _, known, seen in rows):
+            return None
+        if len(rows) == 1 and rows[0][1] and rows[0][1] < size and not location.endswith(".gz"):
+            source_id, known, _ = rows[0]
+            with open(location, "rb") as f:
+                f.seek(known - 1)
+                whole_lines = f.read(1) == b"\n"  # else the last line was indexed half-written
+            if whole_lines:
+                self.db.execute("UPDATE sources SET size = ?, mtime = ? WHERE id = ?", (size, mtime, source_id))
+                return source_id, known
+        for source_id, _, _ in rows:
+            self._drop(source_id)
+        return self._source(service, location, size, mtime), 0
+
+    def _insert(self, source_id, service, rows):
+        # rows: (trace, ts, level, user, route, duration_ms, event, error_type, offset, length, raw)
+        self.db.executemany(
+            "INSERT INTO events (trace_id, ts, level, user_id, route, duration_ms, event, error_type, "
+            f"offset, length, raw, service, source_id) VALUES ({', '.join('?' * 11)}, ?, ?)",
+            (r + (service, source_id) if len(r) == 11 else r + (None, service, source_id) for r in rows),
+        )
+        if self._rollup:
+            self.db.executemany("INSERT OR IGNORE INTO touched VALUES (?)", ((r[0],) for r in rows))
+
+    def ingest_files(self, files, workers: int = None, chunk_bytes: int = CHUNK_BYTES, progress=None):
+        """
+        Index [(service, path)] (or {service: path}) in one pass; a service can
+        list several files, e.g. app.log and its rotated .gz segments. Files
+        already indexed unchanged are skipped, files that grew are indexed
+        from where the last run stopped, and files that changed otherwise
+        replace their earlier events.
+        """
+        if isinstance(files, dict):
+            files = files.items()
+        jobs = []
+        for service, path in files:
+            st = os.stat(path)
+            found = self._file_source(service, os.path.abspath(path), st.st_size, st.st_mtime)
+            if found is None:
+                if progress:
+                    progress(f"{path}: already indexed, skipped")
+                continue
+            source_id, resume = found
+            if resume and progress:
+                progress(f"{path}: grew, indexing from byte {resume:,}")
+            if path.endswith(".gz"):
+                jobs.append((source_id, service, parse_gzip, path, 0, None))
+                continue
+            jobs += [(source_id, service, parse_range, path, start, end)
+                     for start, end in _chunks(path, chunk_bytes, resume)]
+        self.db.commit()
+
+        total = 0
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending, queue = {}, list(reversed(jobs))
+            while queue or pending:
+                # keep at most 2 chunks per worker in flight: bounded memory
+                while queue and len(pending) < workers * 2:
+                    source_id, service, parse, path, start, end = queue.pop()
+                    pending[pool.submit(parse, path, start, end)] = (source_id, service)
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    source_id, service = pending.pop(future)
+                    rows = future.result()
+                    self._insert(source_id, service, rows)
+                    total += len(rows)
+                self.db.commit()
+                if progress:
+                    progress(f"{total:,} traced lines indexed, {len(queue) + len(pending)} chunks left")
+        self._finish()
+        return total
+
+    def ingest_lines(self, service, location, lines):
+        """
+        Index raw lines fetched from somewhere without offsets (e.g. /logs); the
+        line itself is kept. Re-fetching the same location replaces its events.
+        """
+        old = [row[0] for row in self.db.execute("SELECT id FROM sources WHERE location = ?", (location,))]
+        for source_id in old:
+            self._drop(source_id)
+        source_id = self._source(service, location, None, time.time())
+        batch, total = [], 0
+        for line in lines:
+            raw = line.encode() if isinstance(line, str) else line
+            parsed = parse_line(raw)
+            if parsed:
+                batch.append((*parsed, None, None, raw.decode(errors="replace")))
+            if len(batch) >= 10_000:
+                self._insert(source_id, service, batch)
+                total += len(batch)
+                batch = []
+        self._insert(source_id, service, batch)
+        self._finish()
+        return total + len(batch)
+
+    def _finish(self):
+        # built once after the bulk load: much cheaper than maintaining it per insert
+        self.db.execute("CREATE INDEX IF NOT EXISTS events_trace ON events (trace_id, ts)")
+        # per-trace rollup, so the reports don't aggregate millions of events
+        # on every query: built in one ordered pass over the index the first
+        # time, afterwards redone for the traces this run added to or dropped from
+        if self._rollup:
+            self.db.execute("DELETE FROM traces WHERE trace_id IN (SELECT trace_id FROM touched)")
+            self.db.execute(f"INSERT INTO traces {self._ROLLUP.format(where='WHERE trace_id IN touched')}")
+            self.db.execute("DELETE FROM touched")
+        else:
+            self.db.executescript(f"""
+                CREATE TABLE traces AS {self._ROLLUP.format(where='')};
+                CREATE UNIQUE INDEX traces_id ON traces (trace_id);
+                CREATE INDEX traces_hop_ms ON traces (hop_ms);
+                CREATE INDEX traces_span ON traces (span_ms);
+                CREATE INDEX traces_failed ON traces (errors, t_start);
+            """)
+            self._rollup = True
+        self.db.commit()
+
+    # ------------------------------------------------------------------ queries
+
+    _ROLLUP = """
+        SELECT trace_id,
+               min(ts) AS t_start, max(ts) AS t_end,
+               round((max(ts) - min(ts)) * 1000, 1) AS span_ms,
+               count(*) AS lines,
+               group_concat(DISTINCT service) AS services,
+               sum(CASE WHEN duration_ms IS NOT NULL THEN 1 ELSE 0 END) AS hops,
+               coalesce(sum(duration_ms), 0) AS hop_ms,
+               sum(CASE WHEN level IN ('ERROR', 'CRITICAL') OR error_type IS NOT NULL THEN 1 ELSE 0 END) AS errors,
+               max(user_id) AS user_id
+        FROM events {where} GROUP BY trace_id
+    """
+
+    _COLUMNS = ("trace_id", "start", "end", "span_ms", "lines", "services", "hops", "hop_ms", "errors", "user_id")
+
+    def _summaries(self, where="", args=()):
+        sql = "SELECT trace_id, t_start, t_end, span_ms, lines, services, hops, hop_ms, errors, user_id FROM traces "
+        out = []
+        for row in self.db.execute(sql + where, args):
+            item = dict(zip(self._COLUMNS, row))
+            item["hop_ms"] = round(item["hop_ms"], 2)
+            out.append(item)
+        return out
+
+    def stats(self):
+        events = self.db.execute("SELECT count(*) FROM events").fetchone()[0]
+        traces = self.db.execute("SELECT count(*) FROM traces").fetchone()[0] if events else 0
+        sources = self.db.execute("SELECT service, location FROM sources ORDER BY id").fetchall()
+        return {"events": events, "traces": traces, "sources": sources}
+
+    def slowest(self, n=10, by="hop_ms"):
+        """Traces with the most time spent in requests (sum of hop duration_ms) or the widest span."""
+        order = "hop_ms" if by == "hop_ms" else "span_ms"
+        return self._summaries(f"ORDER BY {order} DESC LIMIT ?", (n,))
+
+    def failed(self, n=10):
+        """Latest traces with an ERROR line or any error_type (validation failures included)."""
+        return self._summaries("WHERE errors > 0 ORDER BY t_start DESC LIMIT ?", (n,))
+
+    def summary(self, trace_id):
+        rows = self._summaries("WHERE trace_id = ?", (trace_id,))
+        return rows[0] if rows else None
+
+    def hops(self, trace_id):
+        """One entry per request the trace made (the access lines), in time order."""
+        return [
+            {"ts": ts, "service": service, "route": route, "duration_ms": duration}
+            for ts, service, route, duration in self.db.execute(
+                "SELECT ts, service, route, duration_ms FROM events "
+                "WHERE trace_id = ? AND duration_ms IS NOT NULL ORDER BY ts", (trace_id,))
+        ]
+
+    def hop_stats(self):
+        """Per service/route: request count and average / max duration_ms across all traces."""
+        return [
+            {"service": s, "route": r, "count": c, "avg_ms": round(a, 2), "max_ms": m}
+            for s, r, c, a, m in self.db.execute(
+                "SELECT service, route, count(*), avg(duration_ms), max(duration_ms) FROM events "
+                "WHERE duration_ms IS NOT NULL GROUP BY service, route ORDER BY avg(duration_ms) DESC")
+        ]
+
+    def timeline(self, trace_id):
+        """Every line of the trace across services, oldest first, with the original text."""
+        rows = self.db.execute(
+            "SELECT e.ts, e.service, e.level, e.route, e.duration_ms, e.error_type, e.offset, e.length, e.raw, "
+            "s.location FROM events e JOIN sources s ON s.id = e.source_id WHERE e.trace_id = ? ORDER BY e.ts",
+            (trace_id,),
+        ).fetchall()
+        handles = {}
+        out = []
+        try:
+            for ts, service, level, route, duration, error_type, offset, length, raw, location in rows:
+                if raw is None and offset is not None:
+                    f = handles.get(location)
+                    if f is None:
+                        f = handles[location] = _open(location)
+                    f.seek(offset)
+                    raw = f.read(length).decode(errors="replace")
+                out.append({"ts": ts, "service": service, "level": level, "route": route,
+                            "duration_ms": duration, "error_type": error_type, "line": raw})
+        finally:
+            for f in handles.values():
+                f.close()
+        return out
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,361 @@
+"""
+W3C trace context, spans and head-based sampling for the services.
+
+TracingMiddleware opens one server span per request; handlers can open child
+spans around the slow parts:
+
+    with start_span("idempotency.claim", payment_id=p.id):
+        ...
+
+and forward the context on outgoing calls with `outgoing_headers()`.
+
+Sampling is decided once, at the head of the trace: an incoming `traceparent`
+decides for us (its sampled flag), otherwise the trace id is hashed against
+TRACE_SAMPLE_RATE, so every service makes the same call for the same trace.
+In unsampled requests, SamplingFilter drops INFO/DEBUG records before they
+reach the log queue. A WARNING or ERROR (payment_failure, validation errors)
+still goes through and marks the whole request as kept, so its access line
+and spans are written as if it had been sampled.
+
+Finished spans go through SpanExporter: a bounded queue plus a background
+thread that writes OTLP/JSON batches to a file or POSTs them to a collector.
+The file is kept open and rotated / gzipped / pruned like app.log, by the
+same LOG_ROTATE_* and LOG_RETENTION_* knobs (sre_common.logfile).
+
+Environment knobs:
+    TRACE_SAMPLE_RATE       fraction of new traces recorded  (default 1.0)
+    TRACE_EXPORT            "" (off), "file:/path/spans.jsonl" or an
+                            OTLP/HTTP url like http://collector:4318/v1/traces
+    TRACE_EXPORT_BATCH      max spans per write/POST         (default 512)
+    TRACE_EXPORT_INTERVAL   max seconds a span waits         (default 2)
+    TRACE_EXPORT_QUEUE      max queued spans, extra dropped  (default 20000)
+"""
+
+import atexit
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+
+from .logfile import RotatingAppendFile
+
+SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+EXPORT = os.getenv("TRACE_EXPORT", "")
+EXPORT_BATCH = int(os.getenv("TRACE_EXPORT_BATCH", "512"))
+EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", "2"))
+EXPORT_QUEUE = int(os.getenv("TRACE_EXPORT_QUEUE", "20000"))
+
+_INVALID_TRACE = "0" * 32
+_INVALID_SPAN = "0" * 16
+_HEX = frozenset("0123456789abcdef")
+
+_current = contextvars.ContextVar("sre_span", default=None)
+
+
+def _is_hex(value: str, length: int) -> bool:
+    return len(value) == length and _HEX.issuperset(value)
+
+
+def parse_traceparent(value: str):
+    """"00-<trace>-<parent span>-<flags>" -> (trace_id, parent_id, sampled), or None if invalid."""
+    if not value:
+        return None
+    parts = value.strip().lower().split("-")
+    if len(parts) < 4:
+        return None
+    version, trace_id, parent_id, flags = parts[:4]
+    if (not _is_hex(version, 2) or version == "ff" or (version == "00" and len(parts) != 4)
+            or not _is_hex(trace_id, 32) or trace_id == _INVALID_TRACE
+            or not _is_hex(parent_id, 16) or parent_id == _INVALID_SPAN or not _is_hex(flags, 2)):
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+def format_traceparent(trace_id: str, span_id: str, sampled: bool) -> str:
+    return f"00-{trace_id}-{span_id}-{'01' if sampled else '00'}"
+
+
+def trace_id_for(value: str) -> str:
+    """W3C trace id for an x-trace-id: a UUID maps to its hex, anything else is hashed."""
+    candidate = value.replace("-", "").lower()
+    if _is_hex(candidate, 32) and candidate != _INVALID_TRACE:
+        return candidate
+    return hashlib.blake2b(value.encode(), digest_size=16).hexdigest()
+
+
+def new_span_id() -> str:
+    return secrets.token_hex(8)
+
+
+class Sampler:
+    """Trace-id ratio sampler: same trace id, same decision, in every service."""
+
+    def __init__(self, rate: float = SAMPLE_RATE):
+        self.rate = max(0.0, min(1.0, rate))
+        self._bound = int(self.rate * (1 << 56))
+
+    def should_sample(self, trace_id: str) -> bool:
+        if self.rate >= 1.0:
+            return True
+        # the low 7 bytes of a W3C id are random (same rule as OTel's ratio sampler)
+        return int(trace_id[-14:], 16) < self._bound
+
+
+class Span:
+    """
+    Wall-clock start for export, monotonic clock for the duration. Child spans
+    share their root's `spans` list, so the request is exported (or not) as a whole.
+    """
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "sampled", "tracestate",
+                 "attributes", "error", "start_ns", "end_ns", "_t0", "root", "spans", "keep")
+
+    def __init__(self, trace_id, name, parent_id=None, sampled=True, kind="internal", root=None,
+                 tracestate=None, **attributes):
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.sampled = sampled
+        self.tracestate = tracestate
+        self.attributes = attributes
+        self.error = None
+        self.root = root or self
+        self.spans = self.root.spans if root else []
+        self.keep = False
+        self.spans.append(self)
+        self.start_ns = time.time_ns()
+        self._t0 = time.perf_counter_ns()
+        self.end_ns = None
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = self.start_ns + (time.perf_counter_ns() - self._t0)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else self.start_ns + (time.perf_counter_ns() - self._t0)
+        return (end - self.start_ns) / 1e6
+
+    @property
+    def recorded(self) -> bool:
+        return self.root.sampled or self.root.keep
+
+    def set_error(self, error_type: str):
+        self.error = error_type
+        self.root.keep = True
+
+    def traceparent(self) -> str:
+        return format_traceparent(self.trace_id, self.span_id, self.recorded)
+
+
+def current_span():
+    return _current.get()
+
+
+def activate(span: Span):
+    """Make `span` current; returns the token for deactivate()."""
+    return _current.set(span)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+@contextmanager
+def start_span(name: str, **attributes):
+    """Child span of the current one (no-op outside a traced request)."""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    span = Span(parent.trace_id, name, parent_id=parent.span_id, sampled=parent.sampled, root=parent.root,
+                **attributes)
+    token = _current.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.set_error(type(e).__name__)
+        raise
+    finally:
+        span.end()
+        _current.reset(token)
+
+
+def outgoing_headers(span: Span = None) -> dict:
+    """Headers that continue the current trace on a downstream call."""
+    span = span or _current.get()
+    if span is None:
+        return {}
+    headers = {"traceparent": span.traceparent()}
+    if span.root.tracestate:
+        headers["tracestate"] = span.root.tracestate
+    trace_header = span.root.attributes.get("log.trace_id")
+    if trace_header:
+        headers["x-trace-id"] = trace_header
+    return headers
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Handler filter: inside an unsampled request only WARNING+ records pass,
+    and the first one flips the request to kept. Also copies event/error_type
+    from `extra=` onto the current span.
+    """
+
+    def filter(self, record) -> bool:
+        span = _current.get()
+        if span is None:
+            return True
+        event = record.__dict__.get("event")
+        if event:
+            span.attributes["event"] = event
+        error_type = record.__dict__.get("error_type")
+        if error_type:
+            span.attributes["error_type"] = error_type
+        if record.levelno >= logging.WARNING:
+            if record.levelno >= logging.ERROR or error_type:
+                span.set_error(error_type or record.levelname)
+            else:
+                span.root.keep = True
+            return True
+        return span.root.sampled or span.root.keep
+
+
+###############################################
+# EXPORT
+###############################################
+
+def _otlp_span(span: Span) -> dict:
+    doc = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 2 if span.kind == "server" else 1,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns or span.start_ns),
+        "attributes": [{"key": k, "value": {"stringValue": str(v)}} for k, v in span.attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 0},
+    }
+    if span.parent_id:
+        doc["parentSpanId"] = span.parent_id
+    return doc
+
+
+def otlp_batch(service: str, spans) -> dict:
+    """OTLP/JSON ExportTraceServiceRequest for one service's spans."""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service}}]},
+        "scopeSpans": [{"scope": {"name": "sre_common"}, "spans": [_otlp_span(s) for s in spans]}],
+    }]}
+
+
+class SpanExporter:
+    """
+    exporter = SpanExporter("payment-service", "file:/var/log/spans.jsonl")
+    exporter.export(root.spans)   # never blocks; drops (and counts) when the queue is full
+    """
+
+    def __init__(self, service: str, target: str = EXPORT, batch_size: int = EXPORT_BATCH,
+                 interval: float = EXPORT_INTERVAL, queue_size: int = EXPORT_QUEUE):
+        self.service = service
+        self.target = target
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stats = {"exported": 0, "dropped": 0, "batches": 0, "failed": 0}
+        self._file = None  # RotatingAppendFile for file: targets, opened on the first write
+        self._stop = threading.Event()
+        self._start()
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def _after_fork(self):
+        # preloaded app: the parent's thread and queued spans stay in the parent
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self.stats = dict.fromkeys(self.stats, 0)
+        if self._file is not None:
+            self._file.after_fork()
+        self._start()
+
+    def export(self, spans):
+        for span in spans:
+            try:
+                self.queue.put_nowait(span)
+            except queue.Full:
+                self.stats["dropped"] += 1
+
+    def _run(self):
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            if self._stop.is_set() and self.queue.empty():
+                return
+
+    def _write(self, batch):
+        body = json.dumps(otlp_batch(self.service, batch), separators=(",", ":"))
+        try:
+            if self.target.startswith("file:"):
+                if self._file is None:
+                    self._file = RotatingAppendFile(self.target[len("file:"):])
+                self._file.write(body + "\n")
+            else:
+                req = urllib.request.Request(self.target, data=body.encode(), method="POST",
+                                             headers={"content-type": "application/json"})
+                urllib.request.urlopen(req, timeout=5).close()
+        except Exception as e:
+            self.stats["failed"] += len(batch)
+            logging.getLogger("sre_common").warning(f"span export to {self.target} failed: {e}")
+            return
+        self.stats["exported"] += len(batch)
+        self.stats["batches"] += 1
+
+    def shutdown(self):
+        """Flush what is queued and stop the thread."""
+        self._stop.set()
+        self.interval = 0.05
+        self._thread.join(timeout=10)
+        if self._file is not None and not self._thread.is_alive():
+            self._file.close()
+
+
+_exporters = {}
+
+
+def _after_fork_in_child():
+    for exporter in _exporters.values():
+        exporter._after_fork()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def get_exporter(service: str):
+    """Process-wide exporter for TRACE_EXPORT, or None when export is off."""
+    if not EXPORT:
+        return None
+    exporter = _exporters.get(service)
+    if exporter is None:
+        exporter = _exporters[service] = SpanExporter(service)
+        atexit.register(exporter.shutdown)
+    return exporter
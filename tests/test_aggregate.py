@@ -0,0 +1,150 @@
+import pytest
+
+from snow.aggregate import IncidentAggregator, IncidentStore, parse_ts
+
+
+class Tickets:
+    """create_ticket stand-in that records what would have been filed."""
+
+    def __init__(self):
+        self.filed = []
+
+    def __call__(self, short_desc, description):
+        self.filed.append((short_desc, description))
+        return f"INC{len(self.filed):07d}"
+
+
+@pytest.fixture
+def store(tmp_path):
+    return IncidentStore(str(tmp_path / "incidents.db"))
+
+
+def burst(agg, issue="Fraud Blocked", n=5, start="2026-10-13T09:00:00Z", service="payment", step=1):
+    base = parse_ts(start)
+    for i in range(n):
+        agg.add(issue, f"[trace=t{i}] error_type=FraudBlocked order_id=o{i}", base + i * step,
+                {"service": service})
+
+
+def test_burst_becomes_one_ticket(store):
+    tickets = Tickets()
+    agg = IncidentAggregator(store, tickets, window=300)
+    burst(agg, n=50)
+    agg.flush()
+
+    assert len(tickets.filed) == 1
+    short, description = tickets.filed[0]
+    assert short == "Fraud Blocked x50"
+    assert "Occurrences: 50" in description
+    assert "Sample Trace IDs: t0, t1, t2, t3, t4" in description
+    assert agg.stats == {"detections": 50, "tickets": 1, "merged": 0, "closed": 0}
+
+
+def test_groups_split_by_field_and_window(store):
+    tickets = Tickets()
+    agg = IncidentAggregator(store, tickets, window=60, group_by=("service",))
+    burst(agg, n=3, service="payment")
+    burst(agg, n=3, service="order")
+    burst(agg, n=3, service="payment", start="2026-10-13T10:00:00Z")  # an hour later: new incident
+    agg.flush()
+
+    assert sorted(short for short, _ in tickets.filed) == [
+        "Fraud Blocked [order] x3", "Fraud Blocked [payment] x3", "Fraud Blocked [payment] x3"]
+
+
+def test_rerun_merges_into_open_incident(store):
+    tickets = Tickets()
+    burst(agg := IncidentAggregator(store, tickets, window=300), n=10)
+    agg.flush()
+
+    # the same export again: nothing new is filed and the count is not doubled
+    burst(again := IncidentAggregator(store, tickets, window=300), n=10)
+    again.flush()
+    assert len(tickets.filed) == 1
+    assert again.stats["merged"] == 1
+    assert store.db.execute("SELECT count FROM incidents").fetchall() == [(10,)]
+
+    # a burst continuing right after extends the same incident
+    burst(later := IncidentAggregator(store, tickets, window=300), n=4, start="2026-10-13T09:01:00Z")
+    later.flush()
+    assert len(tickets.filed) == 1
+    assert store.db.execute("SELECT count FROM incidents").fetchall() == [(14,)]
+
+
+def test_closed_incident_is_refiled(store):
+    tickets = Tickets()
+    burst(agg := IncidentAggregator(store, tickets, window=300), n=2)
+    agg.flush()
+    store.close("INC0000001")
+
+    # new occurrences right after: a new ticket, not the closed one
+    burst(again := IncidentAggregator(store, tickets, window=300), n=2, start="2026-10-13T09:02:00Z")
+    again.flush()
+    assert len(tickets.filed) == 2
+
+    # replaying the closed incident's own lines files nothing
+    burst(replay := IncidentAggregator(store, tickets, window=300), n=2)
+    replay.flush()
+    assert len(tickets.filed) == 2
+
+
+def test_recurring_issue_gets_a_new_ticket_after_max_age(store):
+    tickets = Tickets()
+    # a burst every 4 minutes: every pair of windows touches
+    for hour in range(6):
+        for quarter in range(15):
+            agg = IncidentAggregator(store, tickets, window=300, max_age=2 * 3600)
+            burst(agg, n=2, start=f"2026-10-13T{hour:02d}:{quarter * 4:02d}:00Z")
+            agg.flush()
+
+    assert len(tickets.filed) == 3
+    spans = store.db.execute("SELECT last_ts - first_ts FROM incidents ORDER BY id").fetchall()
+    assert all(span <= 2 * 3600 for span, in spans)
+
+    # replaying the first hour merges into the first ticket, not a new one
+    replay = IncidentAggregator(store, tickets, window=300, max_age=2 * 3600)
+    burst(replay, n=2, start="2026-10-13T00:00:00Z")
+    replay.flush()
+    assert len(tickets.filed) == 3
+
+
+def test_stale_incidents_are_closed(store):
+    tickets = Tickets()
+    burst(agg := IncidentAggregator(store, tickets, window=300, max_age=3600), n=2, service="payment")
+    agg.flush()
+
+    later = IncidentAggregator(store, tickets, window=300, max_age=3600)
+    burst(later, n=2, issue="Payment Failure", start="2026-10-13T12:00:00Z")
+    later.flush()
+    assert later.stats["closed"] == 1
+    assert store.db.execute("SELECT ticket, state FROM incidents ORDER BY id").fetchall() == [
+        ("INC0000001", "closed"), ("INC0000002", "open")]
+
+
+def test_failed_ticket_is_not_recorded(store):
+    agg = IncidentAggregator(store, lambda short, description: None, window=300)
+    burst(agg, n=3)
+    agg.flush()
+    assert store.db.execute("SELECT count(*) FROM incidents").fetchone() == (0,)
+
+
+def test_batch_creation_and_placeholder_swap(store):
+    batches = []
+
+    def create_tickets(items):
+        batches.append(items)
+        return [f"outbox:{i}" for i, _ in enumerate(items, 1)]
+
+    agg = IncidentAggregator(store, None, window=300, group_by=("service",), create_tickets=create_tickets)
+    burst(agg, n=2, service="payment")
+    burst(agg, n=2, service="order")
+    agg.flush()
+    assert len(batches) == 1 and len(batches[0]) == 2
+
+    store.set_ticket("outbox:1", "INC0000042")
+    assert ("INC0000042",) in store.db.execute("SELECT ticket FROM incidents").fetchall()
+
+
+def test_parse_ts_formats():
+    assert parse_ts("2026-10-13T09:12:44.120Z") == pytest.approx(1791882764.12)
+    assert parse_ts("Oct 13, 2026 @ 09:12:44.120") > 0
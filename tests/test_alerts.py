@@ -0,0 +1,140 @@
+import asyncio
+import os
+from concurrent.futures import Future
+
+import httpx
+import pytest
+
+from snow.alerts import AlertReceiver, AlertStore, alert_issue, fingerprint_of
+from snow.fake_alertmanager import make_alerts, payload
+from snow.fake_snow import FakeServiceNow
+from snow.matcher import IssueMatcher
+from snow.servicenow import ServiceNowClient
+
+RULES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "snow", "rules.json")
+
+
+class StubClient:
+    """ServiceNowClient stand-in: submit() hands back the next canned ticket as a finished Future."""
+
+    workers = 2
+
+    def __init__(self, *tickets):
+        self.tickets = list(tickets)
+        self.submitted = []
+
+    def submit(self, short_desc, description):
+        self.submitted.append(short_desc)
+        future = Future()
+        future.set_result(self.tickets.pop(0))
+        return future
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "snow_state.db")
+
+
+@pytest.fixture
+def store(db):
+    return AlertStore(db)
+
+
+def serve(receiver, scenario):
+    """Run `scenario(http)` against the receiver on a free port, then drain it."""
+    async def run():
+        port = await receiver.start("127.0.0.1", 0)
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as http:
+                return await scenario(http)
+        finally:
+            await receiver.stop(timeout=10)
+    return asyncio.run(run())
+
+
+def test_one_incident_per_fingerprint_until_resolved(store):
+    snow = FakeServiceNow(latency=0).start()
+    client = ServiceNowClient(snow.url, None, workers=4, rate=1000, burst=100)
+    receiver = AlertReceiver(client, store, IssueMatcher.from_file(RULES))
+    alerts = make_alerts(6, seed=1)
+
+    async def scenario(http):
+        for _ in range(3):  # Alertmanager's repeat re-sends
+            assert (await http.post("/alerts", json=payload(alerts))).status_code == 200
+        await receiver.queue.join()
+        created = len(snow.incidents)
+        await http.post("/alerts", json=payload(alerts, "resolved"))
+        await receiver.queue.join()
+        # firing again after the resolve is a new incident
+        await http.post("/alerts", json=payload(alerts[:2]))
+        await receiver.queue.join()
+        return created, (await http.get("/stats")).json()
+
+    try:
+        created, stats = serve(receiver, scenario)
+    finally:
+        client.close()
+        snow.stop()
+
+    assert created == 6
+    assert len(snow.incidents) == 8
+    assert {k: stats[k] for k in ("received", "created", "deduped", "resolved", "failed")} == {
+        "received": 26, "created": 8, "deduped": 12, "resolved": 6, "failed": 0}
+    assert stats["firing"] == 2
+    assert sorted(i["description"].split("Fingerprint: ")[1][:16] for i in snow.incidents[:6]) == sorted(
+        a["fingerprint"] for a in alerts)
+
+
+@pytest.mark.parametrize("body", [b"[]", b'"x"', b'{"alerts": [1]}', b'{"alerts": {}}', b"{", b"\xff"])
+def test_bad_payloads_get_400(store, body):
+    receiver = AlertReceiver(StubClient(), store, workers=1)
+
+    async def scenario(http):
+        bad = await http.post("/alerts", content=body)
+        # the connection is still usable afterwards
+        health = await http.get("/health")
+        return bad.status_code, health.status_code
+
+    assert serve(receiver, scenario) == (400, 200)
+    assert receiver.stats["received"] == 0
+
+
+def test_full_queue_refuses_the_whole_payload(store):
+    receiver = AlertReceiver(StubClient(), store, queue_size=2, workers=1)
+
+    async def scenario(http):
+        return await http.post("/alerts", json=payload(make_alerts(3)))
+
+    response = serve(receiver, scenario)
+    assert response.status_code == 503 and response.headers["retry-after"] == "5"
+    assert receiver.stats["refused"] == 3 and receiver.stats["received"] == 0
+
+
+def test_failed_incident_is_retried_on_the_next_send(db, store):
+    client = StubClient(None, "INC0000007")
+    receiver = AlertReceiver(client, store, workers=1)
+    alert = make_alerts(1)[0]
+
+    async def scenario(http):
+        for _ in range(3):
+            await http.post("/alerts", json=payload([alert]))
+            await receiver.queue.join()
+
+    serve(receiver, scenario)
+    assert len(client.submitted) == 2
+    assert receiver.stats["failed"] == 1 and receiver.stats["created"] == 1 and receiver.stats["deduped"] == 1
+
+    # firing alerts and their ticket survive a restart
+    fp = fingerprint_of(alert)
+    reopened = AlertStore(db)
+    assert reopened.firing == {fp}
+    assert reopened.resolve(fp) == "INC0000007"
+
+
+def test_alert_issue_uses_the_log_rules():
+    matcher = IssueMatcher.from_file(RULES)
+    fraud = {"labels": {"alertname": "PaymentFraudBlocksSpike", "error_type": "FraudBlocked"}}
+    unknown = {"labels": {"alertname": "PaymentChargeLatencyHigh"}}
+    assert alert_issue(fraud, matcher)[0] == "Fraud Blocked"
+    assert alert_issue(unknown, matcher)[0] == "Alert: PaymentChargeLatencyHigh"
+    assert fingerprint_of(unknown) == fingerprint_of({"labels": {"alertname": "PaymentChargeLatencyHigh"}})
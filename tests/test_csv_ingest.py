@@ -0,0 +1,100 @@
+import csv
+import os
+
+import pytest
+
+from snow import csv_ingest
+from snow.csv_ingest import scan_csv, scan_csv_files
+from snow.matcher import IssueMatcher
+
+RULES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "snow", "rules.json")
+
+# (message, expected issue) cycled through every export
+ROWS = [
+    ("event=payment_success order_id=o{i}", None),
+    ("event=payment_validation error_type=FraudBlocked order_id=o{i}", "Fraud Blocked"),
+    ("", None),
+    ("TRANSACTION FAILED for o{i}", "Payment Failure"),
+    ("event=payment_failure error_type=RandomFail order_id=o{i}", "Random Failure"),
+]
+
+
+def export(path, n, offset=0, columns=("@timestamp", "message", "service")):
+    """A Kibana-style CSV of `n` rows; returns the expected (issue, message) detections."""
+    expected = []
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for i in range(offset, offset + n):
+            template, issue = ROWS[i % len(ROWS)]
+            message = template.format(i=i)
+            row = {"@timestamp": f"2026-10-13T09:00:{i % 60:02d}.000Z", "message": message,
+                   "event.original": f"raw {message}", "service": "payment"}
+            writer.writerow([row[c] for c in columns])
+            if issue:
+                expected.append((issue, message))
+    return expected
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return IssueMatcher.from_file(RULES)
+
+
+def test_chunk_boundaries_do_not_drop_or_repeat_rows(tmp_path, matcher):
+    path = str(tmp_path / "export.csv")
+    expected = export(path, 103)
+    for chunksize in (7, 10, 103, 1000):
+        found = [(d.issue, d.message) for d in scan_csv(path, matcher, chunksize)]
+        assert found == expected
+
+
+def test_typed_columns_come_along(tmp_path, matcher):
+    path = str(tmp_path / "export.csv")
+    export(path, 5)
+    hit = next(scan_csv(path, matcher, chunksize=2))
+    assert hit.issue == "Fraud Blocked"
+    assert hit.timestamp == "2026-10-13T09:00:01.000Z"
+    assert hit.fields == {"service": "payment"} and hit.source == path
+
+
+def test_message_falls_back_to_event_original(tmp_path, matcher):
+    path = str(tmp_path / "raw.csv")
+    with open(path, "w", newline="") as f:
+        f.write("@timestamp,message,event.original\n")
+        f.write("2026-10-13T09:00:00Z,,payment failed for o1\n")
+        f.write("2026-10-13T09:00:01Z,event=payment_success,transaction failed\n")
+    assert [(d.issue, d.message) for d in scan_csv(path, matcher)] == [("Payment Failure", "payment failed for o1")]
+
+
+def test_several_files_over_the_pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv_ingest, "RESULT_BATCH", 4)  # several batches per file (inherited by fork)
+    expected = []
+    paths = []
+    for n in range(3):
+        path = str(tmp_path / f"export-{n}.csv")
+        expected += [(issue, message, path) for issue, message in export(path, 40 + n, offset=1000 * n)]
+        paths.append(path)
+
+    found = [(d.issue, d.message, d.source) for d in scan_csv_files(paths, RULES, workers=2, chunksize=9)]
+    assert sorted(found) == sorted(expected)
+    assert len(found) == len(expected)
+
+
+def test_closing_early_stops_the_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv_ingest, "RESULT_BATCH", 2)
+    paths = []
+    for n in range(2):
+        paths.append(str(tmp_path / f"export-{n}.csv"))
+        export(paths[-1], 500)
+
+    scan = scan_csv_files(paths, RULES, workers=2, chunksize=50)
+    assert next(scan).issue
+    scan.close()  # returns once the pool has shut down
+
+
+def test_worker_errors_reach_the_caller(tmp_path):
+    good = str(tmp_path / "good.csv")
+    export(good, 10)
+    with pytest.raises(FileNotFoundError):
+        list(scan_csv_files([good, str(tmp_path / "missing.csv")], RULES, workers=2))
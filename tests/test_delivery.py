@@ -0,0 +1,174 @@
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def delivery(service_module):
+    return service_module("notification-service", "delivery")
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_duplicates_coalesce_while_queued(delivery):
+    provider = delivery.FakeProvider(latency=0)
+
+    async def scenario():
+        queue = delivery.DeliveryQueue(provider, workers=1, batch_wait=0, spool_path=None)
+        await queue.start()
+        outcomes = [queue.offer("u1", "order shipped")[0] for _ in range(3)]
+        outcomes.append(queue.offer("u2", "order shipped")[0])
+        await queue.stop()
+        return outcomes
+
+    assert run(scenario()) == ["queued", "coalesced", "coalesced", "queued"]
+    assert [(p.to, p.count) for p in provider.delivered] == [("u1", 3), ("u2", 1)]
+
+
+def test_duplicate_after_pickup_is_a_new_notification(delivery):
+    provider = delivery.FakeProvider(latency=0.05)
+
+    async def scenario():
+        queue = delivery.DeliveryQueue(provider, workers=1, batch_wait=0, spool_path=None)
+        await queue.start()
+        first = queue.offer("u1", "hi")
+        await asyncio.sleep(0.01)  # a worker has taken it and is talking to the provider
+        second = queue.offer("u1", "hi")
+        await queue.stop()
+        return first, second
+
+    (status1, item1), (status2, item2) = run(scenario())
+    assert (status1, status2) == ("queued", "queued")
+    assert item1.count == item2.count == 1
+    assert len(provider.delivered) == 2
+
+
+def test_batches_and_backpressure(delivery):
+    provider = delivery.FakeProvider(latency=0)
+
+    async def scenario():
+        queue = delivery.DeliveryQueue(provider, workers=1, batch_size=4, batch_wait=0.05, maxsize=10,
+                                       spool_path=None)
+        await queue.start()
+        outcomes = [queue.offer(f"u{i}", "hi")[0] for i in range(12)]
+        await queue.stop()
+        return outcomes
+
+    outcomes = run(scenario())
+    assert outcomes.count("queued") == 10 and outcomes[-2:] == ["rejected", "rejected"]
+    assert provider.calls == 3
+    assert len(provider.delivered) == 10
+
+
+def test_spool_restores_pending_with_their_count(delivery, tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+
+    async def crash():
+        # no workers: everything is still pending when the process goes away
+        queue = delivery.DeliveryQueue(delivery.FakeProvider(latency=0), workers=0, spool_path=spool)
+        await queue.start()
+        for _ in range(3):
+            queue.offer("u1", "payment failed")
+        queue.offer("u2", "payment failed")
+        queue.spool.close()
+
+    async def restart(provider):
+        queue = delivery.DeliveryQueue(provider, workers=1, batch_wait=0, spool_path=spool)
+        await queue.start()
+        await queue.stop()
+
+    run(crash())
+    provider = delivery.FakeProvider(latency=0)
+    run(restart(provider))
+    assert sorted((p.to, p.count) for p in provider.delivered) == [("u1", 3), ("u2", 1)]
+
+    # delivered ones are marked done and not sent again
+    again = delivery.FakeProvider(latency=0)
+    run(restart(again))
+    assert again.delivered == []
+
+
+def test_spool_skips_a_torn_last_line(delivery, tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    spool.write_text('{"op": "add", "id": "a", "to": "u1", "message": "hi"}\n{"op": "add", "id": "b", "to"')
+    store = delivery.Spool(str(spool))
+    restored = store.load()
+    store.close()
+    assert [(p.id, p.to, p.count) for p in restored] == [("a", "u1", 1)]
+
+
+class FlakyProvider:
+    """Fails the first `failures` calls, then delivers."""
+
+    def __init__(self, delivery, failures):
+        self.inner = delivery.FakeProvider(latency=0)
+        self.failures = failures
+        self.calls = 0
+
+    async def send_batch(self, items):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("provider unavailable")
+        await self.inner.send_batch(items)
+
+    async def close(self):
+        pass
+
+
+def test_failed_batch_is_retried_later(delivery, monkeypatch, tmp_path):
+    monkeypatch.setattr(delivery, "MAX_ATTEMPTS", 1)
+    provider = FlakyProvider(delivery, failures=2)
+    spool = str(tmp_path / "spool.jsonl")
+
+    async def scenario():
+        queue = delivery.DeliveryQueue(provider, workers=1, batch_wait=0, spool_path=spool, retry_backoff=0.01)
+        await queue.start()
+        queue.offer("u1", "payment failed")
+        await asyncio.sleep(0.2)  # two failed rounds, backing off 0.01s then 0.02s
+        await queue.stop()
+        return queue.spool.pending
+
+    assert run(scenario()) == {}
+    assert provider.calls == 3
+    assert [p.to for p in provider.inner.delivered] == ["u1"]
+
+
+def test_batch_given_up_on_stays_spooled(delivery, monkeypatch, tmp_path):
+    monkeypatch.setattr(delivery, "MAX_ATTEMPTS", 1)
+    provider = FlakyProvider(delivery, failures=10)
+    spool = str(tmp_path / "spool.jsonl")
+
+    async def scenario():
+        queue = delivery.DeliveryQueue(provider, workers=1, batch_wait=0, spool_path=spool,
+                                       retry_rounds=2, retry_backoff=0.01)
+        await queue.start()
+        queue.offer("u1", "payment failed")
+        await asyncio.sleep(0.2)
+        await queue.stop()
+
+    run(scenario())
+    assert provider.calls == 3  # the first try and two rounds
+    restored = delivery.Spool(spool).load()
+    assert [p.to for p in restored] == ["u1"]
+
+
+def test_spool_is_compacted_while_running(delivery, tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    provider = delivery.FakeProvider(latency=0)
+
+    async def scenario():
+        queue = delivery.DeliveryQueue(provider, workers=1, batch_size=5, batch_wait=0, spool_path=str(spool))
+        queue.spool = delivery.Spool(str(spool), compact_lines=20)
+        await queue.start()
+        for i in range(100):
+            queue.offer(f"u{i}", "hi")
+            await asyncio.sleep(0)
+        await queue.stop()
+        return queue.spool
+
+    store = run(scenario())
+    assert len(provider.delivered) == 100
+    assert store.pending == {}
+    assert len(spool.read_text().splitlines()) <= 20
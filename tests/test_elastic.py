@@ -0,0 +1,84 @@
+import pytest
+
+from snow.elastic import Checkpoint, ElasticPoller, fields_of, message_of
+from snow.fake_es import FakeElasticsearch
+from snow.matcher import IssueMatcher
+
+
+def doc(second, message, **fields):
+    return {"@timestamp": f"2026-10-13T09:00:{second:02d}.000Z", "message": message, **fields}
+
+
+@pytest.fixture
+def es():
+    server = FakeElasticsearch().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "incidents.db")
+
+
+@pytest.fixture
+def checkpoint(db):
+    return Checkpoint(db, "logs-*")
+
+
+def ids(poller):
+    return [doc_id for doc_id, _ in poller.poll()]
+
+
+def test_pages_through_everything_oldest_first(es, checkpoint):
+    for i in reversed(range(10)):
+        es.add(doc(i, f"line {i}"), doc_id=f"d{i}")
+    poller = ElasticPoller(es.url, "logs-*", checkpoint, page_size=3)
+
+    assert ids(poller) == [f"d{i}" for i in range(10)]
+    assert poller.stats["pages"] == 4
+    assert es.stats["pits_open"] == 0
+
+
+def test_checkpoint_skips_processed_docs(es, db, checkpoint):
+    es.add(doc(1, "a"), doc_id="a")
+    es.add(doc(2, "b"), doc_id="b")
+    poller = ElasticPoller(es.url, "logs-*", checkpoint, page_size=2)
+
+    assert ids(poller) == ["a", "b"]
+    # not committed (e.g. the cycle failed): the same window again
+    assert ids(poller) == ["a", "b"]
+    poller.commit()
+    assert ids(poller) == []
+
+    # a late doc with the checkpoint's exact timestamp, and a newer one
+    es.add(doc(2, "b2"), doc_id="b2")
+    es.add(doc(3, "c"), doc_id="c")
+    assert ids(poller) == ["b2", "c"]
+    poller.commit()
+
+    # a restart reads the checkpoint back from SQLite
+    restarted = ElasticPoller(es.url, "logs-*", Checkpoint(db, "logs-*"))
+    assert ids(restarted) == []
+
+
+def test_matcher_narrows_the_query(es, checkpoint):
+    es.add(doc(1, "event=payment_success order_id=o1"), doc_id="ok")
+    es.add(doc(2, "event=payment_validation error_type=FraudBlocked", error_type="FraudBlocked"), doc_id="fraud")
+    es.add({"@timestamp": doc(3, "")["@timestamp"], "event.original": "payment failed for o3"}, doc_id="raw")
+    matcher = IssueMatcher([
+        {"issue": "Fraud Blocked", "any": ["error_type=fraudblocked"]},
+        {"issue": "Payment Failure", "any": ["payment failed"]},
+    ])
+    poller = ElasticPoller(es.url, "logs-*", checkpoint, matcher)
+
+    docs = dict(poller.poll())
+    assert sorted(docs) == ["fraud", "raw"]
+    assert message_of(docs["raw"]) == "payment failed for o3"
+    assert fields_of(docs["fraud"]) == {"error_type": "FraudBlocked"}
+
+
+def test_field_rules_disable_narrowing(es, checkpoint):
+    es.add(doc(1, "anything"), doc_id="x")
+    matcher = IssueMatcher([{"issue": "Slow Charge", "where": {"duration_ms": {">": 2000}}}])
+    assert ids(ElasticPoller(es.url, "logs-*", checkpoint, matcher)) == ["x"]
@@ -0,0 +1,106 @@
+import pytest
+
+CONFIG = {
+    "max_amount": 1000,
+    "rules": [
+        {"name": "user_burst", "key": "user", "window": 60, "max_count": 3},
+        {"name": "user_spend", "key": "user", "window": 600, "buckets": 10, "max_sum": 2500},
+        {"name": "order_retries", "key": "order", "window": 600, "buckets": 10, "max_count": 2},
+    ],
+}
+
+
+@pytest.fixture
+def fraud(service_module):
+    return service_module("payment-service", "fraud")
+
+
+def checks(engine, user, orders, amount=10.0, start=0.0, step=1.0):
+    return [engine.check(user, order, amount, now=start + i * step) for i, order in enumerate(orders)]
+
+
+def test_rules_trip_in_order(fraud):
+    engine = fraud.FraudEngine(CONFIG)
+    assert checks(engine, "u1", ["o1", "o2", "o3", "o4"]) == [None, None, None, "user_burst"]
+    assert engine.check("u2", "o9", 5000, now=0) == "max_amount"
+    assert checks(engine, "u3", ["o5"] * 3, start=100) == [None, None, "order_retries"]
+    # spend adds up across the burst window
+    assert checks(engine, "u4", ["a", "b", "c"], amount=900, step=30) == [None, None, "user_spend"]
+    assert engine.stats == {"checked": 11, "blocked": 4}
+
+
+def test_windows_expire(fraud):
+    engine = fraud.FraudEngine(CONFIG)
+    assert checks(engine, "u1", ["o1", "o2", "o3"]) == [None, None, None]
+    assert engine.check("u1", "o4", 10, now=30) == "user_burst"
+    # 60s later the first charges have slid out of the burst window
+    assert engine.check("u1", "o5", 10, now=65) is None
+    assert engine.check("u1", "o6", 10, now=200) is None
+    # anonymous callers are not one user
+    assert checks(engine, "unknown", [f"x{i}" for i in range(5)]) == [None] * 5
+
+
+def test_sliding_window_counts_and_sums(fraud):
+    window = fraud.SlidingWindow(60, buckets=6)
+    assert window.add(0, 5.0, now=0) == (1, 5.0)
+    assert window.add(0, 5.0, now=5) == (2, 10.0)
+    assert window.add(0, 1.0, now=35) == (3, 11.0)
+    assert window.add(0, 1.0, now=65) == (2, 2.0)   # the bucket of 0s and 5s expired
+    assert window.add(0, 1.0, now=500) == (1, 1.0)  # idle past the window: starts over
+    assert window.add(0, 1.0, now=500, new=True) == (1, 1.0)  # slot reused by another key
+
+
+def test_key_slots_evict_the_least_recently_seen(fraud):
+    slots = fraud.KeySlots(max_keys=4, sample=4)
+    for i, key in enumerate("abcd"):
+        assert slots.get(key, now=i) == (i, True)
+    slots.get("a", now=10)  # a is recent again
+
+    slot, new = slots.get("e", now=11)
+    assert new and slot == 1 and "b" not in slots.slots
+    assert slots.get("a", now=12) == (0, False)
+    assert len(slots) == 4 and slots.evictions == 1
+
+
+def test_eviction_sample_wraps_around(fraud):
+    slots = fraud.KeySlots(max_keys=5, sample=3)
+    for i, key in enumerate("abcde"):
+        slots.get(key, now=10 + i)
+    slots.get("a", now=1)  # the oldest key sits in slot 0
+    slots.hand = 4
+    slot, _ = slots.get("f", now=20)
+    # slots 4, 0, 1 are sampled, not just slot 4
+    assert slot == 0 and "a" not in slots.slots
+    assert slots.hand == 2
+
+
+def test_shared_windows_count_across_workers(fraud, tmp_path):
+    db = str(tmp_path / "fraud.db")
+    one, two = fraud.SharedFraudEngine(CONFIG, db), fraud.SharedFraudEngine(CONFIG, db)
+    assert one.blocking and not fraud.FraudEngine(CONFIG).blocking
+    assert one.check("u1", "o1", 10, now=1000) is None
+    assert two.check("u1", "o2", 10, now=1001) is None
+    assert one.check("u1", "o3", 10, now=1002) is None
+    assert two.check("u1", "o4", 10, now=1003) == "user_burst"
+    assert two.check("u1", "o5", 10, now=1070) is None  # expired for both
+    assert one.stats["fallbacks"] == two.stats["fallbacks"] == 0
+
+
+def test_shared_table_is_capped(fraud, tmp_path, monkeypatch):
+    monkeypatch.setattr(fraud, "PRUNE_EVERY", 10)
+    engine = fraud.SharedFraudEngine(CONFIG, str(tmp_path / "fraud.db"), max_keys=1)
+    engine.max_rows = 12
+    for i in range(40):
+        engine.check(f"u{i}", f"o{i}", 10, now=1000 + i)
+    rows = engine._db.execute("SELECT count(*) FROM fraud_buckets").fetchone()[0]
+    assert rows <= 12 + 9 * 3  # the cap, plus what was written since the last prune
+    assert engine.stats["evicted"] > 0
+    # buckets started most recently are the ones kept
+    kept = engine._db.execute("SELECT key FROM fraud_buckets WHERE window = 60").fetchall()
+    assert ("u39",) in kept and ("u0",) not in kept
+
+
+def test_shared_store_fails_open(fraud, tmp_path):
+    engine = fraud.SharedFraudEngine(CONFIG, str(tmp_path / "missing-dir" / "fraud.db"))
+    assert checks(engine, "u1", ["o1", "o2", "o3", "o4"]) == [None, None, None, "user_burst"]
+    assert engine.stats["fallbacks"] == 4
@@ -0,0 +1,163 @@
+import asyncio
+import time
+
+import pytest
+
+
+@pytest.fixture
+def idem(service_module):
+    return service_module("payment-service", "idempotency")
+
+
+def claim(store, payment_id, order_id, amount, idem):
+    return asyncio.run(store.claim(payment_id, order_id, idem.fingerprint(order_id, amount)))
+
+
+def test_replay_returns_the_stored_response(idem):
+    store = idem.MemoryStore()
+    outcome, record = claim(store, "p1", "o1", 10.0, idem)
+    assert outcome == idem.NEW
+
+    # a retry while the first attempt is still running
+    assert claim(store, "p1", "o1", 10.0, idem)[0] == idem.IN_PROGRESS
+
+    body = {"status": "charged", "payment_id": "p1"}
+    asyncio.run(store.complete(record, body, charged=True))
+    outcome, replayed = claim(store, "p1", "o1", 10.0, idem)
+    assert outcome == idem.REPLAY
+    assert replayed.body is body and replayed.charged
+
+
+def test_same_payment_id_with_other_details_conflicts(idem):
+    store = idem.MemoryStore()
+    claim(store, "p1", "o1", 10.0, idem)
+    assert claim(store, "p1", "o1", 11.0, idem)[0] == idem.CONFLICT
+    assert claim(store, "p1", "o2", 10.0, idem)[0] == idem.CONFLICT
+
+
+def test_second_payment_for_a_charged_order(idem):
+    store = idem.MemoryStore()
+    _, record = claim(store, "p1", "o1", 10.0, idem)
+    asyncio.run(store.complete(record, {"status": "charged"}, charged=True))
+
+    outcome, owner = claim(store, "p2", "o1", 10.0, idem)
+    assert outcome == idem.DUPLICATE_ORDER
+    assert owner.payment_id == "p1"
+
+
+def test_rejected_payment_does_not_own_the_order(idem):
+    store = idem.MemoryStore()
+    _, record = claim(store, "p1", "o1", 10.0, idem)
+    asyncio.run(store.complete(record, {"status": "blocked"}, charged=False))
+
+    assert claim(store, "p1", "o1", 10.0, idem)[0] == idem.REPLAY
+    assert claim(store, "p2", "o1", 10.0, idem)[0] == idem.NEW
+
+
+def test_release_forgets_the_claim(idem):
+    store = idem.MemoryStore()
+    _, record = claim(store, "p1", "o1", 10.0, idem)
+    asyncio.run(store.release(record))
+    assert claim(store, "p1", "o1", 10.0, idem)[0] == idem.NEW
+
+
+def test_claims_expire(idem):
+    store = idem.MemoryStore(ttl=0.05)
+    _, record = claim(store, "p1", "o1", 10.0, idem)
+    asyncio.run(store.complete(record, {"status": "charged"}, charged=True))
+
+    time.sleep(0.06)
+    assert claim(store, "p1", "o1", 10.0, idem)[0] == idem.NEW
+
+
+class FakeCursor:
+    def __init__(self, row=None, rowcount=0):
+        self.row, self.rowcount = row, rowcount
+
+    async def fetchone(self):
+        return self.row
+
+
+class FakeConnection:
+    """Stands in for a psycopg pool connection: answers each execute() from a script of cursors."""
+
+    def __init__(self, script):
+        self.script = script
+        self.executed = []
+
+    async def execute(self, sql, params=None):
+        self.executed.append((" ".join(sql.split()), params))
+        if sql.lstrip().startswith("SELECT pg_advisory"):
+            return FakeCursor()
+        return self.script.pop(0)
+
+    def transaction(self):
+        return self
+
+    def connection(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def postgres_store(idem, *script, lease=30.0):
+    """A PostgresStore over a scripted connection (no psycopg needed)."""
+    store = object.__new__(idem.PostgresStore)
+    store.ttl, store.lease = 600.0, lease
+    store.cache = idem.TTLCache(100, 600.0)
+    store.pool = FakeConnection(list(script))
+    store._ready = True
+    return store
+
+
+def test_postgres_claim_takes_a_lease(idem):
+    store = postgres_store(idem, FakeCursor(), FakeCursor(), FakeCursor(("t1",)), lease=12.0)
+    outcome, record = claim(store, "p1", "o1", 10.0, idem)
+    assert outcome == idem.NEW and record.claimed_at == "t1"
+
+    (_, lock), (own, own_params), (order, order_params), (upsert, _) = store.pool.executed
+    assert lock == ("o1",)
+    # an unfinished claim only counts while its lease runs, for its own id and for the order
+    assert "done OR claimed_at > now() - make_interval(secs => %s)" in own
+    assert own_params == ("p1", 600.0, 12.0)
+    assert "charged OR (NOT done AND claimed_at > now() - make_interval(secs => %s))" in order
+    assert order_params == ("o1", "p1", 12.0, 600.0)
+    assert "claimed_at = clock_timestamp()" in upsert and upsert.endswith("RETURNING claimed_at")
+
+
+def test_postgres_claim_outcomes(idem):
+    fp = idem.fingerprint("o1", 10.0)
+    done = ("p1", "o1", fp, True, True, {"status": "charged"}, "t0")
+    store = postgres_store(idem, FakeCursor(done))
+    outcome, record = claim(store, "p1", "o1", 10.0, idem)
+    assert outcome == idem.REPLAY and record.body == {"status": "charged"}
+    # finished records are served from the cache afterwards
+    assert claim(store, "p1", "o1", 10.0, idem)[0] == idem.REPLAY
+    assert len(store.pool.executed) == 2
+
+    running = ("p1", "o1", fp, False, False, None, "t0")
+    assert claim(postgres_store(idem, FakeCursor(running)), "p1", "o1", 10.0, idem)[0] == idem.IN_PROGRESS
+    assert claim(postgres_store(idem, FakeCursor(running)), "p1", "o1", 11.0, idem)[0] == idem.CONFLICT
+
+    charged = ("p0", "o1", fp, True, True, {"status": "charged"}, "t0")
+    outcome, owner = claim(postgres_store(idem, FakeCursor(), FakeCursor(charged)), "p1", "o1", 10.0, idem)
+    assert outcome == idem.DUPLICATE_ORDER and owner.payment_id == "p0"
+
+
+def test_postgres_complete_and_release_only_touch_their_own_claim(idem):
+    record = idem.Record("p1", "o1", "fp", claimed_at="t1")
+    store = postgres_store(idem, FakeCursor(rowcount=1), FakeCursor())
+    asyncio.run(store.complete(record, {"status": "charged"}, charged=True))
+    asyncio.run(store.release(record))
+    (update, update_params), (delete, delete_params) = store.pool.executed
+    assert update.endswith("WHERE payment_id = %s AND claimed_at = %s") and update_params[2:] == ("p1", "t1")
+    assert delete.endswith("WHERE payment_id = %s AND claimed_at = %s") and delete_params == ("p1", "t1")
+
+    # the lease ran out and another worker re-claimed: nothing is written, nothing cached
+    store = postgres_store(idem, FakeCursor(rowcount=0))
+    asyncio.run(store.complete(idem.Record("p1", "o1", "fp", claimed_at="t1"), {"status": "charged"}, charged=True))
+    assert store.cache.get("p1") is None
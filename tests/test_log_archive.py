@@ -0,0 +1,126 @@
+import gzip
+import json
+import os
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from sre_common import log_archive  # noqa: E402
+from sre_common.log_archive import LogArchive  # noqa: E402
+
+
+def text_line(i, day=13):
+    return (f"2026-10-{day} 09:{i // 60 % 60:02d}:{i % 60:02d},{i % 1000:03d} [{'ERROR' if i % 10 == 0 else 'INFO'}] "
+            f"[trace=t{i}] [user=u{i % 3}] [route=/charge] [duration_ms={i % 50}.5] "
+            f"event=payment_success error_type={'RandomFail' if i % 10 == 0 else 'None'} amount={i}.25\n")
+
+
+def json_line(i):
+    return json.dumps({"@timestamp": f"2026-10-14T10:00:{i % 60:02d}.000Z", "level": "INFO", "trace_id": f"j{i}",
+                       "user_id": "u9", "route": "/list", "duration_ms": 3.0, "event": "listed"}) + "\n"
+
+
+@pytest.fixture
+def logs(tmp_path):
+    """payment: a rotated .gz segment plus app.log (text); order: app.log (JSON lines)."""
+    payment = tmp_path / "payment"
+    order = tmp_path / "order"
+    payment.mkdir()
+    order.mkdir()
+    with gzip.open(payment / "app.log.20261013-080000-000000.gz", "wt") as f:
+        f.writelines(text_line(i) for i in range(0, 40))
+    (payment / "app.log").write_text("".join(text_line(i) for i in range(40, 100)))
+    (order / "app.log").write_text("".join(json_line(i) for i in range(30)))
+    return {"payment": str(payment / "app.log"), "order": str(order / "app.log")}
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return LogArchive(str(tmp_path / "archive"))
+
+
+def rows(archive):
+    table = archive.dataset().to_table()
+    return sorted(zip(table.column("trace_id").to_pylist(), table.column("service").to_pylist()))
+
+
+def expected_rows(payment=100, order=30):
+    return sorted([(f"t{i}", "payment") for i in range(payment)] + [(f"j{i}", "order") for i in range(order)])
+
+
+def test_segments_round_trip_to_parquet(archive, logs):
+    assert archive.ingest_files(logs, workers=1) == 130
+    assert rows(archive) == expected_rows()
+
+    table = archive.dataset().to_table(filter=log_archive.ds.field("trace_id") == "t10")
+    row = table.to_pylist()[0]
+    assert (row["level"], row["user_id"], row["route"], row["duration_ms"], row["event"], row["error_type"],
+            row["amount"], str(row["date"])) == ("ERROR", "u1", "/charge", 10.5, "payment_success", "RandomFail",
+                                                  10.25, "2026-10-13")
+    assert table.column("timestamp")[0].as_py().isoformat() == "2026-10-13T09:00:10.010000+00:00"
+    assert archive.dataset().to_table(filter=log_archive.ds.field("trace_id") == "t11").column(
+        "error_type").to_pylist() == [None]
+    # partitioned by service and day, nothing left in staging
+    assert sorted(os.listdir(archive.path)) == ["_manifest.json", "service=order", "service=payment"]
+    assert os.listdir(os.path.join(archive.path, "service=order")) == ["date=2026-10-14"]
+
+
+def test_only_new_lines_are_added(archive, logs):
+    archive.ingest_files(logs, workers=1)
+    assert archive.ingest_files(logs, workers=1) == 0
+
+    with open(logs["payment"], "a") as f:
+        f.writelines(text_line(i) for i in range(100, 110))
+        f.write(text_line(110)[:30])  # half-written: waits for the next run
+    assert archive.ingest_files(logs, workers=1) == 10
+    with open(logs["payment"], "a") as f:
+        f.write(text_line(110)[30:])
+    assert archive.ingest_files(logs, workers=1) == 1
+    assert rows(archive) == expected_rows(payment=111)
+
+
+def test_crash_before_the_commit_record_loses_nothing(archive, logs, monkeypatch):
+    save_json = LogArchive._save_json
+
+    def crash_at_commit(self, path, doc):
+        if path == self.commit_path:
+            raise KeyboardInterrupt("killed between stage and commit")
+        save_json(self, path, doc)
+
+    monkeypatch.setattr(LogArchive, "_save_json", crash_at_commit)
+    with pytest.raises(KeyboardInterrupt):
+        archive.ingest_files(logs, workers=1)
+    assert os.listdir(archive.staging_path)  # staged parts are left behind
+    assert not os.path.exists(archive.manifest_path)
+    monkeypatch.undo()
+
+    # the next run drops the staged parts and archives everything once
+    again = LogArchive(archive.path)
+    assert again.ingest_files(logs, workers=1) == 130
+    assert rows(again) == expected_rows()
+    assert not os.path.exists(again.staging_path)
+
+
+def test_crash_while_moving_parts_is_rolled_forward(archive, logs, monkeypatch):
+    replace = os.replace
+    moved = []
+
+    def crash_after_first_part(src, dst):
+        if src.endswith(".parquet"):
+            if moved:
+                raise KeyboardInterrupt("killed while moving parts")
+            moved.append(dst)
+        replace(src, dst)
+
+    monkeypatch.setattr(log_archive.os, "replace", crash_after_first_part)
+    with pytest.raises(KeyboardInterrupt):
+        archive.ingest_files(logs, workers=1)
+    monkeypatch.undo()
+    assert len(moved) == 1 and os.path.exists(archive.commit_path)
+
+    # recovery moves the rest and applies the offsets: no row twice, none missing
+    again = LogArchive(archive.path)
+    assert again.ingest_files(logs, workers=1) == 0
+    assert rows(again) == expected_rows()
+    assert not os.path.exists(again.commit_path)
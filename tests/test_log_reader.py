@@ -0,0 +1,124 @@
+import pytest
+
+from sre_common.log_reader import LogFilter, read_page
+from sre_common.logfile import RotatingAppendFile, SegmentCompressor, list_segments
+
+
+class ManualCompressor(SegmentCompressor):
+    """No background thread: the test decides when segments get gzipped."""
+
+    def submit(self):
+        pass
+
+
+@pytest.fixture
+def log(tmp_path):
+    path = str(tmp_path / "app.log")
+    compressor = ManualCompressor(path, keep_files=0, delay=0)
+    f = RotatingAppendFile(path, max_bytes=1000, compressor=compressor)
+    yield path, f, compressor
+    f.close()
+
+
+def write(f, start, stop):
+    lines = [f"2026-10-18 07:45:12 [INFO] [trace=t{i % 7}] line {i:04d}" for i in range(start, stop)]
+    for line in lines:
+        f.write(line + "\n")
+    return lines
+
+
+def walk_back(path, lines=7, cursor=None, flt=None):
+    """Every line from `cursor` (default: the end) back to the start of the oldest segment, oldest first."""
+    pages = []
+    while True:
+        page = read_page(path, lines, cursor, flt)
+        pages.append(list(page.iter_lines()))
+        cursor = page.older
+        if cursor is None:
+            return [line for page in reversed(pages) for line in page]
+
+
+def test_pages_back_through_rotated_segments(log):
+    path, f, compressor = log
+    written = write(f, 0, 200)
+    assert f.rotations >= 5
+
+    assert walk_back(path) == written
+
+    compressor.sweep()
+    assert all(seg.compressed for seg in list_segments(path))
+    assert walk_back(path) == written
+
+
+def test_older_cursor_survives_compression(log):
+    path, f, compressor = log
+    written = write(f, 0, 200)
+
+    first = read_page(path, 60)
+    newest = list(first.iter_lines())
+    assert newest == written[-60:]
+
+    compressor.sweep()  # the cursor now points into a .gz
+    assert walk_back(path, cursor=first.older) + newest == written
+
+
+def test_newer_cursor_follows_rotation(log):
+    path, f, compressor = log
+    write(f, 0, 50)
+    page = read_page(path, 5)
+
+    added = write(f, 50, 200)  # rotates several times meanwhile
+    compressor.sweep()
+    seen, cursor = [], page.newer
+    while True:
+        page = read_page(path, 25, cursor)
+        lines = list(page.iter_lines())
+        if not lines:
+            break
+        seen += lines
+        cursor = page.newer
+    assert seen == added
+
+    # nothing new: an empty page that keeps the cursor usable
+    assert list(read_page(path, 25, cursor).iter_lines()) == []
+    assert write(f, 200, 201) == list(read_page(path, 25, cursor).iter_lines())
+
+
+def test_page_read_before_rotation_still_decodes(log):
+    path, f, compressor = log
+    written = write(f, 0, 10)
+    page = read_page(path, 5)
+
+    write(f, 10, 200)
+    compressor.sweep()  # the file the page was read from is now a .gz
+    assert list(page.iter_lines()) == written[-5:]
+
+
+def test_filter_across_segments(log):
+    path, f, compressor = log
+    written = write(f, 0, 200)
+    compressor.sweep()
+    assert walk_back(path, flt=LogFilter(trace="t3")) == [line for line in written if "[trace=t3]" in line]
+
+
+def test_retention_ends_history(log):
+    path, f, compressor = log
+    written = write(f, 0, 200)
+    compressor.keep_files = 1
+    compressor.sweep()
+
+    lines = walk_back(path)
+    assert lines == written[-len(lines):]
+    assert len(lines) < len(written)
+
+
+def test_bad_cursor(log):
+    path, f, _ = log
+    write(f, 0, 3)
+    with pytest.raises(ValueError):
+        read_page(path, 10, "not-a-cursor")
+
+
+def test_missing_file(tmp_path):
+    page = read_page(str(tmp_path / "nothing.log"))
+    assert list(page.iter_lines()) == [] and page.older is None and page.newer is None
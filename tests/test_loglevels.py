@@ -0,0 +1,103 @@
+import logging
+
+import pytest
+
+from sre_common.middleware import AccessLogPolicy, LogLevelJournal
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return str(tmp_path / "loglevel.jsonl")
+
+
+@pytest.fixture
+def logger_name(request):
+    name = f"test-loglevels-{request.node.name}"
+    yield name
+    logging.getLogger(name).setLevel(logging.NOTSET)
+
+
+@pytest.fixture
+def tokens():
+    from sre_common.tokens import TokenSigner, TokenVerifier
+
+    return TokenSigner("k1", b"secret-one", ttl=60), TokenVerifier({"k1": b"secret-one"})
+
+
+def test_change_reaches_the_other_workers(journal, logger_name):
+    # two workers of one service: separate policies, one journal
+    first = LogLevelJournal(journal, AccessLogPolicy(), interval=0)
+    second = LogLevelJournal(journal, AccessLogPolicy(), interval=0)
+
+    first.change({"route": "/list", "rate": 0.1, "level": "DEBUG"})
+    first.change({"logger": logger_name, "level": "debug"})
+    assert second.policy.as_dict() == {}
+    second.poll()
+    assert second.policy.as_dict() == {"/list": {"rate": 0.1, "level": "DEBUG"}}
+    assert logging.getLogger(logger_name).level == logging.DEBUG
+
+    second.change({"route": "/list", "reset": True})
+    first.poll()
+    assert first.policy.as_dict() == second.policy.as_dict() == {}
+
+    # a worker started later replays the whole journal
+    third = LogLevelJournal(journal, AccessLogPolicy(), interval=0)
+    third.poll()
+    assert third.policy.as_dict() == {}
+    assert third.offset == first.offset
+
+
+def test_poll_is_throttled_and_waits_for_whole_lines(journal):
+    writer = LogLevelJournal(journal, AccessLogPolicy())
+    reader = LogLevelJournal(journal, AccessLogPolicy(), interval=3600)
+    reader.poll()
+    writer.change({"route": "/a", "rate": 0})
+    reader.poll()
+    assert reader.policy.as_dict() == {}  # not due yet
+    reader.poll(force=True)
+    assert reader.policy.as_dict() == {"/a": {"rate": 0.0, "level": "INFO"}}
+
+    with open(journal, "a") as f:
+        f.write('{"route": "/b", "ra')
+    reader.poll(force=True)
+    assert "/b" not in reader.policy.as_dict()
+    with open(journal, "a") as f:
+        f.write('te": 0.5}\n')
+    reader.poll(force=True)
+    assert reader.policy.as_dict()["/b"] == {"rate": 0.5, "level": "INFO"}
+
+
+def test_bad_change_is_refused_and_not_journalled(journal):
+    levels = LogLevelJournal(journal, AccessLogPolicy())
+    for change in ({"level": "LOUD"}, {"logger": "x"}, {"route": "/a", "level": "LOUD"}):
+        with pytest.raises(ValueError):
+            levels.change(change)
+    assert levels.offset == 0
+    with pytest.raises(FileNotFoundError):
+        open(journal)
+
+
+def test_loglevel_endpoint_goes_through_the_journal(journal, tokens):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from sre_common.logs_api import loglevel_router
+    from sre_common.tokens import TokenAuthMiddleware
+
+    signer, verifier = tokens
+    one = LogLevelJournal(journal, AccessLogPolicy(), interval=0)
+    other = LogLevelJournal(journal, AccessLogPolicy(), interval=0)
+    apps = []
+    for levels in (one, other):
+        app = FastAPI()
+        app.include_router(loglevel_router(levels))
+        app.add_middleware(TokenAuthMiddleware, verifier=verifier)
+        apps.append(TestClient(app))
+
+    admin = {"Authorization": f"Bearer {signer.issue('ops', roles=['admin'])}"}
+    user = {"Authorization": f"Bearer {signer.issue('alice')}"}
+    change = {"route": "/list", "rate": 0.25}
+    assert apps[0].post("/loglevel", json=change, headers=user).status_code == 403
+    assert apps[0].post("/loglevel", json={"level": "LOUD"}, headers=admin).status_code == 400
+    assert apps[0].post("/loglevel", json=change, headers=admin).status_code == 200
+    assert apps[1].get("/loglevel").json()["access_log"] == {"/list": {"rate": 0.25, "level": "INFO"}}
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from snow.matcher import IssueMatcher
+
+RULES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "snow", "rules.json")
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return IssueMatcher.from_file(RULES)
+
+
+def test_match_is_case_insensitive(matcher):
+    assert matcher.match("event=payment_validation error_type=FraudBlocked order_id=o1") == "Fraud Blocked"
+    assert matcher.match("PAYMENT FAILED for order o2") == "Payment Failure"
+    assert matcher.match("event=payment_success order_id=o3") is None
+
+
+def test_first_rule_wins(matcher):
+    # both "Random Failure" and "Payment Failure" keywords: the earlier rule wins
+    assert matcher.match("event=payment_failure payment failed") == "Random Failure"
+    assert matcher.match("payment failed error_type=InvalidAmount") == "Invalid Amount"
+
+
+def test_match_many_agrees_with_match(matcher):
+    lines = [
+        "event=payment_success",
+        "error_type=DuplicateTransaction",
+        "transaction failed",
+        "",
+        "error_type=RandomFail event=payment_failure",
+        "nothing to see",
+    ]
+    assert matcher.match_many(lines) == [matcher.match(line) for line in lines]
+
+
+def test_match_many_non_ascii_lines(matcher):
+    # "İ".lower() is two code points: offsets must come from the lowered lines
+    lines = ["İstanbul İİİİ user=İlker"] * 40 + ["ok", "error_type=FraudBlocked", "ok", "TRANSACTİON FAILED"]
+    assert matcher.match_many(lines) == [matcher.match(line) for line in lines]
+    assert matcher.match_many(lines)[41] == "Fraud Blocked"
+
+
+def test_where_rules_use_fields():
+    m = IssueMatcher([
+        {"issue": "Slow Charge", "where": {"route": "/charge", "duration_ms": {">": 2000}}},
+        {"issue": "Fraud Blocked", "any": ["error_type=fraudblocked"]},
+    ])
+    assert m.match("[route=/charge] [duration_ms=2500.1] done") == "Slow Charge"
+    assert m.match("[route=/charge] [duration_ms=20.0] done") is None
+    assert m.match("done", {"route": "/charge", "duration_ms": 3000}) == "Slow Charge"
+    assert m.match_many(["[route=/charge] [duration_ms=2500.1] error_type=FraudBlocked"]) == ["Slow Charge"]
+
+
+def test_bad_operator_is_rejected():
+    with pytest.raises(ValueError):
+        IssueMatcher([{"issue": "x", "where": {"amount": {"~": 1}}}])
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def store_module(service_module):
+    return service_module("order-service", "store")
+
+
+@pytest.fixture
+def store(store_module, tmp_path):
+    store = store_module.SQLiteOrderStore(str(tmp_path / "orders.db"))
+    yield store
+    asyncio.run(store.close())
+
+
+def walk(store, **kwargs):
+    """Every page of /list, following `next` until it runs out."""
+    async def run():
+        pages, cursor = [], None
+        while True:
+            page = await store.list(cursor=cursor, **kwargs)
+            pages.append([order["id"] for order in page["orders"]])
+            cursor = page["next"]
+            if cursor is None:
+                return pages
+    return asyncio.run(run())
+
+
+def fill(store, n, customers=("c1", "c2", "c3")):
+    orders = [(f"o{i}", customers[i % len(customers)], float(i)) for i in range(n)]
+    return asyncio.run(store.insert_many(orders))
+
+
+def test_pages_newest_first_without_gaps(store):
+    assert fill(store, 25) == 25
+    pages = walk(store, limit=10)
+
+    assert [len(p) for p in pages] == [10, 10, 5]
+    assert sum(pages, []) == [f"o{i}" for i in reversed(range(25))]
+
+
+def test_exact_multiple_has_no_empty_last_page(store):
+    fill(store, 20)
+    assert [len(p) for p in walk(store, limit=10)] == [10, 10]
+
+
+def test_customer_filter(store):
+    fill(store, 30)
+    pages = walk(store, customer_id="c2", limit=4)
+    assert sum(pages, []) == [f"o{i}" for i in reversed(range(30)) if i % 3 == 1]
+
+
+def test_rows_added_between_pages_do_not_shift_the_cursor(store):
+    fill(store, 10)
+
+    async def run():
+        first = await store.list(limit=5)
+        await store.insert("late", "c1", 1.0)
+        return first, await store.list(limit=5, cursor=first["next"])
+
+    first, second = asyncio.run(run())
+    assert [o["id"] for o in first["orders"]] == ["o9", "o8", "o7", "o6", "o5"]
+    assert [o["id"] for o in second["orders"]] == ["o4", "o3", "o2", "o1", "o0"]
+
+
+def test_duplicate_ids_are_ignored(store):
+    async def run():
+        assert await store.insert("o1", "c1", 5.0)
+        assert not await store.insert("o1", "c2", 7.0)
+        return await store.insert_many([("o1", "c1", 5.0), ("o2", "c1", 6.0)])
+
+    assert asyncio.run(run()) == 1
+    assert walk(store, limit=10) == [["o2", "o1"]]
+
+
+@pytest.mark.parametrize("cursor", ["nope", "e30", "eyJzIjoieCJ9", "W10"])
+def test_bad_cursor(store, store_module, cursor):
+    with pytest.raises(ValueError):
+        asyncio.run(store.list(cursor=cursor))
+    with pytest.raises(ValueError):
+        store_module.decode_cursor(cursor)
+
+
+def test_cursor_round_trip(store_module):
+    assert store_module.decode_cursor(store_module.encode_cursor(12345)) == 12345
+
+
+def test_get(store):
+    async def run():
+        await store.insert("o1", "c1", 5.0)
+        return await store.get("o1"), await store.get("missing")
+
+    order, missing = asyncio.run(run())
+    assert missing is None
+    assert {k: order[k] for k in ("id", "customer_id", "amount")} == {"id": "o1", "customer_id": "c1", "amount": 5.0}
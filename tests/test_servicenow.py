@@ -0,0 +1,115 @@
+import pytest
+
+from snow.fake_snow import FakeServiceNow
+from snow.servicenow import Outbox, ServiceNowClient
+
+
+@pytest.fixture
+def snow():
+    server = FakeServiceNow(latency=0, seed=7).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return Outbox(str(tmp_path / "snow_state.db"))
+
+
+def client_for(url, outbox, **kwargs):
+    kwargs = {"workers": 4, "rate": 1000, "burst": 100, "max_retries": 8, "backoff": 0.001, **kwargs}
+    return ServiceNowClient(url, ("user", "pw"), outbox=outbox, **kwargs)
+
+
+def test_create_many_retries_through_errors(snow, outbox):
+    snow.error_rate = 0.3
+    client = client_for(snow.url, outbox)
+    items = [(f"Fraud Blocked x{i}", f"incident {i}") for i in range(20)]
+    try:
+        tickets = client.create_many(items)
+    finally:
+        client.close()
+
+    assert len(set(tickets)) == 20 and all(t.startswith("INC") for t in tickets)
+    assert [i["short_description"] for i in snow.incidents if i["number"] == tickets[3]] == ["Fraud Blocked x3"]
+    assert client.stats["created"] == 20
+    assert client.stats["retries"] == snow.stats["errors"] > 0
+    assert len({i["correlation_id"] for i in snow.incidents}) == 20
+    assert outbox.pending() == []
+
+
+def test_unreachable_incidents_wait_in_the_outbox(snow, outbox):
+    created = []
+    snow.error_rate = 1.0
+    client = client_for(snow.url, outbox, max_retries=1, on_created=lambda ref, ticket: created.append((ref, ticket)))
+    try:
+        assert client.create("Payment Failure x4", "first") == "outbox:1"
+        assert client.create("Invalid Amount x1", "second") == "outbox:2"
+        assert client.stats["deferred"] == 2
+        assert [row[0] for row in outbox.pending()] == [1, 2]
+
+        # ServiceNow is back: the next run drains what was left behind
+        snow.error_rate = 0.0
+        assert client.drain_outbox() == 2
+    finally:
+        client.close()
+
+    by_number = {i["number"]: i["short_description"] for i in snow.incidents}
+    assert {ref: by_number[ticket] for ref, ticket in created} == {
+        "outbox:1": "Payment Failure x4", "outbox:2": "Invalid Amount x1"}
+    assert outbox.pending() == []
+    assert client.drain_outbox() == 0
+
+
+def test_lost_reply_does_not_create_a_duplicate(snow, outbox):
+    snow.lost_reply_rate = 1.0  # created, but the client only sees a 504
+    client = client_for(snow.url, outbox, max_retries=2)
+    try:
+        ticket = client.create("Fraud Blocked x9", "burst")
+    finally:
+        client.close()
+
+    assert [i["number"] for i in snow.incidents] == [ticket]
+    assert client.stats["found"] == 1
+    assert outbox.pending() == []
+
+
+def test_drain_finds_what_an_earlier_run_created(snow, outbox):
+    # an earlier run's POST landed, but it died before marking the entry done
+    entry_id, correlation_id = outbox.put("Fraud Blocked x2", "earlier")
+    earlier = client_for(snow.url, None)
+    try:
+        earlier._post("Fraud Blocked x2", "earlier", correlation_id)
+    finally:
+        earlier.close()
+
+    created = []
+    client = client_for(snow.url, outbox, on_created=lambda ref, ticket: created.append((ref, ticket)))
+    try:
+        assert client.drain_outbox() == 1
+    finally:
+        client.close()
+    assert len(snow.incidents) == 1
+    assert created == [(f"outbox:{entry_id}", snow.incidents[0]["number"])]
+
+
+def test_client_errors_are_not_retried(snow, outbox):
+    client = client_for(snow.url.replace("/incident", "/nope"), outbox)
+    try:
+        assert client.create("x", "y") is None
+    finally:
+        client.close()
+    assert snow.stats["requests"] == 0
+    assert client.stats["retries"] == 0
+    assert outbox.pending() == []
+    assert outbox.db.execute("SELECT state, attempts FROM outbox").fetchall() == [("failed", 1)]
+
+
+def test_without_outbox_nothing_is_deferred(snow):
+    snow.error_rate = 1.0
+    client = client_for(snow.url, None, max_retries=0)
+    try:
+        assert client.create("x", "y") is None
+        assert client.drain_outbox() == 0
+    finally:
+        client.close()
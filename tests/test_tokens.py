@@ -0,0 +1,145 @@
+import base64
+import json
+import time
+
+import pytest
+
+from sre_common.tokens import InvalidToken, TokenAuthMiddleware, TokenSigner, TokenVerifier, _sign, load_keys
+
+
+def b64(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).rstrip(b"=").decode()
+
+
+@pytest.fixture
+def signer():
+    return TokenSigner("k1", b"secret-one", ttl=60)
+
+
+@pytest.fixture
+def verifier():
+    return TokenVerifier({"k1": b"secret-one"})
+
+
+def test_issue_and_verify(signer, verifier):
+    token = signer.issue("alice", roles=["admin"])
+    claims = verifier.verify(token)
+    assert claims["sub"] == "alice" and claims["roles"] == ["admin"]
+    assert claims["exp"] - claims["iat"] == 60
+
+    # the second check comes from the cache
+    assert verifier.verify(token) == claims
+    assert verifier.stats == {"hits": 1, "misses": 1}
+
+
+def test_expired_token(verifier):
+    token = TokenSigner("k1", b"secret-one", ttl=-1).issue("alice")
+    with pytest.raises(InvalidToken, match="expired"):
+        verifier.verify(token)
+
+
+def test_cached_token_still_expires(verifier):
+    token = TokenSigner("k1", b"secret-one", ttl=1).issue("alice")
+    verifier.verify(token)
+    time.sleep(1.05)
+    with pytest.raises(InvalidToken, match="expired"):
+        verifier.verify(token)
+
+
+def test_tampered_payload(signer, verifier):
+    header, _, signature = signer.issue("alice").split(".")
+    forged = f"{header}.{b64({'sub': 'root', 'exp': time.time() + 60})}.{signature}"
+    with pytest.raises(InvalidToken, match="bad signature"):
+        verifier.verify(forged)
+
+
+def test_unknown_key(verifier):
+    with pytest.raises(InvalidToken, match="unknown signing key"):
+        verifier.verify(TokenSigner("k2", b"secret-two").issue("alice"))
+
+
+def test_wrong_alg(verifier, signer):
+    _, payload, signature = signer.issue("alice").split(".")
+    with pytest.raises(InvalidToken, match="unsupported alg"):
+        verifier.verify(f"{b64({'alg': 'none', 'kid': 'k1'})}.{payload}.{signature}")
+
+
+@pytest.mark.parametrize("token", [
+    "",
+    "abc",
+    "a.b",
+    "a.b.c.d",
+    "W10.e30.x",                               # header is a JSON list
+    "!!!.e30.x",                               # not base64
+    f"{b64('k1')}.e30.x",                       # header is a JSON string
+    f"{b64({'alg': 'HS256', 'kid': ['k1']})}.e30.x",  # unhashable kid
+    "eyJ.e30.sïg",                             # non-ASCII
+    None,
+    123,
+])
+def test_malformed_tokens(verifier, token):
+    with pytest.raises(InvalidToken):
+        verifier.verify(token)
+
+
+@pytest.mark.parametrize("claims", [[1], "alice", {"exp": 9999999999}, {"sub": 1, "exp": 9999999999},
+                                    {"sub": "alice"}, {"sub": "alice", "exp": "soon"}])
+def test_malformed_claims_with_a_valid_signature(signer, verifier, claims):
+    signing_input = f"{signer.header}.{b64(claims)}"
+    with pytest.raises(InvalidToken):
+        verifier.verify(f"{signing_input}.{_sign(b'secret-one', signing_input)}")
+
+
+def test_key_rotation(verifier):
+    old = TokenSigner("k1", b"secret-one").issue("alice")
+    new = TokenSigner("k2", b"secret-two").issue("bob")
+    verifier.verify(old)
+
+    # new key first, old one still accepted while its tokens live
+    verifier.set_keys({"k2": b"secret-two", "k1": b"secret-one"})
+    assert verifier.verify(new)["sub"] == "bob"
+    assert verifier.verify(old)["sub"] == "alice"
+
+    # old key dropped: its tokens stop working, cached or not
+    verifier.set_keys({"k2": b"secret-two"})
+    with pytest.raises(InvalidToken):
+        verifier.verify(old)
+
+
+def test_load_keys():
+    assert load_keys("new:s2,old:s1") == ("new", {"new": b"s2", "old": b"s1"})
+    with pytest.raises(ValueError):
+        load_keys("no-secret")
+
+
+def test_middleware(signer, verifier):
+    from fastapi import FastAPI, Request
+    from fastapi.testclient import TestClient
+
+    app = FastAPI()
+
+    @app.get("/whoami")
+    def whoami(request: Request):
+        return {"user": getattr(request.state, "user_id", None)}
+
+    app.add_middleware(TokenAuthMiddleware, verifier=verifier, required=True)
+    client = TestClient(app)
+
+    ok = client.get("/whoami", headers={"Authorization": f"Bearer {signer.issue('alice')}"})
+    assert ok.status_code == 200 and ok.json() == {"user": "alice"}
+    assert client.get("/whoami", headers={"Authorization": "Bearer W10.e30.x"}).status_code == 401
+    missing = client.get("/whoami")
+    assert missing.status_code == 401 and missing.headers["www-authenticate"] == "Bearer"
+
+
+def test_admin_credentials():
+    from sre_common.tokens import AdminCredentials, hash_password
+
+    admins = AdminCredentials.from_env(f"alice:{hash_password('s3cret', iterations=1000)}, ")
+    assert "alice" in admins and "bob" not in admins
+    assert admins.check("alice", "s3cret") is True
+    assert admins.check("alice", "guess") is False
+    assert admins.check("bob", "s3cret") is None
+    assert AdminCredentials.from_env("").hashes == {}
+    with pytest.raises(ValueError, match="AUTH_ADMINS"):
+        AdminCredentials.from_env("alice")  # a bare username no longer makes an admin
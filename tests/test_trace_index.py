@@ -0,0 +1,95 @@
+import gzip
+import os
+
+import pytest
+
+from sre_common.trace_index import TraceIndex, parse_line
+
+
+def line(i, trace, route=None, duration=None, level="INFO", extra="event=payment_success"):
+    head = f"2026-10-13 09:00:{i % 60:02d},{i % 1000:03d} [{level}] [trace={trace}]"
+    if route:
+        head += f" [route={route}] [duration_ms={duration}]"
+    return f"{head} {extra} n={i}\n"
+
+
+def write(path, lines, mode="w"):
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, mode + "t") as f:
+        f.writelines(lines)
+    return str(path)
+
+
+@pytest.fixture
+def idx(tmp_path):
+    index = TraceIndex(str(tmp_path / "traces.db"))
+    yield index
+    index.close()
+
+
+def test_parse_line_text_and_json():
+    parsed = parse_line(line(3, "t1", "/charge", 12.5, extra="event=payment_validation error_type=FraudBlocked")
+                        .rstrip().encode())
+    assert parsed[0] == "t1" and parsed[4:] == ("/charge", 12.5, "payment_validation", "FraudBlocked")
+    doc = b'{"@timestamp": "2026-10-13T09:00:01.250Z", "trace_id": "t2", "level": "ERROR", "duration_ms": 3}'
+    assert parse_line(doc)[:3] == ("t2", parse_line(line(1, "x").encode())[1] + 0.249, "ERROR")
+    assert parse_line(b"2026-10-13 09:00:01,000 [INFO] no trace here") is None
+
+
+def test_segments_of_one_service_are_indexed_together(tmp_path, idx):
+    old = write(tmp_path / "app.log.20261013-090000-000000.gz", [line(i, f"t{i % 3}") for i in range(30)])
+    current = write(tmp_path / "app.log", [line(i, f"t{i % 3}", "/charge", 1.0) for i in range(30, 36)])
+    other = write(tmp_path / "order.log", [line(40, "t0", "/checkout", 5.0)])
+
+    assert idx.ingest_files([("payment", old), ("payment", current), ("order", other)], workers=1) == 37
+    summary = idx.summary("t0")
+    assert summary["lines"] == 13 and summary["hops"] == 3 and summary["hop_ms"] == 7.0
+    assert sorted(summary["services"].split(",")) == ["order", "payment"]
+
+    # lines come back from the .gz and the plain file alike
+    timeline = idx.timeline("t0")
+    assert [e["line"] for e in timeline if e["service"] == "payment"][:2] == [
+        line(0, "t0").rstrip(), line(3, "t0").rstrip()]
+    assert timeline[-1]["line"] == line(40, "t0", "/checkout", 5.0).rstrip()
+
+
+def test_rerun_only_adds_what_grew(tmp_path, idx):
+    path = write(tmp_path / "app.log", [line(i, "t1") for i in range(5)])
+    assert idx.ingest_files([("payment", path)], workers=1) == 5
+    assert idx.ingest_files([("payment", path)], workers=1) == 0
+
+    write(path, [line(5, "t2", "/charge", 2.0, level="ERROR")], mode="a")
+    os.utime(path, (1, 1))  # a different mtime even within the clock's resolution
+    assert idx.ingest_files([("payment", path)], workers=1) == 1
+    assert idx.summary("t1")["lines"] == 5
+    assert idx.summary("t2")["errors"] == 1
+    assert [t["trace_id"] for t in idx.failed()] == ["t2"]
+
+
+def test_rollup_follows_a_rewritten_file(tmp_path, idx):
+    path = write(tmp_path / "app.log", [line(i, "t1") for i in range(5)] + [line(9, "gone")])
+    idx.ingest_files([("payment", path)], workers=1)
+    assert idx.summary("gone") is not None
+
+    # rotated underneath: the old events and the traces only they made up are dropped
+    write(path, [line(i, "t1") for i in range(20, 22)])
+    os.utime(path, (2, 2))
+    idx.ingest_files([("payment", path)], workers=1)
+    assert idx.summary("gone") is None
+    assert idx.summary("t1")["lines"] == 2
+    assert idx.stats()["traces"] == 1
+
+
+def test_chunked_parse_matches_single_chunk(tmp_path, idx):
+    path = write(tmp_path / "app.log", [line(i, f"t{i % 7}", "/charge", i) for i in range(200)])
+    assert idx.ingest_files([("payment", path)], workers=2, chunk_bytes=512) == 200
+    assert sum(t["lines"] for t in idx.slowest(10)) == 200
+    assert idx.slowest(1)[0]["trace_id"] == "t3"
+    assert idx.slowest(1)[0]["hop_ms"] == sum(range(3, 200, 7))
+
+
+def test_fetched_lines_replace_the_previous_fetch(idx):
+    assert idx.ingest_lines("payment", "http://payment/logs", [line(1, "t1"), line(2, "t2")]) == 2
+    assert idx.ingest_lines("payment", "http://payment/logs", [line(3, "t2")]) == 1
+    assert idx.summary("t1") is None
+    assert [e["line"] for e in idx.timeline("t2")] == [line(3, "t2")]